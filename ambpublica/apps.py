@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AmbpublicaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ambpublica'
+
+    def ready(self):
+        # Registramos el chequeo de la cache del limitador de tasa
+        from ambpublica import limitador
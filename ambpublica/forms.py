@@ -1,8 +1,12 @@
+import datetime
+
 from django import forms
+from django.conf import settings
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.formats import date_format
 
-from paneltrabajador.models import Cita
+from paneltrabajador import disponibilidad
 
 class BuscarMascotaForm(forms.Form):
     rut = forms.IntegerField()
@@ -40,21 +44,66 @@ class MascotaSelectForm(forms.Form):
         if queryset is not None:
             self.fields['mascota'].choices = [(m.id_mascota, f"{m.nombre} - {m.especie}") for m in queryset]
 
-class CitaForm(forms.ModelForm):
-    class Meta:
-        model = Cita
-        fields = ['n_cita']
+class CitaForm(forms.Form):
+    """
+    Selección de una hora disponible en una ventana de días (ver paneltrabajador.disponibilidad).
+    El valor de cada opción es "<id del veterinario>|<fecha ISO>", la cita se crea al reservar.
+    """
+    # Máximo de días hacia adelante que se puede reservar
+    DIAS_MAXIMOS = 90
 
-    def __init__(self, *args, **kwargs):
+    hora = forms.ChoiceField(label="Seleccione una Fecha:")
+
+    def __init__(self, *args, desde=None, **kwargs):
         super().__init__(*args, **kwargs)
 
         # Agrega clases de Bootstrap a los campos
         for field_name, field in self.fields.items():
             field.widget.attrs['class'] = 'form-control'
 
-        # Filtra las citas con estado igual a 0 y obtén sus fechas e ID
-        citas_disponibles = Cita.objects.filter(estado='0').values_list('n_cita', 'fecha')
-        # Crea una lista de tuplas en el formato adecuado para el campo de selección
-        opciones = [(cita[0], date_format(cita[1], 'DATETIME_FORMAT')) for cita in citas_disponibles]
-        # Agrega las opciones al campo de selección
-        self.fields['n_cita'] = forms.ChoiceField(choices=opciones, widget=forms.Select(attrs={'class': 'form-control'}), label="Seleccione una Fecha:")
+        # Ventana de días que se muestra, desde hoy como mínimo
+        hoy = timezone.localdate()
+        self.desde = min(max(desde or hoy, hoy), hoy + datetime.timedelta(days=self.DIAS_MAXIMOS))
+        self.hasta = self.desde + datetime.timedelta(days=settings.RESERVA_DIAS)
+
+        # Horas agrupadas por día, en una sola consulta
+        dias = {}
+        for hora in disponibilidad.horas(self.desde, self.hasta):
+            local = timezone.localtime(hora['fecha'])
+            opcion = ('{}|{}'.format(hora['usuario_id'], hora['fecha'].isoformat()), '{} - {}'.format(date_format(local, 'TIME_FORMAT'), hora['nombre']))
+            dias.setdefault(date_format(local.date(), 'DATE_FORMAT'), []).append(opcion)
+        self.fields['hora'].choices = list(dias.items())
+
+    def clean_hora(self):
+        # Devuelve (id del veterinario, fecha)
+        usuario, fecha = self.cleaned_data['hora'].split('|', 1)
+        return int(usuario), datetime.datetime.fromisoformat(fecha)
+
+class ListaEsperaForm(forms.Form):
+    # Máximo de días hacia adelante que se puede esperar una hora
+    DIAS_MAXIMOS = 90
+
+    rut = forms.IntegerField(label='RUT')
+    id_mascota = forms.IntegerField(label='ID de la mascota')
+    desde = forms.DateField(label='Desde', widget=forms.DateInput(attrs={'type': 'date'}))
+    hasta = forms.DateField(label='Hasta', widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Agrega clases de Bootstrap a los campos
+        for field_name, field in self.fields.items():
+            field.widget.attrs['class'] = 'form-control'
+
+    def clean(self):
+        datos = super().clean()
+        desde = datos.get('desde')
+        hasta = datos.get('hasta')
+        if desde and hasta:
+            hoy = timezone.localdate()
+            if desde < hoy:
+                self.add_error('desde', 'La fecha no puede ser anterior a hoy.')
+            if hasta < desde:
+                self.add_error('hasta', 'La fecha debe ser posterior a "Desde".')
+            elif hasta > hoy + datetime.timedelta(days=self.DIAS_MAXIMOS):
+                self.add_error('hasta', 'Puede esperar como máximo {} días.'.format(self.DIAS_MAXIMOS))
+        return datos
@@ -0,0 +1,191 @@
+import hashlib
+import time
+from functools import wraps
+
+from django import forms
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+# Limitador de tasa con "token bucket" (cubo de fichas) para las vistas públicas.
+# El estado de cada cubo se guarda en la cache configurada en LIMITES_TASA_CACHE. Para que todos los
+# procesos del servidor compartan los mismos contadores esa cache debe ser compartida (CACHE_BACKEND
+# "archivo" o "redis"): con la memoria del proceso (locmem) cada proceso aplica su propio límite.
+# El chequeo ambpublica.W001 lo advierte en `python manage.py check --deploy`.
+
+# Mismo campo que el RUT de los formularios públicos (BuscarMascotaForm, RutForm...)
+CAMPO_RUT = forms.IntegerField()
+
+
+def consumir(clave, capacidad, por_minuto, cache=None):
+    """
+    Intenta consumir una ficha del cubo indicado.
+
+    El cubo se lee y se escribe con una llamada a la cache cada vez. La operación no es atómica:
+    bajo mucha concurrencia pueden pasar algunas peticiones de más, lo cual es aceptable
+    para proteger la base de datos.
+
+    Args:
+        clave: Clave de cache del cubo.
+        capacidad: Cantidad máxima de fichas (ráfaga permitida).
+        por_minuto: Fichas que se recargan por minuto.
+        cache: Cache a utilizar, por defecto la definida en LIMITES_TASA_CACHE.
+
+    Returns:
+        float: Segundos que se debe esperar, 0 si la petición está permitida.
+    """
+    if cache is None:
+        cache = caches[getattr(settings, 'LIMITES_TASA_CACHE', 'default')]
+
+    tasa = por_minuto / 60.0
+    ahora = time.time()
+
+    # Un cubo que no existe en la cache está lleno
+    fichas, ultimo = cache.get(clave, (capacidad, ahora))
+    fichas = min(capacidad, fichas + (ahora - ultimo) * tasa)
+
+    espera = 0.0
+    if fichas < 1:
+        espera = (1 - fichas) / tasa
+    else:
+        fichas -= 1
+
+    # Pasado este tiempo el cubo estaría lleno de nuevo, así que la cache puede olvidarlo
+    cache.set(clave, (fichas, ahora), int(capacidad / tasa) + 1)
+    return espera
+
+
+def _clave(vista, tipo, valor):
+    # Hasheamos el valor para no guardar RUTs o IPs en texto plano en la cache
+    resumen = hashlib.sha1(str(valor).encode()).hexdigest()[:16]
+    return 'limite:{}:{}:{}'.format(vista, tipo, resumen)
+
+
+def _obtener_rut(request):
+    # Solo consideramos el RUT enviado en el formulario. No usamos la sesión ya que
+    # leerla implica una consulta a la base de datos.
+    if request.method != 'POST':
+        return None
+    rut = request.POST.get('rut', '').strip()
+    if not rut:
+        return None
+    # Se normaliza igual que en los formularios, así "012345678" y "12345678" comparten el cubo.
+    # Un valor que los formularios rechazan (por ejemplo "12345678-K") tiene su propio cubo
+    try:
+        return CAMPO_RUT.clean(rut)
+    except ValidationError:
+        return rut.upper()
+
+
+def _obtener_usuario(request):
+    # Nombre de usuario enviado en el formulario de inicio de sesión, sin distinguir mayúsculas
+    if request.method != 'POST':
+        return None
+    usuario = request.POST.get('username', '').strip().lower()
+    return usuario or None
+
+
+# Valores por los que se puede limitar además de la IP: {nombre en LIMITES_TASA: función que lo obtiene}
+OBTENER_VALOR = {
+    'rut': _obtener_rut,
+    'usuario': _obtener_usuario,
+}
+
+
+def comprobar(vista, request):
+    """
+    Consume una ficha de cada cubo configurado para la vista (IP, RUT, usuario).
+
+    Args:
+        vista: Nombre de la configuración en LIMITES_TASA.
+        request: Petición actual.
+
+    Returns:
+        float: Segundos que se debe esperar, 0 si la petición está permitida.
+    """
+    limites = getattr(settings, 'LIMITES_TASA', {}).get(vista)
+
+    # Sin configuración no se limita nada
+    if not limites:
+        return 0.0
+
+    if 'ip' in limites:
+        capacidad, por_minuto = limites['ip']
+        espera = consumir(_clave(vista, 'ip', request.META.get('REMOTE_ADDR')), capacidad, por_minuto)
+        if espera > 0:
+            return espera
+
+    for tipo, obtener in OBTENER_VALOR.items():
+        if tipo not in limites:
+            continue
+        valor = obtener(request)
+        if valor is not None:
+            capacidad, por_minuto = limites[tipo]
+            espera = consumir(_clave(vista, tipo, valor), capacidad, por_minuto)
+            if espera > 0:
+                return espera
+    return 0.0
+
+
+def limitar_tasa(vista):
+    """
+    Decorador que limita la cantidad de peticiones por IP y por RUT (o usuario) para una vista.
+
+    La configuración se lee desde settings.LIMITES_TASA[vista], por ejemplo:
+    {'ip': (20, 10), 'rut': (5, 2)} donde cada tupla es (capacidad, fichas por minuto).
+    Las peticiones sobre el límite se responden con un 429 antes de ejecutar la vista,
+    es decir, sin ningún trabajo del ORM.
+
+    Args:
+        vista: Nombre de la configuración en LIMITES_TASA.
+    """
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(request, *args, **kwargs):
+            espera = comprobar(vista, request)
+            if espera > 0:
+                return respuesta_limite(espera)
+            return funcion(request, *args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def respuesta_limite(espera):
+    """
+    Construye la respuesta 429 (Too Many Requests).
+
+    Se renderiza sin el request para no cargar la sesión ni los mensajes.
+
+    Args:
+        espera: Segundos que debe esperar el cliente antes de reintentar.
+
+    Returns:
+        HttpResponse: Respuesta con estado 429 y cabecera Retry-After.
+    """
+    segundos = int(espera) + 1
+    contenido = render_to_string('429.html', {'titulo': 'Demasiadas solicitudes', 'espera': segundos})
+    respuesta = HttpResponse(contenido, status=429)
+    respuesta['Retry-After'] = str(segundos)
+    return respuesta
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def revisar_cache(app_configs, **kwargs):
+    """
+    Advierte (check --deploy) si los límites de tasa se cuentan en la memoria de cada proceso.
+    """
+    if not getattr(settings, 'LIMITES_TASA', None):
+        return []
+    alias = getattr(settings, 'LIMITES_TASA_CACHE', 'default')
+    if not isinstance(caches[alias], LocMemCache):
+        return []
+    return [checks.Warning(
+        "Los límites de tasa usan una cache en la memoria de cada proceso: cada proceso aplica su propio límite.",
+        hint="Configure una cache compartida con CACHE_BACKEND=archivo o CACHE_BACKEND=redis (ver .env.template).",
+        obj=alias,
+        id='ambpublica.W001',
+    )]
@@ -0,0 +1,52 @@
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from ambpublica.limitador import limitar_tasa
+
+
+# Comando para medir la latencia que agrega el limitador de tasa a las peticiones permitidas
+class Command(BaseCommand):
+    help = "Mide la latencia agregada por el limitador de tasa a las peticiones permitidas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=20000)
+
+    def handle(self, **options):
+        iteraciones = options['iteraciones']
+        fabrica = RequestFactory()
+
+        def vista(request):
+            return HttpResponse("OK")
+
+        # Límites altos para que todas las peticiones sean permitidas
+        limites = {'benchmark': {'ip': (iteraciones * 2, 60000), 'rut': (iteraciones * 2, 60000)}}
+        vista_limitada = limitar_tasa('benchmark')(vista)
+
+        peticiones = [fabrica.post('/consulta_mascota/', {'rut': '12345678', 'id_mascota': '1'}) for i in range(iteraciones)]
+        # Forzamos el parseo del POST para que no se cuente en la medición
+        for peticion in peticiones:
+            peticion.POST
+
+        with override_settings(LIMITES_TASA=limites):
+            caches['default'].clear()
+
+            inicio = time.perf_counter()
+            for peticion in peticiones:
+                vista(peticion)
+            base = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            for peticion in peticiones:
+                respuesta = vista_limitada(peticion)
+                assert respuesta.status_code == 200
+            limitada = time.perf_counter() - inicio
+
+        extra = (limitada - base) / iteraciones * 1e6
+        self.stdout.write("Iteraciones: {}".format(iteraciones))
+        self.stdout.write("Sin limitador: {:.2f} us/peticion".format(base / iteraciones * 1e6))
+        self.stdout.write("Con limitador: {:.2f} us/peticion".format(limitada / iteraciones * 1e6))
+        self.stdout.write(self.style.SUCCESS("Latencia agregada: {:.2f} us/peticion".format(extra)))
@@ -1,3 +1,62 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ambpublica import limitador
+
+
+class LimitadorTests(TestCase):
+    """
+    Verifica el cubo de fichas del limitador de tasa y la respuesta 429 de las vistas públicas.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+
+    @mock.patch('ambpublica.limitador.time')
+    def test_cubo_se_agota_y_recarga(self, reloj):
+        reloj.time.return_value = 1000.0
+        # Capacidad 3, una ficha cada 2 segundos
+        for i in range(3):
+            self.assertEqual(limitador.consumir('prueba', 3, 30), 0)
+        self.assertAlmostEqual(limitador.consumir('prueba', 3, 30), 2.0)
+
+        # A los 2 segundos hay una ficha nueva, solo una
+        reloj.time.return_value = 1002.0
+        self.assertEqual(limitador.consumir('prueba', 3, 30), 0)
+        self.assertAlmostEqual(limitador.consumir('prueba', 3, 30), 2.0)
+
+        # Tras mucho tiempo el cubo no supera su capacidad
+        reloj.time.return_value = 2000.0
+        for i in range(3):
+            self.assertEqual(limitador.consumir('prueba', 3, 30), 0)
+        self.assertGreater(limitador.consumir('prueba', 3, 30), 0)
+
+    @override_settings(LIMITES_TASA={'consulta_mascota': {'ip': (2, 1)}})
+    def test_respuesta_429(self):
+        datos = {'rut': '1', 'id_mascota': '1'}
+        for i in range(2):
+            self.assertEqual(self.client.post(reverse('ambpublico_consulta'), datos).status_code, 302)
+
+        # La petición rechazada no llega a la vista: ninguna consulta a la base de datos
+        with self.assertNumQueries(0):
+            respuesta = self.client.post(reverse('ambpublico_consulta'), datos)
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertTrue(1 <= int(respuesta['Retry-After']) <= 60)
+
+    @override_settings(LIMITES_TASA={'consulta_mascota': {'rut': (1, 1)}})
+    def test_cubo_por_rut(self):
+        datos = {'rut': '12345678', 'id_mascota': '1'}
+        self.assertEqual(self.client.post(reverse('ambpublico_consulta'), datos).status_code, 302)
+        # El mismo RUT escrito distinto comparte el cubo, uno con dígito verificador no
+        self.assertEqual(self.client.post(reverse('ambpublico_consulta'), dict(datos, rut=' 012345678')).status_code, 429)
+        self.assertEqual(limitador.comprobar('consulta_mascota', RequestFactory().post('/', dict(datos, rut='12345678-K'))), 0)
+        self.assertGreater(limitador.comprobar('consulta_mascota', RequestFactory().post('/', dict(datos, rut='12345678-k'))), 0)
+
+    @override_settings(LIMITES_TASA={'consulta_mascota': {'ip': (2, 1)}})
+    def test_advertencia_cache_local(self):
+        self.assertEqual([aviso.id for aviso in limitador.revisar_cache(None)], ['ambpublica.W001'])
+        with override_settings(LIMITES_TASA={}):
+            self.assertEqual(limitador.revisar_cache(None), [])
@@ -1,12 +1,17 @@
+import datetime
 from ast import And
 from urllib import request
+from django.conf import settings
 from django.http import HttpResponse
 from django.shortcuts import redirect, render
 from django.template import loader
 from django.contrib import messages
-from ambpublica.forms import BuscarMascotaForm, CitaForm, MascotaSelectForm, RutForm
+from django.utils import timezone
+from ambpublica.forms import BuscarMascotaForm, CitaForm, ListaEsperaForm, MascotaSelectForm, RutForm
+from ambpublica.limitador import limitar_tasa
+from paneltrabajador import disponibilidad, documentos, espera, sucursales
 from paneltrabajador.forms import ClienteForm, MascotaForm
-from paneltrabajador.models import Cita, Cliente, Mascota
+from paneltrabajador.models import Cliente, EstadoCita, ListaEspera, Mascota
 
 # Create your views here.
 
@@ -16,6 +21,7 @@ def main(request):
     return HttpResponse(template.render())
 
 
+@limitar_tasa('consulta_mascota')
 def consulta_mascota(request):
     """
     Maneja la consulta de una mascota a través de un formulario.
@@ -44,7 +50,9 @@ def consulta_mascota(request):
             try:
                 cliente = Cliente.objects.get(rut=rut)
                 mascota = Mascota.objects.get(cliente=cliente, id_mascota=id_mascota)
-                return render(request, 'ambpublica/consulta_mascota/ficha.html', {'mascota': mascota})
+                # Enlace firmado a la versión para imprimir (no requiere volver a ingresar el RUT)
+                enlace = documentos.enlace('ficha', mascota.id_mascota)
+                return render(request, 'ambpublica/consulta_mascota/ficha.html', {'mascota': mascota, 'enlace_imprimir': enlace})
             except Cliente.DoesNotExist:
                 messages.error(request, 'Cliente con Rut {} no encontrado.'.format(rut))
                 return redirect('ambpublico_consulta')
@@ -58,6 +66,7 @@ def consulta_mascota(request):
 
 # Maneja un flujo de pasos para la reserva de una cita.
 # Utiliza la sesión para almacenar el estado del proceso de reserva.
+@limitar_tasa('reserva_hora')
 def reserva_hora(request):
     """
     Maneja un flujo de pasos para la reserva de una cita.
@@ -208,27 +217,28 @@ def reserva_hora(request):
             messages.error(request, 'Ha ocurrido un error. Intente nuevamente...')
             return redirect('ambpublico_reserva_cancelar')
 
+        # Primer día de la ventana de horas que se muestra (?desde=AAAA-MM-DD)
+        try:
+            desde = datetime.date.fromisoformat(request.GET.get('desde', ''))
+        except ValueError:
+            desde = None
+
         # Se envia el formulario
         if request.method == 'POST':
             # Pasamos los datos de la peticion al formulario
-            form = CitaForm(request.POST)
+            form = CitaForm(request.POST, desde=desde)
 
             # Todo OK
             if form.is_valid():
-                # Obtener el valor de la nueva cita
-                n_cita = form.cleaned_data['n_cita']
+                # Veterinario y fecha de la hora seleccionada
+                usuario_id, fecha = form.cleaned_data['hora']
 
-                # Verificamos que la cita ingresada sea real, ingresamos los datos del cliente y la mascota a ella
-                try:
-                    cita = Cita.objects.get(n_cita=n_cita)
-                    cita.estado = '1'
-                    cita.cliente = cliente
-                    cita.mascota = mascota
-                    cita.save()
-                # Error generico
-                except:
-                    messages.error(request, 'Ha ocurrido un error. Intente nuevamente...')
-                    return redirect('ambpublico_reserva_cancelar')
+                # Creamos la cita, solo si la hora sigue disponible (otro cliente pudo reservarla recién)
+                # Si era una cita disponible pudo estar reservada antes por otro cliente, el nuevo debe recibir su recordatorio
+                cita = disponibilidad.reservar(usuario_id, fecha, estado=EstadoCita.RESERVADA, cliente=cliente, mascota=mascota, recordatorio_enviado_en=None)
+                if cita is None:
+                    messages.error(request, 'La hora seleccionada ya no está disponible. Por favor, seleccione otra.')
+                    return redirect(request.get_full_path())
 
                 # Eliminamos el paso para que se devuelva al inicio
                 try:
@@ -239,22 +249,28 @@ def reserva_hora(request):
                 # Todo OK, nos devolvemos
                 messages.success(request, '¡Se ha reservado su hora exitosamente!')
                 return redirect('ambpublico_reserva')
+        else:
+            # Definimos el formulario para ser usado más abajo en la renderizacion del template
+            form = CitaForm(desde=desde)
 
-        # Definimos el formulario para ser usado más abajo en la renderizacion del template
-        form = CitaForm()
+        # Ventanas anterior y siguiente de horas
+        dias = datetime.timedelta(days=settings.RESERVA_DIAS)
+        anterior = form.desde - dias if form.desde > timezone.localdate() else None
+        siguiente = form.hasta if form.hasta - timezone.localdate() <= datetime.timedelta(days=CitaForm.DIAS_MAXIMOS) else None
 
         # Contexto distinto para mostrar toda la información en el resumen ya que es el paso final
-        context = {'form': form, 'step': step, 'mascota': mascota, 'cliente': cliente}
+        context = {'form': form, 'step': step, 'mascota': mascota, 'cliente': cliente, 'anterior': anterior, 'siguiente': siguiente}
 
         # Hacemos return aquí para que no se cargue el contexto de más abajo
         return render(request, 'ambpublica/reserva_horas/form.html', context)
     else:
-        # Obtenemos la lista de todas las citas
-        citas = Cita.objects.filter(estado='0')
+        # Horas disponibles de los próximos días
+        hoy = timezone.localdate()
+        horas = disponibilidad.horas(hoy, hoy + datetime.timedelta(days=settings.RESERVA_DIAS))
 
-        # Si no hay citas, entonces le asignamos al formulario un contexto personalizado
-        # Para mostrar que no hay citas
-        if not citas.exists():
+        # Si no hay horas, entonces le asignamos al formulario un contexto personalizado
+        # Para mostrar que no hay horas
+        if not horas:
             return render(request, 'ambpublica/reserva_horas/form.html', {'step': 'nohours'})
         else:
             # Se envia el formulario
@@ -305,3 +321,112 @@ def reserva_hora_cancelar(request):
         pass
     messages.success(request, "El proceso de reserva ha sido cancelado.")
     return redirect('ambpublico_reserva')
+
+
+# Inscripción en la lista de espera, se ofrece cuando no hay horas disponibles
+@limitar_tasa('lista_espera')
+def lista_espera(request):
+    """
+    Inscribe a un cliente y su mascota en la lista de espera para un rango de fechas.
+    Cuando se libere una hora en ese rango se le ofrecerá por correo (ver paneltrabajador.espera).
+
+    Args:
+        request: La solicitud HTTP.
+
+    Returns:
+        HttpResponse: El formulario de inscripción o una redirección a la reserva de horas.
+    """
+    if request.method == 'POST':
+        form = ListaEsperaForm(request.POST)
+        if form.is_valid():
+            rut = form.cleaned_data['rut']
+            id_mascota = form.cleaned_data['id_mascota']
+
+            # La mascota debe pertenecer al cliente
+            mascota = Mascota.objects.filter(cliente_id=rut, id_mascota=id_mascota).first()
+            if mascota is None:
+                messages.error(request, 'Mascota con ID {} no encontrada para el cliente con Rut {}.'.format(id_mascota, rut))
+                return redirect('ambpublico_espera')
+
+            # Una sola inscripción vigente por mascota
+            activas = (ListaEspera.ESTADO_ESPERANDO, ListaEspera.ESTADO_OFRECIDA)
+            if ListaEspera.objects.filter(mascota=mascota, estado__in=activas).exists():
+                messages.error(request, 'Su mascota ya está en la lista de espera.')
+                return redirect('ambpublico_reserva')
+
+            desde = form.cleaned_data['desde']
+            hasta = form.cleaned_data['hasta']
+            ListaEspera.objects.create(cliente_id=rut, mascota=mascota, desde=desde, hasta=hasta)
+
+            # Si ya hay una hora disponible en el rango se ofrece de inmediato (al primero de la lista)
+            horas = disponibilidad.horas(desde, hasta + datetime.timedelta(days=1))
+            if horas:
+                espera.ofrecer(horas[0]['usuario_id'], horas[0]['fecha'])
+
+            messages.success(request, 'Quedó inscrito en la lista de espera. Le avisaremos por correo cuando haya una hora para usted.')
+            return redirect('ambpublico_reserva')
+    else:
+        form = ListaEsperaForm()
+    return render(request, 'ambpublica/reserva_horas/espera.html', {'form': form})
+
+
+@limitar_tasa('lista_espera')
+def lista_espera_oferta(request, token):
+    """
+    Muestra la hora ofrecida a un inscrito de la lista de espera y le permite confirmarla o rechazarla.
+    El enlace (firmado) llega por correo y vence junto con la oferta.
+
+    Args:
+        request: La solicitud HTTP.
+        token: Token firmado con la inscripción y la sucursal.
+
+    Returns:
+        HttpResponse: El detalle de la oferta o una redirección a la reserva de horas.
+    """
+    datos = espera.leer_token(token)
+    # El enlace debe abrirse en la sucursal de la oferta (el prefijo /s/<código>/ de la URL)
+    if datos is None or datos[1] != sucursales.actual():
+        messages.error(request, 'El enlace no es válido o la oferta ya venció.')
+        return redirect('ambpublico_reserva')
+
+    oferta = ListaEspera.objects.select_related('cliente', 'mascota', 'cita').filter(
+        pk=datos[0], estado=ListaEspera.ESTADO_OFRECIDA, oferta_vence_en__gt=timezone.now(),
+    ).first()
+    if oferta is None:
+        messages.error(request, 'La oferta ya no está vigente.')
+        return redirect('ambpublico_reserva')
+
+    if request.method == 'POST':
+        if request.POST.get('accion') == 'confirmar':
+            if espera.confirmar(oferta):
+                messages.success(request, '¡Se ha reservado su hora exitosamente!')
+            else:
+                messages.error(request, 'La oferta ya no está vigente.')
+        else:
+            espera.liberar(oferta, ListaEspera.ESTADO_RECHAZADA)
+            messages.success(request, 'Ha rechazado la hora ofrecida. Gracias por avisarnos.')
+        return redirect('ambpublico_reserva')
+
+    return render(request, 'ambpublica/reserva_horas/oferta.html', {'oferta': oferta})
+
+
+@limitar_tasa('documento')
+def documento(request, token):
+    """
+    Muestra un documento para imprimir (por ejemplo, la ficha de una mascota) desde un enlace firmado.
+    El enlace se obtiene en la consulta de mascotas y vence después de DOCUMENTOS_ENLACE_HORAS.
+
+    Args:
+        request: La solicitud HTTP.
+        token: Token firmado con el tipo de documento, el registro y la sucursal.
+
+    Returns:
+        HttpResponse: El documento (?formato=pdf para PDF), o una redirección a la consulta si el enlace no es válido.
+    """
+    datos = documentos.leer_token(token)
+    # El enlace debe abrirse en la sucursal del documento (el prefijo /s/<código>/ de la URL)
+    if datos is None or datos[2] != sucursales.actual():
+        messages.error(request, 'El enlace no es válido o ya venció.')
+        return redirect('ambpublico_consulta')
+
+    return documentos.respuesta(request, datos[0], datos[1], request.GET.get('formato', 'html'))
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from django.contrib import messages
 from dotenv import load_dotenv
@@ -51,10 +52,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Debe ir antes de los middleware que leen o modifican el contenido de la respuesta
+    'paneltrabajador.compresion.CompresionMiddleware',
+    'paneltrabajador.consultas_lentas.ConsultasLentasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'paneltrabajador.sucursales.SucursalMiddleware',
+    'paneltrabajador.perfilador.PerfiladorMiddleware',
+    'paneltrabajador.auditoria.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,6 +79,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'paneltrabajador.sucursales.contexto',
             ],
         },
     },
@@ -90,6 +98,32 @@ DATABASES = {
     }
 }
 
+# Sucursales. Cada una guarda clientes, mascotas, citas y facturas en su propia base de datos
+# (ver paneltrabajador.sucursales). Se definen en .env como SUCURSALES="centro:Sucursal Centro,norte:Sucursal Norte".
+# Sin sucursales todo queda en la base "default".
+SUCURSALES = {}
+for definicion in filter(None, os.getenv('SUCURSALES', '').split(',')):
+    codigo, _, nombre = definicion.strip().partition(':')
+    SUCURSALES[codigo] = {'nombre': nombre or codigo, 'base_datos': 'sucursal_' + codigo}
+    DATABASES['sucursal_' + codigo] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "db_sucursal_{}.sqlite3".format(codigo),
+    }
+
+# Dos sucursales de prueba, solo al ejecutar las pruebas (manage.py test), cada una con su propia base SQLite.
+# Las pruebas de sucursales las activan con override_settings(SUCURSALES=SUCURSALES_PRUEBA), las demás pruebas
+# se ejecutan sin sucursales
+SUCURSALES_PRUEBA = {}
+if sys.argv[1:2] == ['test']:
+    for codigo in ('centro', 'norte'):
+        SUCURSALES_PRUEBA[codigo] = {'nombre': 'Sucursal ' + codigo.capitalize(), 'base_datos': 'prueba_' + codigo}
+        DATABASES['prueba_' + codigo] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": "db_prueba_{}.sqlite3".format(codigo),
+        }
+
+DATABASE_ROUTERS = ['paneltrabajador.routers.SucursalRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -156,3 +190,65 @@ EMAIL_HOST_USER = str(os.getenv('EMAIL_HOST_USER'))
 EMAIL_HOST_PASSWORD = str(os.getenv('EMAIL_HOST_PASSWORD'))
 EMAIL_PORT = int(os.getenv('EMAIL_PORT'))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS') == 'True'
+
+# Cache. En desarrollo se usa la memoria del proceso; en produccion conviene una cache compartida
+# entre procesos: en archivos ("archivo", CACHE_UBICACION es una carpeta) o un servidor Redis
+# ("redis", CACHE_UBICACION es la URL, requiere el paquete redis). Los backends son los de Django
+# con estadisticas de uso (ver paneltrabajador.cache).
+CACHE_BACKENDS = {
+    'locmem': 'paneltrabajador.cache.LocMemCache',
+    'archivo': 'paneltrabajador.cache.FileBasedCache',
+    'redis': 'paneltrabajador.cache.RedisCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.getenv('CACHE_UBICACION', 'ficats'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRADAS', '5000')),
+        },
+    }
+}
+
+# Perfilador de peticiones bajo demanda (?perfilar=1 o encabezado X-Perfilar, solo superusuarios).
+# Se guardan las ultimas PERFILADOR_MAXIMO_CAPTURAS capturas en la carpeta (ver paneltrabajador.perfilador)
+PERFILADOR_DIRECTORIO = os.getenv('PERFILADOR_DIRECTORIO', str(BASE_DIR / 'perfiles'))
+PERFILADOR_MAXIMO_CAPTURAS = int(os.getenv('PERFILADOR_MAXIMO_CAPTURAS', '50'))
+
+# Registro de consultas lentas (ver paneltrabajador.consultas_lentas). Se registran las consultas que tardan
+# CONSULTAS_LENTAS_UMBRAL_MS o mas; vacio lo desactiva. El archivo rota al llegar al tamano maximo (bytes)
+CONSULTAS_LENTAS_UMBRAL_MS = os.getenv('CONSULTAS_LENTAS_UMBRAL_MS', '200')
+CONSULTAS_LENTAS_UMBRAL_MS = float(CONSULTAS_LENTAS_UMBRAL_MS) if CONSULTAS_LENTAS_UMBRAL_MS else None
+CONSULTAS_LENTAS_ARCHIVO = os.getenv('CONSULTAS_LENTAS_ARCHIVO', str(BASE_DIR / 'logs' / 'consultas_lentas.log'))
+CONSULTAS_LENTAS_TAMANO_MAXIMO = 5 * 1024 * 1024
+CONSULTAS_LENTAS_RESPALDOS = 5
+
+# Limites de tasa (token bucket) para las vistas publicas
+# Cada tupla es (capacidad, fichas por minuto). La cache debe ser compartida entre procesos en produccion
+# (CACHE_BACKEND archivo o redis), con locmem cada proceso aplica su propio limite (chequeo ambpublica.W001 de check --deploy).
+LIMITES_TASA_CACHE = 'default'
+LIMITES_TASA = {
+    'consulta_mascota': {'ip': (20, 10), 'rut': (5, 2)},
+    'reserva_hora': {'ip': (60, 30), 'rut': (20, 10)},
+    # Inicio de sesión del panel, por IP y por nombre de usuario. Se comprueba antes de verificar la contraseña
+    'login': {'ip': (20, 10), 'usuario': (5, 2)},
+    'lista_espera': {'ip': (10, 5), 'rut': (5, 2)},
+    'documento': {'ip': (30, 15)},
+}
+
+# Días de horas disponibles que muestra cada página de la reserva de horas (ver paneltrabajador.disponibilidad)
+RESERVA_DIAS = int(os.getenv('RESERVA_DIAS', '14'))
+
+# Lista de espera de horas (ver paneltrabajador.espera): minutos que se retiene una cita ofrecida
+LISTA_ESPERA_OFERTA_MINUTOS = int(os.getenv('LISTA_ESPERA_OFERTA_MINUTOS', '120'))
+# Dirección pública del sitio, para los enlaces de los correos
+URL_PUBLICA = os.getenv('URL_PUBLICA', 'http://localhost:8000')
+
+# Documentos imprimibles (ver paneltrabajador.documentos): carpeta de los documentos generados
+# y horas de validez de los enlaces públicos. El formato PDF requiere el paquete weasyprint
+DOCUMENTOS_DIRECTORIO = os.getenv('DOCUMENTOS_DIRECTORIO', str(BASE_DIR / 'documentos'))
+DOCUMENTOS_ENLACE_HORAS = int(os.getenv('DOCUMENTOS_ENLACE_HORAS', '24'))
+
+# Compresión de las respuestas (ver paneltrabajador.compresion): tamaño mínimo en bytes para comprimir.
+# Con el paquete brotli instalado se usa brotli con los navegadores que lo aceptan, si no gzip
+COMPRESION_MINIMO_BYTES = int(os.getenv('COMPRESION_MINIMO_BYTES', '1024'))
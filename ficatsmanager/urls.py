@@ -32,33 +32,67 @@ urlpatterns = [
     path('panel/clientes/eliminar/<int:rut>/', vistas_panel.cliente_eliminar, name='panel_cliente_eliminar'),
 
     path('panel/citas/', vistas_panel.cita_listar, name="panel_cita_listar"),
+    path('panel/citas/calendario/', vistas_panel.cita_calendario, name="panel_cita_calendario"),
+    path('panel/citas/calendario/datos/', vistas_panel.cita_calendario_datos, name="panel_cita_calendario_datos"),
+    path('panel/citas/filas/', vistas_panel.cita_filas, name="panel_cita_filas"),
+    path('panel/citas/acciones/', vistas_panel.cita_acciones, name="panel_cita_acciones"),
     path('panel/citas/nuevo/', vistas_panel.cita_agregar, name="panel_cita_nuevo"),
     path('panel/citas/editar/<int:n_cita>/', vistas_panel.cita_editar, name='panel_cita_editar'),
     path('panel/citas/eliminar/<int:n_cita>/', vistas_panel.cita_eliminar, name='panel_cita_eliminar'),
 
     path('panel/mascotas/', vistas_panel.mascota_listar, name='panel_mascota_listar'),
+    path('panel/mascotas/filas/', vistas_panel.mascota_filas, name='panel_mascota_filas'),
     path('panel/mascotas/nuevo/', vistas_panel.mascota_agregar, name='panel_mascota_nuevo'),
     path('panel/mascotas/editar/<int:id_mascota>/', vistas_panel.mascota_editar, name='panel_mascota_editar'),
     path('panel/mascotas/eliminar/<int:id_mascota>/', vistas_panel.mascota_eliminar, name='panel_mascota_eliminar'),
+    path('panel/mascotas/imprimir/<int:id_mascota>/', vistas_panel.mascota_imprimir, name='panel_mascota_imprimir'),
 
     path('panel/facturas/', vistas_panel.factura_listar, name='panel_factura_listar'),
+    path('panel/facturas/acciones/', vistas_panel.factura_acciones, name='panel_factura_acciones'),
     path('panel/facturas/nuevo/', vistas_panel.factura_agregar, name='panel_factura_nuevo'),
     path('panel/facturas/editar/<int:numero_factura>/', vistas_panel.factura_editar, name='panel_factura_editar'),
     path('panel/facturas/eliminar/<int:numero_factura>/', vistas_panel.factura_eliminar, name='panel_factura_eliminar'),
+    path('panel/facturas/imprimir/<int:numero_factura>/', vistas_panel.factura_imprimir, name='panel_factura_imprimir'),
 
     path('panel/productos/', vistas_panel.producto_listar, name='panel_producto_listar'),
+    path('panel/productos/acciones/', vistas_panel.producto_acciones, name='panel_producto_acciones'),
     path('panel/productos/agregar/', vistas_panel.producto_agregar, name='panel_producto_agregar'),
     path('panel/productos/editar/<int:id_producto>/', vistas_panel.producto_editar, name='panel_producto_editar'),
     path('panel/productos/eliminar/<int:id_producto>/', vistas_panel.producto_eliminar, name='panel_producto_eliminar'),
 
+    path('panel/historico/citas/', vistas_panel.historico_citas, name='panel_historico_citas'),
+    path('panel/historico/facturas/', vistas_panel.historico_facturas, name='panel_historico_facturas'),
+
     path('panel/usuarios/', vistas_panel.usuario_listar, name='panel_usuario_listar'),
     path('panel/usuarios/agregar/', vistas_panel.usuario_agregar, name='panel_usuario_agregar'),
     path('panel/usuarios/editar/<int:id_usuario>/', vistas_panel.usuario_editar, name='panel_usuario_editar'),
     path('panel/usuarios/eliminar/<int:id_usuario>/', vistas_panel.usuario_eliminar, name='panel_usuario_eliminar'),
     path('panel/usuarios/newpassword/<int:id_usuario>/', vistas_panel.usuario_newpassword, name='panel_usuario_newpassword'),
 
+    path('panel/auditoria/', vistas_panel.auditoria_listar, name='panel_auditoria_listar'),
+
+    path('panel/sucursal/', vistas_panel.sucursal_cambiar, name='panel_sucursal_cambiar'),
+    path('panel/reportes/sucursales/', vistas_panel.reporte_sucursales, name='panel_reporte_sucursales'),
+    path('panel/cache/', vistas_panel.cache_estadisticas, name='panel_cache_estadisticas'),
+    path('panel/perfiles/', vistas_panel.perfil_listar, name='panel_perfil_listar'),
+    path('panel/perfiles/<str:nombre>/', vistas_panel.perfil_detalle, name='panel_perfil_detalle'),
+    path('panel/perfiles/<str:nombre>/descargar/', vistas_panel.perfil_descargar, name='panel_perfil_descargar'),
+
+    path('panel/autocompletar/clientes/', vistas_panel.autocompletar_clientes, name='panel_autocompletar_clientes'),
+    path('panel/autocompletar/mascotas/', vistas_panel.autocompletar_mascotas, name='panel_autocompletar_mascotas'),
+    path('panel/autocompletar/usuarios/', vistas_panel.autocompletar_usuarios, name='panel_autocompletar_usuarios'),
+    path('panel/autocompletar/productos/', vistas_panel.autocompletar_productos, name='panel_autocompletar_productos'),
+
+    path('panel/api/v1/<str:recurso>/', vistas_panel.api_coleccion, name='panel_api_coleccion'),
+    path('panel/api/v1/<str:recurso>/bulk/', vistas_panel.api_masivo, name='panel_api_masivo'),
+    path('panel/api/v1/<str:recurso>/<int:pk>/', vistas_panel.api_detalle, name='panel_api_detalle'),
+    path('panel/api/v1/facturas/<int:pk>/lineas/', vistas_panel.api_factura_lineas, name='panel_api_factura_lineas'),
+
     path('', vistas_publica.main, name="ambpublico_index"),
     path('consulta_mascota/', vistas_publica.consulta_mascota, name="ambpublico_consulta"),
     path('reservahora/', vistas_publica.reserva_hora, name="ambpublico_reserva"),
     path('reservahora/cancelar/', vistas_publica.reserva_hora_cancelar, name="ambpublico_reserva_cancelar"),
+    path('reservahora/espera/', vistas_publica.lista_espera, name="ambpublico_espera"),
+    path('reservahora/espera/<str:token>/', vistas_publica.lista_espera_oferta, name="ambpublico_espera_oferta"),
+    path('documento/<str:token>/', vistas_publica.documento, name="ambpublico_documento"),
 ]
@@ -0,0 +1,480 @@
+"""
+Prueba de carga HTTP para FiCats Manager.
+
+Simula usuarios concurrentes contra un servidor en ejecución, con cookies, tokens CSRF
+y la secuencia completa de pasos de cada escenario:
+
+- reserva: flujo completo de reserva_hora (RUT -> crear_cliente -> crear_mascota ->
+  select_mascota -> final) con un cliente nuevo en cada iteración.
+- ficha: consulta pública de la ficha de una mascota (consulta_mascota).
+- panel: navegación de los listados del panel con un usuario del personal.
+
+Solo usa la biblioteca estándar (asyncio), no requiere Django ni dependencias extra.
+Cada petición abre una conexión nueva (Connection: close).
+
+Ejemplo:
+    python herramientas/prueba_carga.py --url http://127.0.0.1:8000 --usuarios 200 --duracion 60 \\
+        --escenarios reserva:2,ficha:5,panel:3 --panel-usuario gerente --panel-clave secreto
+
+Notas:
+- Las vistas públicas y el inicio de sesión del panel tienen límite de tasa por IP
+  (y por usuario en el inicio de sesión, LIMITES_TASA). Desde una sola máquina
+  la mayoría de las peticiones terminarán en 429; para medir el servidor se debe subir
+  o vaciar LIMITES_TASA en el ambiente de la prueba. Los 429 se reportan aparte: no cuentan
+  como errores ni en los percentiles de duración, y el escenario se detiene en ese paso.
+- El escenario "reserva" necesita horarios de veterinarios (o citas disponibles) y va ocupando sus horas.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import ssl
+import string
+import sys
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urljoin, urlsplit
+
+# Cantidad máxima de redirecciones que se siguen en un paso
+MAXIMO_REDIRECCIONES = 5
+
+RE_CSRF = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+RE_OPCION = re.compile(r'<option value="([^"]+)"')
+
+
+def _select(html, nombre):
+    # Valores de las opciones de un <select name="...">
+    inicio = html.find('<select name="{}"'.format(nombre))
+    if inicio < 0:
+        return []
+    fin = html.find('</select>', inicio)
+    return RE_OPCION.findall(html[inicio:fin])
+
+
+class ErrorPaso(Exception):
+    """
+    El paso terminó con una respuesta inesperada (estado HTTP o contenido).
+    """
+
+
+class Respuesta:
+    def __init__(self, estado, cabeceras, cuerpo, url):
+        self.estado = estado
+        self.cabeceras = cabeceras
+        self.cuerpo = cuerpo
+        self.url = url
+
+    @property
+    def texto(self):
+        return self.cuerpo.decode('utf-8', errors='replace')
+
+
+class Sesion:
+    """
+    Cliente HTTP mínimo sobre asyncio con cookies y token CSRF, uno por usuario virtual.
+    """
+
+    def __init__(self, base, tiempo_espera):
+        self.base = base.rstrip('/')
+        self.tiempo_espera = tiempo_espera
+        self.cookies = {}
+
+    async def _enviar(self, metodo, url, cuerpo=None):
+        partes = urlsplit(url)
+        seguro = partes.scheme == 'https'
+        puerto = partes.port or (443 if seguro else 80)
+        ruta = partes.path or '/'
+        if partes.query:
+            ruta += '?' + partes.query
+
+        cabeceras = {
+            'Host': partes.netloc,
+            'User-Agent': 'ficats-prueba-carga',
+            'Accept': 'text/html,application/json',
+            'Connection': 'close',
+        }
+        if self.cookies:
+            cabeceras['Cookie'] = '; '.join('{}={}'.format(nombre, valor) for nombre, valor in self.cookies.items())
+        if cuerpo is not None:
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+            cabeceras['Content-Length'] = str(len(cuerpo))
+            # Django exige Referer en los POST por HTTPS
+            cabeceras['Referer'] = url
+            cabeceras['Origin'] = '{}://{}'.format(partes.scheme, partes.netloc)
+
+        lector, escritor = await asyncio.open_connection(partes.hostname, puerto, ssl=ssl.create_default_context() if seguro else None)
+        try:
+            peticion = '{} {} HTTP/1.1\r\n'.format(metodo, ruta)
+            peticion += ''.join('{}: {}\r\n'.format(nombre, valor) for nombre, valor in cabeceras.items())
+            escritor.write(peticion.encode('latin-1') + b'\r\n' + (cuerpo or b''))
+            await escritor.drain()
+            datos = await lector.read()
+        finally:
+            escritor.close()
+
+        encabezado, _, contenido = datos.partition(b'\r\n\r\n')
+        lineas = encabezado.decode('latin-1').split('\r\n')
+        estado = int(lineas[0].split()[1])
+        respuesta = defaultdict(list)
+        for linea in lineas[1:]:
+            nombre, _, valor = linea.partition(':')
+            respuesta[nombre.strip().lower()].append(valor.strip())
+
+        if 'chunked' in ''.join(respuesta.get('transfer-encoding', [])).lower():
+            contenido = self._sin_chunks(contenido)
+
+        for cookie in respuesta.get('set-cookie', []):
+            nombre, _, valor = cookie.split(';', 1)[0].partition('=')
+            if valor in ('', '""'):
+                self.cookies.pop(nombre.strip(), None)
+            else:
+                self.cookies[nombre.strip()] = valor.strip()
+
+        return Respuesta(estado, respuesta, contenido, url)
+
+    @staticmethod
+    def _sin_chunks(contenido):
+        resultado = b''
+        while contenido:
+            tamano, _, resto = contenido.partition(b'\r\n')
+            tamano = int(tamano.split(b';')[0], 16)
+            if tamano == 0:
+                break
+            resultado += resto[:tamano]
+            contenido = resto[tamano + 2:]
+        return resultado
+
+    async def pedir(self, metodo, ruta, datos=None):
+        """
+        Envía una petición y sigue las redirecciones. En los POST agrega el token CSRF de la cookie.
+        """
+        url = urljoin(self.base + '/', ruta.lstrip('/'))
+        cuerpo = None
+        if datos is not None:
+            datos = dict(datos)
+            datos.setdefault('csrfmiddlewaretoken', self.cookies.get('csrftoken', ''))
+            cuerpo = urlencode(datos).encode()
+
+        for _ in range(MAXIMO_REDIRECCIONES + 1):
+            respuesta = await asyncio.wait_for(self._enviar(metodo, url, cuerpo), self.tiempo_espera)
+            if respuesta.estado not in (301, 302, 303, 307, 308):
+                return respuesta
+            url = urljoin(url, respuesta.cabeceras['location'][0])
+            metodo, cuerpo = 'GET', None
+        raise ErrorPaso('demasiadas redirecciones')
+
+    async def get(self, ruta):
+        return await self.pedir('GET', ruta)
+
+    async def post(self, ruta, datos):
+        return await self.pedir('POST', ruta, datos)
+
+
+class Estadisticas:
+    """
+    Acumula la duración y el resultado de cada paso. Los pasos rechazados por el límite de tasa (429)
+    solo se cuentan, sin su duración.
+    """
+
+    def __init__(self):
+        self.duraciones = defaultdict(list)
+        self.errores = Counter()
+        self.limitados = Counter()
+        self.estados = Counter()
+        self.muestras = defaultdict(Counter)
+        self.inicio = time.perf_counter()
+        self.fin = None
+
+    def registrar(self, paso, segundos, error=None, limitado=False):
+        if limitado:
+            self.limitados[paso] += 1
+            return
+        self.duraciones[paso].append(segundos)
+        if error is not None:
+            self.errores[paso] += 1
+            self.muestras[paso][error] += 1
+
+    def resumen(self):
+        duracion = (self.fin or time.perf_counter()) - self.inicio
+        pasos = {}
+        for paso in sorted(set(self.duraciones) | set(self.limitados)):
+            tiempos = sorted(self.duraciones[paso])
+            peticiones = len(tiempos) + self.limitados[paso]
+            pasos[paso] = {
+                'peticiones': peticiones,
+                'errores': self.errores[paso],
+                'limitados': self.limitados[paso],
+                'por_segundo': peticiones / duracion,
+                'p50_ms': _percentil(tiempos, 50) * 1000,
+                'p90_ms': _percentil(tiempos, 90) * 1000,
+                'p95_ms': _percentil(tiempos, 95) * 1000,
+                'p99_ms': _percentil(tiempos, 99) * 1000,
+                'max_ms': tiempos[-1] * 1000 if tiempos else 0.0,
+                'muestras_error': dict(self.muestras[paso].most_common(3)),
+            }
+        total = sum(paso['peticiones'] for paso in pasos.values())
+        return {
+            'duracion_s': duracion,
+            'pasos': pasos,
+            'total': total,
+            'errores': sum(self.errores.values()),
+            'limitados': sum(self.limitados.values()),
+            'por_segundo': total / duracion if duracion else 0,
+            'estados_http': dict(self.estados),
+        }
+
+
+def _percentil(valores, percentil):
+    # Percentil por rango más cercano sobre una lista ordenada
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, int(round(percentil / 100 * len(valores))) - 1))
+    return valores[indice]
+
+
+async def paso(estadisticas, nombre, corutina, esperado=None):
+    """
+    Ejecuta un paso, mide su duración y lo registra. Si se indica "esperado",
+    el texto debe aparecer en la respuesta final para que el paso sea correcto.
+    Un 429 (límite de tasa) no es un error, se registra aparte.
+
+    Returns:
+        Respuesta o None si el paso falló.
+    """
+    inicio = time.perf_counter()
+    error = None
+    respuesta = None
+    try:
+        respuesta = await corutina
+        estadisticas.estados[respuesta.estado] += 1
+        if respuesta.estado == 429:
+            estadisticas.registrar(nombre, time.perf_counter() - inicio, limitado=True)
+            return None
+        if respuesta.estado >= 400:
+            error = 'HTTP {}'.format(respuesta.estado)
+        elif esperado is not None and esperado not in respuesta.texto:
+            error = 'contenido inesperado'
+    except asyncio.TimeoutError:
+        error = 'tiempo de espera agotado'
+    except (OSError, ValueError, IndexError, ErrorPaso) as excepcion:
+        error = '{}: {}'.format(type(excepcion).__name__, excepcion)
+
+    estadisticas.registrar(nombre, time.perf_counter() - inicio, error)
+    return None if error else respuesta
+
+
+def _texto(largo=8):
+    return ''.join(random.choices(string.ascii_lowercase, k=largo))
+
+
+async def escenario_reserva(sesion, estadisticas, compartido, opciones):
+    """
+    Flujo completo de reserva de hora con un cliente nuevo.
+    """
+    # Partimos de cero por si quedó un paso pendiente en la sesión
+    await sesion.get('/reservahora/cancelar/')
+
+    respuesta = await paso(estadisticas, 'reserva: inicio', sesion.get('/reservahora/'), esperado='name="rut"')
+    if respuesta is None:
+        return
+
+    rut = random.randint(10_000_000, 99_999_999)
+    respuesta = await paso(estadisticas, 'reserva: rut', sesion.post('/reservahora/', {'rut': rut}))
+    if respuesta is None:
+        return
+
+    # El RUT podría existir, en ese caso se salta directo a la selección de mascota
+    if 'name="nombre_cliente"' in respuesta.texto:
+        datos = {
+            'rut': rut,
+            'nombre_cliente': 'Carga ' + _texto(),
+            'direccion': 'Calle ' + _texto(),
+            'telefono': random.randint(900_000_000, 999_999_999),
+            'email': '{}@carga.test'.format(_texto()),
+        }
+        respuesta = await paso(estadisticas, 'reserva: crear_cliente', sesion.post('/reservahora/', datos))
+        if respuesta is None:
+            return
+
+    if 'name="numero_chip"' in respuesta.texto:
+        datos = {
+            'nombre': _texto(6).capitalize(),
+            'numero_chip': random.randint(10 ** 11, 10 ** 12),
+            'especie': 'Gato',
+            'raza': 'Mestizo',
+            'fecha_nacimiento': '2020-01-01',
+        }
+        respuesta = await paso(estadisticas, 'reserva: crear_mascota', sesion.post('/reservahora/', datos), esperado='name="mascota"')
+        if respuesta is None:
+            return
+
+    mascotas = _select(respuesta.texto, 'mascota')
+    if not mascotas:
+        estadisticas.registrar('reserva: select_mascota', 0, 'sin mascotas para seleccionar')
+        return
+    id_mascota = random.choice(mascotas)
+    compartido['fichas'].append((rut, id_mascota))
+
+    respuesta = await paso(estadisticas, 'reserva: select_mascota', sesion.post('/reservahora/', {'mascota': id_mascota}), esperado='name="hora"')
+    if respuesta is None:
+        return
+
+    horas = _select(respuesta.texto, 'hora')
+    if not horas:
+        estadisticas.registrar('reserva: final', 0, 'sin horas disponibles')
+        return
+    await paso(estadisticas, 'reserva: final', sesion.post('/reservahora/', {'hora': random.choice(horas)}), esperado='exitosamente')
+
+
+async def escenario_ficha(sesion, estadisticas, compartido, opciones):
+    """
+    Consulta pública de la ficha de una mascota. Usa las mascotas creadas por el escenario
+    de reserva; si aún no hay, consulta una que no existe.
+    """
+    respuesta = await paso(estadisticas, 'ficha: formulario', sesion.get('/consulta_mascota/'), esperado='name="id_mascota"')
+    if respuesta is None:
+        return
+
+    if compartido['fichas']:
+        rut, id_mascota = random.choice(compartido['fichas'])
+        await paso(estadisticas, 'ficha: consulta', sesion.post('/consulta_mascota/', {'rut': rut, 'id_mascota': id_mascota}), esperado='Historial')
+    else:
+        datos = {'rut': random.randint(1, 9_999_999), 'id_mascota': random.randint(1, 10 ** 6)}
+        await paso(estadisticas, 'ficha: consulta (no encontrada)', sesion.post('/consulta_mascota/', datos))
+
+
+# Páginas del panel que recorre el escenario "panel"
+PAGINAS_PANEL = (
+    ('panel: home', '/panel/'),
+    ('panel: citas', '/panel/citas/'),
+    ('panel: citas (filas)', '/panel/citas/filas/?pagina=2'),
+    ('panel: mascotas', '/panel/mascotas/'),
+    ('panel: clientes', '/panel/clientes/'),
+    ('panel: facturas', '/panel/facturas/'),
+)
+
+
+async def escenario_panel(sesion, estadisticas, compartido, opciones):
+    """
+    Navegación del personal por los listados del panel. Inicia sesión solo la primera vez.
+    """
+    if 'sessionid' not in sesion.cookies:
+        await sesion.get('/panel/')
+        datos = {'username': opciones.panel_usuario, 'password': opciones.panel_clave}
+        respuesta = await paso(estadisticas, 'panel: login', sesion.post('/panel/', datos))
+        if respuesta is None:
+            return
+        if 'name="password"' in respuesta.texto:
+            estadisticas.registrar('panel: login', 0, 'credenciales rechazadas')
+            return
+
+    for nombre, ruta in random.sample(PAGINAS_PANEL, 3):
+        respuesta = await paso(estadisticas, nombre, sesion.get(ruta))
+        if respuesta is not None and 'name="password"' in respuesta.texto:
+            estadisticas.registrar(nombre, 0, 'sesión perdida')
+            sesion.cookies.pop('sessionid', None)
+            return
+
+
+ESCENARIOS = {
+    'reserva': escenario_reserva,
+    'ficha': escenario_ficha,
+    'panel': escenario_panel,
+}
+
+
+async def usuario_virtual(numero, opciones, escenarios, estadisticas, compartido, termino):
+    # Los usuarios empiezan escalonados durante la rampa
+    await asyncio.sleep(opciones.rampa * numero / opciones.usuarios)
+
+    nombres, pesos = zip(*escenarios)
+    sesiones = {}
+    while time.perf_counter() < termino:
+        nombre = random.choices(nombres, weights=pesos)[0]
+        # Cada escenario tiene su propia sesión (el personal mantiene la suya entre iteraciones)
+        sesion = sesiones.setdefault(nombre, Sesion(opciones.url, opciones.tiempo_espera))
+        await ESCENARIOS[nombre](sesion, estadisticas, compartido, opciones)
+        if nombre != 'panel':
+            sesiones.pop(nombre)
+        await asyncio.sleep(random.uniform(0, opciones.pausa))
+
+
+def _leer_escenarios(valor):
+    escenarios = []
+    for parte in valor.split(','):
+        nombre, _, peso = parte.strip().partition(':')
+        if nombre not in ESCENARIOS:
+            raise argparse.ArgumentTypeError('escenario desconocido: {}'.format(nombre))
+        escenarios.append((nombre, float(peso or 1)))
+    return escenarios
+
+
+def imprimir(resumen):
+    columnas = ('peticiones', 'errores', 'limitados', 'por_segundo', 'p50_ms', 'p90_ms', 'p95_ms', 'p99_ms', 'max_ms')
+    ancho = max([len(paso) for paso in resumen['pasos']] + [4])
+    print('{:<{ancho}} {:>10} {:>8} {:>9} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+        'paso', 'peticiones', 'errores', '429', 'req/s', 'p50 ms', 'p90 ms', 'p95 ms', 'p99 ms', 'max ms', ancho=ancho))
+    for nombre, datos in resumen['pasos'].items():
+        valores = [datos[columna] for columna in columnas]
+        print('{:<{ancho}} {:>10} {:>8} {:>9} {:>8.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}'.format(nombre, *valores, ancho=ancho))
+
+    # La tasa de error es sobre los pasos atendidos, sin los rechazados por el límite de tasa
+    total = resumen['total']
+    atendidos = total - resumen['limitados']
+    tasa_error = 100.0 * resumen['errores'] / atendidos if atendidos else 0
+    tasa_limitados = 100.0 * resumen['limitados'] / total if total else 0
+    print()
+    print('Duración: {:.1f} s  Pasos: {}  Throughput: {:.1f} pasos/s  Errores: {} ({:.2f}%)  Limitados (429): {} ({:.2f}%)'.format(
+        resumen['duracion_s'], total, resumen['por_segundo'], resumen['errores'], tasa_error, resumen['limitados'], tasa_limitados))
+    print('Estados HTTP: {}'.format(', '.join('{}={}'.format(estado, cantidad) for estado, cantidad in sorted(resumen['estados_http'].items()))))
+
+    for nombre, datos in resumen['pasos'].items():
+        for mensaje, cantidad in datos['muestras_error'].items():
+            print('  {}: {} x{}'.format(nombre, mensaje, cantidad))
+
+
+async def ejecutar(opciones):
+    estadisticas = Estadisticas()
+    compartido = {'fichas': []}
+    termino = time.perf_counter() + opciones.rampa + opciones.duracion
+    await asyncio.gather(*[
+        usuario_virtual(numero, opciones, opciones.escenarios, estadisticas, compartido, termino)
+        for numero in range(opciones.usuarios)
+    ])
+    estadisticas.fin = time.perf_counter()
+    return estadisticas.resumen()
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description='Prueba de carga HTTP de FiCats Manager (solo biblioteca estándar).')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL base del servidor.')
+    parser.add_argument('--usuarios', type=int, default=50, help='Usuarios virtuales concurrentes.')
+    parser.add_argument('--duracion', type=float, default=30, help='Segundos de prueba después de la rampa.')
+    parser.add_argument('--rampa', type=float, default=5, help='Segundos en que se inician todos los usuarios.')
+    parser.add_argument('--pausa', type=float, default=1.0, help='Pausa máxima (aleatoria) entre iteraciones de un usuario.')
+    parser.add_argument('--tiempo-espera', type=float, default=30, help='Segundos máximos por petición.')
+    parser.add_argument('--escenarios', type=_leer_escenarios, default=_leer_escenarios('reserva:2,ficha:5'),
+                        help='Escenarios y pesos, por ejemplo "reserva:2,ficha:5,panel:3".')
+    parser.add_argument('--panel-usuario', default='', help='Usuario del personal para el escenario "panel".')
+    parser.add_argument('--panel-clave', default='', help='Contraseña del usuario del personal.')
+    parser.add_argument('--json', help='Guarda el resumen en este archivo JSON.')
+    opciones = parser.parse_args(argumentos)
+
+    if any(nombre == 'panel' for nombre, peso in opciones.escenarios) and not opciones.panel_usuario:
+        parser.error('el escenario "panel" requiere --panel-usuario y --panel-clave')
+
+    print('Probando {} con {} usuarios durante {:.0f} s (rampa {:.0f} s)...'.format(opciones.url, opciones.usuarios, opciones.duracion, opciones.rampa))
+    resumen = asyncio.run(ejecutar(opciones))
+    imprimir(resumen)
+
+    if opciones.json:
+        with open(opciones.json, 'w') as archivo:
+            json.dump(resumen, archivo, indent=2)
+
+    # Código de salida distinto de cero si hubo errores, útil para automatizar
+    return 1 if resumen['errores'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from paneltrabajador.models import Cita, Cliente, Factura, Mascota, Producto
+from paneltrabajador.models import Cita, CitaHistorica, Cliente, Factura, FacturaHistorica, HorarioVeterinario, ListaEspera, Mascota, Producto, RegistroAuditoria
 
 # Registramos los modelos para poder visualizarlos en Django ADMIN
 admin.site.register(Cliente)
@@ -8,3 +8,30 @@ admin.site.register(Mascota)
 admin.site.register(Producto)
 admin.site.register(Factura)
 admin.site.register(Cita)
+admin.site.register(ListaEspera)
+admin.site.register(CitaHistorica)
+admin.site.register(FacturaHistorica)
+
+
+# Horarios de atención, de los que se calculan las horas disponibles (ver paneltrabajador.disponibilidad)
+@admin.register(HorarioVeterinario)
+class HorarioVeterinarioAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'dia_semana', 'hora_inicio', 'hora_fin', 'duracion')
+    list_filter = ('usuario', 'dia_semana')
+
+
+# El registro de auditoría es de solo lectura
+@admin.register(RegistroAuditoria)
+class RegistroAuditoriaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'usuario', 'accion', 'modelo', 'objeto_id')
+    list_filter = ('accion', 'modelo')
+    search_fields = ('objeto_id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PaneltrabajadorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'paneltrabajador'
+
+    def ready(self):
+        # Conectamos las señales del panel
+        from paneltrabajador import signals
+
+        # Registro de consultas lentas en todas las conexiones
+        from django.db.backends.signals import connection_created
+        from paneltrabajador import consultas_lentas
+        connection_created.connect(consultas_lentas.conectar)
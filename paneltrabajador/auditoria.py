@@ -0,0 +1,169 @@
+import logging
+import threading
+
+from django.db import router, transaction
+from django.utils import timezone
+
+# Registro de auditoría de los cambios hechos desde el panel y el admin.
+# Los cambios se capturan con señales (ver paneltrabajador.signals) y se acumulan en memoria
+# durante la petición. Al terminar la petición (request_finished, después de enviar la respuesta)
+# se guardan todos juntos con un solo bulk_create por base de datos: con sucursales, la de la sucursal
+# de la petición (ver paneltrabajador.sucursales.MODELOS_SUCURSAL).
+# Fuera de una petición (comandos, shell) no se registra nada.
+
+logger = logging.getLogger(__name__)
+
+# Modelos cuyos cambios quedan registrados
+MODELOS_AUDITADOS = ('paneltrabajador.cita', 'paneltrabajador.factura', 'paneltrabajador.producto')
+
+_estado = threading.local()
+
+
+class AuditoriaMiddleware:
+    """
+    Activa la captura de auditoría durante la petición con el usuario que la hace.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _estado.request = request
+        _estado.registros = []
+        return self.get_response(request)
+
+
+def activa():
+    """
+    Indica si la petición actual captura cambios (hay una petición de un usuario autenticado).
+    """
+    request = getattr(_estado, 'request', None)
+    return request is not None and getattr(request, 'user', None) is not None and request.user.is_authenticated
+
+
+def auditado(modelo):
+    """
+    Indica si los cambios del modelo se registran.
+    """
+    return modelo._meta.label_lower in MODELOS_AUDITADOS
+
+
+def valores(instancia):
+    # Valores de los campos concretos del objeto, por nombre de columna (cliente_id, usuario_id...)
+    return {campo.attname: getattr(instancia, campo.attname) for campo in instancia._meta.concrete_fields}
+
+
+def valores_anteriores(instancia, using=None):
+    """
+    Obtiene los valores guardados en la base de datos de un objeto, antes de editarlo.
+
+    Returns:
+        dict o None si el objeto no existe.
+    """
+    campos = [campo.attname for campo in instancia._meta.concrete_fields]
+    return type(instancia)._base_manager.using(using).filter(pk=instancia.pk).values(*campos).first()
+
+
+def diferencias(anterior, actual):
+    """
+    Compara dos diccionarios de valores y devuelve {campo: [antes, después]} con los campos distintos.
+    """
+    return {campo: [anterior.get(campo), valor] for campo, valor in actual.items() if anterior.get(campo) != valor}
+
+
+def registrar(modelo, objeto_id, accion, cambios, using=None):
+    """
+    Agrega un registro de auditoría a la petición actual.
+
+    El registro se agrega cuando se confirma la transacción, así los cambios revertidos no quedan registrados.
+    """
+    if not auditado(modelo) or not activa():
+        return
+
+    from paneltrabajador import sucursales
+    from paneltrabajador.models import RegistroAuditoria
+
+    registro = RegistroAuditoria(
+        modelo=modelo._meta.label_lower,
+        objeto_id=str(objeto_id),
+        accion=accion,
+        cambios=cambios,
+        usuario_id=_estado.request.user.pk,
+        fecha=timezone.now(),
+        # Las llaves primarias se repiten entre sucursales
+        sucursal=(sucursales.actual() or '') if sucursales.es_de_sucursal(modelo) else '',
+    )
+    # La base de datos se decide ahora: al vaciar, la sucursal de la petición ya no está activa
+    destino = router.db_for_write(RegistroAuditoria)
+    registros = _estado.registros
+    transaction.on_commit(lambda: registros.append((destino, registro)), using=using)
+
+
+def registrar_guardado(instancia, creado, using=None):
+    """
+    Registra la creación o edición de un objeto. En una edición se usan los valores
+    obtenidos en pre_save (instancia._auditoria_anterior).
+    """
+    from paneltrabajador.models import RegistroAuditoria
+
+    actual = valores(instancia)
+    anterior = getattr(instancia, '_auditoria_anterior', None)
+    instancia._auditoria_anterior = None
+
+    if creado or anterior is None:
+        registrar(type(instancia), instancia.pk, RegistroAuditoria.ACCION_CREAR, {campo: [None, valor] for campo, valor in actual.items()}, using)
+        return
+
+    cambios = diferencias(anterior, actual)
+    # Guardar sin cambios no genera registro
+    if cambios:
+        registrar(type(instancia), instancia.pk, RegistroAuditoria.ACCION_EDITAR, cambios, using)
+
+
+def registrar_eliminacion(instancia, using=None):
+    from paneltrabajador.models import RegistroAuditoria
+
+    cambios = {campo: [valor, None] for campo, valor in valores(instancia).items()}
+    registrar(type(instancia), instancia.pk, RegistroAuditoria.ACCION_ELIMINAR, cambios, using)
+
+
+def registrar_masivo(modelo, anteriores, actuales, using=None):
+    """
+    Registra ediciones hechas sin señales (QuerySet.update, bulk_update), un registro por objeto.
+
+    Args:
+        modelo: Modelo editado.
+        anteriores: Diccionario {pk: {campo: valor}} con los valores antes del cambio.
+        actuales: Diccionario {pk: {campo: valor}} con los valores después del cambio.
+    """
+    from paneltrabajador.models import RegistroAuditoria
+
+    for pk, nuevos in actuales.items():
+        cambios = diferencias(anteriores.get(pk, {}), nuevos)
+        if cambios:
+            registrar(modelo, pk, RegistroAuditoria.ACCION_EDITAR, cambios, using)
+
+
+def vaciar(**kwargs):
+    """
+    Guarda los registros acumulados de la petición con un solo bulk_create por base de datos.
+
+    Se conecta a la señal request_finished. Un error al guardar no afecta al usuario,
+    pero queda en el log.
+    """
+    registros = getattr(_estado, 'registros', None)
+    _estado.request = None
+    _estado.registros = []
+    if not registros:
+        return
+
+    from paneltrabajador.models import RegistroAuditoria
+
+    por_base = {}
+    for destino, registro in registros:
+        por_base.setdefault(destino, []).append(registro)
+    for destino, grupo in por_base.items():
+        try:
+            RegistroAuditoria.objects.using(destino).bulk_create(grupo)
+        except Exception:
+            logger.exception("No se pudieron guardar %d registros de auditoría en %s", len(grupo), destino)
@@ -0,0 +1,195 @@
+import hashlib
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache as FileBasedCacheDjango
+from django.core.cache.backends.locmem import LocMemCache as LocMemCacheDjango
+from django.core.cache.backends.redis import RedisCache as RedisCacheDjango
+
+# Cache de datos derivados del panel, invalidada con contadores de generación por modelo.
+#
+# Cada modelo (Cliente, Mascota, Cita, Factura, Producto y los usuarios) tiene un contador de
+# generación guardado en la cache. El contador se incrementa junto con la versión del modelo
+# (ver versiones.incrementar), así que cubre las señales y también las escrituras masivas.
+# Las claves de los datos incluyen las generaciones de los modelos de los que dependen: al cambiar
+# un modelo las claves antiguas ya no se consultan y la cache las olvida con el tiempo.
+#
+# Los backends de esta clase son los de Django con contadores de aciertos, fallos y desalojos,
+# que se ven en la página de estadísticas de la cache del panel.
+
+# Alias de la cache usada para los datos del panel
+ALIAS = 'default'
+
+# Tiempo de vida por defecto (segundos) de los datos derivados
+TIEMPO_VIDA = 300
+
+PREFIJO_GENERACION = 'generacion:'
+PREFIJO_DATOS = 'datos:'
+
+_FALTA = object()
+
+# Estadísticas de este proceso, por ubicación de la cache
+_bloqueo = threading.Lock()
+_estadisticas = defaultdict(Counter)
+
+
+def contar(ubicacion, **cantidades):
+    with _bloqueo:
+        _estadisticas[ubicacion].update(cantidades)
+
+
+def estadisticas(ubicacion):
+    """
+    Aciertos, fallos y desalojos contados por este proceso para una cache.
+    """
+    with _bloqueo:
+        contador = _estadisticas[str(ubicacion)]
+        return {campo: contador[campo] for campo in ('aciertos', 'fallos', 'desalojos')}
+
+
+class EstadisticasMixin:
+    """
+    Cuenta los aciertos y fallos de las lecturas de la cache.
+    """
+
+    def __init__(self, ubicacion, params):
+        super().__init__(ubicacion, params)
+        self.ubicacion = str(ubicacion)
+
+    def get(self, key, default=None, version=None):
+        valor = super().get(key, _FALTA, version)
+        if valor is _FALTA:
+            contar(self.ubicacion, fallos=1)
+            return default
+        contar(self.ubicacion, aciertos=1)
+        return valor
+
+    def cantidad_entradas(self):
+        """
+        Cantidad de entradas guardadas, o None si el backend no lo permite.
+        """
+        return None
+
+
+class LocMemCache(EstadisticasMixin, LocMemCacheDjango):
+    """
+    Cache en memoria del proceso, para desarrollo.
+    """
+
+    def _cull(self):
+        antes = len(self._cache)
+        super()._cull()
+        contar(self.ubicacion, desalojos=antes - len(self._cache))
+
+    def cantidad_entradas(self):
+        return len(self._cache)
+
+
+class FileBasedCache(EstadisticasMixin, FileBasedCacheDjango):
+    """
+    Cache en archivos, compartida por los procesos de un mismo servidor.
+    """
+
+    def _cull(self):
+        # Igual que FileBasedCache._cull de Django, contando los archivos borrados
+        archivos = self._list_cache_files()
+        cantidad = len(archivos)
+        if cantidad < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            contar(self.ubicacion, desalojos=cantidad)
+            return self.clear()
+        archivos = random.sample(archivos, int(cantidad / self._cull_frequency))
+        for archivo in archivos:
+            self._delete(archivo)
+        contar(self.ubicacion, desalojos=len(archivos))
+
+    def cantidad_entradas(self):
+        return len(self._list_cache_files())
+
+
+class RedisCache(EstadisticasMixin, RedisCacheDjango):
+    """
+    Cache en un servidor Redis, compartida por todos los procesos.
+    Los desalojos los hace el servidor y no se cuentan aquí.
+    """
+
+    def get_many(self, keys, version=None):
+        encontrados = super().get_many(keys, version)
+        contar(self.ubicacion, aciertos=len(encontrados), fallos=len(keys) - len(encontrados))
+        return encontrados
+
+
+def _clave_generacion(modelo):
+    from paneltrabajador.versiones import etiqueta
+
+    return PREFIJO_GENERACION + etiqueta(modelo)
+
+
+def generaciones(*modelos):
+    """
+    Obtiene las generaciones actuales de los modelos con una sola lectura de la cache.
+
+    Si un contador no existe (cache vacía o desalojado) se crea con un valor basado en la hora,
+    así nunca vuelve a un valor usado antes.
+
+    Returns:
+        list: Generaciones en el mismo orden de los modelos.
+    """
+    cache = caches[ALIAS]
+    claves = [_clave_generacion(modelo) for modelo in modelos]
+    actuales = cache.get_many(claves)
+    for clave in claves:
+        if clave not in actuales:
+            cache.add(clave, time.time_ns(), None)
+            actuales[clave] = cache.get(clave)
+    return [actuales[clave] for clave in claves]
+
+
+def incrementar_generacion(*modelos):
+    """
+    Incrementa la generación de los modelos, lo que deja obsoletos sus datos en cache.
+    """
+    cache = caches[ALIAS]
+    for clave in {_clave_generacion(modelo) for modelo in modelos}:
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.add(clave, time.time_ns(), None)
+
+
+def clave(nombre, modelos, partes=(), por_sucursal=True):
+    """
+    Arma la clave de cache de un dato derivado.
+
+    Args:
+        nombre: Nombre del dato, por ejemplo "reporte_sucursales".
+        modelos: Modelos de los que depende el dato.
+        partes: Valores adicionales que definen el dato (filtros, usuario, etc.).
+        por_sucursal: Si el dato depende de la sucursal activa.
+    """
+    from paneltrabajador import sucursales
+
+    generacion = '.'.join(str(valor) for valor in generaciones(*modelos))
+    if por_sucursal:
+        partes = (sucursales.actual(),) + tuple(partes)
+    resumen = hashlib.sha1(repr(tuple(partes)).encode()).hexdigest()[:16]
+    return '{}{}:{}:{}'.format(PREFIJO_DATOS, nombre, generacion, resumen)
+
+
+def obtener_o_calcular(nombre, modelos, funcion, partes=(), por_sucursal=True, tiempo_vida=TIEMPO_VIDA):
+    """
+    Devuelve el dato desde la cache o lo calcula con funcion() y lo guarda.
+
+    El dato se vuelve a calcular cuando cambia cualquiera de los modelos indicados.
+    """
+    cache = caches[ALIAS]
+    llave = clave(nombre, modelos, partes, por_sucursal)
+    valor = cache.get(llave, _FALTA)
+    if valor is _FALTA:
+        valor = funcion()
+        cache.set(llave, valor, tiempo_vida)
+    return valor
@@ -0,0 +1,170 @@
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Minificado y compresión de las respuestas.
+# Las páginas del panel son HTML con mucha indentación (las plantillas anidadas de las tablas). El middleware:
+#   - minifica el HTML: reemplaza cada secuencia de espacios que contiene un salto de línea por un solo salto.
+#     El navegador las muestra igual; no se tocan <pre>, <textarea>, <script>, <style> ni los valores de los
+#     atributos entre comillas, y los espacios dentro de una línea se mantienen.
+#   - comprime con brotli (si está instalado el paquete brotli) o gzip según Accept-Encoding, también las
+#     respuestas en streaming (documentos, descargas), sin leerlas completas.
+# Las respuestas de menos de COMPRESION_MINIMO_BYTES no se comprimen (no vale la pena). Al comprimir, un ETag
+# fuerte pasa a débil (W/"..."), como en GZipMiddleware de Django, y las peticiones condicionales siguen
+# funcionando. gzip agrega bytes aleatorios en la cabecera para mitigar BREACH (igual que Django).
+# El comando benchmark_compresion mide los bytes y el tiempo de CPU por tipo de página.
+
+# Bytes aleatorios en la cabecera gzip (mitigación de BREACH, ver django.middleware.gzip)
+MAXIMO_BYTES_ALEATORIOS = 100
+
+# Calidad de brotli: 4 comprime mejor que gzip con un costo de CPU similar (11 es para archivos estáticos)
+CALIDAD_BROTLI = 4
+
+# Tipos de contenido que se comprimen (las imágenes y los PDF ya vienen comprimidos)
+TIPOS_COMPRIMIBLES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+# Bloques que se copian sin cambios al minificar
+PROTEGIDOS = re.compile(r'<(pre|textarea|script|style)\b.*?</\1\s*>|=\s*"[^"]*"|=\s*\'[^\']*\'', re.IGNORECASE | re.DOTALL)
+ESPACIOS_CON_SALTO = re.compile(r'[ \t\r\f\v]*\n\s*')
+
+
+def minificar(html):
+    """
+    Minifica un documento HTML sin cambiar cómo se muestra.
+    """
+    partes = []
+    posicion = 0
+    for bloque in PROTEGIDOS.finditer(html):
+        partes.append(ESPACIOS_CON_SALTO.sub('\n', html[posicion:bloque.start()]))
+        partes.append(bloque.group(0))
+        posicion = bloque.end()
+    partes.append(ESPACIOS_CON_SALTO.sub('\n', html[posicion:]))
+    return ''.join(partes)
+
+
+def codificaciones():
+    """
+    Codificaciones disponibles, en orden de preferencia.
+    """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negociar(aceptadas):
+    """
+    Elige la codificación según el encabezado Accept-Encoding (con sus valores q).
+
+    Returns:
+        str o None si el cliente no acepta ninguna de las disponibles.
+    """
+    valores = {}
+    for parte in aceptadas.split(','):
+        nombre, _, parametros = parte.partition(';')
+        nombre = nombre.strip().lower()
+        calidad = 1.0
+        parametros = parametros.strip().replace(' ', '')
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        if nombre:
+            valores[nombre] = calidad
+
+    for codificacion in codificaciones():
+        if valores.get(codificacion, valores.get('*', 0)) > 0:
+            return codificacion
+    return None
+
+
+def comprimir(datos, codificacion):
+    """
+    Comprime un contenido completo.
+    """
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=CALIDAD_BROTLI)
+    return compress_string(datos, max_random_bytes=MAXIMO_BYTES_ALEATORIOS)
+
+
+def comprimir_secuencia(secuencia, codificacion):
+    """
+    Comprime un contenido en streaming, parte por parte.
+    """
+    if codificacion != 'br':
+        yield from compress_sequence(secuencia, max_random_bytes=MAXIMO_BYTES_ALEATORIOS)
+        return
+
+    compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+    for parte in secuencia:
+        datos = compresor.process(parte)
+        if datos:
+            yield datos
+    yield compresor.finish()
+
+
+def _tipo(response):
+    return response.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+class CompresionMiddleware:
+    """
+    Minifica las respuestas HTML y las comprime con la codificación que acepte el cliente.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        # Ya codificada, parcial o asíncrona: se envía tal cual
+        if response.has_header('Content-Encoding') or response.has_header('Content-Range') or getattr(response, 'is_async', False):
+            return response
+
+        tipo = _tipo(response)
+        if not response.streaming and tipo == 'text/html':
+            self.minificar(response)
+
+        if not tipo.startswith(TIPOS_COMPRIMIBLES):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESION_MINIMO_BYTES:
+            return response
+
+        # La respuesta depende de Accept-Encoding (para las caches intermedias)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codificacion = negociar(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codificacion is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = comprimir_secuencia(response.streaming_content, codificacion)
+            # El largo comprimido no se conoce hasta terminar
+            del response.headers['Content-Length']
+        else:
+            comprimido = comprimir(response.content, codificacion)
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers['Content-Length'] = str(len(comprimido))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codificacion
+        return response
+
+    def minificar(self, response):
+        charset = response.charset or 'utf-8'
+        try:
+            html = response.content.decode(charset)
+        except UnicodeDecodeError:
+            return
+        response.content = minificar(html).encode(charset)
+        if response.has_header('Content-Length'):
+            response.headers['Content-Length'] = str(len(response.content))
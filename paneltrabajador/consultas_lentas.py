@@ -0,0 +1,185 @@
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+from paneltrabajador.diagnostico import ubicacion
+
+# Registro de consultas lentas.
+# Cada conexión a la base de datos (de cualquier alias) pasa sus consultas por registrar(). Las que tardan
+# más de CONSULTAS_LENTAS_UMBRAL_MS se registran con sus parámetros, la URL de la petición, la línea
+# de plantilla y de código que la originó, su huella (SQL normalizado) y el plan de ejecución (EXPLAIN).
+# Las entradas se escriben en otro hilo (QueueHandler -> QueueListener) a un archivo rotativo,
+# una línea JSON por consulta. El comando resumen_consultas_lentas las agrupa por huella.
+
+logger = logging.getLogger(__name__)
+
+# Logger de las entradas, solo escribe en el archivo del registro (no pasa a los demás handlers)
+registro = logging.getLogger('consultas_lentas')
+registro.propagate = False
+
+# Largo máximo de los parámetros guardados (repr)
+MAXIMO_PARAMETROS = 500
+
+_local = threading.local()
+_bloqueo = threading.Lock()
+_oyente = None
+
+
+class ConsultasLentasMiddleware:
+    """
+    Guarda la petición actual para agregar su URL a las consultas lentas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.request = request
+        try:
+            return self.get_response(request)
+        finally:
+            _local.request = None
+
+
+def conectar(sender, connection, **kwargs):
+    """
+    Receptor de connection_created: agrega registrar() a las consultas de la conexión.
+    """
+    if registrar not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, registrar)
+
+
+def registrar(execute, sql, params, many, context):
+    """
+    Envoltura de ejecución (execute_wrapper) que registra las consultas sobre el umbral.
+    """
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        milisegundos = (time.perf_counter() - inicio) * 1000
+        umbral = settings.CONSULTAS_LENTAS_UMBRAL_MS
+        # Las consultas del propio EXPLAIN no se registran
+        if umbral is not None and milisegundos >= umbral and not getattr(_local, 'explicando', False):
+            try:
+                _registrar_lenta(sql, params, many, context, milisegundos, sys._getframe(1))
+            except Exception:
+                # El registro nunca debe romper la consulta
+                logger.exception("No se pudo registrar una consulta lenta")
+
+
+def huella(sql):
+    """
+    Normaliza el SQL (valores literales y listas IN) para agrupar las consultas iguales.
+
+    Returns:
+        tuple: (SQL normalizado, huella de 12 caracteres)
+    """
+    normalizado = ' '.join(sql.split())
+    normalizado = re.sub(r"'(?:[^']|'')*'", '?', normalizado)
+    normalizado = re.sub(r'\b\d+(?:\.\d+)?\b', '?', normalizado)
+    normalizado = re.sub(r'(%s|\?)', '?', normalizado)
+    # IN (?, ?, ?) con cualquier cantidad de valores
+    normalizado = re.sub(r'IN \(\?(?:, \?)*\)', 'IN (...)', normalizado)
+    return normalizado, hashlib.md5(normalizado.encode()).hexdigest()[:12]
+
+
+def explicar(alias, sql, params):
+    """
+    Plan de ejecución de una consulta SELECT, o None si no se puede obtener.
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    conexion = connections[alias]
+    prefijo = 'EXPLAIN QUERY PLAN ' if conexion.vendor == 'sqlite' else 'EXPLAIN '
+    _local.explicando = True
+    try:
+        # Dentro de una transacción se usa un punto de guardado, así un error del EXPLAIN no la invalida
+        with transaction.atomic(using=alias) if conexion.in_atomic_block else nullcontext():
+            with conexion.cursor() as cursor:
+                cursor.execute(prefijo + sql, params)
+                return [' '.join(str(valor) for valor in fila) for fila in cursor.fetchall()]
+    except DatabaseError:
+        return None
+    finally:
+        _local.explicando = False
+
+
+def _registrar_lenta(sql, params, many, context, milisegundos, frame):
+    alias = context['connection'].alias
+    normalizado, codigo_huella = huella(sql)
+    request = getattr(_local, 'request', None)
+    match = getattr(request, 'resolver_match', None)
+    entrada = {
+        'fecha': timezone.now().isoformat(),
+        'ms': round(milisegundos, 2),
+        'alias': alias,
+        'huella': codigo_huella,
+        'normalizado': normalizado,
+        'sql': sql,
+        'parametros': repr(params)[:MAXIMO_PARAMETROS],
+        'url': match.view_name if match else None,
+        'ruta': request.path if request is not None else None,
+        # executemany no se explica (los parámetros son una lista de filas)
+        'plan': None if many else explicar(alias, sql, params),
+    }
+    entrada.update(ubicacion(frame))
+    _iniciar()
+    registro.warning(json.dumps(entrada, default=str))
+
+
+def _iniciar():
+    """
+    Crea el hilo que escribe las entradas en el archivo rotativo, la primera vez que se necesita.
+    """
+    global _oyente
+    if _oyente is not None:
+        return
+    with _bloqueo:
+        if _oyente is not None:
+            return
+        archivo = str(settings.CONSULTAS_LENTAS_ARCHIVO)
+        os.makedirs(os.path.dirname(archivo), exist_ok=True)
+        escritor = logging.handlers.RotatingFileHandler(
+            archivo, maxBytes=settings.CONSULTAS_LENTAS_TAMANO_MAXIMO,
+            backupCount=settings.CONSULTAS_LENTAS_RESPALDOS, encoding='utf-8',
+        )
+        escritor.setFormatter(logging.Formatter('%(message)s'))
+        cola = queue.SimpleQueue()
+        manejador = logging.handlers.QueueHandler(cola)
+        registro.addHandler(manejador)
+        registro.setLevel(logging.WARNING)
+        oyente = logging.handlers.QueueListener(cola, escritor)
+        oyente.start()
+        oyente.manejador = manejador
+        _oyente = oyente
+
+
+def detener():
+    """
+    Escribe las entradas pendientes y detiene el hilo del registro (se inicia de nuevo si hace falta).
+    """
+    global _oyente
+    with _bloqueo:
+        if _oyente is None:
+            return
+        _oyente.stop()
+        registro.removeHandler(_oyente.manejador)
+        for escritor in _oyente.handlers:
+            escritor.close()
+        _oyente = None
+
+
+atexit.register(detener)
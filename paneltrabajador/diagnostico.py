@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# Herramientas para diagnosticar las consultas SQL de una petición:
+# captura cada consulta con su duración y el lugar que la originó (línea de plantilla y de código).
+# Se usan en las pruebas de presupuesto de consultas (paneltrabajador/tests.py) y en el perfilador
+# de peticiones (paneltrabajador.perfilador).
+
+# Solo se consideran como "código del proyecto" los archivos dentro de BASE_DIR que no son de dependencias
+_RAIZ = str(settings.BASE_DIR)
+_ESTE_ARCHIVO = os.path.abspath(__file__)
+
+
+def _es_del_proyecto(archivo):
+    archivo = os.path.abspath(archivo)
+    return archivo.startswith(_RAIZ) and 'site-packages' not in archivo and archivo != _ESTE_ARCHIVO
+
+
+def ubicacion(frame=None):
+    """
+    Busca en la pila de llamadas el lugar que originó la operación actual.
+
+    Returns:
+        dict: {'plantilla': "archivo.html:línea" o None, 'codigo': "archivo.py:línea (función)" o None}
+    """
+    frame = frame or sys._getframe(1)
+    plantilla = None
+    codigo = None
+    while frame is not None and (plantilla is None or codigo is None):
+        # El nodo de plantilla más interno que se estaba renderizando (Node.render_annotated)
+        if plantilla is None and frame.f_code.co_name == 'render_annotated':
+            nodo = frame.f_locals.get('self')
+            token = getattr(nodo, 'token', None)
+            origen = getattr(nodo, 'origin', None)
+            if token is not None and origen is not None:
+                plantilla = '{}:{}'.format(origen.template_name or origen.name, token.lineno)
+        if codigo is None and _es_del_proyecto(frame.f_code.co_filename):
+            archivo = os.path.relpath(frame.f_code.co_filename, _RAIZ)
+            codigo = '{}:{} ({})'.format(archivo, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return {'plantilla': plantilla, 'codigo': codigo}
+
+
+class CapturaConsultas:
+    """
+    Captura las consultas de todas las bases de datos dentro de un bloque "with".
+
+    Cada consulta queda en self.consultas como un diccionario con
+    'alias', 'sql', 'inicio' (time.perf_counter() al empezar), 'segundos', 'plantilla' y 'codigo'.
+    """
+
+    def __init__(self):
+        self.consultas = []
+        self._pila = None
+
+    def __enter__(self):
+        self._pila = ExitStack()
+        for alias in connections:
+            self._pila.enter_context(connections[alias].execute_wrapper(self._registrar(alias)))
+        return self
+
+    def __exit__(self, *args):
+        self._pila.close()
+
+    def __len__(self):
+        return len(self.consultas)
+
+    def _registrar(self, alias):
+        def envoltura(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                datos = {'alias': alias, 'sql': sql, 'inicio': inicio, 'segundos': time.perf_counter() - inicio}
+                datos.update(ubicacion(sys._getframe(1)))
+                self.consultas.append(datos)
+        return envoltura
+
+    def resumen(self, maximo_sql=300):
+        """
+        Texto con una línea por consulta: origen en plantilla y código, y el SQL (recortado).
+        """
+        lineas = []
+        for numero, consulta in enumerate(self.consultas, 1):
+            sql = ' '.join(consulta['sql'].split())
+            if len(sql) > maximo_sql:
+                sql = sql[:maximo_sql] + '...'
+            origen = ' | '.join(parte for parte in (consulta['plantilla'], consulta['codigo']) if parte) or '?'
+            lineas.append('{:>3}. [{}] {}\n     {}'.format(numero, consulta['alias'], origen, sql))
+        return '\n'.join(lineas)
@@ -0,0 +1,157 @@
+import datetime
+from collections import defaultdict
+
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from paneltrabajador import cache, versiones
+from paneltrabajador.models import Cita, EstadoCita, HorarioVeterinario
+
+# Horas disponibles para reservar.
+# Las horas no se guardan como citas "Disponible": se calculan para la ventana pedida a partir de los
+# horarios semanales de los veterinarios (HorarioVeterinario, en cache), más las citas disponibles
+# creadas a mano (horas extra), menos las citas que ocupan la hora. Así la consulta es una sola por ventana
+# y la tabla de citas guarda solo las citas reales.
+# La cita se crea al reservar; la restricción única (usuario, fecha) de Cita evita que dos reservas
+# simultáneas tomen la misma hora.
+
+
+def horarios():
+    """
+    Horarios de los veterinarios activos. Se guardan en la cache hasta que cambie un horario o un usuario.
+    """
+    def calcular():
+        return list(
+            HorarioVeterinario.objects
+            .filter(usuario__is_active=True)
+            .values('usuario_id', 'usuario__username', 'usuario__first_name', 'usuario__last_name',
+                    'dia_semana', 'hora_inicio', 'hora_fin', 'duracion')
+        )
+    return cache.obtener_o_calcular('horarios_veterinarios', (HorarioVeterinario, versiones.AUTH), calcular)
+
+
+def _nombre(fila):
+    completo = '{} {}'.format(fila['usuario__first_name'], fila['usuario__last_name']).strip()
+    return completo or fila['usuario__username']
+
+
+def horas_horario(desde, hasta, usuario=None):
+    """
+    Horas de los horarios entre dos días, sin considerar las citas.
+
+    Args:
+        desde: Primer día (date), incluido.
+        hasta: Último día (date), excluido.
+        usuario: ID del veterinario, opcional.
+
+    Returns:
+        generator: Tuplas (usuario_id, nombre de usuario, nombre del veterinario, fecha).
+    """
+    zona = timezone.get_current_timezone()
+    por_dia = defaultdict(list)
+    for horario in horarios():
+        if usuario is None or horario['usuario_id'] == usuario:
+            por_dia[horario['dia_semana']].append(horario)
+
+    dia = desde
+    while dia < hasta:
+        for horario in por_dia[dia.weekday()]:
+            paso = datetime.timedelta(minutes=horario['duracion'])
+            inicio = datetime.datetime.combine(dia, horario['hora_inicio'])
+            fin = datetime.datetime.combine(dia, horario['hora_fin'])
+            while inicio + paso <= fin:
+                yield horario['usuario_id'], horario['usuario__username'], _nombre(horario), timezone.make_aware(inicio, zona)
+                inicio += paso
+        dia += datetime.timedelta(days=1)
+
+
+def horas(desde, hasta, usuario=None):
+    """
+    Horas disponibles (futuras) entre dos días, ordenadas por fecha.
+
+    Se resuelve con una sola consulta: las citas no canceladas de la ventana (índice de fecha,
+    o de usuario y fecha si se filtra por veterinario).
+
+    Args:
+        desde: Primer día (date), incluido.
+        hasta: Último día (date), excluido.
+        usuario: ID del veterinario, opcional.
+
+    Returns:
+        list: Diccionarios con 'usuario_id', 'usuario' (nombre de usuario), 'nombre' (del veterinario), 'fecha'
+            y 'n_cita' (la cita disponible creada a mano, o None si la hora es del horario).
+    """
+    zona = timezone.get_current_timezone()
+    inicio = timezone.make_aware(datetime.datetime.combine(desde, datetime.time.min), zona)
+    fin = timezone.make_aware(datetime.datetime.combine(hasta, datetime.time.min), zona)
+
+    # Las citas de clientes eliminados también ocupan la hora, por eso el manager base
+    citas = Cita._base_manager.filter(fecha__gte=inicio, fecha__lt=fin).exclude(estado=EstadoCita.CANCELADA)
+    if usuario is not None:
+        citas = citas.filter(usuario_id=usuario)
+
+    libres = {}
+    ocupadas = set()
+    filas = citas.values('n_cita', 'usuario_id', 'usuario__username', 'usuario__first_name', 'usuario__last_name', 'fecha', 'estado')
+    for fila in filas:
+        llave = (fila['usuario_id'], fila['fecha'])
+        if fila['estado'] == EstadoCita.DISPONIBLE:
+            libres[llave] = {'usuario': fila['usuario__username'], 'nombre': _nombre(fila), 'n_cita': fila['n_cita']}
+        else:
+            ocupadas.add(llave)
+
+    for usuario_id, username, nombre, fecha in horas_horario(desde, hasta, usuario):
+        libres.setdefault((usuario_id, fecha), {'usuario': username, 'nombre': nombre, 'n_cita': None})
+
+    ahora = timezone.now()
+    resultado = [
+        dict(hora, usuario_id=usuario_id, fecha=fecha)
+        for (usuario_id, fecha), hora in libres.items()
+        if fecha > ahora and (usuario_id, fecha) not in ocupadas
+    ]
+    resultado.sort(key=lambda hora: (hora['fecha'], hora['nombre']))
+    return resultado
+
+
+def en_horario(usuario_id, fecha):
+    """
+    Indica si la hora corresponde al horario del veterinario.
+    """
+    dia = timezone.localtime(fecha).date()
+    return any(hora == fecha for _, _, _, hora in horas_horario(dia, dia + datetime.timedelta(days=1), usuario_id))
+
+
+def reservar(usuario_id, fecha, solo_horario=True, **datos):
+    """
+    Crea (o toma) la cita de una hora, si sigue libre.
+
+    Una cita disponible creada a mano se toma con una actualización condicional. Si no hay, se crea la cita;
+    si otra reserva tomó la hora al mismo tiempo, la restricción única (usuario, fecha) lo impide.
+
+    Args:
+        usuario_id: ID del veterinario.
+        fecha: Fecha y hora de la cita.
+        solo_horario: Si es False también se puede crear una cita fuera del horario
+            (por ejemplo, para ofrecer la hora de una cita cancelada).
+        **datos: Valores de la cita (estado, cliente, mascota...).
+
+    Returns:
+        Cita o None si la hora ya no estaba disponible.
+    """
+    using = router.db_for_write(Cita)
+    with transaction.atomic(using=using):
+        libre = Cita._base_manager.filter(usuario_id=usuario_id, fecha=fecha, estado=EstadoCita.DISPONIBLE).values_list('pk', flat=True).first()
+        if libre is not None:
+            if not Cita._base_manager.filter(pk=libre, estado=EstadoCita.DISPONIBLE).update(**datos):
+                return None
+            # QuerySet.update no envía señales
+            versiones.incrementar(Cita)
+            return Cita._base_manager.get(pk=libre)
+
+        if solo_horario and not en_horario(usuario_id, fecha):
+            return None
+        try:
+            # Punto de guardado: el error de la restricción no debe invalidar la transacción externa
+            with transaction.atomic(using=using):
+                return Cita.objects.create(usuario_id=usuario_id, fecha=fecha, **datos)
+        except IntegrityError:
+            return None
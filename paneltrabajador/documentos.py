@@ -0,0 +1,236 @@
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, Http404
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from paneltrabajador import sucursales
+from paneltrabajador.models import Factura, FacturaLinea, Mascota
+
+# Documentos imprimibles (facturas y fichas de mascotas), en HTML para imprimir y opcionalmente en PDF.
+# Los documentos se guardan en DOCUMENTOS_DIRECTORIO con el nombre de su huella: un SHA-256 de los datos
+# del registro que se muestran (con sus líneas, cliente y sucursal), del formato y de las plantillas.
+# La huella es la versión del documento: si el registro cambia, cambia la huella y se genera un archivo nuevo;
+# si no cambia, se sirve el archivo ya generado sin renderizar. La huella también es el ETag (fuerte) de la
+# respuesta, así el navegador recibe un 304 sin que se lea el archivo.
+# Calcular la huella cuesta una o dos consultas. Los archivos viejos se pueden borrar en cualquier momento
+# (se vuelven a generar al pedirlos); el comando prerenderizar_documentos los genera por adelantado.
+# El PDF requiere el paquete weasyprint; sin él solo está disponible el HTML.
+
+SAL = 'paneltrabajador.documentos'
+
+FORMATOS = {
+    'html': 'text/html; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+
+
+class FormatoNoDisponible(Exception):
+    pass
+
+
+def datos_facturas(pks):
+    """
+    Datos que se muestran en las facturas, con dos consultas para todo el lote.
+
+    Returns:
+        dict: {número de factura: datos}
+    """
+    campos = ('numero_factura', 'total_pagar', 'detalle', 'estado_pago',
+              'cliente_id', 'cliente__nombre_cliente', 'cliente__direccion', 'cliente__telefono', 'cliente__email')
+    facturas = {fila['numero_factura']: dict(fila, lineas=[]) for fila in Factura.objects.filter(pk__in=pks).values(*campos)}
+    lineas = FacturaLinea.objects.filter(factura_id__in=facturas).order_by('pk').values('factura_id', 'nombre', 'cantidad', 'precio')
+    for linea in lineas:
+        linea['subtotal'] = linea['cantidad'] * linea['precio']
+        facturas[linea.pop('factura_id')]['lineas'].append(linea)
+    return facturas
+
+
+def datos_fichas(pks):
+    """
+    Datos que se muestran en las fichas de las mascotas, con una consulta para todo el lote.
+
+    Returns:
+        dict: {id de la mascota: datos}
+    """
+    campos = ('id_mascota', 'nombre', 'numero_chip', 'especie', 'raza', 'fecha_nacimiento', 'historial_medico',
+              'cliente_id', 'cliente__nombre_cliente')
+    return {fila['id_mascota']: fila for fila in Mascota.objects.filter(pk__in=pks).values(*campos)}
+
+
+# Tipos de documento: modelo, plantilla, función que obtiene los datos de un lote y prefijo del nombre del archivo descargado
+TIPOS = {
+    'factura': {'modelo': Factura, 'plantilla': 'documentos/factura.html', 'datos': datos_facturas, 'nombre': 'factura'},
+    'ficha': {'modelo': Mascota, 'plantilla': 'documentos/ficha.html', 'datos': datos_fichas, 'nombre': 'ficha'},
+}
+
+# Plantilla base de todos los documentos (también forma parte de la huella)
+PLANTILLA_BASE = 'documentos/base.html'
+
+
+def directorio():
+    return str(settings.DOCUMENTOS_DIRECTORIO)
+
+
+@functools.lru_cache(maxsize=None)
+def _huella_plantilla(nombre):
+    # Se lee una vez por proceso: un cambio en las plantillas se aplica al reiniciar el servidor
+    fuentes = [get_template(plantilla).template.source for plantilla in (PLANTILLA_BASE, nombre)]
+    return hashlib.sha256('\0'.join(fuentes).encode()).hexdigest()
+
+
+def pdf_disponible():
+    """
+    Indica si está instalado el paquete del PDF (weasyprint).
+    """
+    return importlib.util.find_spec('weasyprint') is not None
+
+
+def formatos():
+    """
+    Formatos que se pueden generar con los paquetes instalados.
+    """
+    return [formato for formato in FORMATOS if formato != 'pdf' or pdf_disponible()]
+
+
+def huella(tipo, formato, datos):
+    """
+    Huella (SHA-256) del documento: sus datos, el formato, la sucursal y las plantillas.
+    """
+    contenido = json.dumps({
+        'tipo': tipo,
+        'formato': formato,
+        'sucursal': sucursales.actual(),
+        'plantilla': _huella_plantilla(TIPOS[tipo]['plantilla']),
+        'datos': datos,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def ruta(valor, formato):
+    """
+    Ruta del archivo de una huella. Se reparten en subcarpetas por los dos primeros caracteres.
+    """
+    return os.path.join(directorio(), valor[:2], '{}.{}'.format(valor, formato))
+
+
+def _renderizar(tipo, formato, datos):
+    codigo = sucursales.actual()
+    contexto = {
+        'documento': datos,
+        'sucursal': sucursales.nombre(codigo) if codigo else None,
+        'generado_en': timezone.localtime(),
+    }
+    html = render_to_string(TIPOS[tipo]['plantilla'], contexto)
+    if formato == 'html':
+        return html.encode()
+
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        raise FormatoNoDisponible("El formato PDF requiere el paquete weasyprint.")
+    return HTML(string=html, base_url=settings.URL_PUBLICA).write_pdf()
+
+
+def generar(tipo, formato, datos, valor=None):
+    """
+    Devuelve el archivo del documento, renderizándolo solo si no existe uno con la misma huella.
+
+    Args:
+        valor: Huella ya calculada, opcional.
+
+    Returns:
+        tuple: (huella, ruta del archivo, True si se generó ahora)
+    """
+    if formato not in FORMATOS:
+        raise FormatoNoDisponible("Formato desconocido: {}".format(formato))
+
+    valor = valor or huella(tipo, formato, datos)
+    destino = ruta(valor, formato)
+    if os.path.exists(destino):
+        return valor, destino, False
+
+    contenido = _renderizar(tipo, formato, datos)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    # Se escribe en un archivo temporal y se renombra: nunca se sirve un documento a medias,
+    # y dos procesos que generan el mismo documento escriben el mismo contenido
+    temporal = '{}.{}.tmp'.format(destino, uuid.uuid4().hex[:8])
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, destino)
+    return valor, destino, True
+
+
+def datos(tipo, pk):
+    """
+    Datos de un documento, o None si el registro no existe.
+    """
+    return TIPOS[tipo]['datos']([pk]).get(pk)
+
+
+def nombre_archivo(tipo, pk, formato):
+    return '{}-{}.{}'.format(TIPOS[tipo]['nombre'], pk, formato)
+
+
+def respuesta(request, tipo, pk, formato='html'):
+    """
+    Respuesta con el documento, con la huella como ETag.
+    Si el navegador ya tiene esa versión (If-None-Match) responde 304 sin leer ni generar el archivo.
+
+    Raises:
+        Http404: Si el registro no existe o el formato no está disponible.
+    """
+    contenido = datos(tipo, pk)
+    if contenido is None or formato not in FORMATOS:
+        raise Http404("El documento no existe.")
+
+    valor = huella(tipo, formato, contenido)
+    etag = '"{}"'.format(valor)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            valor, destino, _ = generar(tipo, formato, contenido, valor)
+        except FormatoNoDisponible as error:
+            raise Http404(str(error))
+        response = FileResponse(open(destino, 'rb'), content_type=FORMATOS[formato], filename=nombre_archivo(tipo, pk, formato))
+
+    response['ETag'] = etag
+    # El navegador puede guardar el documento, pero debe validarlo siempre (puede cambiar)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def token(tipo, pk):
+    """
+    Token firmado del enlace público de un documento. Incluye la sucursal, así el enlace abre la base de datos correcta.
+    """
+    return signing.dumps({'tipo': tipo, 'pk': pk, 'sucursal': sucursales.actual()}, salt=SAL)
+
+
+def leer_token(valor):
+    """
+    Returns:
+        tuple: (tipo, pk, código de sucursal), o None si el token es inválido o expiró.
+    """
+    try:
+        contenido = signing.loads(valor, salt=SAL, max_age=settings.DOCUMENTOS_ENLACE_HORAS * 3600)
+    except signing.BadSignature:
+        return None
+    if contenido.get('tipo') not in TIPOS:
+        return None
+    return contenido['tipo'], contenido['pk'], contenido['sucursal']
+
+
+def enlace(tipo, pk):
+    """
+    Ruta del enlace público (firmado) de un documento.
+    """
+    return reverse('ambpublico_documento', args=[token(tipo, pk)])
@@ -0,0 +1,223 @@
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMessage
+from django.db import router, transaction
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+from paneltrabajador import disponibilidad, sucursales, versiones
+from paneltrabajador.models import Cita, EstadoCita, ListaEspera
+
+# Lista de espera de horas.
+# Cuando una hora queda libre (cita disponible, cancelada o eliminada) se ofrece al primer cliente de la
+# lista de espera cuyo rango de fechas incluye el día de la hora. La cita queda "Retenida" para él por
+# LISTA_ESPERA_OFERTA_MINUTOS y se le envía un correo con un enlace firmado para confirmarla o rechazarla.
+# La oferta se registra al confirmar la transacción que liberó la hora; el correo lo envía el comando
+# enviar_avisos_espera, fuera de la petición (liberar muchas citas no espera al servidor de correo).
+# Si no responde a tiempo (comando vencer_ofertas_espera) o la rechaza, la cita se ofrece al siguiente.
+# Así los clientes no necesitan volver a revisar la página de reservas hasta que haya una hora para ellos.
+
+# Estados en los que una cita deja su hora libre
+ESTADOS_LIBERADOS = (EstadoCita.DISPONIBLE, EstadoCita.CANCELADA)
+
+# Inscritos que se revisan por cada cita liberada (si otro proceso tomó al primero, se intenta con el siguiente)
+CANDIDATOS = 10
+
+ASUNTO = "Hay una hora disponible para usted en FiCats"
+SAL = 'paneltrabajador.espera'
+
+
+def liberadas(pks, using=None):
+    """
+    Programa la oferta de las citas que quedaron libres, cuando se confirme la transacción actual.
+
+    :param pks: Llaves primarias de las citas.
+    :param using: Alias de la base de datos de la transacción.
+    """
+    pks = list(pks)
+    if not pks:
+        return
+    using = using or router.db_for_write(Cita)
+    transaction.on_commit(lambda: ofrecer_citas(pks), using=using)
+
+
+def hora_liberada(usuario_id, fecha, using=None):
+    """
+    Programa la oferta de una hora que quedó libre sin cita (la cita se eliminó), cuando se confirme la transacción actual.
+    """
+    if fecha <= timezone.now():
+        return
+    using = using or router.db_for_write(Cita)
+    transaction.on_commit(lambda: ofrecer(usuario_id, fecha), using=using)
+
+
+def ofrecer_citas(pks):
+    """
+    Ofrece a la lista de espera las horas de las citas libres (futuras) de la lista.
+
+    Returns:
+        int: Cantidad de ofertas hechas.
+    """
+    ofertas = 0
+    for cita in Cita.objects.filter(pk__in=pks, estado__in=ESTADOS_LIBERADOS, fecha__gt=timezone.now()):
+        ofertas += ofrecer(cita.usuario_id, cita.fecha) is not None
+    return ofertas
+
+
+def candidatos(dia):
+    """
+    Inscritos que esperan una hora para el día, por orden de llegada (índice espera_fifo_idx).
+    """
+    return (
+        ListaEspera.objects
+        .filter(estado=ListaEspera.ESTADO_ESPERANDO, desde__lte=dia, hasta__gte=dia)
+        .order_by('creada_en', 'id')
+    )
+
+
+def ofrecer(usuario_id, fecha):
+    """
+    Retiene una hora libre de un veterinario para el primer inscrito de la lista de espera.
+    El aviso queda pendiente para el comando enviar_avisos_espera.
+
+    La cita retenida se crea (o se toma la cita disponible de esa hora) con disponibilidad.reservar,
+    también fuera del horario (la hora de una cita cancelada), salvo que la hora ya tenga otra cita.
+
+    Returns:
+        ListaEspera ofrecida, o None si no había nadie esperando (o la hora ya no estaba libre).
+    """
+    dia = timezone.localtime(fecha).date()
+    vence = timezone.now() + datetime.timedelta(minutes=settings.LISTA_ESPERA_OFERTA_MINUTOS)
+
+    with transaction.atomic(using=router.db_for_write(Cita)):
+        for espera in candidatos(dia)[:CANDIDATOS]:
+            # Tomamos al inscrito solo si sigue esperando (otro proceso pudo ofrecerle otra cita)
+            tomada = ListaEspera.objects.filter(pk=espera.pk, estado=ListaEspera.ESTADO_ESPERANDO).update(
+                estado=ListaEspera.ESTADO_OFRECIDA, oferta_vence_en=vence,
+            )
+            if tomada:
+                break
+        else:
+            return None
+
+        retenida = disponibilidad.reservar(
+            usuario_id, fecha, solo_horario=False,
+            estado=EstadoCita.RETENIDA, cliente_id=espera.cliente_id, mascota_id=espera.mascota_id, recordatorio_enviado_en=None,
+        )
+        if retenida is None:
+            # La hora ya no está libre, el inscrito sigue esperando
+            transaction.set_rollback(True)
+            return None
+
+        ListaEspera.objects.filter(pk=espera.pk).update(cita_id=retenida.pk)
+
+    espera.estado = ListaEspera.ESTADO_OFRECIDA
+    espera.oferta_vence_en = vence
+    espera.cita_id = retenida.pk
+    return espera
+
+
+def liberar(espera, estado):
+    """
+    Termina una oferta sin reservar (vencida o rechazada) y ofrece la hora al siguiente de la lista.
+
+    Si la hora es del horario del veterinario la cita retenida se elimina (la hora sigue disponible sin cita);
+    si no, vuelve a ser una cita disponible.
+
+    Returns:
+        bool: True si la oferta seguía vigente y se liberó.
+    """
+    with transaction.atomic(using=router.db_for_write(ListaEspera)):
+        if not ListaEspera.objects.filter(pk=espera.pk, estado=ListaEspera.ESTADO_OFRECIDA).update(estado=estado):
+            return False
+        retenida = Cita._base_manager.filter(pk=espera.cita_id, estado=EstadoCita.RETENIDA).first()
+        if retenida is None:
+            return True
+        if disponibilidad.en_horario(retenida.usuario_id, retenida.fecha):
+            # La señal post_delete ofrece la hora (ver paneltrabajador.signals)
+            retenida.delete()
+        else:
+            Cita._base_manager.filter(pk=retenida.pk, estado=EstadoCita.RETENIDA).update(estado=EstadoCita.DISPONIBLE, cliente=None, mascota=None)
+            versiones.incrementar(Cita)
+            liberadas([retenida.pk])
+    return True
+
+
+def confirmar(espera):
+    """
+    Reserva la cita ofrecida, si la oferta sigue vigente.
+
+    Returns:
+        bool: True si se reservó.
+    """
+    with transaction.atomic(using=router.db_for_write(ListaEspera)):
+        vigente = ListaEspera.objects.filter(
+            pk=espera.pk, estado=ListaEspera.ESTADO_OFRECIDA, oferta_vence_en__gt=timezone.now(),
+        ).update(estado=ListaEspera.ESTADO_RESERVADA)
+        if not vigente:
+            return False
+        # La cita pudo ser editada desde el panel mientras estaba retenida
+        if not Cita.objects.filter(pk=espera.cita_id, estado=EstadoCita.RETENIDA, cliente_id=espera.cliente_id).update(estado=EstadoCita.RESERVADA):
+            transaction.set_rollback(True)
+            return False
+        versiones.incrementar(Cita)
+    return True
+
+
+def token(espera):
+    """
+    Token firmado del enlace de la oferta. Incluye la sucursal, así el enlace abre la base de datos correcta.
+    """
+    return signing.dumps({'espera': espera.pk, 'sucursal': sucursales.actual()}, salt=SAL)
+
+
+def leer_token(valor):
+    """
+    Returns:
+        tuple: (pk de la inscripción, código de sucursal), o None si el token es inválido o expiró.
+    """
+    try:
+        datos = signing.loads(valor, salt=SAL, max_age=settings.LISTA_ESPERA_OFERTA_MINUTOS * 60)
+    except signing.BadSignature:
+        return None
+    return datos['espera'], datos['sucursal']
+
+
+def enlace(espera):
+    """
+    URL absoluta de la oferta, con el prefijo de la sucursal si hay sucursales.
+    """
+    ruta = reverse('ambpublico_espera_oferta', args=[token(espera)])
+    codigo = sucursales.actual()
+    if codigo:
+        ruta = sucursales.PREFIJO_URL + codigo + ruta
+    return settings.URL_PUBLICA.rstrip('/') + ruta
+
+
+def avisos_pendientes():
+    """
+    Ofertas vigentes cuyo correo no se ha enviado (índice espera_aviso_idx), con lo necesario para el correo.
+    """
+    return (
+        ListaEspera.objects
+        .filter(estado=ListaEspera.ESTADO_OFRECIDA, aviso_enviado_en__isnull=True, cita__isnull=False)
+        .select_related('cliente', 'mascota', 'cita')
+        .order_by('pk')
+    )
+
+
+def mensaje(espera, conexion=None):
+    """
+    Correo con el aviso de la cita ofrecida (la inscripción debe traer su cliente, mascota y cita).
+    """
+    contexto = {
+        'cliente': espera.cliente,
+        'mascota': espera.mascota,
+        'fecha': timezone.localtime(espera.cita.fecha),
+        'vence': timezone.localtime(espera.oferta_vence_en),
+        'enlace': enlace(espera),
+    }
+    cuerpo = get_template('paneltrabajador/correos/oferta_espera.txt').render(contexto)
+    return EmailMessage(ASUNTO, cuerpo, settings.EMAIL_HOST_USER, [espera.cliente.email], connection=conexion)
@@ -0,0 +1,142 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.db import models, router, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from paneltrabajador import versiones
+from paneltrabajador.models import Factura, FacturaLinea, Producto
+
+# Facturas con líneas de productos.
+# Al guardar una factura con sus líneas, en una misma transacción:
+#   - las líneas se reemplazan con un solo bulk_create,
+#   - el stock de todos los productos se mueve con un solo UPDATE condicional (CASE por producto),
+#     que descuenta solo si alcanza el stock; si algún producto no alcanza no se guarda nada,
+#   - el total se calcula con una agregación (SUM(cantidad * precio)) en la base de datos.
+# Al editar, solo la diferencia con las líneas anteriores mueve el stock.
+# Con sucursales los productos están en "default" y las facturas en la base de la sucursal: se abre
+# una transacción en cada una (la de la sucursal se confirma primero).
+
+
+class StockInsuficiente(Exception):
+    """
+    Algún producto no tiene stock suficiente para las líneas de la factura.
+
+    Atributos:
+        productos (list): Nombres de los productos sin stock suficiente.
+    """
+
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__("Stock insuficiente para: {}".format(', '.join(productos) or 'productos no encontrados'))
+
+
+class _Faltante(Exception):
+    pass
+
+
+def cantidades(lineas):
+    """
+    Unidades por producto de las líneas (un producto puede repetirse en varias líneas).
+
+    Returns:
+        Counter: {id del producto: cantidad}
+    """
+    total = Counter()
+    for producto_id, cantidad in lineas:
+        if producto_id is not None:
+            total[producto_id] += cantidad
+    return total
+
+
+def mover_stock(diferencias):
+    """
+    Descuenta (diferencia positiva) o devuelve (negativa) stock de varios productos con un solo UPDATE.
+    Los descuentos son condicionales: solo se aplican si el stock alcanza.
+
+    Args:
+        diferencias: {id del producto: unidades a descontar}
+
+    Raises:
+        StockInsuficiente: Si algún producto no tiene stock suficiente (no se modifica ninguno).
+    """
+    diferencias = {pk: cantidad for pk, cantidad in diferencias.items() if cantidad}
+    if not diferencias:
+        return
+
+    condicion = reduce(or_, (
+        Q(pk=pk, stock_disponible__gte=cantidad) if cantidad > 0 else Q(pk=pk)
+        for pk, cantidad in diferencias.items()
+    ))
+    descuento = Case(*(When(pk=pk, then=Value(cantidad)) for pk, cantidad in diferencias.items()), output_field=models.IntegerField())
+
+    using = router.db_for_write(Producto)
+    try:
+        # Punto de guardado: si falta stock se deshace solo el UPDATE y se buscan los productos que faltan
+        with transaction.atomic(using=using):
+            actualizados = Producto.objects.filter(condicion).update(stock_disponible=F('stock_disponible') - descuento)
+            if actualizados != len(diferencias):
+                raise _Faltante
+    except _Faltante:
+        faltantes = Producto.objects.filter(pk__in=diferencias).exclude(condicion).values_list('nombre_producto', flat=True)
+        raise StockInsuficiente(list(faltantes))
+
+    # QuerySet.update no envía señales
+    versiones.incrementar(Producto)
+
+
+def total(factura):
+    """
+    Total de las líneas de la factura, calculado en la base de datos (None si no tiene líneas).
+    """
+    return FacturaLinea.objects.filter(factura=factura).aggregate(total=Sum(F('cantidad') * F('precio')))['total']
+
+
+def guardar(factura, lineas):
+    """
+    Guarda la factura y reemplaza sus líneas, moviendo el stock de los productos.
+
+    Si la factura tiene líneas, total_pagar es la suma de ellas; sin líneas se mantiene el total ingresado.
+
+    Args:
+        factura: Factura (nueva o existente) con sus campos ya asignados.
+        lineas: FacturaLinea sin guardar, con producto, cantidad y precio.
+            Si no tienen nombre se usa el del producto.
+
+    Raises:
+        StockInsuficiente: Si algún producto no tiene stock suficiente (no se guarda nada).
+    """
+    with transaction.atomic(using=router.db_for_write(Producto)), transaction.atomic(using=router.db_for_write(Factura)):
+        anteriores = Counter()
+        if factura.pk is not None:
+            actuales = FacturaLinea.objects.filter(factura=factura)
+            anteriores = cantidades(actuales.values_list('producto_id', 'cantidad'))
+            actuales.delete()
+
+        nuevas = cantidades((linea.producto_id, linea.cantidad) for linea in lineas)
+        mover_stock({pk: nuevas[pk] - anteriores[pk] for pk in nuevas.keys() | anteriores.keys()})
+
+        if factura.total_pagar is None:
+            # Se calcula con las líneas más abajo
+            factura.total_pagar = 0
+        factura.save()
+        for linea in lineas:
+            linea.factura = factura
+            if not linea.nombre and linea.producto is not None:
+                linea.nombre = linea.producto.nombre_producto
+        FacturaLinea.objects.bulk_create(lineas)
+
+        suma = total(factura) if lineas else None
+        if suma is not None and suma != factura.total_pagar:
+            factura.total_pagar = suma
+            factura.save(update_fields=['total_pagar'])
+    return factura
+
+
+def devolver_stock(facturas):
+    """
+    Devuelve al stock los productos de las líneas de las facturas (antes de eliminarlas desde el panel).
+    El archivado y la purga de clientes eliminan facturas sin devolver el stock (la venta se hizo).
+    """
+    lineas = FacturaLinea.objects.filter(factura__in=facturas).values_list('producto_id', 'cantidad')
+    mover_stock({pk: -cantidad for pk, cantidad in cantidades(lineas).items()})
@@ -1,5 +1,9 @@
 from django import forms
-from .models import Cita, Cliente, Mascota, Factura, Producto
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from .models import Cita, Cliente, Mascota, Factura, FacturaLinea, Producto, SucursalUsuario
+from . import sucursales
+from .roles import ROL_CHOICES, ROLES
 from django.contrib.auth import get_user_model
 
 # https://stackoverflow.com/a/69965027
@@ -22,6 +26,56 @@ class DateTimeLocalField(forms.DateTimeField):
     widget = DateTimeLocalInput(format="%Y-%m-%dT%H:%M", attrs={'class': 'form-control'})
 
 
+class Autocompletar(forms.Select):
+    """
+    Select para llaves foráneas de tablas grandes (clientes, mascotas, usuarios).
+
+    Solo renderiza la opción seleccionada; las demás se buscan en el servidor mientras
+    el usuario escribe (ver static/panel/autocompletar.js). Así el costo de mostrar
+    el formulario no depende de la cantidad de filas de la tabla.
+
+    Args:
+        url: Nombre de la URL de búsqueda.
+        depende_de: Nombre del campo del formulario que filtra las opciones (por ejemplo "cliente").
+    """
+
+    class Media:
+        js = ['panel/autocompletar.js']
+
+    def __init__(self, url, depende_de=None, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+        self.depende_de = depende_de
+
+    def get_context(self, name, value, attrs):
+        contexto = super().get_context(name, value, attrs)
+        contexto['widget']['attrs']['data-autocompletar'] = reverse(self.url)
+        if self.depende_de:
+            contexto['widget']['attrs']['data-depende-de'] = self.depende_de
+        return contexto
+
+    def optgroups(self, name, value, attrs=None):
+        # Consultamos solamente los objetos seleccionados, no toda la tabla
+        queryset = self.choices.queryset
+        pk = queryset.model._meta.pk
+        seleccionados = []
+        for valor in value:
+            try:
+                seleccionados.append(pk.to_python(valor))
+            except ValidationError:
+                continue
+        seleccionados = [valor for valor in seleccionados if valor is not None]
+
+        opciones = []
+        if self.choices.field.empty_label is not None:
+            opciones.append(self.create_option(name, '', self.choices.field.empty_label, not seleccionados, 0))
+        if seleccionados:
+            for indice, objeto in enumerate(queryset.filter(pk__in=seleccionados), start=len(opciones)):
+                etiqueta = self.choices.field.label_from_instance(objeto)
+                opciones.append(self.create_option(name, self.choices.field.prepare_value(objeto), etiqueta, True, indice))
+        return [(None, opciones, 0)]
+
+
 class ClienteForm(forms.ModelForm):
     class Meta:
         model = Cliente
@@ -39,12 +93,26 @@ class ClienteForm(forms.ModelForm):
         if self.instance and self.instance.pk:
             self.fields['rut'].widget = forms.HiddenInput()
 
+    def clean_rut(self):
+        rut = self.cleaned_data['rut']
+
+        # Un cliente eliminado conserva su RUT hasta que se purgan sus datos
+        if not self.instance.pk and Cliente._base_manager.filter(rut=rut, eliminado=True).exists():
+            raise forms.ValidationError("El cliente con este RUT fue eliminado recientemente. Intente nuevamente más tarde.")
+        return rut
+
 
 class CitaForm(forms.ModelForm):
 
     class Meta:
         model = Cita
         fields = ['cliente', 'mascota', 'estado', 'usuario', 'fecha']
+        # Clientes, mascotas y usuarios se buscan con autocompletado en vez de cargar toda la tabla
+        widgets = {
+            'cliente': Autocompletar('panel_autocompletar_clientes'),
+            'mascota': Autocompletar('panel_autocompletar_mascotas', depende_de='cliente'),
+            'usuario': Autocompletar('panel_autocompletar_usuarios'),
+        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -63,11 +131,24 @@ class CitaForm(forms.ModelForm):
         self.fields['cliente'].required = False
         self.fields['mascota'].required = False
 
+        # El texto de la mascota incluye a su cliente
+        self.fields['mascota'].queryset = Mascota.objects.select_related('cliente')
+
         # Ocultamos los campos "cliente" y "mascota" si estamos agregando una nueva cita
         if not self.instance.pk:  # Verificamos si la instancia ya tiene una clave primaria
             self.fields['cliente'].widget = forms.HiddenInput()
             self.fields['mascota'].widget = forms.HiddenInput()
 
+    def clean(self):
+        cleaned_data = super().clean()
+        cliente = cleaned_data.get('cliente')
+        mascota = cleaned_data.get('mascota')
+
+        # La mascota debe pertenecer al cliente de la cita
+        if cliente and mascota and mascota.cliente_id != cliente.pk:
+            self.add_error('mascota', "La mascota seleccionada no pertenece al cliente.")
+        return cleaned_data
+
 
 class MascotaForm(forms.ModelForm):
     class Meta:
@@ -77,6 +158,8 @@ class MascotaForm(forms.ModelForm):
             'fecha_nacimiento': forms.DateInput(
                 format=('%Y-%m-%d'),
                 attrs={'placeholder': 'Seleccione una fecha...', 'type': 'date'}),
+            # Los clientes se buscan con autocompletado en vez de cargar toda la tabla
+            'cliente': Autocompletar('panel_autocompletar_clientes'),
         }
 
     def __init__(self, *args, es_reserva=False, **kwargs):
@@ -92,13 +175,25 @@ class MascotaForm(forms.ModelForm):
             self.fields.pop('cliente')
             self.fields.pop('historial_medico')
 
+    def clean_numero_chip(self):
+        numero_chip = self.cleaned_data['numero_chip']
+
+        # Las mascotas de un cliente eliminado conservan su chip hasta que se purgan sus datos
+        if Mascota._base_manager.filter(numero_chip=numero_chip, cliente__eliminado=True).exists():
+            raise forms.ValidationError("Este número de chip pertenece a una mascota eliminada recientemente. Intente nuevamente más tarde.")
+        return numero_chip
+
 
 class FacturaForm(forms.ModelForm):
     class Meta:
         model = Factura
         fields = ['cliente', 'total_pagar', 'detalle', 'estado_pago']
+        # Los clientes se buscan con autocompletado en vez de cargar toda la tabla
+        widgets = {
+            'cliente': Autocompletar('panel_autocompletar_clientes'),
+        }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, con_lineas=False, **kwargs):
         super().__init__(*args, **kwargs)
 
         # Agrega clases de Bootstrap a los campos
@@ -107,11 +202,48 @@ class FacturaForm(forms.ModelForm):
 
         self.fields['cliente'].widget.attrs['class'] = 'form-select'
 
+        # Con líneas de productos el total se calcula de ellas (ver paneltrabajador.facturacion)
+        if con_lineas:
+            self.fields['total_pagar'].required = False
+            self.fields['total_pagar'].help_text = "Si agrega productos, se calcula de ellos."
+
+
+class FacturaLineaForm(forms.ModelForm):
+    class Meta:
+        model = FacturaLinea
+        fields = ['producto', 'cantidad', 'precio']
+        # Los productos se buscan con autocompletado
+        widgets = {
+            'producto': Autocompletar('panel_autocompletar_productos'),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Agrega clases de Bootstrap a los campos
+        for field_name, field in self.fields.items():
+            field.widget.attrs['class'] = 'form-control'
+
+        self.fields['producto'].widget.attrs['class'] = 'form-select'
+        self.fields['producto'].required = True
+        # Sin precio se usa el del producto
+        self.fields['precio'].required = False
+
+    def clean(self):
+        datos = super().clean()
+        if datos.get('precio') is None and datos.get('producto') is not None:
+            datos['precio'] = datos['producto'].precio
+        return datos
+
+
+# Líneas de productos del formulario de facturas
+FacturaLineaFormSet = forms.inlineformset_factory(Factura, FacturaLinea, form=FacturaLineaForm, extra=3, can_delete=True)
+
 
 class ProductoForm(forms.ModelForm):
     class Meta:
         model = Producto
-        fields = ['nombre_producto', 'stock_disponible']
+        fields = ['nombre_producto', 'stock_disponible', 'precio']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -122,16 +254,15 @@ class ProductoForm(forms.ModelForm):
 
 class UsuarioForm(forms.ModelForm):
 
-    # Constante de tuplas con las opciones que tiene el selector de los roles de usuario
-    ROL_CHOICES = (
-        ('veterinario', 'Veterinario'),
-        ('gerente', 'Gerente'),
-        ('recepcionista', 'Recepcionista'),
-    )
+    # Constante de tuplas con las opciones que tiene el selector de los roles de usuario (ver paneltrabajador.roles)
+    ROL_CHOICES = ROL_CHOICES
 
     # Asignamos nuestro campo personalizado con las opciones y siendo obligatorio
     rol_usuario = forms.ChoiceField(choices=ROL_CHOICES, required=True)
 
+    # Sucursal asignada, solo si hay sucursales configuradas. Sin sucursal el usuario puede trabajar en todas
+    sucursal = forms.ChoiceField(required=False)
+
     class Meta:
         # El modelo lo obtenemos desde la autentificacion de Django
         model = get_user_model()
@@ -146,14 +277,28 @@ class UsuarioForm(forms.ModelForm):
         if self.instance.pk:
             # Si estamos editando un usuario, entonces vamos a obtener su grupo de usuario desde Django Auth
             # Y lo vamos a asignar el select de rol_usuario
-            if self.instance.groups.filter(name='veterinario').exists():
-                self.fields['rol_usuario'].initial = "veterinario"
-            if self.instance.groups.filter(name='gerente').exists():
-                self.fields['rol_usuario'].initial = "gerente"
-            if self.instance.groups.filter(name='recepcionista').exists():
-                self.fields['rol_usuario'].initial = "recepcionista"
+            self.fields['rol_usuario'].initial = self.instance.groups.filter(name__in=ROLES).values_list('name', flat=True).first()
+
+        if sucursales.codigos():
+            self.fields['sucursal'].choices = [('', 'Todas')] + [(codigo, sucursales.nombre(codigo)) for codigo in sucursales.codigos()]
+            if self.instance.pk:
+                self.fields['sucursal'].initial = sucursales.de_usuario(self.instance)
+        else:
+            del self.fields['sucursal']
 
         # Agrega clases de Bootstrap a los campos
         for field_name, field in self.fields.items():
             if field_name is not 'is_active':
                 field.widget.attrs['class'] = 'form-control'
+
+    def guardar_sucursal(self, usuario):
+        """
+        Guarda la sucursal asignada al usuario. Se llama después de guardar el usuario.
+        """
+        if 'sucursal' not in self.fields:
+            return
+        codigo = self.cleaned_data.get('sucursal')
+        if codigo:
+            SucursalUsuario.objects.update_or_create(usuario=usuario, defaults={'sucursal': codigo})
+        else:
+            SucursalUsuario.objects.filter(usuario=usuario).delete()
@@ -0,0 +1,121 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.utils import timezone
+from paneltrabajador import sucursales
+from paneltrabajador.models import Cita, CitaHistorica, EstadoPago, Factura, FacturaHistorica, FacturaLinea
+
+
+# Comando para mover las citas antiguas y las facturas pagadas a las tablas históricas.
+# Cada lote se copia y se borra de la tabla principal en una misma transacción.
+# Con sucursales configuradas se archiva cada sucursal por separado.
+class Command(BaseCommand):
+    help = "Archiva las citas antiguas y las facturas pagadas en las tablas históricas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=12, help="Antigüedad mínima (en meses) de las citas a archivar.")
+        parser.add_argument('--lote', type=int, default=500, help="Cantidad máxima de filas por transacción.")
+        parser.add_argument('--pausa', type=float, default=0.05, help="Segundos de espera entre lotes para dejar pasar otras escrituras.")
+
+    def handle(self, **options):
+        if options['meses'] < 1:
+            raise CommandError("La cantidad de meses debe ser mayor a 0.")
+
+        # Aproximamos un mes como 30 días
+        limite = timezone.now() - datetime.timedelta(days=30 * options['meses'])
+
+        for codigo in sucursales.codigos() or [None]:
+            with sucursales.usar(codigo):
+                if codigo:
+                    self.stdout.write("{}:".format(sucursales.nombre(codigo)))
+                self.archivar_sucursal(limite, options)
+
+        self.stdout.write(self.style.SUCCESS("Archivado finalizado."))
+
+    def archivar_sucursal(self, limite, options):
+        """
+        Archiva las citas y facturas de la sucursal activa.
+        """
+        citas = self.archivar(
+            Cita.objects.filter(fecha__lt=limite),
+            CitaHistorica,
+            ('n_cita', 'cliente_id', 'cliente__nombre_cliente', 'mascota_id', 'mascota__nombre', 'estado', 'usuario_id', 'usuario__username', 'fecha'),
+            lambda fila: CitaHistorica(
+                n_cita=fila['n_cita'],
+                cliente_rut=fila['cliente_id'],
+                cliente_nombre=fila['cliente__nombre_cliente'] or '',
+                mascota_id=fila['mascota_id'],
+                mascota_nombre=fila['mascota__nombre'] or '',
+                estado=fila['estado'],
+                usuario_id=fila['usuario_id'],
+                usuario_nombre=fila['usuario__username'] or '',
+                fecha=fila['fecha'],
+            ),
+            options,
+        )
+        self.stdout.write("Citas archivadas: {}".format(citas))
+
+        facturas = self.archivar(
+            Factura.objects.filter(estado_pago=EstadoPago.PAGADA),
+            FacturaHistorica,
+            ('numero_factura', 'cliente_id', 'cliente__nombre_cliente', 'total_pagar', 'detalle', 'estado_pago'),
+            lambda fila: FacturaHistorica(
+                numero_factura=fila['numero_factura'],
+                cliente_rut=fila['cliente_id'],
+                cliente_nombre=fila['cliente__nombre_cliente'],
+                total_pagar=fila['total_pagar'],
+                detalle='\n'.join([fila['detalle']] + fila['lineas']).strip(),
+                estado_pago=fila['estado_pago'],
+            ),
+            options,
+            complementar=self.agregar_lineas,
+        )
+        self.stdout.write("Facturas archivadas: {}".format(facturas))
+
+    def agregar_lineas(self, filas):
+        """
+        Agrega a cada factura del lote sus líneas como texto, con una sola consulta.
+        La tabla histórica no tiene líneas, quedan en el detalle.
+        """
+        por_factura = {fila['numero_factura']: fila for fila in filas}
+        for fila in filas:
+            fila['lineas'] = []
+        lineas = FacturaLinea.objects.filter(factura_id__in=por_factura).order_by('pk').values_list('factura_id', 'cantidad', 'nombre', 'precio')
+        for factura_id, cantidad, nombre, precio in lineas:
+            por_factura[factura_id]['lineas'].append('{} x {} (${})'.format(cantidad, nombre, precio))
+
+    def archivar(self, queryset, historico, campos, convertir, options, complementar=None):
+        """
+        Copia en lotes las filas del queryset a la tabla histórica y las borra de la tabla principal.
+
+        Args:
+            queryset: Filas a archivar.
+            historico: Modelo de la tabla histórica.
+            campos: Campos a leer (con los nombres relacionados necesarios).
+            convertir: Función que recibe una fila y devuelve el objeto histórico.
+            options: Opciones del comando (lote y pausa).
+            complementar: Función opcional que recibe las filas del lote y les agrega datos relacionados.
+
+        Returns:
+            int: Cantidad de filas archivadas.
+        """
+        modelo = queryset.model
+        pk = modelo._meta.pk.name
+        total = 0
+
+        while True:
+            with transaction.atomic(using=router.db_for_write(modelo)):
+                filas = list(queryset.order_by(pk).values(*campos)[:options['lote']])
+                if not filas:
+                    return total
+
+                if complementar is not None:
+                    complementar(filas)
+                historico.objects.bulk_create([convertir(fila) for fila in filas])
+                modelo._base_manager.filter(pk__in=[fila[pk] for fila in filas]).delete()
+
+            total += len(filas)
+            if options['pausa']:
+                time.sleep(options['pausa'])
@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from paneltrabajador import auditoria
+from paneltrabajador.models import Producto, RegistroAuditoria
+
+
+# Comando para medir la latencia que agrega la auditoría a las ediciones del panel.
+# Crea un producto temporal, lo edita muchas veces con y sin auditoría y al final borra
+# el producto y sus registros.
+class Command(BaseCommand):
+    help = "Mide la latencia agregada por la auditoría al editar un objeto desde el panel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=500)
+        parser.add_argument('--presupuesto-ms', type=float, default=2.0,
+                            help="Latencia máxima aceptable por edición, en milisegundos.")
+
+    def handle(self, **options):
+        iteraciones = options['iteraciones']
+        usuario = get_user_model().objects.order_by('pk').first()
+        if usuario is None:
+            raise CommandError("Se necesita al menos un usuario para medir la auditoría.")
+
+        producto = Producto.objects.create(nombre_producto='benchmark', stock_disponible=0)
+        request = RequestFactory().post('/panel/productos/editar/{}/'.format(producto.pk))
+        request.user = usuario
+
+        # Una "petición" que edita el producto en cada iteración, como producto_editar
+        def vista(request):
+            for i in range(iteraciones):
+                producto.stock_disponible = i + 1
+                producto.save()
+            return HttpResponse("OK")
+
+        try:
+            inicio = time.perf_counter()
+            vista(request)
+            base = time.perf_counter() - inicio
+
+            # Con el middleware se captura cada cambio y se guardan todos al terminar (vaciar)
+            inicio = time.perf_counter()
+            auditoria.AuditoriaMiddleware(vista)(request)
+            auditoria.vaciar()
+            auditada = time.perf_counter() - inicio
+
+            registros = RegistroAuditoria.objects.filter(modelo=Producto._meta.label_lower, objeto_id=str(producto.pk))
+            cantidad = registros.count()
+        finally:
+            RegistroAuditoria.objects.filter(modelo=Producto._meta.label_lower, objeto_id=str(producto.pk)).delete()
+            producto.delete()
+
+        extra = (auditada - base) / iteraciones * 1000
+        self.stdout.write("Iteraciones: {} (registros guardados: {})".format(iteraciones, cantidad))
+        self.stdout.write("Sin auditoría: {:.3f} ms/edición".format(base / iteraciones * 1000))
+        self.stdout.write("Con auditoría: {:.3f} ms/edición".format(auditada / iteraciones * 1000))
+        if extra > options['presupuesto_ms']:
+            raise CommandError("La auditoría agrega {:.3f} ms/edición, sobre el presupuesto de {:.3f} ms.".format(extra, options['presupuesto_ms']))
+        self.stdout.write(self.style.SUCCESS("Latencia agregada: {:.3f} ms/edición (presupuesto {:.3f} ms)".format(extra, options['presupuesto_ms'])))
@@ -0,0 +1,108 @@
+import secrets
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from paneltrabajador import compresion
+
+# Páginas medidas: nombre de la URL y sus argumentos
+PAGINAS = {
+    'panel_cliente_listado': {},
+    'panel_cita_listar': {},
+    'panel_mascota_listar': {},
+    'panel_factura_listar': {},
+    'panel_producto_listar': {},
+    'panel_historico_citas': {},
+    'panel_auditoria_listar': {},
+    'panel_api_coleccion': {'recurso': 'clientes'},
+    'ambpublico_index': {},
+}
+
+
+# Comando para medir el minificado y la compresión de las respuestas (ver paneltrabajador.compresion).
+# Obtiene cada página sin el middleware de compresión (con los datos de la base de datos actual, como
+# un superusuario temporal) y mide, por página, los bytes originales, minificados y comprimidos con
+# cada codificación, junto con el tiempo de CPU de cada paso. Al terminar borra el usuario temporal.
+class Command(BaseCommand):
+    help = "Mide los bytes y el tiempo de CPU del minificado y la compresión de cada tipo de página."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=50, help="Repeticiones de cada paso para medir la CPU.")
+
+    def handle(self, **options):
+        repeticiones = options['repeticiones']
+        if repeticiones < 1:
+            raise CommandError("La cantidad de repeticiones debe ser mayor a 0.")
+
+        paginas = self.obtener_paginas()
+        self.stdout.write("Codificaciones disponibles: {}{}".format(
+            ', '.join(compresion.codificaciones()), '' if compresion.brotli else ' (instalar el paquete brotli para medir br)',
+        ))
+        self.stdout.write("Página: original -> minificado | por codificación: comprimido, minificado y comprimido (CPU por respuesta)")
+
+        totales = {'original': 0, 'minificado': 0}
+        for nombre, (tipo, contenido) in paginas.items():
+            minificar = tipo == 'text/html'
+            html = contenido.decode('utf-8')
+            minificado = compresion.minificar(html).encode('utf-8') if minificar else contenido
+            cpu_minificar = self.cpu(lambda: compresion.minificar(html), repeticiones) if minificar else 0
+
+            partes = []
+            for codificacion in compresion.codificaciones():
+                solo = len(compresion.comprimir(contenido, codificacion))
+                ambos = len(compresion.comprimir(minificado, codificacion))
+                cpu = self.cpu(lambda: compresion.comprimir(minificado, codificacion), repeticiones)
+                partes.append("{} {} B, {} B ({:.0f}%, {:.2f} ms)".format(
+                    codificacion, solo, ambos, 100 * ambos / len(contenido), (cpu + cpu_minificar) * 1000,
+                ))
+                totales[codificacion] = totales.get(codificacion, 0) + ambos
+            totales['original'] += len(contenido)
+            totales['minificado'] += len(minificado)
+
+            self.stdout.write("{} ({}): {} B -> {} B ({:.2f} ms) | {}".format(
+                nombre, tipo, len(contenido), len(minificado), cpu_minificar * 1000, ' | '.join(partes),
+            ))
+
+        self.stdout.write(self.style.SUCCESS("Total: {} B, minificado {} B, {}".format(
+            totales['original'], totales['minificado'],
+            ', '.join('{} {} B'.format(codificacion, totales[codificacion]) for codificacion in compresion.codificaciones()),
+        )))
+
+    def obtener_paginas(self):
+        """
+        Respuestas de las páginas sin minificar ni comprimir.
+
+        Returns:
+            dict: {nombre de la URL: (tipo de contenido, contenido)}
+        """
+        clave = secrets.token_urlsafe(16)
+        usuario = get_user_model().objects.create_superuser('benchmark_compresion_' + secrets.token_hex(4), password=clave)
+        middleware = [nombre for nombre in settings.MIDDLEWARE if nombre != 'paneltrabajador.compresion.CompresionMiddleware']
+        paginas = {}
+        try:
+            with override_settings(MIDDLEWARE=middleware, LIMITES_TASA={}):
+                cliente = Client(SERVER_NAME=(settings.ALLOWED_HOSTS or ['localhost'])[0])
+                cliente.force_login(usuario)
+                for nombre, kwargs in PAGINAS.items():
+                    respuesta = cliente.get(reverse(nombre, kwargs=kwargs))
+                    if respuesta.status_code != 200:
+                        self.stdout.write(self.style.WARNING("{} respondió {}, se omite.".format(nombre, respuesta.status_code)))
+                        continue
+                    paginas[nombre] = (respuesta['Content-Type'].split(';')[0], respuesta.content)
+                cliente.logout()
+        finally:
+            usuario.delete()
+        return paginas
+
+    def cpu(self, funcion, repeticiones):
+        """
+        Tiempo de CPU promedio de una llamada, en segundos.
+        """
+        inicio = time.process_time()
+        for _ in range(repeticiones):
+            funcion()
+        return (time.process_time() - inicio) / repeticiones
@@ -0,0 +1,140 @@
+import secrets
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.forms import AuthenticationForm
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory, override_settings
+
+from paneltrabajador.views import home
+
+# Hilos que envían la ráfaga de intentos fallidos
+HILOS = 4
+
+
+
+# Comando para medir el costo del inicio de sesión del panel.
+# 1. Compara el tiempo de CPU del flujo anterior (validar el formulario y volver a llamar a authenticate)
+#    con el actual (una sola verificación de contraseña con form.get_user()).
+# 2. Simula una ráfaga de "credential stuffing" desde una IP contra la vista de inicio de sesión,
+#    con y sin el límite de tasa, y mide cuánto tardan los inicios de sesión legítimos durante la ráfaga.
+# Crea un usuario temporal y lo borra al terminar.
+class Command(BaseCommand):
+    help = "Mide el costo de CPU del inicio de sesión del panel y el efecto del límite de tasa."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicios', type=int, default=20, help="Inicios de sesión a medir en cada flujo.")
+        parser.add_argument('--duracion', type=float, default=15, help="Segundos que dura cada ráfaga de intentos fallidos.")
+        parser.add_argument('--tasa', type=float, default=50, help="Intentos fallidos por segundo de la ráfaga.")
+        parser.add_argument('--proporcion-maxima', type=float, default=0.6,
+                            help="Proporción máxima del tiempo de CPU del flujo actual respecto del anterior.")
+
+    def handle(self, **options):
+        fabrica = RequestFactory()
+        clave = secrets.token_urlsafe(16)
+        usuario = get_user_model().objects.create_user('benchmark_login_' + secrets.token_hex(4), password=clave)
+        datos = {'username': usuario.username, 'password': clave}
+
+        try:
+            anterior, actual = self.medir_flujos(fabrica, datos, options['inicios'])
+            sin_limite = self.medir_rafaga(fabrica, datos, options['duracion'], options['tasa'], limitar=False)
+            con_limite = self.medir_rafaga(fabrica, datos, options['duracion'], options['tasa'], limitar=True)
+        finally:
+            usuario.delete()
+            caches['default'].clear()
+
+        inicios = options['inicios']
+        self.stdout.write("Flujo anterior (dos verificaciones): {:.1f} ms CPU/inicio".format(anterior / inicios * 1000))
+        self.stdout.write("Flujo actual (una verificación): {:.1f} ms CPU/inicio".format(actual / inicios * 1000))
+        for nombre, resultado in (('Ráfaga sin límite', sin_limite), ('Ráfaga con límite', con_limite)):
+            self.stdout.write(
+                "{}: {} intentos, {} rechazados (429), {:.2f} s CPU de la ráfaga; {} inicios legítimos durante la ráfaga, mediana {:.1f} ms".format(
+                    nombre, resultado['intentos'], resultado['rechazados'], resultado['cpu'], resultado['legitimos'], resultado['legitimo'] * 1000
+                )
+            )
+
+        proporcion = actual / anterior
+        if proporcion > options['proporcion_maxima']:
+            raise CommandError("El flujo actual usa {:.0%} del CPU del anterior, sobre el máximo de {:.0%}.".format(proporcion, options['proporcion_maxima']))
+        self.stdout.write(self.style.SUCCESS("El flujo actual usa {:.0%} del CPU del anterior.".format(proporcion)))
+
+    def medir_flujos(self, fabrica, datos, inicios):
+        """
+        Returns:
+            tuple: Segundos de CPU del flujo anterior y del actual.
+        """
+        request = fabrica.post('/panel/', datos)
+
+        inicio = time.process_time()
+        for i in range(inicios):
+            form = AuthenticationForm(request=request, data=datos)
+            if form.is_valid():
+                authenticate(request, username=form.cleaned_data['username'], password=form.cleaned_data['password'])
+        anterior = time.process_time() - inicio
+
+        inicio = time.process_time()
+        for i in range(inicios):
+            form = AuthenticationForm(request=request, data=datos)
+            if form.is_valid():
+                form.get_user()
+        actual = time.process_time() - inicio
+        return anterior, actual
+
+    def medir_rafaga(self, fabrica, datos, duracion, tasa, limitar):
+        """
+        Envía a la vista de inicio de sesión, durante los segundos indicados y a la tasa indicada, una ráfaga
+        de contraseñas incorrectas para distintos usuarios desde una misma IP (en varios hilos). Mientras tanto, mide
+        inicios de sesión legítimos desde otra IP.
+        """
+        caches['default'].clear()
+        limites = {'login': {'ip': (20, 10), 'usuario': (5, 2)}} if limitar else {}
+        termino = time.perf_counter() + duracion
+
+        # Cada hilo envía sus intentos a intervalos regulares, sin esperar si va atrasado
+        intervalo = HILOS / tasa
+
+        def atacante(hilo):
+            intentos = 0
+            rechazados = 0
+            siguiente = time.perf_counter()
+            cpu = time.thread_time()
+            try:
+                while time.perf_counter() < termino:
+                    time.sleep(max(0, siguiente - time.perf_counter()))
+                    siguiente += intervalo
+                    datos_falsos = {'username': 'usuario{}_{}'.format(hilo, intentos), 'password': 'incorrecta'}
+                    request = fabrica.post('/panel/', datos_falsos, REMOTE_ADDR='203.0.113.1')
+                    request.user = AnonymousUser()
+                    request.session = {}
+                    rechazados += home(request).status_code == 429
+                    intentos += 1
+            finally:
+                connections.close_all()
+            return intentos, rechazados, time.thread_time() - cpu
+
+        with override_settings(LIMITES_TASA=limites):
+            with ThreadPoolExecutor(max_workers=HILOS) as ejecutor:
+                resultados = ejecutor.map(atacante, range(HILOS))
+
+                # Inicios de sesión legítimos durante la ráfaga (solo validan la contraseña)
+                latencias = []
+                while time.perf_counter() < termino:
+                    comienzo = time.perf_counter()
+                    form = AuthenticationForm(request=fabrica.post('/panel/', datos, REMOTE_ADDR='198.51.100.1'), data=datos)
+                    form.is_valid()
+                    latencias.append(time.perf_counter() - comienzo)
+
+                resultados = list(resultados)
+
+        return {
+            'intentos': sum(resultado[0] for resultado in resultados),
+            'rechazados': sum(resultado[1] for resultado in resultados),
+            'cpu': sum(resultado[2] for resultado in resultados),
+            'legitimos': len(latencias),
+            'legitimo': statistics.median(latencias),
+        }
@@ -1,63 +1,88 @@
-from django.core.management.base import BaseCommand
 from django.contrib.auth.models import Group, Permission
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from paneltrabajador import versiones
+from paneltrabajador.roles import ROLES, permisos_por_rol
 
-# Comando personalizado para la configuración rápida de los permisos y grupos
-# Ya creados de Django Auth
-class Command(BaseCommand):
 
-    PERMISOS_GERENTE = ["add_user", "change_user", "delete_user", "view_user", "add_cita", "change_cita", "delete_cita", "view_cita", "add_cliente", "change_cliente", "delete_cliente", "view_cliente", "add_factura", "change_factura",
-                        "delete_factura", "view_factura", "add_mascota", "change_mascota", "delete_mascota", "view_mascota", "add_producto", "change_producto", "delete_producto", "view_producto"]
+# Comando para sincronizar los grupos de Django Auth con los roles declarados en paneltrabajador.roles.
+# Lee todos los permisos en una consulta, calcula las diferencias con lo que tiene cada grupo
+# y aplica solo los cambios (altas y bajas en lote) en una transacción. Si no hay diferencias
+# no escribe nada, así que se puede ejecutar en cada despliegue.
+class Command(BaseCommand):
+    help = "Sincroniza los grupos y permisos del panel con los roles declarados en paneltrabajador/roles.py."
 
-    PERMISOS_VET = ["view_user", "change_cita", "view_cita", "view_cliente", "change_mascota", "view_mascota", "view_producto"]
-    PERMISOS_RECEP = ["view_user", "add_cita", "change_cita", "delete_cita", "view_cita", "add_cliente", "change_cliente", "view_cliente", "add_factura", "change_factura",
-                      "view_factura", "add_mascota", "change_mascota", "delete_mascota", "view_mascota", "change_producto", "view_producto"]
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Muestra los cambios sin aplicarlos.")
 
     def handle(self, **options):
-
-        print("..::PROCESO INICIAL DE PERMISOS Y GRUPOS POR PERICODERS::..")
-
-        print("Lista de permisos disponibles: ", end="")
-
-        for action in Permission.objects.all():
-            print("\"{}\",".format(action.codename), end="")
-
-        print("\nCreación de grupos")
-
-        veterinario_group, created = Group.objects.get_or_create(name='veterinario')
-        gerente_group, created = Group.objects.get_or_create(name='gerente')
-        recepcionista_group, created = Group.objects.get_or_create(name='recepcionista')
-
-        print("OK")
-
-        print("Limpieza de permisos en caso de que existieran")
-
-        gerente_group.permissions.clear()
-        veterinario_group.permissions.clear()
-        recepcionista_group.permissions.clear()
-
-        print("OK")
-
-        print("Asignacion permisos GERENTE")
-        for permiso in self.PERMISOS_GERENTE:
-            perm = Permission.objects.get(codename=permiso)
-            gerente_group.permissions.add(perm)
-
-        print("OK")
-
-        print("Asignacion permisos VETERINARIO")
-
-        for permiso in self.PERMISOS_VET:
-            perm = Permission.objects.get(codename=permiso)
-            veterinario_group.permissions.add(perm)
-
-        print("OK")
-
-        print("Asignacion permisos RECEPCIONISTA")
-
-        for permiso in self.PERMISOS_RECEP:
-            perm = Permission.objects.get(codename=permiso)
-            recepcionista_group.permissions.add(perm)
-
-        print("OK")
-
-        print("TODO OK PROCESO FINALIZADO")
+        simulacion = options['dry_run']
+        declarados = permisos_por_rol()
+
+        # Todos los permisos necesarios en una sola consulta
+        necesarios = set().union(*declarados.values())
+        consulta = Permission.objects.filter(
+            content_type__app_label__in={app_label for app_label, codename in necesarios},
+            codename__in={codename for app_label, codename in necesarios},
+        ).values_list('pk', 'content_type__app_label', 'codename')
+        permisos = {(app_label, codename): pk for pk, app_label, codename in consulta if (app_label, codename) in necesarios}
+        faltantes = necesarios - set(permisos)
+        if faltantes:
+            raise CommandError("No existen los permisos: {}. ¿Se ejecutaron las migraciones?".format(
+                ', '.join(sorted('.'.join(permiso) for permiso in faltantes))
+            ))
+        nombres = {pk: '.'.join(permiso) for permiso, pk in permisos.items()}
+
+        grupos = {grupo.name: grupo for grupo in Group.objects.filter(name__in=ROLES)}
+        nuevos = [nombre for nombre in ROLES if nombre not in grupos]
+
+        # Permisos actuales de los grupos existentes, en una consulta
+        Relacion = Group.permissions.through
+        actuales = {nombre: {} for nombre in ROLES}
+        por_id = {grupo.pk: nombre for nombre, grupo in grupos.items()}
+        for pk, grupo_id, permiso_id in Relacion.objects.filter(group_id__in=por_id).values_list('pk', 'group_id', 'permission_id'):
+            actuales[por_id[grupo_id]][permiso_id] = pk
+
+        cambios = {}
+        for nombre in ROLES:
+            deseados = {permisos[permiso] for permiso in declarados[nombre]}
+            cambios[nombre] = (deseados - set(actuales[nombre]), set(actuales[nombre]) - deseados)
+
+        # Nombres de los permisos que sobran (no declarados), solo si hay alguno
+        sobrantes = {pk for agregar, quitar in cambios.values() for pk in quitar} - set(nombres)
+        if sobrantes:
+            consulta = Permission.objects.filter(pk__in=sobrantes).values_list('pk', 'content_type__app_label', 'codename')
+            nombres.update({pk: '{}.{}'.format(app_label, codename) for pk, app_label, codename in consulta})
+
+        for nombre, (agregar, quitar) in cambios.items():
+            estado = "nuevo" if nombre in nuevos else "existente"
+            self.stdout.write("{} ({}): +{} -{}".format(nombre, estado, len(agregar), len(quitar)))
+            if simulacion or options['verbosity'] > 1:
+                for pk in sorted(agregar, key=nombres.get):
+                    self.stdout.write("  + {}".format(nombres[pk]))
+                for pk in sorted(quitar, key=nombres.get):
+                    self.stdout.write("  - {}".format(nombres[pk]))
+
+        hay_cambios = nuevos or any(agregar or quitar for agregar, quitar in cambios.values())
+        if simulacion:
+            self.stdout.write(self.style.WARNING("Simulación: no se aplicó ningún cambio."))
+            return
+        if not hay_cambios:
+            self.stdout.write(self.style.SUCCESS("Los grupos ya están sincronizados."))
+            return
+
+        with transaction.atomic(using=router.db_for_write(Group)):
+            for nombre in nuevos:
+                grupos[nombre] = Group.objects.create(name=nombre)
+
+            Relacion.objects.filter(pk__in=[actuales[nombre][pk] for nombre, (agregar, quitar) in cambios.items() for pk in quitar]).delete()
+            Relacion.objects.bulk_create([
+                Relacion(group_id=grupos[nombre].pk, permission_id=pk)
+                for nombre, (agregar, quitar) in cambios.items()
+                for pk in agregar
+            ])
+
+            # Las altas y bajas en lote no envían m2m_changed, actualizamos la versión a mano
+            versiones.incrementar(versiones.AUTH)
+
+        self.stdout.write(self.style.SUCCESS("Grupos sincronizados."))
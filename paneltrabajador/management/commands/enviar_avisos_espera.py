@@ -0,0 +1,87 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from paneltrabajador import espera, sucursales
+from paneltrabajador.models import ListaEspera
+
+logger = logging.getLogger(__name__)
+
+
+# Comando para enviar por correo los avisos de las ofertas de la lista de espera (ver paneltrabajador.espera).
+# Las ofertas se registran en la petición que libera la hora y el correo se envía aquí, fuera de la petición.
+# Se ejecuta periódicamente (cron, por ejemplo cada minuto). Las ofertas sin aviso se leen en lotes
+# (índice espera_aviso_idx) y los correos se envían por una misma conexión SMTP, uno a la vez:
+# cada oferta se toma (ListaEspera.aviso_enviado_en) antes de enviar su correo y se libera solo si ese
+# correo falla, así un error no repite los avisos ya enviados y se reintenta en la próxima ejecución.
+# Al enviar, el plazo para responder (LISTA_ESPERA_OFERTA_MINUTOS) empieza de nuevo, así la espera
+# hasta la ejecución del comando no lo acorta.
+class Command(BaseCommand):
+    help = "Envía por correo los avisos pendientes de las ofertas de la lista de espera."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=200, help="Cantidad de ofertas leídas por consulta.")
+
+    def handle(self, **options):
+        if options['lote'] < 1:
+            raise CommandError("El lote debe ser mayor a 0.")
+
+        enviados = 0
+        fallidos = 0
+        # Una sola conexión SMTP para todos los correos
+        with get_connection() as conexion:
+            for codigo in sucursales.codigos() or [None]:
+                with sucursales.usar(codigo):
+                    resultado = self.enviar_sucursal(conexion, options['lote'])
+                    enviados += resultado[0]
+                    fallidos += resultado[1]
+
+        self.stdout.write("Avisos de la lista de espera: {} enviados, {} fallidos.".format(enviados, fallidos))
+        if fallidos:
+            self.stdout.write(self.style.WARNING("Los avisos fallidos se reintentarán en la próxima ejecución."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Envío finalizado."))
+
+    def enviar_sucursal(self, conexion, lote):
+        """
+        Envía los avisos pendientes de la sucursal activa, por lotes.
+
+        Returns:
+            tuple: (enviados, fallidos)
+        """
+        enviados = 0
+        fallidos = 0
+        ultimo = 0
+
+        while True:
+            ofertas = list(espera.avisos_pendientes().filter(pk__gt=ultimo)[:lote])
+            if not ofertas:
+                return enviados, fallidos
+            ultimo = ofertas[-1].pk
+
+            for oferta in ofertas:
+                # Tomamos la oferta solo si sigue vigente y sin aviso (otra ejecución pudo tomarla)
+                ahora = timezone.now()
+                vence = ahora + datetime.timedelta(minutes=settings.LISTA_ESPERA_OFERTA_MINUTOS)
+                tomada = ListaEspera.objects.filter(
+                    pk=oferta.pk, estado=ListaEspera.ESTADO_OFRECIDA, aviso_enviado_en__isnull=True,
+                ).update(aviso_enviado_en=ahora, oferta_vence_en=vence)
+                if not tomada:
+                    continue
+                oferta.oferta_vence_en = vence
+
+                try:
+                    cantidad = conexion.send_messages([espera.mensaje(oferta, conexion)])
+                except Exception:
+                    logger.exception("No se pudo enviar el aviso de la oferta de la lista de espera %d", oferta.pk)
+                    cantidad = 0
+
+                if cantidad:
+                    enviados += 1
+                else:
+                    # Se libera para reintentarlo en la próxima ejecución
+                    ListaEspera.objects.filter(pk=oferta.pk, aviso_enviado_en=ahora).update(aviso_enviado_en=None)
+                    fallidos += 1
@@ -0,0 +1,119 @@
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+from django.utils import timezone
+from paneltrabajador import sucursales, versiones
+from paneltrabajador.models import Cita, EstadoCita
+
+logger = logging.getLogger(__name__)
+
+ASUNTO = "Recordatorio de su cita en FiCats"
+
+
+# Comando para enviar por correo el recordatorio de las citas reservadas del día siguiente.
+# Se ejecuta una vez al día (cron). Las citas se leen en lotes con una sola consulta por lote
+# (junto con el cliente y la mascota) y los correos se envían por una misma conexión SMTP, uno a la vez.
+# Cada cita enviada queda marcada (Cita.recordatorio_enviado_en), así volver a ejecutarlo no repite correos;
+# si un correo falla, solo su cita se desmarca y se reintenta en la próxima ejecución.
+class Command(BaseCommand):
+    help = "Envía por correo los recordatorios de las citas reservadas del día siguiente."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Día de las citas (AAAA-MM-DD). Por defecto, mañana.")
+        parser.add_argument('--lote', type=int, default=200, help="Cantidad de correos por lote.")
+
+    def handle(self, **options):
+        if options['fecha']:
+            try:
+                dia = datetime.date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError("La fecha debe tener el formato AAAA-MM-DD.")
+        else:
+            dia = timezone.localdate() + datetime.timedelta(days=1)
+
+        if options['lote'] < 1:
+            raise CommandError("El lote debe ser mayor a 0.")
+
+        inicio = timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+        fin = inicio + datetime.timedelta(days=1)
+        plantilla = get_template('paneltrabajador/correos/recordatorio_cita.txt')
+
+        comienzo = time.perf_counter()
+        enviados = 0
+        fallidos = 0
+        # Una sola conexión SMTP para todos los correos
+        with get_connection() as conexion:
+            for codigo in sucursales.codigos() or [None]:
+                with sucursales.usar(codigo):
+                    resultado = self.enviar_sucursal(conexion, plantilla, inicio, fin, options['lote'])
+                    enviados += resultado[0]
+                    fallidos += resultado[1]
+
+        if enviados:
+            # QuerySet.update no envía señales
+            versiones.incrementar(Cita)
+
+        segundos = time.perf_counter() - comienzo
+        self.stdout.write("Recordatorios del {}: {} enviados, {} fallidos en {:.2f} s.".format(dia.isoformat(), enviados, fallidos, segundos))
+        if fallidos:
+            self.stdout.write(self.style.WARNING("Los recordatorios fallidos se reintentarán en la próxima ejecución."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Envío finalizado."))
+
+    def enviar_sucursal(self, conexion, plantilla, inicio, fin, lote):
+        """
+        Envía los recordatorios pendientes de la sucursal activa, por lotes.
+
+        Returns:
+            tuple: (enviados, fallidos)
+        """
+        pendientes = (
+            Cita.objects
+            .filter(estado=EstadoCita.RESERVADA, fecha__gte=inicio, fecha__lt=fin, recordatorio_enviado_en__isnull=True, mascota__isnull=False)
+            .select_related('cliente', 'mascota__cliente')
+            .order_by('pk')
+        )
+        enviados = 0
+        fallidos = 0
+        ultimo = 0
+
+        while True:
+            # Lotes por llave primaria: cada lote es una consulta con el cliente y la mascota
+            citas = list(pendientes.filter(pk__gt=ultimo)[:lote])
+            if not citas:
+                return enviados, fallidos
+            ultimo = citas[-1].pk
+
+            # Marcamos el lote antes de enviar. Si otra ejecución ya tomó una cita, la omitimos
+            ahora = timezone.now()
+            pks = [cita.pk for cita in citas]
+            Cita.objects.filter(pk__in=pks, recordatorio_enviado_en__isnull=True).update(recordatorio_enviado_en=ahora)
+            tomadas = set(Cita.objects.filter(pk__in=pks, recordatorio_enviado_en=ahora).values_list('pk', flat=True))
+
+            no_enviadas = []
+            for cita in citas:
+                if cita.pk not in tomadas:
+                    continue
+                cliente = cita.cliente or cita.mascota.cliente
+                contexto = {'cita': cita, 'cliente': cliente, 'mascota': cita.mascota, 'fecha': timezone.localtime(cita.fecha)}
+                mensaje = EmailMessage(ASUNTO, plantilla.render(contexto), settings.EMAIL_HOST_USER, [cliente.email], connection=conexion)
+                # Uno a la vez: un error solo afecta a este correo, los anteriores ya se enviaron
+                try:
+                    cantidad = conexion.send_messages([mensaje])
+                except Exception:
+                    logger.exception("No se pudo enviar el recordatorio de la cita %d", cita.pk)
+                    cantidad = 0
+                if cantidad:
+                    enviados += 1
+                else:
+                    no_enviadas.append(cita.pk)
+
+            if no_enviadas:
+                # Se desmarcan solo las citas sin enviar para reintentarlas en la próxima ejecución
+                Cita.objects.filter(pk__in=no_enviadas, recordatorio_enviado_en=ahora).update(recordatorio_enviado_en=None)
+                fallidos += len(no_enviadas)
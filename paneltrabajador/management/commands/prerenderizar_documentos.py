@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from paneltrabajador import documentos, sucursales
+
+
+# Comando para generar por adelantado los documentos imprimibles (facturas y fichas de mascotas),
+# por ejemplo antes del cierre de mes. Los registros se leen en lotes (una o dos consultas por lote)
+# y solo se renderizan los documentos cuya versión no está ya en DOCUMENTOS_DIRECTORIO.
+# Con sucursales configuradas se recorre cada sucursal.
+class Command(BaseCommand):
+    help = "Genera los documentos imprimibles que no estén en la carpeta de documentos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', action='append', choices=sorted(documentos.TIPOS), help="Tipo de documento (se puede repetir). Por defecto todos.")
+        parser.add_argument('--formato', action='append', choices=sorted(documentos.FORMATOS), help="Formato (se puede repetir). Por defecto html.")
+        parser.add_argument('--lote', type=int, default=200, help="Cantidad de registros leídos por consulta.")
+        parser.add_argument('--pausa', type=float, default=0, help="Segundos de espera entre lotes.")
+
+    def handle(self, **options):
+        if options['lote'] < 1:
+            raise CommandError("El tamaño del lote debe ser mayor a 0.")
+        tipos = options['tipo'] or sorted(documentos.TIPOS)
+        formatos = options['formato'] or ['html']
+        if 'pdf' in formatos and not documentos.pdf_disponible():
+            raise CommandError("El formato PDF requiere el paquete weasyprint.")
+
+        for codigo in sucursales.codigos() or [None]:
+            with sucursales.usar(codigo):
+                if codigo:
+                    self.stdout.write("{}:".format(sucursales.nombre(codigo)))
+                for tipo in tipos:
+                    generados, existentes = self.prerenderizar(tipo, formatos, options)
+                    self.stdout.write("{}: {} generados, {} ya existían.".format(tipo, generados, existentes))
+
+        self.stdout.write(self.style.SUCCESS("Documentos listos en {}.".format(documentos.directorio())))
+
+    def prerenderizar(self, tipo, formatos, options):
+        """
+        Genera los documentos de un tipo en la sucursal activa, recorriendo los registros por llave primaria.
+
+        Returns:
+            tuple: (documentos generados, documentos que ya existían)
+        """
+        modelo = documentos.TIPOS[tipo]['modelo']
+        obtener = documentos.TIPOS[tipo]['datos']
+        generados = existentes = 0
+        ultimo = None
+        while True:
+            # Paginación por llave primaria: cada lote es una consulta por índice, sin OFFSET
+            pks = modelo.objects.order_by('pk')
+            if ultimo is not None:
+                pks = pks.filter(pk__gt=ultimo)
+            lote = list(pks.values_list('pk', flat=True)[:options['lote']])
+            if not lote:
+                return generados, existentes
+            for pk, datos in sorted(obtener(lote).items()):
+                for formato in formatos:
+                    if documentos.generar(tipo, formato, datos)[2]:
+                        generados += 1
+                    else:
+                        existentes += 1
+            ultimo = lote[-1]
+            if options['pausa']:
+                time.sleep(options['pausa'])
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.db.models import Q
+from paneltrabajador import sucursales
+from paneltrabajador.models import Cita, CitaHistorica, Cliente, Factura, FacturaHistorica, FacturaLinea, ListaEspera, Mascota
+
+
+# Comando para borrar definitivamente los clientes eliminados (soft delete) y todos sus datos relacionados.
+# Los registros se borran en lotes pequeños, cada uno en su propia transacción, para no bloquear
+# la base de datos por mucho tiempo. Se puede ejecutar periódicamente (cron) o después de eliminar clientes.
+# Con sucursales configuradas se purga cada sucursal por separado.
+class Command(BaseCommand):
+    help = "Borra en lotes los datos de los clientes eliminados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=200, help="Cantidad máxima de filas por transacción.")
+        parser.add_argument('--pausa', type=float, default=0.05, help="Segundos de espera entre lotes para dejar pasar otras escrituras.")
+
+    def handle(self, **options):
+        for codigo in sucursales.codigos() or [None]:
+            with sucursales.usar(codigo):
+                if codigo:
+                    self.stdout.write("{}:".format(sucursales.nombre(codigo)))
+                self.purgar(options['lote'], options['pausa'])
+
+    def purgar(self, lote, pausa):
+        """
+        Purga los clientes eliminados de la sucursal activa.
+        """
+        ruts = list(Cliente._base_manager.filter(eliminado=True).values_list('rut', flat=True))
+        if not ruts:
+            self.stdout.write("No hay clientes pendientes de purga.")
+            return
+
+        for rut in ruts:
+            # Orden: primero lo que depende de las mascotas (lista de espera y citas), luego las facturas (con sus líneas)
+            # y mascotas, al final el cliente
+            relacionados = [
+                (ListaEspera, Q(cliente_id=rut) | Q(mascota__cliente_id=rut)),
+                (Cita, Q(cliente_id=rut) | Q(mascota__cliente_id=rut)),
+                (FacturaLinea, Q(factura__cliente_id=rut)),
+                (Factura, Q(cliente_id=rut)),
+                (Mascota, Q(cliente_id=rut)),
+                (CitaHistorica, Q(cliente_rut=rut)),
+                (FacturaHistorica, Q(cliente_rut=rut)),
+            ]
+            total = 0
+            for modelo, filtro in relacionados:
+                total += self.borrar_en_lotes(modelo, filtro, lote, pausa)
+
+            with transaction.atomic(using=router.db_for_write(Cliente)):
+                Cliente._base_manager.filter(rut=rut, eliminado=True).delete()
+
+            self.stdout.write("Cliente {} purgado ({} registros relacionados).".format(rut, total))
+
+        self.stdout.write(self.style.SUCCESS("Purga finalizada: {} clientes.".format(len(ruts))))
+
+    def borrar_en_lotes(self, modelo, filtro, lote, pausa):
+        """
+        Borra los registros del modelo que cumplan el filtro, en lotes de tamaño acotado.
+
+        Returns:
+            int: Cantidad de registros borrados.
+        """
+        total = 0
+        while True:
+            pks = list(modelo._base_manager.filter(filtro).values_list('pk', flat=True)[:lote])
+            if not pks:
+                return total
+
+            with transaction.atomic(using=router.db_for_write(modelo)):
+                modelo._base_manager.filter(pk__in=pks).delete()
+            total += len(pks)
+
+            if pausa:
+                time.sleep(pausa)
@@ -0,0 +1,85 @@
+import glob
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+ORDENES = {
+    'total': lambda grupo: grupo['total'],
+    'cantidad': lambda grupo: grupo['cantidad'],
+    'maximo': lambda grupo: grupo['maximo'],
+}
+
+
+# Comando para resumir el registro de consultas lentas (ver paneltrabajador.consultas_lentas).
+# Lee el archivo y sus respaldos rotados, agrupa las consultas por huella (SQL normalizado)
+# y muestra por cada grupo la cantidad, el tiempo total y máximo, las vistas y el origen más frecuente,
+# junto con el plan de ejecución de la consulta más lenta.
+class Command(BaseCommand):
+    help = "Agrupa el registro de consultas lentas por huella de SQL, con cantidad y tiempo total."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', default=str(settings.CONSULTAS_LENTAS_ARCHIVO), help="Archivo del registro.")
+        parser.add_argument('--orden', choices=sorted(ORDENES), default='total', help="Orden de los grupos.")
+        parser.add_argument('--limite', type=int, default=20, help="Cantidad de grupos a mostrar.")
+
+    def handle(self, **options):
+        grupos = {}
+        invalidas = 0
+        # El archivo actual y sus respaldos (archivo.1, archivo.2...)
+        for ruta in [options['archivo']] + sorted(glob.glob(glob.escape(options['archivo']) + '.*')):
+            try:
+                archivo = open(ruta, encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with archivo:
+                for linea in archivo:
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        invalidas += 1
+                        continue
+                    self.agregar(grupos, entrada)
+
+        if not grupos:
+            self.stdout.write("No hay consultas lentas registradas en {}.".format(options['archivo']))
+            return
+
+        ordenados = sorted(grupos.values(), key=ORDENES[options['orden']], reverse=True)
+        self.stdout.write("{} consultas lentas en {} grupos.".format(sum(grupo['cantidad'] for grupo in grupos.values()), len(grupos)))
+        for grupo in ordenados[:options['limite']]:
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_HEADING("[{}] {} veces, {:.1f} ms en total, máximo {:.1f} ms, promedio {:.1f} ms".format(
+                grupo['huella'], grupo['cantidad'], grupo['total'], grupo['maximo'], grupo['total'] / grupo['cantidad'],
+            )))
+            self.stdout.write("  SQL: {}".format(grupo['normalizado']))
+            self.stdout.write("  Vistas: {}".format(', '.join('{} ({})'.format(url or '-', cantidad) for url, cantidad in grupo['urls'].most_common(5))))
+            origen, cantidad = grupo['origenes'].most_common(1)[0]
+            self.stdout.write("  Origen: {} ({})".format(origen, cantidad))
+            lenta = grupo['mas_lenta']
+            self.stdout.write("  Más lenta: {} {:.1f} ms, parámetros {}".format(lenta['fecha'], lenta['ms'], lenta['parametros']))
+            for paso in lenta.get('plan') or []:
+                self.stdout.write("    {}".format(paso))
+
+        if invalidas:
+            self.stdout.write(self.style.WARNING("Se omitieron {} líneas inválidas.".format(invalidas)))
+
+    def agregar(self, grupos, entrada):
+        grupo = grupos.setdefault(entrada['huella'], {
+            'huella': entrada['huella'],
+            'normalizado': entrada['normalizado'],
+            'cantidad': 0,
+            'total': 0.0,
+            'maximo': 0.0,
+            'urls': Counter(),
+            'origenes': Counter(),
+            'mas_lenta': entrada,
+        })
+        grupo['cantidad'] += 1
+        grupo['total'] += entrada['ms']
+        grupo['urls'][entrada.get('url')] += 1
+        grupo['origenes'][' | '.join(parte for parte in (entrada.get('plantilla'), entrada.get('codigo')) if parte) or '-'] += 1
+        if entrada['ms'] >= grupo['maximo']:
+            grupo['maximo'] = entrada['ms']
+            grupo['mas_lenta'] = entrada
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from paneltrabajador import sucursales
+
+
+# Comando para copiar los usuarios del panel a la base de datos de cada sucursal.
+# Las copias se mantienen al día con señales (ver paneltrabajador.signals), este comando
+# se usa al agregar una sucursal nueva o si una base de datos quedó desactualizada.
+class Command(BaseCommand):
+    help = "Copia los usuarios del panel a la base de datos de cada sucursal."
+
+    def handle(self, **options):
+        if not sucursales.codigos():
+            raise CommandError("No hay sucursales configuradas (SUCURSALES en .env).")
+
+        modelo = get_user_model()
+        usuarios = list(modelo.objects.using('default').all())
+        pks = [usuario.pk for usuario in usuarios]
+        for usuario in usuarios:
+            sucursales.replicar_usuario(usuario)
+
+        # Los usuarios que ya no existen se eliminan de las sucursales
+        for codigo in sucursales.codigos():
+            alias = sucursales.base_datos(codigo)
+            eliminados, _ = modelo.objects.using(alias).exclude(pk__in=pks).delete()
+            self.stdout.write("{}: {} usuarios copiados, {} objetos eliminados.".format(sucursales.nombre(codigo), len(usuarios), eliminados))
+
+        self.stdout.write(self.style.SUCCESS("Usuarios sincronizados."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from paneltrabajador import espera, sucursales
+from paneltrabajador.models import ListaEspera
+
+
+# Comando para vencer las ofertas de la lista de espera que no se respondieron a tiempo.
+# Cada cita retenida vuelve a estar disponible y se ofrece al siguiente inscrito.
+# Se ejecuta periódicamente (cron, por ejemplo cada 5 minutos). Las ofertas vencidas se buscan
+# con el índice espera_oferta_idx, así la consulta no recorre toda la lista.
+class Command(BaseCommand):
+    help = "Vence las ofertas de la lista de espera sin respuesta y ofrece sus horas al siguiente inscrito."
+
+    def handle(self, **options):
+        for codigo in sucursales.codigos() or [None]:
+            with sucursales.usar(codigo):
+                if codigo:
+                    self.stdout.write("{}:".format(sucursales.nombre(codigo)))
+                vencidas = ListaEspera.objects.filter(estado=ListaEspera.ESTADO_OFRECIDA, oferta_vence_en__lte=timezone.now())
+                cantidad = sum(espera.liberar(oferta, ListaEspera.ESTADO_VENCIDA) for oferta in vencidas.only('pk', 'cita_id'))
+                self.stdout.write("{} ofertas vencidas.".format(cantidad))
+        self.stdout.write(self.style.SUCCESS("Listo."))
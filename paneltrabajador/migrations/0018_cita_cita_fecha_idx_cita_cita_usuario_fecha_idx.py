@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0017_delete_blogentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha'], name='cita_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['usuario', 'fecha'], name='cita_usuario_fecha_idx'),
+        ),
+    ]
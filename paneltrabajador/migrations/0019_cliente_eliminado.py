@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0018_cita_cita_fecha_idx_cita_cita_usuario_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='eliminado',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
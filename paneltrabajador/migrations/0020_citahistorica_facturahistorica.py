@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0019_cliente_eliminado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CitaHistorica',
+            fields=[
+                ('n_cita', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('cliente_rut', models.PositiveIntegerField(db_index=True, null=True)),
+                ('cliente_nombre', models.CharField(blank=True, max_length=150)),
+                ('mascota_id', models.PositiveIntegerField(null=True)),
+                ('mascota_nombre', models.CharField(blank=True, max_length=150)),
+                ('estado', models.CharField(choices=[('0', 'Disponible'), ('1', 'Reservada'), ('2', 'Cancelada')], max_length=1)),
+                ('usuario_id', models.PositiveIntegerField(null=True)),
+                ('usuario_nombre', models.CharField(blank=True, max_length=150)),
+                ('fecha', models.DateTimeField(db_index=True)),
+                ('archivada_en', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FacturaHistorica',
+            fields=[
+                ('numero_factura', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('cliente_rut', models.PositiveIntegerField(db_index=True)),
+                ('cliente_nombre', models.CharField(blank=True, max_length=150)),
+                ('total_pagar', models.IntegerField()),
+                ('detalle', models.TextField()),
+                ('estado_pago', models.CharField(max_length=1)),
+                ('archivada_en', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0020_citahistorica_facturahistorica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionModelo',
+            fields=[
+                ('modelo', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField()),
+            ],
+        ),
+    ]
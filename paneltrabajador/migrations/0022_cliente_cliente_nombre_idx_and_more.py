@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0021_versionmodelo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nombre_cliente'], name='cliente_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mascota',
+            index=models.Index(fields=['nombre'], name='mascota_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mascota',
+            index=models.Index(fields=['cliente', 'nombre'], name='mascota_cliente_nombre_idx'),
+        ),
+    ]
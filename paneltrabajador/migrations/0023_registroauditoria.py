@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:35
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneltrabajador', '0022_cliente_cliente_nombre_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100)),
+                ('objeto_id', models.CharField(max_length=64)),
+                ('accion', models.CharField(choices=[('C', 'Creación'), ('E', 'Edición'), ('D', 'Eliminación')], max_length=1)),
+                ('cambios', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('fecha', models.DateTimeField()),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modelo', 'objeto_id', 'fecha'], name='auditoria_objeto_idx'), models.Index(fields=['usuario', 'fecha'], name='auditoria_usuario_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('paneltrabajador', '0023_registroauditoria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SucursalUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('sucursal', models.CharField(max_length=30)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='registroauditoria',
+            name='sucursal',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0024_sucursales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cita',
+            name='recordatorio_enviado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0025_cita_recordatorio'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cita',
+            name='estado',
+            field=models.CharField(choices=[('0', 'Disponible'), ('1', 'Reservada'), ('2', 'Cancelada'), ('3', 'Retenida')], max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='citahistorica',
+            name='estado',
+            field=models.CharField(choices=[('0', 'Disponible'), ('1', 'Reservada'), ('2', 'Cancelada'), ('3', 'Retenida')], max_length=1),
+        ),
+        migrations.CreateModel(
+            name='ListaEspera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.DateField()),
+                ('hasta', models.DateField()),
+                ('estado', models.CharField(choices=[('0', 'Esperando'), ('1', 'Ofrecida'), ('2', 'Reservada'), ('3', 'Vencida'), ('4', 'Rechazada')], default='0', max_length=1)),
+                ('oferta_vence_en', models.DateTimeField(blank=True, null=True)),
+                ('creada_en', models.DateTimeField(auto_now_add=True)),
+                ('cita', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='paneltrabajador.cita')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='paneltrabajador.cliente')),
+                ('mascota', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='paneltrabajador.mascota')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('estado', '0')), fields=['creada_en', 'id'], name='espera_fifo_idx'), models.Index(condition=models.Q(('estado', '1')), fields=['oferta_vence_en'], name='espera_oferta_idx')],
+            },
+        ),
+    ]
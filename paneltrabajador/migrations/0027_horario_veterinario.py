@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def eliminar_disponibles_repetidas(apps, schema_editor):
+    """
+    Antes de la restricción única (usuario, fecha): elimina las citas disponibles repetidas en la misma
+    hora de un veterinario, dejando la que tiene cliente (o la más antigua). Dos citas reservadas en la
+    misma hora son una doble reserva que se debe resolver a mano antes de migrar.
+    """
+    Cita = apps.get_model('paneltrabajador', 'Cita')
+    citas = Cita.objects.using(schema_editor.connection.alias).exclude(estado='2')
+    repetidas = citas.values('usuario_id', 'fecha').annotate(cantidad=models.Count('n_cita')).filter(cantidad__gt=1)
+    dobles = []
+    for hora in repetidas:
+        grupo = list(citas.filter(usuario_id=hora['usuario_id'], fecha=hora['fecha']).order_by('n_cita'))
+        ocupadas = [cita for cita in grupo if cita.estado != '0']
+        conservar = ocupadas[0] if ocupadas else grupo[0]
+        citas.filter(pk__in=[cita.pk for cita in grupo if cita.estado == '0' and cita.pk != conservar.pk]).delete()
+        if len(ocupadas) > 1:
+            dobles.extend(cita.pk for cita in ocupadas)
+    if dobles:
+        raise RuntimeError("Hay citas reservadas en la misma hora del mismo veterinario: {}".format(dobles))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneltrabajador', '0026_lista_espera'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorarioVeterinario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')])),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('duracion', models.PositiveSmallIntegerField(default=30)),
+            ],
+        ),
+        migrations.RunPython(eliminar_disponibles_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', '2'), _negated=True), fields=('usuario', 'fecha'), name='cita_usuario_fecha_unica', violation_error_message='El veterinario ya tiene una cita a esa hora.'),
+        ),
+        migrations.AddField(
+            model_name='horarioveterinario',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='horarioveterinario',
+            constraint=models.CheckConstraint(check=models.Q(('hora_fin__gt', models.F('hora_inicio'))), name='horario_rango_valido'),
+        ),
+        migrations.AddConstraint(
+            model_name='horarioveterinario',
+            constraint=models.CheckConstraint(check=models.Q(('duracion__gt', 0)), name='horario_duracion_valida'),
+        ),
+    ]
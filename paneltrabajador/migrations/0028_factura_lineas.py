@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0027_horario_veterinario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='precio',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='FacturaLinea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=30)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio', models.PositiveIntegerField()),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='paneltrabajador.factura')),
+                ('producto', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='paneltrabajador.producto')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='facturalinea',
+            constraint=models.CheckConstraint(check=models.Q(('cantidad__gt', 0)), name='factura_linea_cantidad_valida'),
+        ),
+    ]
@@ -0,0 +1,213 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:34
+
+from django.db import migrations, models, router, transaction
+
+# Filas que se convierten por transacción: las tablas grandes no quedan bloqueadas durante toda la conversión
+LOTE = 2000
+
+ESTADOS_CITA = {'0': 0, '1': 1, '2': 2, '3': 3}
+ESTADOS_PAGO = {'0': 0, '1': 1}
+
+# (modelo, campo de texto, campo entero nuevo, valores, valor para los desconocidos o None si no se aceptan)
+# estado_pago no tenía opciones: cualquier valor distinto de "pagada" se deja pendiente (no se archiva)
+CONVERSIONES = (
+    ('Cita', 'estado', 'estado_entero', ESTADOS_CITA, None),
+    ('CitaHistorica', 'estado', 'estado_entero', ESTADOS_CITA, None),
+    ('Factura', 'estado_pago', 'estado_pago_entero', ESTADOS_PAGO, 0),
+    ('FacturaHistorica', 'estado_pago', 'estado_pago_entero', ESTADOS_PAGO, 0),
+)
+
+
+def _convertir(filas, origen, destino, valores, defecto, using):
+    casos = models.Case(
+        *[models.When(**{origen: texto, 'then': models.Value(entero)}) for texto, entero in valores.items()],
+        default=models.Value(defecto), output_field=filas.model._meta.get_field(destino).clone(),
+    )
+    # Por rangos de la llave primaria, cada lote en su propia transacción
+    ultimo = None
+    while True:
+        pendientes = filas.order_by('pk')
+        if ultimo is not None:
+            pendientes = pendientes.filter(pk__gt=ultimo)
+        pks = list(pendientes.values_list('pk', flat=True)[:LOTE])
+        if not pks:
+            return
+        with transaction.atomic(using=using):
+            filas.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(**{destino: casos})
+        ultimo = pks[-1]
+
+
+def validar_estados(apps, schema_editor):
+    """
+    Antes de cambiar las tablas: un estado de cita desconocido detiene la migración, se debe corregir a mano antes de migrar.
+    """
+    using = schema_editor.connection.alias
+    for nombre, origen, destino, valores, defecto in CONVERSIONES:
+        modelo = apps.get_model('paneltrabajador', nombre)
+        if defecto is not None or not router.allow_migrate_model(using, modelo):
+            continue
+        desconocidos = list(modelo._base_manager.using(using).exclude(**{origen + '__in': list(valores)}).values_list('pk', flat=True)[:20])
+        if desconocidos:
+            raise RuntimeError("Hay registros de {} con un {} desconocido: {}".format(nombre, origen, desconocidos))
+
+
+def estados_a_enteros(apps, schema_editor):
+    """
+    Copia los estados guardados como texto ('0', '1'...) a las columnas enteras nuevas, por lotes.
+    """
+    using = schema_editor.connection.alias
+    for nombre, origen, destino, valores, defecto in CONVERSIONES:
+        modelo = apps.get_model('paneltrabajador', nombre)
+        if router.allow_migrate_model(using, modelo):
+            _convertir(modelo._base_manager.using(using), origen, destino, valores, defecto, using)
+
+
+def enteros_a_estados(apps, schema_editor):
+    using = schema_editor.connection.alias
+    for nombre, origen, destino, valores, defecto in CONVERSIONES:
+        modelo = apps.get_model('paneltrabajador', nombre)
+        if not router.allow_migrate_model(using, modelo):
+            continue
+        textos = {entero: texto for texto, entero in valores.items()}
+        _convertir(modelo._base_manager.using(using), destino, origen, textos, '0', using)
+
+
+class Migration(migrations.Migration):
+
+    # Cada lote se confirma por separado (ver estados_a_enteros)
+    atomic = False
+
+    dependencies = [
+        ('paneltrabajador', '0028_factura_lineas'),
+    ]
+
+    operations = [
+        migrations.RunPython(validar_estados, migrations.RunPython.noop),
+        # La restricción única tiene una condición sobre el estado, se vuelve a crear con el valor entero
+        migrations.RemoveConstraint(
+            model_name='cita',
+            name='cita_usuario_fecha_unica',
+        ),
+        # Las columnas de texto quedan opcionales hasta eliminarlas, así la migración se puede revertir
+        migrations.AlterField(
+            model_name='cita',
+            name='estado',
+            field=models.CharField(choices=[('0', 'Disponible'), ('1', 'Reservada'), ('2', 'Cancelada'), ('3', 'Retenida')], max_length=1, null=True),
+        ),
+        migrations.AlterField(
+            model_name='citahistorica',
+            name='estado',
+            field=models.CharField(choices=[('0', 'Disponible'), ('1', 'Reservada'), ('2', 'Cancelada'), ('3', 'Retenida')], max_length=1, null=True),
+        ),
+        migrations.AlterField(
+            model_name='factura',
+            name='estado_pago',
+            field=models.CharField(max_length=1, null=True),
+        ),
+        migrations.AlterField(
+            model_name='facturahistorica',
+            name='estado_pago',
+            field=models.CharField(max_length=1, null=True),
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='estado_entero',
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='citahistorica',
+            name='estado_entero',
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='estado_pago_entero',
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='facturahistorica',
+            name='estado_pago_entero',
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.RunPython(estados_a_enteros, enteros_a_estados),
+        migrations.RemoveField(
+            model_name='cita',
+            name='estado',
+        ),
+        migrations.RemoveField(
+            model_name='citahistorica',
+            name='estado',
+        ),
+        migrations.RemoveField(
+            model_name='factura',
+            name='estado_pago',
+        ),
+        migrations.RemoveField(
+            model_name='facturahistorica',
+            name='estado_pago',
+        ),
+        migrations.RenameField(
+            model_name='cita',
+            old_name='estado_entero',
+            new_name='estado',
+        ),
+        migrations.RenameField(
+            model_name='citahistorica',
+            old_name='estado_entero',
+            new_name='estado',
+        ),
+        migrations.RenameField(
+            model_name='factura',
+            old_name='estado_pago_entero',
+            new_name='estado_pago',
+        ),
+        migrations.RenameField(
+            model_name='facturahistorica',
+            old_name='estado_pago_entero',
+            new_name='estado_pago',
+        ),
+        migrations.AlterField(
+            model_name='cita',
+            name='estado',
+            field=models.SmallIntegerField(choices=[(0, 'Disponible'), (1, 'Reservada'), (2, 'Cancelada'), (3, 'Retenida')]),
+        ),
+        migrations.AlterField(
+            model_name='citahistorica',
+            name='estado',
+            field=models.SmallIntegerField(choices=[(0, 'Disponible'), (1, 'Reservada'), (2, 'Cancelada'), (3, 'Retenida')]),
+        ),
+        migrations.AlterField(
+            model_name='factura',
+            name='estado_pago',
+            field=models.SmallIntegerField(choices=[(0, 'Pendiente'), (1, 'Pagada')], default=0),
+        ),
+        migrations.AlterField(
+            model_name='facturahistorica',
+            name='estado_pago',
+            field=models.SmallIntegerField(choices=[(0, 'Pendiente'), (1, 'Pagada')]),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(condition=models.Q(('estado', 0)), fields=['fecha'], name='cita_disponible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(condition=models.Q(('estado', 1)), fields=['fecha'], name='cita_reservada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(condition=models.Q(('estado_pago', 0)), fields=['cliente'], name='factura_pendiente_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 2), _negated=True), fields=('usuario', 'fecha'), name='cita_usuario_fecha_unica', violation_error_message='El veterinario ya tiene una cita a esa hora.'),
+        ),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=models.CheckConstraint(check=models.Q(('estado__in', [0, 1, 2, 3])), name='cita_estado_valido'),
+        ),
+        migrations.AddConstraint(
+            model_name='factura',
+            constraint=models.CheckConstraint(check=models.Q(('estado_pago__in', [0, 1])), name='factura_estado_pago_valido'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:46
+
+from django.db import migrations, models, router
+from django.utils import timezone
+
+
+def marcar_avisos_enviados(apps, schema_editor):
+    """
+    Las ofertas vigentes ya recibieron su correo al ofrecerse, el comando enviar_avisos_espera no debe repetirlo.
+    """
+    using = schema_editor.connection.alias
+    ListaEspera = apps.get_model('paneltrabajador', 'ListaEspera')
+    if not router.allow_migrate_model(using, ListaEspera):
+        return
+    ListaEspera.objects.using(using).filter(estado='1').update(aviso_enviado_en=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneltrabajador', '0029_estados_enteros'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listaespera',
+            name='aviso_enviado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(marcar_avisos_enviados, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listaespera',
+            index=models.Index(condition=models.Q(('aviso_enviado_en__isnull', True), ('estado', '1')), fields=['id'], name='espera_aviso_idx'),
+        ),
+    ]
@@ -1,8 +1,27 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 # Create your models here.
 
+# Managers que ocultan los clientes eliminados (soft delete) y todo lo relacionado a ellos.
+# Para acceder a todos los registros usar Modelo._base_manager (por ejemplo en el comando purgar_clientes).
+class ClienteManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(eliminado=False)
+
+
+class DeClienteManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(cliente__eliminado=False)
+
+
+class CitaManager(models.Manager):
+    def get_queryset(self):
+        # El cliente de una cita es opcional (citas disponibles)
+        return super().get_queryset().filter(models.Q(cliente__isnull=True) | models.Q(cliente__eliminado=False))
+
+
 class Cliente(models.Model):
     """
     Representa un cliente en el sistema.
@@ -13,12 +32,37 @@ class Cliente(models.Model):
         direccion (CharField): Dirección del cliente.
         telefono (IntegerField): Número de teléfono del cliente.
         email (EmailField): Dirección de correo electrónico del cliente.
+        eliminado (BooleanField): Indica si el cliente fue eliminado y está pendiente de purga.
     """
     rut = models.PositiveIntegerField(primary_key=True)
     nombre_cliente = models.CharField(max_length=150)
     direccion = models.CharField(max_length=65)
     telefono = models.IntegerField()
     email = models.EmailField(max_length=254)
+    eliminado = models.BooleanField(default=False, db_index=True)
+
+    objects = ClienteManager()
+
+    class Meta:
+        # Índice para la búsqueda por nombre del autocompletado
+        indexes = [
+            models.Index(fields=['nombre_cliente'], name='cliente_nombre_idx'),
+        ]
+
+    def eliminar(self):
+        """
+        Marca el cliente como eliminado con un solo UPDATE.
+
+        Sus mascotas, citas y facturas quedan ocultas inmediatamente y se borran
+        después en lotes con el comando purgar_clientes.
+        """
+        from paneltrabajador import versiones
+
+        Cliente._base_manager.filter(rut=self.rut).update(eliminado=True)
+        self.eliminado = True
+
+        # Lo relacionado al cliente también deja de mostrarse
+        versiones.incrementar(Cliente, Mascota, Cita, Factura)
 
     # Devuelve una representación de cadena del objeto Cliente, útil para la visualización en la interfaz de administración de Django.
     # En este caso, también usable en nuestra interfaz personalizada
@@ -53,6 +97,15 @@ class Mascota(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     historial_medico = models.TextField()
 
+    objects = DeClienteManager()
+
+    class Meta:
+        # Índices para la búsqueda por nombre del autocompletado, general y por cliente
+        indexes = [
+            models.Index(fields=['nombre'], name='mascota_nombre_idx'),
+            models.Index(fields=['cliente', 'nombre'], name='mascota_cliente_nombre_idx'),
+        ]
+
     # Devuelve una representación de cadena del objeto Mascota, útil para la visualización en la interfaz de administración de Django.
     # En este caso, también usable en nuestra interfaz personalizada
     def __str__(self):
@@ -62,6 +115,26 @@ class Mascota(models.Model):
         return f"{self.nombre} (ID: {self.id_mascota}) de {self.cliente.nombre_cliente} (RUT: {self.cliente.rut})"
 
 
+class EstadoCita(models.IntegerChoices):
+    """
+    Estados de una cita. Se guardan como enteros pequeños; el nombre que se muestra sale de aquí
+    (cita.get_estado_display()).
+    """
+    DISPONIBLE = 0, 'Disponible'
+    RESERVADA = 1, 'Reservada'
+    CANCELADA = 2, 'Cancelada'
+    # Apartada por un tiempo para un cliente de la lista de espera (ver paneltrabajador.espera)
+    RETENIDA = 3, 'Retenida'
+
+
+class EstadoPago(models.IntegerChoices):
+    """
+    Estados de pago de una factura.
+    """
+    PENDIENTE = 0, 'Pendiente'
+    PAGADA = 1, 'Pagada'
+
+
 class Cita (models.Model):
     """
     Representa una cita en el sistema.
@@ -70,53 +143,92 @@ class Cita (models.Model):
         n_cita (AutoField): ID único de la cita.
         cliente (ForeignKey): Cliente asociado con la cita (vinculado al modelo Cliente).
         mascota (ForeignKey): Mascota asociada con la cita (vinculada al modelo Mascota).
-        estado (CharField): Estado de la cita.
+        estado (SmallIntegerField): Estado de la cita (EstadoCita).
         usuario (ForeignKey): Usuario que creó la cita (vinculado al modelo User).
         fecha (DateTimeField): Fecha y hora de la cita.
-    """
+        recordatorio_enviado_en (DateTimeField): Fecha en que se envió el recordatorio al cliente
+            (ver el comando enviar_recordatorios), vacío si no se ha enviado.
 
-    # Definimos las opciones que puede tener el estado de la Cita
-    # Nota: verificar si podemos transformar esto a una tupla en vez de un arreglo
-    ESTADO_CHOICES = [
-        ('0', 'Disponible'),
-        ('1', 'Reservada'),
-        ('2', 'Cancelada'),
-    ]
+    Las horas de los horarios de los veterinarios no necesitan una cita "Disponible": la cita se crea
+    al reservar (ver paneltrabajador.disponibilidad). Una cita "Disponible" es una hora extra fuera del horario.
+    """
 
     n_cita = models.AutoField(primary_key=True)
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, null=True)
     mascota = models.ForeignKey(Mascota, on_delete=models.CASCADE, null=True)
-    estado = models.CharField(max_length=1, choices=ESTADO_CHOICES)
+    estado = models.SmallIntegerField(choices=EstadoCita.choices)
     usuario = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     fecha = models.DateTimeField()
+    recordatorio_enviado_en = models.DateTimeField(null=True, blank=True)
 
-    # Obtenemos el estado pero transformado para el objeto actual
-    # Es decir, si self.estado es = 0 entonces se mostrará "Disponible"
-    def get_estado_display(self):
-        """
-        Devuelve el valor de visualización para el campo 'estado'.
-        """
-        return self.ESTADO_CHOICES[int(self.estado)][1]
+    objects = CitaManager()
 
-    # Obtener el listado de citas
-    # Se hizo esta función para que el listado salga con todos los estados transformados por defecto
-    def get_for_listado(**args):
-        """
-        Devuelve una lista de citas con valores de estado transformados.
+    class Meta:
+        # Índices para las consultas por rango de fechas del calendario
+        indexes = [
+            models.Index(fields=['fecha'], name='cita_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha'], name='cita_usuario_fecha_idx'),
+            # Índices parciales de los estados más consultados (horas extra libres y reservas de los recordatorios):
+            # solo contienen las filas de ese estado, así se mantienen pequeños aunque la tabla crezca
+            models.Index(fields=['fecha'], name='cita_disponible_idx', condition=models.Q(estado=EstadoCita.DISPONIBLE)),
+            models.Index(fields=['fecha'], name='cita_reservada_idx', condition=models.Q(estado=EstadoCita.RESERVADA)),
+        ]
+        constraints = [
+            # Un veterinario tiene una sola cita vigente por hora, así dos reservas simultáneas no pueden tomar la misma
+            models.UniqueConstraint(
+                fields=['usuario', 'fecha'], condition=~models.Q(estado=EstadoCita.CANCELADA), name='cita_usuario_fecha_unica',
+                violation_error_message='El veterinario ya tiene una cita a esa hora.',
+            ),
+            models.CheckConstraint(check=models.Q(estado__in=EstadoCita.values), name='cita_estado_valido'),
+        ]
 
-        Args:
-            **args: Argumentos adicionales de consulta.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Estado guardado en la base de datos, para saber al guardar si la cita quedó libre (ver paneltrabajador.signals)
+        instancia._estado_guardado = instancia.__dict__.get('estado')
+        return instancia
 
-        Returns:
-            queryset: Un queryset de citas.
-        """
 
-        listado = Cita.objects.filter(**args)
+class HorarioVeterinario(models.Model):
+    """
+    Representa un bloque del horario semanal de atención de un veterinario.
+
+    Las horas disponibles para reservar se calculan con estos bloques menos las citas existentes
+    (ver paneltrabajador.disponibilidad).
 
-        # Mostramos el estado que corresponde
-        for cita in listado:
-            cita.estado = cita.get_estado_display()
-        return listado
+    Atributos:
+        usuario (ForeignKey): Veterinario que atiende (vinculado al modelo User).
+        dia_semana (PositiveSmallIntegerField): Día de la semana (0 es lunes).
+        hora_inicio (TimeField): Hora de inicio de la atención.
+        hora_fin (TimeField): Hora de término de la atención.
+        duracion (PositiveSmallIntegerField): Duración de cada cita, en minutos.
+    """
+
+    DIA_CHOICES = [
+        (0, 'Lunes'),
+        (1, 'Martes'),
+        (2, 'Miércoles'),
+        (3, 'Jueves'),
+        (4, 'Viernes'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+
+    usuario = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    dia_semana = models.PositiveSmallIntegerField(choices=DIA_CHOICES)
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    duracion = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(hora_fin__gt=models.F('hora_inicio')), name='horario_rango_valido'),
+            models.CheckConstraint(check=models.Q(duracion__gt=0), name='horario_duracion_valida'),
+        ]
+
+    def __str__(self):
+        return '{} {} {:%H:%M}-{:%H:%M}'.format(self.usuario, self.get_dia_semana_display(), self.hora_inicio, self.hora_fin)
 
 
 class Producto (models.Model):
@@ -127,10 +239,15 @@ class Producto (models.Model):
         id_producto (AutoField): ID único del producto.
         nombre_producto (CharField): Nombre del producto.
         stock_disponible (IntegerField): Stock disponible del producto.
+        precio (PositiveIntegerField): Precio de venta, el que se usa por defecto en las líneas de las facturas.
     """
     id_producto = models.AutoField(primary_key=True)
     nombre_producto = models.CharField(max_length=30)
     stock_disponible = models.IntegerField()
+    precio = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return '{} (stock: {})'.format(self.nombre_producto, self.stock_disponible)
 
 
 class Factura(models.Model):
@@ -140,12 +257,243 @@ class Factura(models.Model):
     Atributos:
         numero_factura (AutoField): ID único de la factura.
         cliente (ForeignKey): Cliente asociado con la factura (vinculado al modelo Cliente).
-        total_pagar (IntegerField): Monto total a pagar.
+        total_pagar (IntegerField): Monto total a pagar. Si la factura tiene líneas es la suma de ellas
+            (ver paneltrabajador.facturacion).
         detalle (TextField): Detalles de la factura.
-        estado_pago (CharField): Estado de pago de la factura.
+        estado_pago (SmallIntegerField): Estado de pago de la factura (EstadoPago).
     """
+
     numero_factura = models.AutoField(primary_key=True)
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     total_pagar = models.IntegerField()
     detalle = models.TextField()
-    estado_pago = models.CharField(max_length=1)
+    estado_pago = models.SmallIntegerField(choices=EstadoPago.choices, default=EstadoPago.PENDIENTE)
+
+    objects = DeClienteManager()
+
+    class Meta:
+        # Índice parcial de las facturas pendientes (reportes y cobranza): las pagadas se archivan
+        indexes = [
+            models.Index(fields=['cliente'], name='factura_pendiente_idx', condition=models.Q(estado_pago=EstadoPago.PENDIENTE)),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(estado_pago__in=EstadoPago.values), name='factura_estado_pago_valido'),
+        ]
+
+
+class FacturaLinea(models.Model):
+    """
+    Representa un producto vendido en una factura. Se guardan junto con la factura y el descuento
+    del stock en paneltrabajador.facturacion.
+
+    Con sucursales la línea queda en la base de datos de la sucursal y el producto en "default",
+    por eso la llave foránea no tiene restricción en la base de datos y la línea guarda el nombre del producto.
+
+    Atributos:
+        factura (ForeignKey): Factura de la línea.
+        producto (ForeignKey): Producto vendido, vacío si el producto se eliminó.
+        nombre (CharField): Nombre del producto al momento de la venta.
+        cantidad (PositiveIntegerField): Unidades vendidas.
+        precio (PositiveIntegerField): Precio unitario de la venta.
+    """
+    factura = models.ForeignKey(Factura, on_delete=models.CASCADE, related_name='lineas')
+    producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True, db_constraint=False)
+    nombre = models.CharField(max_length=30)
+    cantidad = models.PositiveIntegerField()
+    precio = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(cantidad__gt=0), name='factura_linea_cantidad_valida'),
+        ]
+
+    @property
+    def subtotal(self):
+        return self.cantidad * self.precio
+
+    def __str__(self):
+        return '{} x {} (${})'.format(self.cantidad, self.nombre, self.precio)
+
+
+class ListaEspera(models.Model):
+    """
+    Representa la inscripción de un cliente y su mascota en la lista de espera de horas.
+
+    Cuando una cita queda disponible o se cancela, se ofrece al primer inscrito (por orden de llegada)
+    cuyo rango de fechas incluye el día de la cita. La cita queda retenida para él hasta oferta_vence_en
+    (ver paneltrabajador.espera).
+
+    Atributos:
+        cliente (ForeignKey): Cliente inscrito.
+        mascota (ForeignKey): Mascota para la que se pide la hora.
+        desde (DateField): Primer día en que le sirve una hora.
+        hasta (DateField): Último día en que le sirve una hora.
+        estado (CharField): Estado de la inscripción.
+        cita (ForeignKey): Cita ofrecida, si tiene una.
+        oferta_vence_en (DateTimeField): Hasta cuándo se retiene la cita ofrecida.
+        aviso_enviado_en (DateTimeField): Fecha en que se envió el correo de la oferta
+            (ver el comando enviar_avisos_espera), vacío si no se ha enviado.
+        creada_en (DateTimeField): Fecha de inscripción, define el orden de la lista.
+    """
+
+    ESTADO_ESPERANDO = '0'
+    ESTADO_OFRECIDA = '1'
+    ESTADO_RESERVADA = '2'
+    ESTADO_VENCIDA = '3'
+    ESTADO_RECHAZADA = '4'
+    ESTADO_CHOICES = [
+        (ESTADO_ESPERANDO, 'Esperando'),
+        (ESTADO_OFRECIDA, 'Ofrecida'),
+        (ESTADO_RESERVADA, 'Reservada'),
+        (ESTADO_VENCIDA, 'Vencida'),
+        (ESTADO_RECHAZADA, 'Rechazada'),
+    ]
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
+    mascota = models.ForeignKey(Mascota, on_delete=models.CASCADE)
+    desde = models.DateField()
+    hasta = models.DateField()
+    estado = models.CharField(max_length=1, choices=ESTADO_CHOICES, default=ESTADO_ESPERANDO)
+    cita = models.ForeignKey(Cita, on_delete=models.SET_NULL, null=True, blank=True)
+    oferta_vence_en = models.DateTimeField(null=True, blank=True)
+    aviso_enviado_en = models.DateTimeField(null=True, blank=True)
+    creada_en = models.DateTimeField(auto_now_add=True)
+
+    objects = DeClienteManager()
+
+    class Meta:
+        indexes = [
+            # Búsqueda del primer inscrito que espera (orden de llegada), solo sobre los que esperan
+            models.Index(fields=['creada_en', 'id'], name='espera_fifo_idx', condition=models.Q(estado='0')),
+            # Ofertas por vencer (comando vencer_ofertas_espera)
+            models.Index(fields=['oferta_vence_en'], name='espera_oferta_idx', condition=models.Q(estado='1')),
+            # Ofertas sin aviso enviado (comando enviar_avisos_espera)
+            models.Index(fields=['id'], name='espera_aviso_idx', condition=models.Q(estado='1', aviso_enviado_en__isnull=True)),
+        ]
+
+
+class CitaHistorica(models.Model):
+    """
+    Representa una cita archivada (tabla fría). Se llena con el comando archivar_historico.
+
+    Guarda una copia de los datos de la cita sin llaves foráneas, así las tablas
+    principales pueden mantenerse pequeñas.
+
+    Atributos:
+        n_cita (PositiveIntegerField): Número original de la cita.
+        cliente_rut (PositiveIntegerField): RUT del cliente, si tenía.
+        cliente_nombre (CharField): Nombre del cliente al momento de archivar.
+        mascota_id (PositiveIntegerField): ID de la mascota, si tenía.
+        mascota_nombre (CharField): Nombre de la mascota al momento de archivar.
+        estado (SmallIntegerField): Estado de la cita (EstadoCita).
+        usuario_id (PositiveIntegerField): ID del usuario asignado.
+        usuario_nombre (CharField): Nombre de usuario al momento de archivar.
+        fecha (DateTimeField): Fecha y hora de la cita.
+        archivada_en (DateTimeField): Fecha en que se archivó.
+    """
+    n_cita = models.PositiveIntegerField(primary_key=True)
+    cliente_rut = models.PositiveIntegerField(null=True, db_index=True)
+    cliente_nombre = models.CharField(max_length=150, blank=True)
+    mascota_id = models.PositiveIntegerField(null=True)
+    mascota_nombre = models.CharField(max_length=150, blank=True)
+    estado = models.SmallIntegerField(choices=EstadoCita.choices)
+    usuario_id = models.PositiveIntegerField(null=True)
+    usuario_nombre = models.CharField(max_length=150, blank=True)
+    fecha = models.DateTimeField(db_index=True)
+    archivada_en = models.DateTimeField(auto_now_add=True)
+
+
+class FacturaHistorica(models.Model):
+    """
+    Representa una factura pagada archivada (tabla fría). Se llena con el comando archivar_historico.
+
+    Atributos:
+        numero_factura (PositiveIntegerField): Número original de la factura.
+        cliente_rut (PositiveIntegerField): RUT del cliente.
+        cliente_nombre (CharField): Nombre del cliente al momento de archivar.
+        total_pagar (IntegerField): Monto total pagado.
+        detalle (TextField): Detalles de la factura.
+        estado_pago (SmallIntegerField): Estado de pago de la factura (EstadoPago).
+        archivada_en (DateTimeField): Fecha en que se archivó.
+    """
+    numero_factura = models.PositiveIntegerField(primary_key=True)
+    cliente_rut = models.PositiveIntegerField(db_index=True)
+    cliente_nombre = models.CharField(max_length=150, blank=True)
+    total_pagar = models.IntegerField()
+    detalle = models.TextField()
+    estado_pago = models.SmallIntegerField(choices=EstadoPago.choices)
+    archivada_en = models.DateTimeField(auto_now_add=True)
+
+
+class VersionModelo(models.Model):
+    """
+    Versión de los datos de un modelo. Se incrementa cada vez que se guarda o elimina
+    un objeto de ese modelo (ver paneltrabajador.versiones).
+
+    Se usa para responder 304 (Not Modified) en las páginas del panel sin volver a renderizarlas.
+    Con sucursales, los contadores de los modelos de sucursal se guardan en la base de datos de cada sucursal.
+
+    Atributos:
+        modelo (CharField): Etiqueta del modelo, por ejemplo "paneltrabajador.cita".
+        version (PositiveBigIntegerField): Contador de cambios.
+        actualizado_en (DateTimeField): Fecha del último cambio.
+    """
+    modelo = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    actualizado_en = models.DateTimeField()
+
+
+class RegistroAuditoria(models.Model):
+    """
+    Registro de un cambio (creación, edición o eliminación) hecho desde el panel o el admin.
+
+    Los registros se acumulan durante la petición y se guardan juntos al terminarla
+    (ver paneltrabajador.auditoria). Con sucursales se guardan en la base de datos de la sucursal
+    de la petición, también los cambios del inventario.
+
+    Atributos:
+        modelo (CharField): Etiqueta del modelo, por ejemplo "paneltrabajador.cita".
+        objeto_id (CharField): Llave primaria del objeto modificado.
+        accion (CharField): Creación, edición o eliminación.
+        cambios (JSONField): Campos modificados como {campo: [antes, después]}.
+        usuario (ForeignKey): Usuario que hizo el cambio.
+        fecha (DateTimeField): Fecha y hora del cambio.
+        sucursal (CharField): Código de la sucursal del objeto (vacío sin sucursales o para el inventario).
+    """
+
+    ACCION_CREAR = 'C'
+    ACCION_EDITAR = 'E'
+    ACCION_ELIMINAR = 'D'
+    ACCION_CHOICES = [
+        (ACCION_CREAR, 'Creación'),
+        (ACCION_EDITAR, 'Edición'),
+        (ACCION_ELIMINAR, 'Eliminación'),
+    ]
+
+    modelo = models.CharField(max_length=100)
+    objeto_id = models.CharField(max_length=64)
+    accion = models.CharField(max_length=1, choices=ACCION_CHOICES)
+    cambios = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    usuario = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True)
+    fecha = models.DateTimeField()
+    sucursal = models.CharField(max_length=30, blank=True, default='')
+
+    class Meta:
+        # Consultas por objeto (historial de una cita, factura, etc.) y por usuario
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id', 'fecha'], name='auditoria_objeto_idx'),
+            models.Index(fields=['usuario', 'fecha'], name='auditoria_usuario_idx'),
+        ]
+
+
+class SucursalUsuario(models.Model):
+    """
+    Sucursal a la que pertenece un usuario del panel. Los usuarios sin sucursal asignada
+    pueden elegirla desde el panel (ver paneltrabajador.sucursales).
+
+    Atributos:
+        usuario (OneToOneField): Usuario del panel.
+        sucursal (CharField): Código de la sucursal, una llave de settings.SUCURSALES.
+    """
+    usuario = models.OneToOneField(get_user_model(), on_delete=models.CASCADE, primary_key=True)
+    sucursal = models.CharField(max_length=30)
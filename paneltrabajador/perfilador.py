@@ -0,0 +1,202 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+from paneltrabajador.diagnostico import CapturaConsultas
+
+# Perfilador de peticiones bajo demanda.
+# Un superusuario agrega ?perfilar=1 a la URL (o el encabezado "X-Perfilar: 1") y la petición se ejecuta
+# con cProfile y capturando sus consultas SQL. El perfil (.prof, se puede abrir con pstats o snakeviz)
+# y un resumen (.json) se guardan en PERFILADOR_DIRECTORIO, que conserva solo las últimas
+# PERFILADOR_MAXIMO_CAPTURAS. Las capturas se ven en el panel (Perfiles).
+# Las peticiones sin la marca no pasan por el perfilador (solo se revisa si la marca existe).
+
+logger = logging.getLogger(__name__)
+
+PARAMETRO = 'perfilar'
+ENCABEZADO = 'HTTP_X_PERFILAR'
+
+# Funciones por tiempo acumulado que se guardan en el resumen
+FUNCIONES_RESUMEN = 30
+
+# Nombre de una captura: fecha-hora y un sufijo aleatorio (ver _nuevo_nombre)
+NOMBRE_VALIDO = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+
+
+def solicitado(request):
+    """
+    Indica si la petición pidió ser perfilada (sin considerar todavía los permisos).
+    """
+    return PARAMETRO in request.GET or ENCABEZADO in request.META
+
+
+class PerfiladorMiddleware:
+    """
+    Perfila las peticiones marcadas de los superusuarios y guarda la captura.
+
+    La respuesta perfilada lleva el encabezado "X-Perfil" con el nombre de la captura.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not solicitado(request) or not request.user.is_superuser:
+            return self.get_response(request)
+
+        perfil = cProfile.Profile()
+        comienzo = time.perf_counter()
+        with CapturaConsultas() as consultas:
+            perfil.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                perfil.disable()
+        duracion = time.perf_counter() - comienzo
+
+        try:
+            response['X-Perfil'] = guardar(request, response, perfil, consultas, comienzo, duracion)
+        except OSError:
+            # Un error al guardar la captura no debe afectar la respuesta
+            logger.exception("No se pudo guardar el perfil de %s", request.path)
+        return response
+
+
+def directorio():
+    return str(settings.PERFILADOR_DIRECTORIO)
+
+
+def _nuevo_nombre():
+    return '{}-{}'.format(timezone.localtime().strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:8])
+
+
+def _ruta(nombre, extension):
+    return os.path.join(directorio(), nombre + extension)
+
+
+def _relativo(archivo):
+    # Los archivos del proyecto se muestran relativos a BASE_DIR
+    raiz = str(settings.BASE_DIR)
+    return os.path.relpath(archivo, raiz) if archivo.startswith(raiz) else archivo
+
+
+def funciones_principales(estadisticas, cantidad=FUNCIONES_RESUMEN):
+    """
+    Funciones con mayor tiempo acumulado de un perfil.
+
+    Returns:
+        list: Diccionarios con 'funcion', 'llamadas', 'propio' y 'acumulado' (en milisegundos).
+    """
+    filas = sorted(estadisticas.stats.items(), key=lambda item: item[1][3], reverse=True)[:cantidad]
+    return [
+        {
+            'funcion': '{}:{} ({})'.format(_relativo(archivo), linea, funcion),
+            'llamadas': llamadas,
+            'propio': round(propio * 1000, 2),
+            'acumulado': round(acumulado * 1000, 2),
+        }
+        for (archivo, linea, funcion), (primitivas, llamadas, propio, acumulado, origenes) in filas
+    ]
+
+
+def guardar(request, response, perfil, consultas, comienzo, duracion):
+    """
+    Guarda el perfil y el resumen de una petición, y elimina las capturas más antiguas sobre el máximo.
+
+    Returns:
+        str: Nombre de la captura.
+    """
+    os.makedirs(directorio(), exist_ok=True)
+    nombre = _nuevo_nombre()
+    estadisticas = pstats.Stats(perfil)
+
+    resumen = {
+        'nombre': nombre,
+        'fecha': timezone.now().isoformat(),
+        'metodo': request.method,
+        'ruta': request.get_full_path(),
+        'vista': request.resolver_match.view_name if request.resolver_match else '',
+        'usuario': request.user.get_username(),
+        'estado': response.status_code,
+        'duracion': round(duracion * 1000, 2),
+        'tiempo_sql': round(sum(consulta['segundos'] for consulta in consultas.consultas) * 1000, 2),
+        # Línea de tiempo de las consultas, en milisegundos desde el inicio de la petición
+        'consultas': [
+            {
+                'alias': consulta['alias'],
+                'sql': consulta['sql'],
+                'inicio': round((consulta['inicio'] - comienzo) * 1000, 2),
+                'duracion': round(consulta['segundos'] * 1000, 2),
+                'plantilla': consulta['plantilla'],
+                'codigo': consulta['codigo'],
+            }
+            for consulta in consultas.consultas
+        ],
+        'funciones': funciones_principales(estadisticas),
+    }
+
+    perfil.dump_stats(_ruta(nombre, '.prof'))
+    # El resumen se escribe al final y con os.replace, así el listado nunca ve una captura a medias
+    temporal = _ruta(nombre, '.json.tmp')
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(resumen, archivo)
+    os.replace(temporal, _ruta(nombre, '.json'))
+
+    limpiar()
+    return nombre
+
+
+def nombres():
+    """
+    Nombres de las capturas guardadas, de la más reciente a la más antigua.
+    """
+    try:
+        archivos = os.listdir(directorio())
+    except FileNotFoundError:
+        return []
+    return sorted((archivo[:-5] for archivo in archivos if archivo.endswith('.json') and NOMBRE_VALIDO.match(archivo[:-5])), reverse=True)
+
+
+def limpiar():
+    """
+    Elimina las capturas más antiguas que sobran sobre PERFILADOR_MAXIMO_CAPTURAS.
+    """
+    for nombre in nombres()[settings.PERFILADOR_MAXIMO_CAPTURAS:]:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(_ruta(nombre, extension))
+            except FileNotFoundError:
+                pass
+
+
+def leer(nombre):
+    """
+    Lee el resumen de una captura.
+
+    Returns:
+        dict o None si la captura no existe.
+    """
+    if not NOMBRE_VALIDO.match(nombre):
+        return None
+    try:
+        with open(_ruta(nombre, '.json'), encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def ruta_perfil(nombre):
+    """
+    Ruta del archivo .prof de una captura, o None si no existe.
+    """
+    if not NOMBRE_VALIDO.match(nombre):
+        return None
+    ruta = _ruta(nombre, '.prof')
+    return ruta if os.path.exists(ruta) else None
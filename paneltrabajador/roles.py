@@ -0,0 +1,56 @@
+# Roles del panel y sus permisos.
+# Cada rol es un grupo de Django Auth. El comando configurar_permisos deja los grupos exactamente
+# con estos permisos (agrega los que faltan y quita los que sobran), así que para cambiar
+# lo que puede hacer un rol basta con editar esta lista y volver a ejecutarlo.
+# Los permisos se escriben como "app.codename", igual que en user.has_perm().
+
+ROLES = {
+    'veterinario': {
+        'nombre': 'Veterinario',
+        'permisos': [
+            'auth.view_user',
+            'paneltrabajador.change_cita', 'paneltrabajador.view_cita',
+            'paneltrabajador.view_cliente',
+            'paneltrabajador.change_mascota', 'paneltrabajador.view_mascota',
+            'paneltrabajador.view_producto',
+        ],
+    },
+    'gerente': {
+        'nombre': 'Gerente',
+        'permisos': [
+            'auth.add_user', 'auth.change_user', 'auth.delete_user', 'auth.view_user',
+            'paneltrabajador.add_cita', 'paneltrabajador.change_cita', 'paneltrabajador.delete_cita', 'paneltrabajador.view_cita',
+            'paneltrabajador.add_cliente', 'paneltrabajador.change_cliente', 'paneltrabajador.delete_cliente', 'paneltrabajador.view_cliente',
+            'paneltrabajador.add_factura', 'paneltrabajador.change_factura', 'paneltrabajador.delete_factura', 'paneltrabajador.view_factura',
+            'paneltrabajador.add_horarioveterinario', 'paneltrabajador.change_horarioveterinario',
+            'paneltrabajador.delete_horarioveterinario', 'paneltrabajador.view_horarioveterinario',
+            'paneltrabajador.add_mascota', 'paneltrabajador.change_mascota', 'paneltrabajador.delete_mascota', 'paneltrabajador.view_mascota',
+            'paneltrabajador.add_producto', 'paneltrabajador.change_producto', 'paneltrabajador.delete_producto', 'paneltrabajador.view_producto',
+            'paneltrabajador.view_registroauditoria',
+        ],
+    },
+    'recepcionista': {
+        'nombre': 'Recepcionista',
+        'permisos': [
+            'auth.view_user',
+            'paneltrabajador.add_cita', 'paneltrabajador.change_cita', 'paneltrabajador.delete_cita', 'paneltrabajador.view_cita',
+            'paneltrabajador.add_cliente', 'paneltrabajador.change_cliente', 'paneltrabajador.view_cliente',
+            'paneltrabajador.add_factura', 'paneltrabajador.change_factura', 'paneltrabajador.view_factura',
+            'paneltrabajador.add_mascota', 'paneltrabajador.change_mascota', 'paneltrabajador.delete_mascota', 'paneltrabajador.view_mascota',
+            'paneltrabajador.change_producto', 'paneltrabajador.view_producto',
+        ],
+    },
+}
+
+# Opciones para los selectores de rol (formulario de usuarios)
+ROL_CHOICES = tuple((grupo, rol['nombre']) for grupo, rol in ROLES.items())
+
+
+def permisos_por_rol():
+    """
+    Permisos declarados de cada rol.
+
+    Returns:
+        dict: {nombre del grupo: set de tuplas (app_label, codename)}
+    """
+    return {grupo: {tuple(permiso.split('.', 1)) for permiso in rol['permisos']} for grupo, rol in ROLES.items()}
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from paneltrabajador import sucursales
+
+
+class SucursalRouter:
+    """
+    Envía las lecturas y escrituras de los datos operacionales a la base de datos
+    de la sucursal activa (ver paneltrabajador.sucursales). El resto de los modelos
+    usa la base "default".
+    """
+
+    def db_for_read(self, model, **hints):
+        if sucursales.es_de_sucursal(model):
+            return sucursales.base_datos(sucursales.actual())
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Los usuarios están replicados en todas las bases, una cita puede apuntar a un usuario de "default"
+        usuario = get_user_model()
+        if isinstance(obj1, usuario) or isinstance(obj2, usuario):
+            return True
+        # Las líneas de factura apuntan a los productos de "default" (llave sin restricción en la base de datos)
+        if 'paneltrabajador.producto' in (obj1._meta.label_lower, obj2._meta.label_lower):
+            return True
+        return None
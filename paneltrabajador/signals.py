@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from paneltrabajador import auditoria, espera, sucursales, versiones
+from paneltrabajador.models import Cita, Cliente, EstadoCita, Factura, HorarioVeterinario, Mascota, Producto
+
+# Señales del panel. Se conectan en PaneltrabajadorConfig.ready()
+
+# Modelos cuyas versiones se registran para las peticiones condicionales
+MODELOS_VERSIONADOS = (Cliente, Mascota, Cita, Factura, Producto, HorarioVeterinario)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def incrementar_version(sender, using=None, update_fields=None, **kwargs):
+    """
+    Incrementa la versión del modelo (y su generación en la cache) al guardar o eliminar un objeto.
+    """
+    if sender in MODELOS_VERSIONADOS:
+        versiones.programar_incremento(sender, using)
+    elif sender is get_user_model():
+        # Iniciar sesión solo actualiza last_login, lo cual no cambia ninguna página
+        if update_fields is not None and set(update_fields) == {'last_login'}:
+            return
+        versiones.programar_incremento(versiones.AUTH, using)
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def incrementar_version_permisos(sender, action, using=None, **kwargs):
+    """
+    Los cambios de grupos y permisos cambian el menú y lo que puede ver cada usuario.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        versiones.programar_incremento(versiones.AUTH, using)
+
+
+@receiver(pre_save)
+def auditoria_antes_de_guardar(sender, instance, raw=False, using=None, **kwargs):
+    """
+    Obtiene los valores actuales del objeto antes de editarlo, para registrar solo lo que cambió.
+    """
+    if auditoria.auditado(sender) and not raw and auditoria.activa():
+        instance._auditoria_anterior = auditoria.valores_anteriores(instance, using) if instance.pk else None
+
+
+@receiver(post_save)
+def auditoria_guardado(sender, instance, created, raw=False, using=None, **kwargs):
+    if auditoria.auditado(sender) and not raw and auditoria.activa():
+        auditoria.registrar_guardado(instance, created, using)
+
+
+@receiver(post_delete)
+def auditoria_eliminacion(sender, instance, using=None, **kwargs):
+    if auditoria.auditado(sender) and auditoria.activa():
+        auditoria.registrar_eliminacion(instance, using)
+
+
+@receiver(post_save, sender=Cita)
+def ofrecer_cita_liberada(sender, instance, created, raw=False, using=None, **kwargs):
+    """
+    Una cita nueva disponible, o una que pasa a disponible o cancelada, se ofrece a la lista de espera.
+    """
+    if raw or instance.estado not in espera.ESTADOS_LIBERADOS:
+        return
+    if created and instance.estado != EstadoCita.DISPONIBLE:
+        return
+    if not created and getattr(instance, '_estado_guardado', None) == instance.estado:
+        return
+    instance._estado_guardado = instance.estado
+    espera.liberadas([instance.pk], using)
+
+
+@receiver(post_delete, sender=Cita)
+def ofrecer_hora_eliminada(sender, instance, using=None, **kwargs):
+    """
+    Al eliminar una cita que ocupaba su hora, la hora queda libre y se ofrece a la lista de espera.
+    """
+    if instance.estado != EstadoCita.CANCELADA:
+        espera.hora_liberada(instance.usuario_id, instance.fecha, using)
+
+
+@receiver(post_save, sender=get_user_model())
+def replicar_usuario(sender, instance, using=None, raw=False, update_fields=None, **kwargs):
+    """
+    Copia el usuario en la base de datos de cada sucursal, donde lo usan las llaves foráneas de las citas.
+    La base "default" es la original, las copias no se vuelven a replicar.
+    """
+    if using != 'default' or raw or not sucursales.codigos():
+        return
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    sucursales.replicar_usuario(instance)
+
+
+@receiver(post_delete, sender=get_user_model())
+def eliminar_usuario_replicado(sender, instance, using=None, **kwargs):
+    if using != 'default' or not sucursales.codigos():
+        return
+    for alias in sucursales.bases_datos():
+        sender.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+# Los registros de auditoría de la petición se guardan después de enviar la respuesta
+request_finished.connect(auditoria.vaciar, dispatch_uid='paneltrabajador_auditoria_vaciar')
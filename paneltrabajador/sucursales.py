@@ -0,0 +1,210 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+# Sucursales de la clínica.
+# Cada sucursal guarda sus datos operacionales (clientes, mascotas, citas, facturas y sus históricos)
+# en su propia base de datos, definida en settings.SUCURSALES. Así cada sucursal tiene su propio
+# bloqueo de escritura. Los usuarios, permisos, sesiones e inventario siguen en la base "default";
+# los usuarios se replican en cada sucursal para las llaves foráneas (ver paneltrabajador.signals).
+#
+# La sucursal de cada petición la define SucursalMiddleware y la usa paneltrabajador.routers.SucursalRouter.
+# Sin sucursales configuradas todo queda en la base "default", como antes.
+
+# Modelos que se guardan en la base de datos de la sucursal
+MODELOS_SUCURSAL = (
+    'paneltrabajador.cliente',
+    'paneltrabajador.mascota',
+    'paneltrabajador.cita',
+    'paneltrabajador.horarioveterinario',
+    'paneltrabajador.listaespera',
+    'paneltrabajador.factura',
+    'paneltrabajador.facturalinea',
+    'paneltrabajador.citahistorica',
+    'paneltrabajador.facturahistorica',
+    # Los registros de auditoría se escriben en cada petición, así las sucursales no comparten una base para escribir
+    'paneltrabajador.registroauditoria',
+)
+
+# Prefijo de las URLs públicas de una sucursal, por ejemplo /s/centro/reservahora/
+PREFIJO_URL = '/s/'
+
+# Rutas del personal: el prefijo no se acepta en ellas, así la URL no cambia la sucursal de un usuario del panel
+RUTAS_PRIVADAS = ('panel/', 'admin/')
+
+_estado = threading.local()
+
+
+def es_de_sucursal(modelo):
+    """
+    Indica si los datos del modelo se guardan en la base de datos de la sucursal.
+    """
+    return modelo._meta.label_lower in MODELOS_SUCURSAL
+
+
+def codigos():
+    """
+    Códigos de las sucursales configuradas, en orden.
+    """
+    return list(getattr(settings, 'SUCURSALES', {}))
+
+
+def por_defecto():
+    """
+    Sucursal usada cuando la petición no indica ninguna (la primera configurada), o None sin sucursales.
+    """
+    todas = codigos()
+    return todas[0] if todas else None
+
+
+def nombre(codigo):
+    return settings.SUCURSALES[codigo]['nombre'] if codigo else ''
+
+
+def base_datos(codigo):
+    """
+    Alias de la base de datos de una sucursal. Sin sucursal se usa "default".
+    """
+    if not codigo:
+        return 'default'
+    return settings.SUCURSALES[codigo]['base_datos']
+
+
+def bases_datos():
+    """
+    Alias de todas las bases de datos con datos operacionales.
+    """
+    return [base_datos(codigo) for codigo in codigos()] or ['default']
+
+
+def actual():
+    """
+    Código de la sucursal activa en este hilo (petición o comando).
+    """
+    return getattr(_estado, 'codigo', None) or por_defecto()
+
+
+def activar(codigo):
+    _estado.codigo = codigo
+
+
+@contextmanager
+def usar(codigo):
+    """
+    Activa una sucursal dentro de un bloque "with", por ejemplo en los comandos.
+    """
+    anterior = getattr(_estado, 'codigo', None)
+    activar(codigo)
+    try:
+        yield
+    finally:
+        activar(anterior)
+
+
+def en_todas(funcion, *args, **kwargs):
+    """
+    Ejecuta la función en todas las sucursales en paralelo (un hilo y una conexión por sucursal).
+
+    Se usa para los reportes que cruzan sucursales.
+
+    Returns:
+        dict: {código de sucursal: resultado}. Sin sucursales configuradas la llave es None.
+    """
+    def ejecutar(codigo):
+        with usar(codigo):
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                # Cada hilo abre sus propias conexiones, las cerramos al terminar
+                connections.close_all()
+
+    todas = codigos() or [None]
+    if len(todas) == 1:
+        # Con una sola base de datos no hace falta otro hilo
+        with usar(todas[0]):
+            return {todas[0]: funcion(*args, **kwargs)}
+    with ThreadPoolExecutor(max_workers=len(todas)) as ejecutor:
+        return dict(zip(todas, ejecutor.map(ejecutar, todas)))
+
+
+def replicar_usuario(usuario):
+    """
+    Guarda una copia del usuario (con la misma llave primaria) en la base de datos de cada sucursal.
+    """
+    modelo = type(usuario)
+    datos = {campo.attname: getattr(usuario, campo.attname) for campo in modelo._meta.concrete_fields}
+    for alias in bases_datos():
+        # Instancia nueva para no cambiar la base de datos asociada al usuario original
+        modelo(**datos).save(using=alias)
+
+
+def de_usuario(usuario):
+    """
+    Sucursal asignada a un usuario, o None si puede trabajar en todas.
+    """
+    from paneltrabajador.models import SucursalUsuario
+
+    codigo = SucursalUsuario.objects.filter(usuario=usuario).values_list('sucursal', flat=True).first()
+    return codigo if codigo in codigos() else None
+
+
+class SucursalMiddleware:
+    """
+    Define la sucursal de la petición, en este orden:
+
+    1. El prefijo de las URLs públicas (/s/<código>/...), que además queda guardado en la sesión.
+       En las rutas del panel y del admin no se acepta (responden 404).
+    2. La sucursal asignada al usuario del panel.
+    3. La sucursal elegida en la sesión.
+    4. La sucursal por defecto.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        codigo = self.resolver(request) if codigos() else None
+        request.sucursal = codigo
+        activar(codigo)
+        try:
+            return self.get_response(request)
+        finally:
+            activar(None)
+
+    def resolver(self, request):
+        if request.path_info.startswith(PREFIJO_URL):
+            codigo, _, resto = request.path_info[len(PREFIJO_URL):].partition('/')
+            if codigo in codigos() and not (resto + '/').startswith(RUTAS_PRIVADAS):
+                # Quitamos el prefijo para que la URL se resuelva normalmente
+                request.path_info = '/' + resto
+                request.session['sucursal'] = codigo
+                return codigo
+
+        if request.user.is_authenticated:
+            codigo = de_usuario(request.user)
+            if codigo:
+                # El usuario no puede cambiar de sucursal
+                request.sucursal_asignada = True
+                return codigo
+
+        codigo = request.session.get('sucursal')
+        if codigo in codigos():
+            return codigo
+        return por_defecto()
+
+
+def contexto(request):
+    """
+    Procesador de contexto: sucursal actual y sucursales disponibles para el selector del panel.
+    """
+    if not codigos():
+        return {}
+    codigo = getattr(request, 'sucursal', None) or por_defecto()
+    return {
+        'sucursal_actual': {'codigo': codigo, 'nombre': nombre(codigo)},
+        'sucursales': [{'codigo': codigo, 'nombre': nombre(codigo)} for codigo in codigos()],
+        'sucursal_asignada': getattr(request, 'sucursal_asignada', False),
+    }
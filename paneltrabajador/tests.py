@@ -1,3 +1,1774 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.db import IntegrityError, connection, router, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from paneltrabajador import cache, compresion, consultas_lentas, disponibilidad, documentos, espera, facturacion, perfilador, sucursales, versiones
+from paneltrabajador.diagnostico import CapturaConsultas
+from paneltrabajador.forms import CitaForm, ClienteForm, MascotaForm
+from paneltrabajador.roles import ROLES, permisos_por_rol
+from paneltrabajador.views.autocompletar import MAXIMO_RESULTADOS
+from paneltrabajador.views.fragmentos import POR_PAGINA as POR_PAGINA_LISTADO
+from paneltrabajador.views.historico import POR_PAGINA as POR_PAGINA_HISTORICO
+from paneltrabajador.models import (
+    Cita, CitaHistorica, Cliente, EstadoCita, EstadoPago, Factura, FacturaHistorica, FacturaLinea, HorarioVeterinario, ListaEspera, Mascota, Producto,
+    RegistroAuditoria, SucursalUsuario, VersionModelo,
+)
+
+# Pruebas de presupuesto de consultas: cada vista (cada nombre de URL de ficatsmanager/urls.py) se ejecuta
+# con dos cantidades de datos. La prueba falla si la cantidad de consultas crece con la cantidad de filas
+# (N+1) o si supera el máximo de presupuesto_consultas.json, y muestra el SQL y la línea de plantilla de cada consulta.
+#
+# Para actualizar el archivo de presupuesto después de un cambio intencional:
+#   ACTUALIZAR_PRESUPUESTO_CONSULTAS=1 python manage.py test paneltrabajador
+
+ARCHIVO_PRESUPUESTO = os.path.join(os.path.dirname(__file__), 'presupuesto_consultas.json')
+
+# Cantidad de filas de cada modelo en la primera y en la segunda medición
+FILAS_PEQUENO = 2
+FILAS_GRANDE = 7
+
+# URLs que no son del proyecto (sitio de administración de Django)
+ESPACIOS_EXCLUIDOS = ('admin', 'django-admindocs')
+
+
+def _ids(modelo, campo='pk'):
+    return [str(pk) for pk in modelo.objects.order_by(campo).values_list(campo, flat=True)]
+
+
+# Cómo ejecutar cada vista: método, argumentos de la URL, parámetros y si se necesita iniciar sesión.
+# Los argumentos y datos que dependen de la base de datos son funciones que reciben el diccionario "datos".
+PETICIONES = {
+    'panel_home': {},
+    'panel_logout': {},
+
+    'panel_cliente_listado': {},
+    'panel_cliente_nuevo': {},
+    'panel_cliente_editar': {'kwargs': lambda datos: {'rut': datos['cliente'].rut}},
+    'panel_cliente_eliminar': {'kwargs': lambda datos: {'rut': datos['cliente'].rut}},
+
+    'panel_cita_listar': {},
+    'panel_cita_calendario': {},
+    'panel_cita_calendario_datos': {'parametros': lambda datos: {
+        'desde': datos['hoy'].isoformat(), 'hasta': (datos['hoy'] + datetime.timedelta(days=7)).isoformat(),
+    }},
+    'panel_cita_filas': {},
+    'panel_cita_acciones': {'metodo': 'post', 'parametros': lambda datos: {
+        'accion': 'estado', 'estado': '2', 'seleccion': _ids(Cita),
+    }},
+    'panel_cita_nuevo': {},
+    'panel_cita_editar': {'kwargs': lambda datos: {'n_cita': datos['cita'].n_cita}},
+    'panel_cita_eliminar': {'kwargs': lambda datos: {'n_cita': datos['cita'].n_cita}},
+
+    'panel_mascota_listar': {},
+    'panel_mascota_filas': {},
+    'panel_mascota_nuevo': {},
+    'panel_mascota_editar': {'kwargs': lambda datos: {'id_mascota': datos['mascota'].id_mascota}},
+    'panel_mascota_eliminar': {'kwargs': lambda datos: {'id_mascota': datos['mascota'].id_mascota}},
+    'panel_mascota_imprimir': {'kwargs': lambda datos: {'id_mascota': datos['mascota'].id_mascota}},
+
+    'panel_factura_listar': {},
+    'panel_factura_acciones': {'metodo': 'post', 'parametros': lambda datos: {
+        'accion': 'pagada', 'seleccion': _ids(Factura),
+    }},
+    'panel_factura_nuevo': {},
+    'panel_factura_editar': {'kwargs': lambda datos: {'numero_factura': datos['factura'].numero_factura}},
+    'panel_factura_eliminar': {'kwargs': lambda datos: {'numero_factura': datos['factura'].numero_factura}},
+    'panel_factura_imprimir': {'kwargs': lambda datos: {'numero_factura': datos['factura'].numero_factura}},
+
+    'panel_producto_listar': {},
+    'panel_producto_acciones': {'metodo': 'post', 'parametros': lambda datos: {
+        'accion': 'eliminar', 'seleccion': _ids(Producto),
+    }},
+    'panel_producto_agregar': {},
+    'panel_producto_editar': {'kwargs': lambda datos: {'id_producto': datos['producto'].id_producto}},
+    'panel_producto_eliminar': {'kwargs': lambda datos: {'id_producto': datos['producto'].id_producto}},
+
+    'panel_historico_citas': {},
+    'panel_historico_facturas': {},
+
+    'panel_usuario_listar': {},
+    'panel_usuario_agregar': {},
+    'panel_usuario_editar': {'kwargs': lambda datos: {'id_usuario': datos['usuario'].pk}},
+    'panel_usuario_eliminar': {'kwargs': lambda datos: {'id_usuario': datos['usuario'].pk}},
+    'panel_usuario_newpassword': {'kwargs': lambda datos: {'id_usuario': datos['usuario'].pk}},
+
+    'panel_auditoria_listar': {},
+
+    'panel_sucursal_cambiar': {'metodo': 'post', 'parametros': {'sucursal': 'default', 'next': '/panel/'}},
+    'panel_reporte_sucursales': {},
+    'panel_cache_estadisticas': {},
+    'panel_perfil_listar': {},
+    'panel_perfil_detalle': {'kwargs': lambda datos: {'nombre': datos['perfil']}},
+    'panel_perfil_descargar': {'kwargs': lambda datos: {'nombre': datos['perfil']}},
+
+    'panel_autocompletar_clientes': {'parametros': {'q': 'Cliente'}},
+    'panel_autocompletar_mascotas': {'parametros': {'q': 'Mascota'}},
+    'panel_autocompletar_usuarios': {'parametros': {'q': 'usuario'}},
+    'panel_autocompletar_productos': {'parametros': {'q': 'Producto'}},
+
+    'panel_api_coleccion': {'kwargs': {'recurso': 'clientes'}},
+    'panel_api_masivo': {'metodo': 'patch', 'kwargs': {'recurso': 'productos'}, 'json': lambda datos: [
+        {'id_producto': pk, 'stock_disponible': 10} for pk in Producto.objects.values_list('pk', flat=True)
+    ]},
+    'panel_api_detalle': {'kwargs': lambda datos: {'recurso': 'clientes', 'pk': datos['cliente'].rut}},
+    'panel_api_factura_lineas': {'kwargs': lambda datos: {'pk': datos['factura'].numero_factura}},
+
+    'ambpublico_index': {'sesion': False},
+    'ambpublico_consulta': {'sesion': False},
+    'ambpublico_reserva': {'sesion': False},
+    'ambpublico_reserva_cancelar': {'sesion': False},
+    'ambpublico_espera': {'sesion': False},
+    'ambpublico_espera_oferta': {'sesion': False, 'kwargs': lambda datos: {'token': espera.token(datos['oferta'])}},
+    'ambpublico_documento': {'sesion': False, 'kwargs': lambda datos: {'token': documentos.token('ficha', datos['mascota'].pk)}},
+}
+
+
+def nombres_urls():
+    """
+    Nombres de todas las URLs del proyecto, sin las del sitio de administración.
+    """
+    nombres = set()
+    for patron in get_resolver().url_patterns:
+        if getattr(patron, 'namespace', None) in ESPACIOS_EXCLUIDOS or getattr(patron, 'app_name', None) in ESPACIOS_EXCLUIDOS:
+            continue
+        if getattr(patron, 'name', None):
+            nombres.add(patron.name)
+    return nombres
+
+
+def _valor(valor, datos):
+    return valor(datos) if callable(valor) else valor
+
+
+def crear_datos(desde, hasta):
+    """
+    Crea las filas desde..hasta-1 de cada modelo: clientes con su mascota, cita y factura,
+    productos (con una línea en la factura), usuarios con su horario, registros históricos y ofertas de la lista de espera (los registros de auditoría los crean las señales).
+    """
+    usuarios = get_user_model().objects
+    ahora = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    for i in range(desde, hasta):
+        cliente = Cliente.objects.create(
+            rut=10000000 + i, nombre_cliente='Cliente {}'.format(i), direccion='Calle {}'.format(i),
+            telefono=900000000 + i, email='cliente{}@ejemplo.cl'.format(i),
+        )
+        mascota = Mascota.objects.create(
+            nombre='Mascota {}'.format(i), numero_chip=500000 + i, especie='Gato', raza='Común',
+            fecha_nacimiento=datetime.date(2020, 1, 1), cliente=cliente, historial_medico='Sin observaciones',
+        )
+        usuario = usuarios.create_user('usuario{}'.format(i), password='clave-de-prueba', first_name='Usuario', last_name=str(i))
+        Cita.objects.create(cliente=cliente, mascota=mascota, estado=EstadoCita.RESERVADA, usuario=usuario, fecha=ahora + datetime.timedelta(hours=i))
+        Cita.objects.create(estado=EstadoCita.DISPONIBLE, usuario=usuario, fecha=ahora + datetime.timedelta(days=1, hours=i))
+        HorarioVeterinario.objects.create(usuario=usuario, dia_semana=i % 7, hora_inicio=datetime.time(9), hora_fin=datetime.time(13))
+        factura = Factura.objects.create(cliente=cliente, total_pagar=1000 * (i + 1), detalle='Consulta', estado_pago=EstadoPago.PENDIENTE)
+        producto = Producto.objects.create(nombre_producto='Producto {}'.format(i), stock_disponible=i + 1, precio=1000)
+        FacturaLinea.objects.create(factura=factura, producto=producto, nombre=producto.nombre_producto, cantidad=i + 1, precio=1000)
+        CitaHistorica.objects.create(
+            n_cita=100000 + i, cliente_rut=cliente.rut, cliente_nombre=cliente.nombre_cliente,
+            mascota_id=mascota.id_mascota, mascota_nombre=mascota.nombre, estado=EstadoCita.RESERVADA,
+            usuario_id=usuario.pk, usuario_nombre=usuario.username, fecha=ahora - datetime.timedelta(days=400 + i),
+        )
+        FacturaHistorica.objects.create(
+            numero_factura=100000 + i, cliente_rut=cliente.rut, cliente_nombre=cliente.nombre_cliente,
+            total_pagar=1000, detalle='Consulta', estado_pago=EstadoPago.PAGADA,
+        )
+        retenida = Cita.objects.create(cliente=cliente, mascota=mascota, estado=EstadoCita.RETENIDA, usuario=usuario, fecha=ahora + datetime.timedelta(days=2, hours=i))
+        ListaEspera.objects.create(
+            cliente=cliente, mascota=mascota, desde=retenida.fecha.date(), hasta=retenida.fecha.date(),
+            estado=ListaEspera.ESTADO_OFRECIDA, cita=retenida, oferta_vence_en=ahora + datetime.timedelta(days=1),
+        )
+
+
+@override_settings(LIMITES_TASA={})
+class PresupuestoConsultasTests(TestCase):
+    """
+    Verifica que cada vista haga una cantidad de consultas constante y dentro del presupuesto.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrador = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        with open(ARCHIVO_PRESUPUESTO, encoding='utf-8') as archivo:
+            cls.presupuesto = json.load(archivo)
+
+    def setUp(self):
+        # Las capturas del perfilador y los documentos se guardan en una carpeta temporal, con una captura para las vistas de detalle
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        configuracion = self.settings(PERFILADOR_DIRECTORIO=carpeta.name, DOCUMENTOS_DIRECTORIO=carpeta.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.client.force_login(self.administrador)
+        self.client.get(reverse('panel_home'), {perfilador.PARAMETRO: '1'})
+
+    def datos(self):
+        return {
+            'hoy': timezone.localdate(),
+            'cliente': Cliente.objects.order_by('rut').first(),
+            'mascota': Mascota.objects.order_by('pk').first(),
+            'cita': Cita.objects.order_by('pk').first(),
+            'factura': Factura.objects.order_by('pk').first(),
+            'producto': Producto.objects.order_by('pk').first(),
+            'usuario': get_user_model().objects.exclude(pk=self.administrador.pk).order_by('pk').first(),
+            'perfil': perfilador.nombres()[0],
+            'oferta': ListaEspera.objects.order_by('pk').first(),
+        }
+
+    def peticion(self, nombre):
+        """
+        Ejecuta la vista dos veces (la primera llena los cachés de la sesión, permisos, etc.)
+        y devuelve la captura de las consultas de la segunda.
+        """
+        spec = PETICIONES[nombre]
+        datos = self.datos()
+        url = reverse(nombre, kwargs=_valor(spec.get('kwargs', {}), datos))
+        metodo = spec.get('metodo', 'get')
+
+        captura = None
+        for medir in (False, True):
+            caches['default'].clear()
+            cliente = Client()
+            if spec.get('sesion', True):
+                cliente.force_login(self.administrador)
+            argumentos = {}
+            if 'json' in spec:
+                argumentos = {'data': json.dumps(_valor(spec['json'], datos)), 'content_type': 'application/json'}
+            elif 'parametros' in spec:
+                argumentos = {'data': _valor(spec['parametros'], datos)}
+            with CapturaConsultas() as captura:
+                respuesta = getattr(cliente, metodo)(url, **argumentos)
+            self.assertLess(respuesta.status_code, 400, "{} respondió {}".format(nombre, respuesta.status_code))
+        return captura
+
+    def medir(self):
+        return {nombre: self.peticion(nombre) for nombre in sorted(PETICIONES)}
+
+    def test_perfilador(self):
+        # Solo se perfilan las peticiones marcadas de los superusuarios
+        respuesta = self.client.get(reverse('panel_cliente_listado'), {perfilador.PARAMETRO: '1'})
+        captura = perfilador.leer(respuesta['X-Perfil'])
+        self.assertEqual(captura['vista'], 'panel_cliente_listado')
+        self.assertTrue(captura['consultas'])
+        self.assertTrue(captura['funciones'])
+        self.assertIsNotNone(perfilador.ruta_perfil(captura['nombre']))
+
+        self.assertNotIn('X-Perfil', self.client.get(reverse('panel_cliente_listado')))
+        usuario = get_user_model().objects.create_user('sin_permisos', password='clave-de-prueba', is_staff=True)
+        self.client.force_login(usuario)
+        self.assertNotIn('X-Perfil', self.client.get(reverse('panel_home'), {perfilador.PARAMETRO: '1'}))
+
+        # Se conservan solo las últimas capturas
+        self.client.force_login(self.administrador)
+        with self.settings(PERFILADOR_MAXIMO_CAPTURAS=2):
+            for i in range(3):
+                self.client.get(reverse('panel_home'), HTTP_X_PERFILAR='1')
+        self.assertEqual(len(perfilador.nombres()), 2)
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        nombres = nombres_urls()
+        self.assertEqual(set(), nombres - set(PETICIONES), "URLs sin petición definida en PETICIONES")
+        self.assertEqual(set(), nombres - set(self.presupuesto), "URLs sin presupuesto en presupuesto_consultas.json")
+
+    def asignar_citas(self):
+        # Las citas reservadas quedan asignadas al administrador, así el inicio del panel muestra sus filas
+        Cita.objects.filter(estado=EstadoCita.RESERVADA).update(usuario=self.administrador)
+
+    def test_consultas_constantes_y_dentro_del_presupuesto(self):
+        crear_datos(0, FILAS_PEQUENO)
+        self.asignar_citas()
+        pequeno = self.medir()
+        crear_datos(FILAS_PEQUENO, FILAS_GRANDE)
+        self.asignar_citas()
+        self.assertContains(self.client.get(reverse('panel_home')), 'Mascota {}'.format(FILAS_GRANDE - 1))
+        grande = self.medir()
+
+        if os.environ.get('ACTUALIZAR_PRESUPUESTO_CONSULTAS'):
+            with open(ARCHIVO_PRESUPUESTO, 'w', encoding='utf-8') as archivo:
+                json.dump({nombre: len(captura) for nombre, captura in sorted(grande.items())}, archivo, indent=4)
+                archivo.write('\n')
+
+        for nombre in sorted(PETICIONES):
+            with self.subTest(url=nombre):
+                self.assertEqual(
+                    len(pequeno[nombre]), len(grande[nombre]),
+                    "{}: {} consultas con {} filas y {} con {} filas (N+1).\nConsultas con {} filas:\n{}".format(
+                        nombre, len(pequeno[nombre]), FILAS_PEQUENO, len(grande[nombre]), FILAS_GRANDE,
+                        FILAS_GRANDE, grande[nombre].resumen(),
+                    )
+                )
+                maximo = self.presupuesto.get(nombre)
+                if maximo is not None:
+                    self.assertLessEqual(
+                        len(grande[nombre]), maximo,
+                        "{}: {} consultas, el presupuesto es {}.\n{}".format(nombre, len(grande[nombre]), maximo, grande[nombre].resumen())
+                    )
+
+
+class ConsultasLentasTests(TestCase):
+    """
+    Verifica el registro de consultas lentas (con umbral 0 se registran todas).
+    """
+
+    def test_registro(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        archivo = os.path.join(carpeta.name, 'consultas_lentas.log')
+        usuario = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        crear_datos(0, FILAS_PEQUENO)
+        self.client.force_login(usuario)
+
+        with self.settings(CONSULTAS_LENTAS_UMBRAL_MS=0, CONSULTAS_LENTAS_ARCHIVO=archivo):
+            self.client.get(reverse('panel_factura_listar'))
+            consultas_lentas.detener()
+
+        with open(archivo, encoding='utf-8') as registro:
+            entradas = [json.loads(linea) for linea in registro]
+        facturas = [entrada for entrada in entradas if 'paneltrabajador_factura' in entrada['sql'] and entrada['sql'].startswith('SELECT')]
+        self.assertTrue(facturas)
+        self.assertEqual(facturas[0]['url'], 'panel_factura_listar')
+        self.assertIn('factura/listado.html', facturas[0]['plantilla'])
+        self.assertTrue(facturas[0]['plan'])
+        # Las consultas del EXPLAIN no se registran
+        self.assertFalse([entrada for entrada in entradas if entrada['sql'].startswith('EXPLAIN')])
+
+    def test_huella(self):
+        a = consultas_lentas.huella('SELECT * FROM t WHERE id IN (%s, %s) AND x = 5')
+        b = consultas_lentas.huella("SELECT *  FROM t WHERE id IN (%s) AND x = 'y'")
+        self.assertEqual(a, b)
+
+
+class ApiTests(TestCase):
+    """
+    Verifica los permisos, los campos, la paginación por cursor, las peticiones condicionales y las escrituras masivas de la API.
+    """
+
+    def setUp(self):
+        # Se ejecutan los incrementos de versión pendientes, así los cambios de cada prueba incrementan la suya
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clientes = [
+                Cliente.objects.create(rut=10000000 + i, nombre_cliente='Cliente {}'.format(i), direccion='Calle', telefono=900000000, email='c{}@ejemplo.cl'.format(i))
+                for i in range(3)
+            ]
+            self.productos = [Producto.objects.create(nombre_producto='Producto {}'.format(i), stock_disponible=5, precio=1000) for i in range(2)]
+        self.administrador = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        self.client.force_login(self.administrador)
+
+    def _coleccion(self, recurso='clientes'):
+        return reverse('panel_api_coleccion', kwargs={'recurso': recurso})
+
+    def _patch(self, datos):
+        return self.client.patch(reverse('panel_api_masivo', kwargs={'recurso': 'productos'}), json.dumps(datos), content_type='application/json')
+
+    def test_permisos(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self._coleccion()).status_code, 401)
+
+        # Con permiso de ver, pero no de editar
+        usuario = get_user_model().objects.create_user('recepcion', password='clave-de-prueba')
+        usuario.user_permissions.add(Permission.objects.get(codename='view_cliente'))
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(self._coleccion()).status_code, 200)
+        self.assertEqual(self.client.get(self._coleccion('productos')).status_code, 403)
+        detalle = reverse('panel_api_detalle', kwargs={'recurso': 'clientes', 'pk': self.clientes[0].rut})
+        self.assertEqual(self.client.patch(detalle, json.dumps({'nombre_cliente': 'Otro'}), content_type='application/json').status_code, 403)
+        self.assertEqual(self.client.get(reverse('panel_api_coleccion', kwargs={'recurso': 'usuarios'})).status_code, 404)
+
+    def test_campos_y_cursor(self):
+        respuesta = self.client.get(self._coleccion(), {'fields': 'nombre_cliente', 'limite': 2}).json()
+        # La llave primaria se agrega siempre
+        self.assertEqual(respuesta['resultados'], [
+            {'rut': cliente.rut, 'nombre_cliente': cliente.nombre_cliente} for cliente in self.clientes[:2]
+        ])
+        siguiente = self.client.get(self._coleccion(), {'fields': 'nombre_cliente', 'limite': 2, 'cursor': respuesta['siguiente']}).json()
+        self.assertEqual([fila['rut'] for fila in siguiente['resultados']], [self.clientes[2].rut])
+        self.assertIsNone(siguiente['siguiente'])
+
+        self.assertEqual(self.client.get(self._coleccion(), {'fields': 'clave'}).json()['campos'], ['clave'])
+        self.assertEqual(self.client.get(self._coleccion(), {'cursor': 'invalido'}).status_code, 400)
+        self.assertEqual(self.client.get(self._coleccion(), {'limite': 0}).status_code, 400)
+
+    def test_no_modificado_sin_consultar_los_datos(self):
+        respuesta = self.client.get(self._coleccion())
+        etag = respuesta['ETag']
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(self._coleccion(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+        self.assertFalse([consulta for consulta in consultas if 'paneltrabajador_cliente' in consulta['sql']])
+
+        # Otros parámetros son otra respuesta
+        self.assertEqual(self.client.get(self._coleccion(), {'fields': 'email'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Un cambio en los clientes invalida el ETag, también el del detalle
+        detalle = reverse('panel_api_detalle', kwargs={'recurso': 'clientes', 'pk': self.clientes[0].rut})
+        etag_detalle = self.client.get(detalle)['ETag']
+        self.assertEqual(self.client.get(detalle, HTTP_IF_NONE_MATCH=etag_detalle).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clientes[1].nombre_cliente = 'Otro nombre'
+            self.clientes[1].save()
+        self.assertEqual(self.client.get(self._coleccion(), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(detalle, HTTP_IF_NONE_MATCH=etag_detalle).status_code, 200)
+
+    def test_masivo_invalido_no_escribe_nada(self):
+        primero, segundo = self.productos
+        respuesta = self._patch([
+            {'id_producto': primero.pk, 'stock_disponible': 9},
+            {'id_producto': segundo.pk, 'stock_disponible': 'muchos'},
+        ])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(list(respuesta.json()['errores']), ['1'])
+        self.assertEqual(list(Producto.objects.order_by('pk').values_list('stock_disponible', flat=True)), [5, 5])
+
+        respuesta = self._patch([
+            {'id_producto': primero.pk, 'stock_disponible': 9},
+            {'id_producto': segundo.pk, 'stock_disponible': 7},
+        ])
+        self.assertEqual(respuesta.json(), {'actualizados': 2})
+        self.assertEqual(list(Producto.objects.order_by('pk').values_list('stock_disponible', flat=True)), [9, 7])
+
+    def test_masivo_llave_repetida(self):
+        primero = self.productos[0]
+        respuesta = self._patch([
+            {'id_producto': primero.pk, 'stock_disponible': 8},
+            {'id_producto': primero.pk, 'stock_disponible': 3},
+        ])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['errores']['1']['id_producto'][0]['code'], 'duplicate')
+        self.assertEqual(Producto.objects.get(pk=primero.pk).stock_disponible, 5)
+
+
+class CorreoFallido(locmem.EmailBackend):
+    """
+    Backend de correo de prueba: envía los primeros `permitidos` mensajes y falla con los siguientes.
+    """
+    permitidos = 0
+
+    def send_messages(self, messages):
+        enviados = 0
+        for mensaje in messages:
+            if CorreoFallido.permitidos < 1:
+                raise ConnectionError("Servidor de correo no disponible")
+            CorreoFallido.permitidos -= 1
+            enviados += super().send_messages([mensaje])
+        return enviados
+
+
+class ListaEsperaTests(TestCase):
+    """
+    Verifica que las horas liberadas se ofrezcan a la lista de espera por orden de llegada.
+    """
+
+    def setUp(self):
+        crear_datos(0, 3)
+        ListaEspera.objects.all().delete()
+        self.manana = timezone.localdate() + datetime.timedelta(days=1)
+        self.inscritos = [
+            ListaEspera.objects.create(cliente=mascota.cliente, mascota=mascota, desde=self.manana, hasta=self.manana)
+            for mascota in Mascota.objects.order_by('pk')
+        ]
+        self.cita = Cita.objects.filter(estado=EstadoCita.RESERVADA).order_by('pk').first()
+        self.cita.fecha = timezone.now() + datetime.timedelta(days=1)
+        self.cita.save()
+
+    def test_cancelacion_se_ofrece_al_primero(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita.estado = EstadoCita.CANCELADA
+            self.cita.save()
+
+        primero = ListaEspera.objects.get(pk=self.inscritos[0].pk)
+        self.assertEqual(primero.estado, ListaEspera.ESTADO_OFRECIDA)
+        self.assertEqual(primero.cita.estado, EstadoCita.RETENIDA)
+        self.assertEqual(primero.cita.fecha, self.cita.fecha)
+        self.assertEqual(ListaEspera.objects.filter(estado=ListaEspera.ESTADO_ESPERANDO).count(), 2)
+        # El correo no se envía en la petición, sino con el comando (una sola vez)
+        self.assertEqual(len(mail.outbox), 0)
+        call_command('enviar_avisos_espera', stdout=open(os.devnull, 'w'))
+        call_command('enviar_avisos_espera', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(espera.enlace(primero)[len(espera.settings.URL_PUBLICA):], mail.outbox[0].body)
+        self.assertIsNotNone(ListaEspera.objects.get(pk=primero.pk).aviso_enviado_en)
+
+        # Rechaza: la hora pasa al siguiente de la lista
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('ambpublico_espera_oferta', args=[espera.token(primero)]), {'accion': 'rechazar'})
+        segundo = ListaEspera.objects.get(pk=self.inscritos[1].pk)
+        self.assertEqual(segundo.estado, ListaEspera.ESTADO_OFRECIDA)
+        self.assertEqual(segundo.cita_id, primero.cita_id)
+
+        # Confirma: la cita queda reservada a su nombre
+        self.client.post(reverse('ambpublico_espera_oferta', args=[espera.token(segundo)]), {'accion': 'confirmar'})
+        cita = Cita.objects.get(pk=segundo.cita_id)
+        self.assertEqual((cita.estado, cita.mascota_id), (EstadoCita.RESERVADA, segundo.mascota_id))
+
+    def test_oferta_vencida(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita.estado = EstadoCita.DISPONIBLE
+            self.cita.save()
+        ListaEspera.objects.filter(pk=self.inscritos[0].pk).update(oferta_vence_en=timezone.now())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('vencer_ofertas_espera', stdout=open(os.devnull, 'w'))
+        self.assertEqual(ListaEspera.objects.get(pk=self.inscritos[0].pk).estado, ListaEspera.ESTADO_VENCIDA)
+        self.assertEqual(ListaEspera.objects.get(pk=self.inscritos[1].pk).cita_id, self.cita.pk)
+
+    @override_settings(EMAIL_BACKEND='paneltrabajador.tests.CorreoFallido')
+    def test_aviso_fallido(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita.estado = EstadoCita.CANCELADA
+            self.cita.save()
+
+        # El correo falla: la oferta queda sin aviso para reintentarlo en la próxima ejecución
+        CorreoFallido.permitidos = 0
+        call_command('enviar_avisos_espera', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIsNone(ListaEspera.objects.get(pk=self.inscritos[0].pk).aviso_enviado_en)
+
+        CorreoFallido.permitidos = 1
+        call_command('enviar_avisos_espera', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNotNone(ListaEspera.objects.get(pk=self.inscritos[0].pk).aviso_enviado_en)
+
+
+class RecordatoriosTests(TestCase):
+    """
+    Verifica que los recordatorios se envíen una sola vez por cita, aunque falle parte del envío.
+    """
+
+    def setUp(self):
+        crear_datos(0, 3)
+        manana = timezone.localdate() + datetime.timedelta(days=1)
+        Cita.objects.filter(estado=EstadoCita.RESERVADA).update(
+            fecha=timezone.make_aware(datetime.datetime.combine(manana, datetime.time(7, 30)))
+        )
+
+    @override_settings(EMAIL_BACKEND='paneltrabajador.tests.CorreoFallido')
+    def test_envio_parcial(self):
+        # El segundo correo falla: solo las citas sin enviar quedan pendientes
+        CorreoFallido.permitidos = 1
+        call_command('enviar_recordatorios', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(mail.outbox), 1)
+        reservadas = Cita.objects.filter(estado=EstadoCita.RESERVADA).order_by('pk')
+        self.assertEqual([cita.recordatorio_enviado_en is not None for cita in reservadas], [True, False, False])
+
+        # La próxima ejecución envía las pendientes, sin repetir la primera
+        CorreoFallido.permitidos = 10
+        call_command('enviar_recordatorios', stdout=open(os.devnull, 'w'))
+        self.assertEqual(sorted(correo.to[0] for correo in mail.outbox), ['cliente0@ejemplo.cl', 'cliente1@ejemplo.cl', 'cliente2@ejemplo.cl'])
+        self.assertFalse(reservadas.filter(recordatorio_enviado_en__isnull=True).exists())
+
+    def test_solo_las_reservadas_del_dia(self):
+        manana = timezone.localdate() + datetime.timedelta(days=1)
+        usuario = get_user_model().objects.get(username='usuario0')
+        mascota = Mascota.objects.get(numero_chip=500000)
+        # Canceladas, de otro día, sin mascota o ya enviadas no reciben recordatorio
+        for dia, hora, estado, datos in (
+            (manana, datetime.time(8, 10), EstadoCita.CANCELADA, {'mascota': mascota}),
+            (manana + datetime.timedelta(days=1), datetime.time(8, 20), EstadoCita.RESERVADA, {'mascota': mascota}),
+            (manana, datetime.time(8, 40), EstadoCita.RESERVADA, {}),
+            (manana, datetime.time(8, 50), EstadoCita.RESERVADA, {'mascota': mascota, 'recordatorio_enviado_en': timezone.now()}),
+        ):
+            Cita.objects.create(estado=estado, usuario=usuario, fecha=timezone.make_aware(datetime.datetime.combine(dia, hora)), **datos)
+
+        call_command('enviar_recordatorios', lote=2, stdout=open(os.devnull, 'w'))
+        self.assertEqual(sorted(correo.to[0] for correo in mail.outbox), ['cliente0@ejemplo.cl', 'cliente1@ejemplo.cl', 'cliente2@ejemplo.cl'])
+        correo = next(correo for correo in mail.outbox if correo.to == ['cliente0@ejemplo.cl'])
+        self.assertIn('Mascota 0 tiene una cita en FiCats el {:%d/%m/%Y} a las 07:30'.format(manana), correo.body)
+
+        # Volver a ejecutarlo no repite correos; otro día se elige con --fecha
+        call_command('enviar_recordatorios', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(mail.outbox), 3)
+        call_command('enviar_recordatorios', fecha=(manana + datetime.timedelta(days=1)).isoformat(), stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(mail.outbox), 4)
+
+        for opciones in ({'fecha': 'mañana'}, {'lote': 0}):
+            with self.assertRaises(CommandError):
+                call_command('enviar_recordatorios', stdout=open(os.devnull, 'w'), **opciones)
+
+
+class ClientesEliminadosTests(TestCase):
+    """
+    Verifica que un cliente eliminado oculte sus datos sin liberar sus horas ni su RUT, y que la purga borre todo en lotes.
+    """
+
+    def setUp(self):
+        # Los horarios quedan en la cache con la versión de esta prueba, que se repite al revertir la base de datos
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        crear_datos(0, 2)
+        self.cliente = Cliente.objects.get(rut=10000000)
+        self.otro = Cliente.objects.get(rut=10000001)
+
+    def test_datos_ocultos_pero_la_hora_sigue_ocupada(self):
+        veterinario = get_user_model().objects.create_user('veterinario', password='clave-de-prueba')
+        manana = timezone.localdate() + datetime.timedelta(days=1)
+        HorarioVeterinario.objects.create(
+            usuario=veterinario, dia_semana=manana.weekday(), hora_inicio=datetime.time(9), hora_fin=datetime.time(10), duracion=30,
+        )
+        fecha = disponibilidad.horas(manana, manana + datetime.timedelta(days=1), veterinario.pk)[0]['fecha']
+        disponibilidad.reservar(veterinario.pk, fecha, estado=EstadoCita.RESERVADA, cliente=self.cliente, mascota=self.cliente.mascota_set.first())
+
+        self.cliente.eliminar()
+
+        self.assertFalse(Cliente.objects.filter(rut=self.cliente.rut).exists())
+        for modelo in (Mascota, Cita, Factura, ListaEspera):
+            self.assertFalse(modelo.objects.filter(cliente=self.cliente).exists(), modelo)
+            self.assertTrue(modelo._base_manager.filter(cliente=self.cliente).exists(), modelo)
+            self.assertTrue(modelo.objects.filter(cliente=self.otro).exists(), modelo)
+
+        # La cita oculta sigue ocupando su hora
+        horas = disponibilidad.horas(manana, manana + datetime.timedelta(days=1), veterinario.pk)
+        self.assertEqual([hora['fecha'] for hora in horas], [fecha + datetime.timedelta(minutes=30)])
+        self.assertIsNone(disponibilidad.reservar(veterinario.pk, fecha, estado=EstadoCita.RESERVADA))
+
+    def test_formularios_rechazan_rut_y_chip_pendientes_de_purga(self):
+        self.cliente.eliminar()
+
+        formulario = ClienteForm({
+            'rut': self.cliente.rut, 'nombre_cliente': 'Nuevo', 'direccion': 'Calle', 'telefono': 911111111, 'email': 'nuevo@ejemplo.cl',
+        })
+        self.assertFalse(formulario.is_valid())
+        self.assertIn('rut', formulario.errors)
+
+        formulario = MascotaForm({
+            'nombre': 'Nueva', 'numero_chip': 500000, 'especie': 'Perro', 'raza': 'Común',
+            'fecha_nacimiento': '2021-01-01', 'cliente': self.otro.rut, 'historial_medico': 'Sin observaciones',
+        })
+        self.assertFalse(formulario.is_valid())
+        self.assertEqual(list(formulario.errors), ['numero_chip'])
+
+    def test_purgar_borra_en_lotes_solo_los_eliminados(self):
+        # Tres mascotas: con lotes de 2 se borran en dos transacciones
+        for i in range(2):
+            Mascota.objects.create(
+                nombre='Extra {}'.format(i), numero_chip=600000 + i, especie='Perro', raza='Común',
+                fecha_nacimiento=datetime.date(2021, 1, 1), cliente=self.cliente, historial_medico='Sin observaciones',
+            )
+        self.cliente.eliminar()
+        antes = {modelo: modelo._base_manager.count() for modelo in (Cliente, Mascota, Cita, Factura, FacturaLinea, ListaEspera, CitaHistorica, FacturaHistorica)}
+
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('purgar_clientes', lote=2, pausa=0, stdout=StringIO())
+
+        borrados_mascotas = [consulta for consulta in consultas if consulta['sql'].startswith('DELETE FROM "{}"'.format(Mascota._meta.db_table))]
+        self.assertEqual(len(borrados_mascotas), 2)
+
+        rut = self.cliente.rut
+        self.assertFalse(Cliente._base_manager.filter(rut=rut).exists())
+        self.assertFalse(Mascota._base_manager.filter(cliente_id=rut).exists())
+        self.assertFalse(Cita._base_manager.filter(cliente_id=rut).exists())
+        self.assertFalse(Factura._base_manager.filter(cliente_id=rut).exists())
+        self.assertFalse(FacturaLinea._base_manager.filter(factura__cliente_id=rut).exists())
+        self.assertFalse(ListaEspera._base_manager.filter(cliente_id=rut).exists())
+        self.assertFalse(CitaHistorica.objects.filter(cliente_rut=rut).exists())
+        self.assertFalse(FacturaHistorica.objects.filter(cliente_rut=rut).exists())
+
+        # Del otro cliente solo se pierde lo que no era suyo: cada modelo baja exactamente en las filas del eliminado
+        esperado = {Cliente: 1, Mascota: 3, Cita: 2, Factura: 1, FacturaLinea: 1, ListaEspera: 1, CitaHistorica: 1, FacturaHistorica: 1}
+        for modelo, cantidad in esperado.items():
+            self.assertEqual(modelo._base_manager.count(), antes[modelo] - cantidad, modelo)
+        self.assertTrue(Cliente.objects.filter(rut=self.otro.rut).exists())
+        self.assertEqual(Mascota.objects.filter(cliente=self.otro).count(), 1)
+
+
+class AccionesMasivasTests(TestCase):
+    """
+    Verifica que las acciones masivas pidan confirmación, afecten solo a la selección y se reviertan completas si fallan.
+    """
+
+    def setUp(self):
+        crear_datos(0, 3)
+        self.administrador = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        self.client.force_login(self.administrador)
+        self.citas = list(Cita.objects.filter(estado=EstadoCita.RESERVADA).order_by('pk').values_list('pk', flat=True))
+
+    def _estados(self):
+        return dict(Cita.objects.filter(pk__in=self.citas).values_list('pk', 'estado'))
+
+    def test_confirmacion_no_escribe(self):
+        respuesta = self.client.post(reverse('panel_cita_acciones'), {
+            'accion': 'estado', 'estado': EstadoCita.CANCELADA, 'seleccion': self.citas[:2],
+        })
+        self.assertTemplateUsed(respuesta, 'paneltrabajador/acciones_confirmar.html')
+        self.assertEqual(respuesta.context['cantidad'], 2)
+        self.assertEqual(set(self._estados().values()), {EstadoCita.RESERVADA})
+
+    def test_solo_la_seleccion(self):
+        respuesta = self.client.post(reverse('panel_cita_acciones'), {
+            'accion': 'estado', 'estado': EstadoCita.CANCELADA, 'seleccion': self.citas[:2], 'confirmar': '1',
+        }, follow=True)
+        self.assertRedirects(respuesta, reverse('panel_cita_listar'))
+        self.assertEqual([mensaje.level for mensaje in respuesta.context['messages']], [messages.SUCCESS])
+        self.assertEqual(self._estados(), {
+            self.citas[0]: EstadoCita.CANCELADA, self.citas[1]: EstadoCita.CANCELADA, self.citas[2]: EstadoCita.RESERVADA,
+        })
+
+    def test_peticiones_invalidas(self):
+        url = reverse('panel_cita_acciones')
+        for datos in (
+            {'accion': 'otra', 'seleccion': self.citas},
+            {'accion': 'estado', 'estado': EstadoCita.CANCELADA},
+            {'accion': 'estado', 'estado': EstadoCita.CANCELADA, 'seleccion': ['1', 'x']},
+            {'accion': 'estado', 'estado': 9, 'seleccion': self.citas},
+            {'accion': 'usuario', 'usuario': 0, 'seleccion': self.citas},
+        ):
+            respuesta = self.client.post(url, dict(datos, confirmar='1'), follow=True)
+            self.assertRedirects(respuesta, reverse('panel_cita_listar'))
+            self.assertEqual([mensaje.level for mensaje in respuesta.context['messages']], [messages.ERROR], datos)
+
+        # Sin el permiso de la acción
+        self.client.force_login(get_user_model().objects.get(username='usuario0'))
+        respuesta = self.client.post(url, {'accion': 'eliminar', 'seleccion': self.citas, 'confirmar': '1'})
+        self.assertRedirects(respuesta, reverse('panel_home'), fetch_redirect_response=False)
+        self.assertEqual(len(self._estados()), 3)
+
+    def test_error_revierte_todo_el_lote(self):
+        # Un error después de la operación (al actualizar las versiones) revierte los cambios de todas las filas
+        with mock.patch('paneltrabajador.views.acciones.versiones.incrementar', side_effect=IntegrityError):
+            respuesta = self.client.post(reverse('panel_cita_acciones'), {
+                'accion': 'estado', 'estado': EstadoCita.CANCELADA, 'seleccion': self.citas, 'confirmar': '1',
+            }, follow=True)
+        self.assertEqual([mensaje.level for mensaje in respuesta.context['messages']], [messages.ERROR])
+        self.assertEqual(set(self._estados().values()), {EstadoCita.RESERVADA})
+
+    def test_eliminar_facturas_devuelve_stock(self):
+        facturas = list(Factura.objects.order_by('pk').values_list('pk', flat=True))
+        stock = dict(Producto.objects.values_list('pk', 'stock_disponible'))
+        datos = {'accion': 'eliminar', 'seleccion': facturas[:2], 'confirmar': '1'}
+
+        # Si falla la eliminación, el stock devuelto también se revierte
+        with mock.patch('paneltrabajador.views.acciones.versiones.incrementar', side_effect=IntegrityError):
+            self.client.post(reverse('panel_factura_acciones'), datos)
+        self.assertEqual(Factura.objects.count(), 3)
+        self.assertEqual(dict(Producto.objects.values_list('pk', 'stock_disponible')), stock)
+
+        self.client.post(reverse('panel_factura_acciones'), datos)
+        self.assertEqual(list(Factura.objects.values_list('pk', flat=True)), facturas[2:])
+        self.assertFalse(FacturaLinea.objects.filter(factura__in=facturas[:2]).exists())
+        # Cada factura tenía una línea de su producto: i + 1 unidades
+        for i, producto in enumerate(Producto.objects.order_by('pk')):
+            self.assertEqual(producto.stock_disponible, stock[producto.pk] + (i + 1 if i < 2 else 0))
+
+
+class ArchivadoTests(TestCase):
+    """
+    Verifica que archivar_historico mueva las citas antiguas y las facturas pagadas a las tablas históricas, y sus listados.
+    """
+
+    def setUp(self):
+        crear_datos(0, 2)
+        self.cliente = Cliente.objects.get(rut=10000000)
+        self.usuario = get_user_model().objects.get(username='usuario0')
+        self.antigua = Cita.objects.create(
+            cliente=self.cliente, mascota=self.cliente.mascota_set.get(), estado=EstadoCita.RESERVADA,
+            usuario=self.usuario, fecha=timezone.now() - datetime.timedelta(days=400),
+        )
+        self.pagada = Factura.objects.filter(cliente=self.cliente).get()
+        Factura.objects.filter(pk=self.pagada.pk).update(estado_pago=EstadoPago.PAGADA)
+
+    def test_archivar(self):
+        citas = Cita.objects.count()
+        salida = StringIO()
+        call_command('archivar_historico', lote=1, pausa=0, stdout=salida)
+        self.assertIn("Citas archivadas: 1", salida.getvalue())
+        self.assertIn("Facturas archivadas: 1", salida.getvalue())
+
+        # La cita antigua pasa a la tabla histórica con los nombres de su cliente, mascota y usuario
+        self.assertFalse(Cita.objects.filter(pk=self.antigua.pk).exists())
+        self.assertEqual(Cita.objects.count(), citas - 1)
+        historica = CitaHistorica.objects.get(n_cita=self.antigua.pk)
+        self.assertEqual(
+            (historica.cliente_rut, historica.cliente_nombre, historica.mascota_nombre, historica.usuario_nombre, historica.estado),
+            (self.cliente.rut, 'Cliente 0', 'Mascota 0', 'usuario0', self.antigua.estado),
+        )
+
+        # La factura pagada se archiva con sus líneas en el detalle; la pendiente se queda
+        self.assertEqual(list(Factura.objects.values_list('cliente_id', flat=True)), [10000001])
+        self.assertFalse(FacturaLinea.objects.filter(factura_id=self.pagada.pk).exists())
+        historica = FacturaHistorica.objects.get(numero_factura=self.pagada.pk)
+        self.assertEqual(historica.detalle, 'Consulta\n1 x Producto 0 ($1000)')
+
+        # Volver a ejecutarlo no archiva nada más
+        salida = StringIO()
+        call_command('archivar_historico', pausa=0, stdout=salida)
+        self.assertIn("Citas archivadas: 0", salida.getvalue())
+
+    def test_meses_invalidos(self):
+        with self.assertRaises(CommandError):
+            call_command('archivar_historico', meses=0, stdout=StringIO())
+
+    def test_listados(self):
+        url = reverse('panel_historico_citas')
+        self.client.force_login(self.usuario)
+        self.assertRedirects(self.client.get(url), reverse('panel_home'), fetch_redirect_response=False)
+
+        self.client.force_login(get_user_model().objects.create_superuser('administrador', password='clave-de-prueba'))
+        CitaHistorica.objects.bulk_create(
+            CitaHistorica(n_cita=200000 + i, cliente_rut=20000000, estado=EstadoCita.RESERVADA, fecha=timezone.now() - datetime.timedelta(days=500 + i))
+            for i in range(POR_PAGINA_HISTORICO)
+        )
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.context['pagina'].paginator.count, POR_PAGINA_HISTORICO + 2)
+        self.assertEqual(len(respuesta.context['pagina']), POR_PAGINA_HISTORICO)
+        self.assertEqual(len(self.client.get(url, {'pagina': 2}).context['pagina']), 2)
+
+        # Filtro por RUT
+        respuesta = self.client.get(url, {'rut': self.cliente.rut})
+        self.assertEqual([cita.cliente_rut for cita in respuesta.context['pagina']], [self.cliente.rut])
+        self.assertContains(respuesta, 'Cliente 0 (RUT: {})'.format(self.cliente.rut))
+        respuesta = self.client.get(reverse('panel_historico_facturas'), {'rut': 10000001})
+        self.assertEqual([factura.numero_factura for factura in respuesta.context['pagina']], [100001])
+
+
+class PeticionesCondicionalesTests(TestCase):
+    """
+    Verifica los contadores de versión por modelo y las respuestas 304 de las páginas del panel.
+    """
+
+    def setUp(self):
+        self.administrador = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_datos(0, 2)
+        self.client.force_login(self.administrador)
+        self.url = reverse('panel_cliente_listado')
+
+    def _version(self, modelo):
+        return versiones.obtener(modelo)[0][1]
+
+    def test_no_modificado(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Last-Modified', respuesta)
+        self.assertIn('private', respuesta['Cache-Control'])
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        etag = respuesta['ETag']
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta.content, b'')
+        # Solo la sesión, el usuario y los contadores: la página no se renderiza
+        self.assertFalse([consulta for consulta in consultas if Cliente._meta.db_table in consulta['sql']])
+        self.assertEqual(len([consulta for consulta in consultas if VersionModelo._meta.db_table in consulta['sql']]), 1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+
+        # Un cambio de otro modelo no afecta a la página, uno de sus modelos sí
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(nombre_producto='Otro', stock_disponible=1, precio=1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente = Cliente.objects.get(rut=10000000)
+            cliente.nombre_cliente = 'Cambiado'
+            cliente.save()
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'Cambiado')
+
+        # El ETag depende del usuario
+        otro = get_user_model().objects.create_superuser('otro', password='clave-de-prueba')
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sin_validar(self):
+        # Sin sesión o con mensajes pendientes de mostrar la página no lleva ETag
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('panel_cita_acciones'), {'accion': 'otra'})
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('ETag', respuesta)
+
+        self.client.logout()
+        self.assertNotIn('ETag', self.client.get(self.url))
+
+    def test_un_incremento_por_transaccion(self):
+        version = self._version(Producto)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for i in range(3):
+                    Producto.objects.create(nombre_producto='Nuevo {}'.format(i), stock_disponible=1, precio=1)
+        self.assertEqual(self._version(Producto), version + 1)
+
+        # Una transacción revertida no cambia la versión
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Producto.objects.create(nombre_producto='Revertido', stock_disponible=1, precio=1)
+                raise IntegrityError
+        self.assertEqual(self._version(Producto), version + 1)
+
+        # Las escrituras sin señales (acciones masivas) incrementan la versión a mano
+        version = self._version(Cita)
+        self.client.post(reverse('panel_cita_acciones'), {
+            'accion': 'estado', 'estado': EstadoCita.CANCELADA, 'seleccion': list(Cita.objects.values_list('pk', flat=True)), 'confirmar': '1',
+        })
+        self.assertEqual(self._version(Cita), version + 1)
+
+
+class FragmentosTests(TestCase):
+    """
+    Verifica que los listados se paginen sin repetir filas y que los fragmentos devuelvan solo las filas de la página.
+    """
+
+    def setUp(self):
+        crear_datos(0, 2)
+        cliente = Cliente.objects.get(rut=10000000)
+        Mascota.objects.bulk_create(
+            Mascota(
+                nombre='Extra {:03d}'.format(i), numero_chip=700000 + i, especie='Perro', raza='Común',
+                fecha_nacimiento=datetime.date(2021, 1, 1), cliente=cliente, historial_medico='Sin observaciones',
+            )
+            for i in range(POR_PAGINA_LISTADO)
+        )
+        self.client.force_login(get_user_model().objects.create_superuser('administrador', password='clave-de-prueba'))
+
+    def _pagina(self, nombre, **parametros):
+        respuesta = self.client.get(reverse(nombre), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotContains(respuesta, '<html')
+        return respuesta
+
+    def test_paginas_de_mascotas(self):
+        total = Mascota.objects.count()
+        listado = self.client.get(reverse('panel_mascota_listar'))
+        self.assertEqual(len(listado.context['mascotas']), POR_PAGINA_LISTADO)
+        self.assertEqual(listado.context['siguiente'], 2)
+
+        with CaptureQueriesContext(connection) as primera:
+            respuesta = self._pagina('panel_mascota_filas', pagina=1)
+        ids = [mascota.pk for mascota in respuesta.context['mascotas']]
+        self.assertEqual(respuesta['X-Pagina-Siguiente'], '2')
+
+        with CaptureQueriesContext(connection) as segunda:
+            respuesta = self._pagina('panel_mascota_filas', pagina=2)
+        ids += [mascota.pk for mascota in respuesta.context['mascotas']]
+        self.assertEqual(respuesta['X-Pagina-Siguiente'], '')
+        # Las páginas no se repiten ni se saltan filas, y cada página cuesta lo mismo
+        self.assertEqual(ids, sorted(Mascota.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(ids), total)
+        self.assertEqual(len(primera), len(segunda))
+
+        # Búsqueda, orden y parámetros inválidos
+        respuesta = self._pagina('panel_mascota_filas', q='mascota', orden='-nombre')
+        self.assertEqual([mascota.nombre for mascota in respuesta.context['mascotas']], ['Mascota 1', 'Mascota 0'])
+        respuesta = self._pagina('panel_mascota_filas', orden='clave', pagina='x')
+        self.assertEqual([mascota.pk for mascota in respuesta.context['mascotas']], ids[:POR_PAGINA_LISTADO])
+
+    def test_filas_de_citas(self):
+        usuario = get_user_model().objects.get(username='usuario1')
+        respuesta = self._pagina('panel_cita_filas', usuario=usuario.pk, estado=EstadoCita.RESERVADA, orden='-fecha')
+        self.assertEqual(
+            [(cita.usuario_id, cita.estado) for cita in respuesta.context['citas']],
+            [(usuario.pk, EstadoCita.RESERVADA)],
+        )
+        self.assertEqual(respuesta['X-Pagina-Siguiente'], '')
+        self.assertContains(respuesta, '<tr', count=1)
+
+        # Sin permiso no se devuelven filas
+        self.client.force_login(usuario)
+        self.assertRedirects(self.client.get(reverse('panel_cita_filas')), reverse('panel_home'), fetch_redirect_response=False)
+
+
+class AutocompletarTests(TestCase):
+    """
+    Verifica que los campos con autocompletado carguen solo la opción elegida, las búsquedas y la validación de la cita.
+    """
+
+    def setUp(self):
+        crear_datos(0, 3)
+        self.cliente = Cliente.objects.get(rut=10000000)
+        self.mascota = Mascota.objects.get(cliente=self.cliente)
+        self.client.force_login(get_user_model().objects.create_superuser('administrador', password='clave-de-prueba'))
+
+    def _busqueda(self, nombre, **parametros):
+        respuesta = self.client.get(reverse(nombre), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return [fila['id'] for fila in respuesta.json()['resultados']]
+
+    def test_widget_solo_la_opcion_elegida(self):
+        formulario = MascotaForm(instance=self.mascota)
+        with self.assertNumQueries(1):
+            html = str(formulario['cliente'])
+        # La opción vacía y el cliente de la mascota, no toda la tabla
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn('value="{}" selected'.format(self.cliente.rut), html)
+        self.assertIn('data-autocompletar="{}"'.format(reverse('panel_autocompletar_clientes')), html)
+
+        cita = Cita.objects.filter(mascota=self.mascota).first()
+        html = str(CitaForm(instance=cita)['mascota'])
+        self.assertIn('data-depende-de="cliente"', html)
+        self.assertEqual(html.count('<option'), 2)
+
+    def test_busquedas(self):
+        self.assertEqual(self._busqueda('panel_autocompletar_clientes', q=self.cliente.rut), [self.cliente.rut])
+        self.assertEqual(self._busqueda('panel_autocompletar_clientes', q='cliente'), [10000000, 10000001, 10000002])
+        self.assertEqual(self._busqueda('panel_autocompletar_clientes', q=''), [])
+
+        # Las mascotas de un cliente se muestran sin texto de búsqueda
+        self.assertEqual(self._busqueda('panel_autocompletar_mascotas', cliente=self.cliente.rut), [self.mascota.pk])
+        self.assertEqual(self._busqueda('panel_autocompletar_mascotas', q=500001), [Mascota.objects.get(numero_chip=500001).pk])
+        self.assertEqual(self._busqueda('panel_autocompletar_mascotas', q='mascota', cliente=10000002), [Mascota.objects.get(cliente_id=10000002).pk])
+
+        get_user_model().objects.filter(username='usuario1').update(is_active=False)
+        self.assertEqual(
+            self._busqueda('panel_autocompletar_usuarios', q='usuario'),
+            list(get_user_model().objects.filter(username__in=['usuario0', 'usuario2']).order_by('username').values_list('pk', flat=True)),
+        )
+
+        Producto.objects.bulk_create(
+            Producto(nombre_producto='Producto extra {}'.format(i), stock_disponible=1, precio=1) for i in range(MAXIMO_RESULTADOS)
+        )
+        self.assertEqual(len(self._busqueda('panel_autocompletar_productos', q='producto')), MAXIMO_RESULTADOS)
+
+    def test_permisos(self):
+        url = reverse('panel_autocompletar_clientes')
+        self.client.logout()
+        self.assertEqual(self.client.get(url, {'q': 'a'}).status_code, 401)
+        self.client.force_login(get_user_model().objects.get(username='usuario0'))
+        self.assertEqual(self.client.get(url, {'q': 'a'}).status_code, 403)
+
+    def test_mascota_de_otro_cliente(self):
+        cita = Cita.objects.filter(mascota=self.mascota).first()
+        datos = {
+            'cliente': 10000001, 'mascota': self.mascota.pk, 'estado': cita.estado, 'usuario': cita.usuario_id,
+            'fecha': timezone.localtime(cita.fecha).strftime('%Y-%m-%dT%H:%M'),
+        }
+        formulario = CitaForm(datos, instance=cita)
+        self.assertFalse(formulario.is_valid())
+        self.assertEqual(list(formulario.errors), ['mascota'])
+        self.assertTrue(CitaForm(dict(datos, cliente=self.cliente.rut), instance=cita).is_valid())
+
+
+class CacheTests(TestCase):
+    """
+    Verifica que los datos en cache se invaliden con las generaciones de sus modelos y las estadísticas de la cache.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.calculos = 0
+
+    def _obtener(self, modelos=(Cliente,), **opciones):
+        def calcular():
+            self.calculos += 1
+            return self.calculos
+        return cache.obtener_o_calcular('prueba', modelos, calcular, **opciones)
+
+    def test_generaciones(self):
+        self.assertEqual((self._obtener(), self._obtener()), (1, 1))
+
+        # Solo los cambios de los modelos de los que depende el dato lo invalidan
+        cache.incrementar_generacion(Producto)
+        self.assertEqual(self._obtener(), 1)
+        cache.incrementar_generacion(Cliente)
+        self.assertEqual(self._obtener(), 2)
+
+        # Otras partes y otra sucursal son otro dato
+        self.assertEqual(self._obtener(partes=('filtro',)), 3)
+        self.assertEqual(self._obtener(por_sucursal=False), 4)
+        with self.settings(SUCURSALES=settings.SUCURSALES_PRUEBA), sucursales.usar('norte'):
+            self.assertEqual(self._obtener(), 5)
+            self.assertEqual(self._obtener(por_sucursal=False), 4)
+
+        # Un contador perdido (cache vaciada o desalojo) no vuelve a un valor anterior
+        [antes] = cache.generaciones(Cliente)
+        caches['default'].delete('generacion:paneltrabajador.cliente')
+        [despues] = cache.generaciones(Cliente)
+        self.assertGreater(despues, antes)
+
+    def test_escrituras_incrementan_la_generacion(self):
+        usuario = get_user_model().objects.create_user('veterinario', password='clave-de-prueba')
+        self.assertEqual(disponibilidad.horarios(), [])
+
+        # Las señales (al confirmar la transacción) y las escrituras masivas incrementan la generación
+        with self.captureOnCommitCallbacks(execute=True):
+            horario = HorarioVeterinario.objects.create(usuario=usuario, dia_semana=0, hora_inicio=datetime.time(9), hora_fin=datetime.time(10))
+        self.assertEqual(len(disponibilidad.horarios()), 1)
+        HorarioVeterinario.objects.filter(pk=horario.pk).update(hora_fin=datetime.time(11))
+        versiones.incrementar(HorarioVeterinario)
+        self.assertEqual(disponibilidad.horarios()[0]['hora_fin'], datetime.time(11))
+        # Los horarios también dependen de los usuarios
+        get_user_model().objects.filter(pk=usuario.pk).update(is_active=False)
+        versiones.incrementar(versiones.AUTH)
+        self.assertEqual(disponibilidad.horarios(), [])
+
+    def test_estadisticas(self):
+        ubicacion = caches['default'].ubicacion
+        antes = cache.estadisticas(ubicacion)
+        self._obtener()
+        self._obtener()
+        despues = cache.estadisticas(ubicacion)
+        # La primera lectura del dato falla y la segunda acierta (además de las lecturas de las generaciones)
+        self.assertGreaterEqual(despues['fallos'] - antes['fallos'], 1)
+        self.assertGreaterEqual(despues['aciertos'] - antes['aciertos'], 1)
+
+        url = reverse('panel_cache_estadisticas')
+        self.client.force_login(get_user_model().objects.create_user('recepcion', password='clave-de-prueba'))
+        self.assertRedirects(self.client.get(url), reverse('panel_home'), fetch_redirect_response=False)
+        self.client.force_login(get_user_model().objects.create_superuser('administrador', password='clave-de-prueba'))
+        respuesta = self.client.get(url)
+        self.assertEqual([fila['alias'] for fila in respuesta.context['filas']], ['default'])
+        self.assertContains(respuesta, 'paneltrabajador.cliente')
+
+
+class ConfigurarPermisosTests(TestCase):
+    """
+    Verifica que configurar_permisos deje los grupos con los permisos declarados, aplicando solo las diferencias.
+    """
+
+    def _permisos(self, grupo):
+        return set(Group.objects.get(name=grupo).permissions.values_list('content_type__app_label', 'codename'))
+
+    def _ejecutar(self, **opciones):
+        salida = StringIO()
+        call_command('configurar_permisos', stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def test_sincronizar(self):
+        self._ejecutar()
+        declarados = permisos_por_rol()
+        for grupo in ROLES:
+            self.assertEqual(self._permisos(grupo), declarados[grupo], grupo)
+
+        # Sin diferencias no se escribe nada
+        with CaptureQueriesContext(connection) as consultas:
+            salida = self._ejecutar()
+        self.assertIn("Los grupos ya están sincronizados.", salida)
+        self.assertFalse([consulta for consulta in consultas if not consulta['sql'].startswith('SELECT')])
+
+        # Un permiso de más y uno de menos; un grupo borrado
+        veterinario = Group.objects.get(name='veterinario')
+        veterinario.permissions.remove(Permission.objects.get(codename='view_producto'))
+        veterinario.permissions.add(Permission.objects.get(codename='delete_producto'))
+        Group.objects.filter(name='gerente').delete()
+
+        salida = self._ejecutar(dry_run=True)
+        self.assertIn("veterinario (existente): +1 -1", salida)
+        self.assertIn("  + paneltrabajador.view_producto", salida)
+        self.assertIn("  - paneltrabajador.delete_producto", salida)
+        self.assertIn("gerente (nuevo): +{} -0".format(len(declarados['gerente'])), salida)
+        self.assertIn("recepcionista (existente): +0 -0", salida)
+        # La simulación no cambia nada
+        self.assertFalse(Group.objects.filter(name='gerente').exists())
+        self.assertIn(('paneltrabajador', 'delete_producto'), self._permisos('veterinario'))
+
+        self.assertIn("Grupos sincronizados.", self._ejecutar())
+        for grupo in ROLES:
+            self.assertEqual(self._permisos(grupo), declarados[grupo], grupo)
+
+    def test_permiso_inexistente(self):
+        antes = sorted(Group.objects.values_list('name', 'permissions'))
+        with mock.patch.dict(ROLES['veterinario'], permisos=ROLES['veterinario']['permisos'] + ['paneltrabajador.volar_cita']):
+            with self.assertRaisesMessage(CommandError, 'paneltrabajador.volar_cita'):
+                self._ejecutar()
+        # No se aplica ningún cambio
+        self.assertEqual(sorted(Group.objects.values_list('name', 'permissions')), antes)
+
+
+class DisponibilidadTests(TestCase):
+    """
+    Verifica que las horas del horario se calculen sin citas y que cada hora se reserve una sola vez.
+    """
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user('veterinario', password='clave-de-prueba')
+        self.manana = timezone.localdate() + datetime.timedelta(days=1)
+        HorarioVeterinario.objects.create(
+            usuario=self.usuario, dia_semana=self.manana.weekday(), hora_inicio=datetime.time(9), hora_fin=datetime.time(10), duracion=30,
+        )
+
+    def test_reservar_hora_del_horario(self):
+        horas = disponibilidad.horas(self.manana, self.manana + datetime.timedelta(days=1))
+        self.assertEqual([timezone.localtime(hora['fecha']).time() for hora in horas], [datetime.time(9), datetime.time(9, 30)])
+        self.assertFalse(Cita.objects.exists())
+
+        fecha = horas[0]['fecha']
+        cita = disponibilidad.reservar(self.usuario.pk, fecha, estado=EstadoCita.RESERVADA)
+        self.assertEqual(cita.estado, EstadoCita.RESERVADA)
+        # La hora ya no está disponible y no se puede reservar de nuevo
+        self.assertEqual(len(disponibilidad.horas(self.manana, self.manana + datetime.timedelta(days=1))), 1)
+        self.assertIsNone(disponibilidad.reservar(self.usuario.pk, fecha, estado=EstadoCita.RESERVADA))
+        # Fuera del horario tampoco
+        self.assertIsNone(disponibilidad.reservar(self.usuario.pk, fecha + datetime.timedelta(minutes=5), estado=EstadoCita.RESERVADA))
+        self.assertEqual(Cita.objects.count(), 1)
+
+        # Cancelada, la hora vuelve a estar disponible
+        cita.estado = EstadoCita.CANCELADA
+        cita.save()
+        self.assertIsNotNone(disponibilidad.reservar(self.usuario.pk, fecha, estado=EstadoCita.RESERVADA))
+
+    def _citas_misma_hora(self):
+        # Dos veterinarios con una cita a la misma hora
+        otro = get_user_model().objects.create_user('otro', password='clave-de-prueba')
+        fecha = timezone.now().replace(microsecond=0) + datetime.timedelta(days=2)
+        primera = Cita.objects.create(estado=EstadoCita.RESERVADA, usuario=self.usuario, fecha=fecha)
+        segunda = Cita.objects.create(estado=EstadoCita.RESERVADA, usuario=otro, fecha=fecha)
+        self.client.force_login(get_user_model().objects.create_superuser('administrador', password='clave-de-prueba'))
+        return primera, segunda
+
+    def test_accion_masiva_hora_ocupada(self):
+        _, segunda = self._citas_misma_hora()
+        respuesta = self.client.post(reverse('panel_cita_acciones'), {
+            'accion': 'usuario', 'usuario': self.usuario.pk, 'seleccion': [segunda.pk], 'confirmar': '1',
+        }, follow=True)
+        self.assertRedirects(respuesta, reverse('panel_cita_listar'))
+        self.assertEqual([mensaje.level for mensaje in respuesta.context['messages']], [messages.ERROR])
+        self.assertEqual(Cita.objects.get(pk=segunda.pk).usuario_id, segunda.usuario_id)
+
+    def test_api_masivo_hora_ocupada(self):
+        primera, segunda = self._citas_misma_hora()
+        tercero = get_user_model().objects.create_user('tercero', password='clave-de-prueba')
+        respuesta = self.client.patch(
+            reverse('panel_api_masivo', kwargs={'recurso': 'citas'}),
+            json.dumps([{'n_cita': primera.pk, 'usuario': tercero.pk}, {'n_cita': segunda.pk, 'usuario': tercero.pk}]),
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertFalse(Cita.objects.filter(usuario=tercero).exists())
+
+
+class FacturacionTests(TestCase):
+    """
+    Verifica que las líneas de la factura descuenten el stock en una transacción y calculen el total.
+    """
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            rut=11111111, nombre_cliente='Cliente', direccion='Calle', telefono=900000000, email='cliente@ejemplo.cl',
+        )
+        self.alimento = Producto.objects.create(nombre_producto='Alimento', stock_disponible=5, precio=2000)
+        self.collar = Producto.objects.create(nombre_producto='Collar', stock_disponible=1, precio=3000)
+
+    def _factura(self):
+        return Factura(cliente=self.cliente, detalle='Venta', estado_pago=EstadoPago.PENDIENTE)
+
+    def _stock(self, producto):
+        return Producto.objects.get(pk=producto.pk).stock_disponible
+
+    def test_guardar_descuenta_stock_y_calcula_total(self):
+        factura = facturacion.guardar(self._factura(), [
+            FacturaLinea(producto=self.alimento, cantidad=2, precio=2000),
+            FacturaLinea(producto=self.collar, cantidad=1, precio=3000),
+        ])
+        self.assertEqual(Factura.objects.get(pk=factura.pk).total_pagar, 7000)
+        self.assertEqual((self._stock(self.alimento), self._stock(self.collar)), (3, 0))
+
+        # Al editar solo se mueve la diferencia: se devuelve el collar y se descuenta un alimento más
+        facturacion.guardar(factura, [FacturaLinea(producto=self.alimento, cantidad=3, precio=2000)])
+        self.assertEqual((self._stock(self.alimento), self._stock(self.collar)), (2, 1))
+        self.assertEqual(Factura.objects.get(pk=factura.pk).total_pagar, 6000)
+        self.assertEqual(list(factura.lineas.values_list('nombre', flat=True)), ['Alimento'])
+
+    def test_stock_insuficiente_no_guarda_nada(self):
+        with self.assertRaises(facturacion.StockInsuficiente) as error:
+            facturacion.guardar(self._factura(), [
+                FacturaLinea(producto=self.alimento, cantidad=2, precio=2000),
+                FacturaLinea(producto=self.collar, cantidad=2, precio=3000),
+            ])
+        self.assertEqual(error.exception.productos, ['Collar'])
+        self.assertEqual((self._stock(self.alimento), self._stock(self.collar)), (5, 1))
+        self.assertFalse(Factura.objects.exists())
+        self.assertFalse(FacturaLinea.objects.exists())
+
+
+class DocumentosTests(TestCase):
+    """
+    Verifica que los documentos se generen una vez por versión del registro y se validen con su ETag.
+    """
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        configuracion = self.settings(DOCUMENTOS_DIRECTORIO=carpeta.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.carpeta = carpeta.name
+
+        cliente = Cliente.objects.create(
+            rut=11111111, nombre_cliente='Cliente', direccion='Calle', telefono=900000000, email='cliente@ejemplo.cl',
+        )
+        self.factura = Factura.objects.create(cliente=cliente, total_pagar=5000, detalle='Consulta', estado_pago=EstadoPago.PENDIENTE)
+        self.mascota = Mascota.objects.create(
+            nombre='Michi', numero_chip=500000, especie='Gato', raza='Común',
+            fecha_nacimiento=datetime.date(2020, 1, 1), cliente=cliente, historial_medico='Sin observaciones',
+        )
+        self.client.force_login(get_user_model().objects.create_superuser('administrador', password='clave-de-prueba'))
+
+    def _archivos(self):
+        return sorted(nombre for _, _, nombres in os.walk(self.carpeta) for nombre in nombres)
+
+    def test_etag_y_version(self):
+        url = reverse('panel_factura_imprimir', args=[self.factura.pk])
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Consulta', b''.join(respuesta.streaming_content).decode())
+        etag = respuesta['ETag']
+        self.assertEqual(self._archivos(), [etag.strip('"') + '.html'])
+
+        # La misma versión: 304 sin generar otro archivo
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Al cambiar la factura cambia la huella y se genera un archivo nuevo
+        Factura.objects.filter(pk=self.factura.pk).update(detalle='Vacuna')
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(len(self._archivos()), 2)
+
+    def test_prerenderizar_y_enlace_publico(self):
+        call_command('prerenderizar_documentos', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(self._archivos()), 2)
+        call_command('prerenderizar_documentos', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(self._archivos()), 2)
+
+        self.client.logout()
+        respuesta = self.client.get(documentos.enlace('ficha', self.mascota.pk))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Michi', b''.join(respuesta.streaming_content).decode())
+        self.assertEqual(len(self._archivos()), 2)
+        # Un token alterado no muestra el documento
+        self.assertEqual(self.client.get(reverse('ambpublico_documento', args=['invalido'])).status_code, 302)
+
+
+class CompresionTests(TestCase):
+    """
+    Verifica que el minificado no cambie el contenido protegido y que las respuestas se compriman según Accept-Encoding.
+    """
+
+    def test_minificar(self):
+        html = '<ul>\n    <li>Uno  dos</li>\n\n    <li title="a\n  b">3</li>\n</ul>\n<pre>\n  x\n    y</pre>\n  <textarea>\n  z</textarea>'
+        self.assertEqual(
+            compresion.minificar(html),
+            '<ul>\n<li>Uno  dos</li>\n<li title="a\n  b">3</li>\n</ul>\n<pre>\n  x\n    y</pre>\n<textarea>\n  z</textarea>',
+        )
+
+    def test_negociar(self):
+        self.assertEqual(compresion.negociar('gzip, deflate'), 'gzip')
+        self.assertIsNone(compresion.negociar('gzip;q=0, identity'))
+        self.assertIsNone(compresion.negociar(''))
+        self.assertEqual(compresion.negociar('*'), compresion.codificaciones()[0])
+
+    def test_middleware(self):
+        for i in range(30):
+            Cliente.objects.create(
+                rut=10000000 + i, nombre_cliente='Cliente {}'.format(i), direccion='Calle', telefono=900000000, email='c{}@ejemplo.cl'.format(i),
+            )
+        self.client.force_login(get_user_model().objects.create_superuser('administrador', password='clave-de-prueba'))
+        url = reverse('panel_cliente_listado')
+
+        sin_comprimir = self.client.get(url)
+        self.assertNotIn('Content-Encoding', sin_comprimir)
+        self.assertIn('<tbody>\n<tr>\n<td>10000000</td>', sin_comprimir.content.decode())
+
+        comprimida = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(comprimida['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', comprimida['Vary'])
+        self.assertTrue(comprimida['ETag'].startswith('W/'))
+        self.assertEqual(gzip.decompress(comprimida.content), sin_comprimir.content)
+        # El ETag débil sigue validando la página
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=comprimida['ETag']).status_code, 304)
+
+        # Las respuestas pequeñas no se comprimen
+        with self.settings(COMPRESION_MINIMO_BYTES=10 ** 7):
+            self.assertNotIn('Content-Encoding', self.client.get(url, HTTP_ACCEPT_ENCODING='gzip'))
+
+
+class CalendarioTests(TestCase):
+    """
+    Verifica la ventana de fechas del calendario de citas: validación, límites en la zona de la clínica y horas del horario.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.usuario = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        self.otro = get_user_model().objects.create_user('otro', password='clave-de-prueba')
+        self.manana = timezone.localdate() + datetime.timedelta(days=1)
+        HorarioVeterinario.objects.create(
+            usuario=self.usuario, dia_semana=self.manana.weekday(), hora_inicio=datetime.time(9), hora_fin=datetime.time(10), duracion=30,
+        )
+        self.url = reverse('panel_cita_calendario_datos')
+        self.ventana = {'desde': self.manana.isoformat(), 'hasta': (self.manana + datetime.timedelta(days=1)).isoformat()}
+
+    def _fecha(self, dia, hora):
+        return timezone.make_aware(datetime.datetime.combine(dia, hora), timezone.get_current_timezone())
+
+    def _citas(self, **parametros):
+        respuesta = self.client.get(self.url, dict(self.ventana, **parametros))
+        self.assertEqual(respuesta.status_code, 200)
+        return [
+            (datetime.datetime.fromisoformat(cita['fecha']).time(), cita['usuario'], cita['n_cita'] is not None)
+            for cita in respuesta.json()['citas']
+        ]
+
+    def test_permisos(self):
+        self.assertEqual(self.client.get(self.url, self.ventana).status_code, 401)
+        self.client.force_login(self.otro)
+        self.assertEqual(self.client.get(self.url, self.ventana).status_code, 403)
+
+    def test_parametros_invalidos(self):
+        self.client.force_login(self.usuario)
+        hoy = timezone.localdate()
+        for parametros in (
+            {},
+            {'desde': 'ayer', 'hasta': hoy.isoformat()},
+            {'desde': hoy.isoformat(), 'hasta': hoy.isoformat()},
+            {'desde': hoy.isoformat(), 'hasta': (hoy + datetime.timedelta(days=43)).isoformat()},
+            dict(self.ventana, usuario='x'),
+        ):
+            self.assertEqual(self.client.get(self.url, parametros).status_code, 400, parametros)
+        self.assertEqual(self.client.get(self.url, {'desde': hoy.isoformat(), 'hasta': (hoy + datetime.timedelta(days=42)).isoformat()}).status_code, 200)
+
+    def test_ventana_y_horas_del_horario(self):
+        siguiente = self.manana + datetime.timedelta(days=1)
+        # Una cita ocupa la hora de las 9 del horario; la de medianoche es el primer instante del día (incluido)
+        # y la del día siguiente a medianoche queda fuera de la ventana (excluida)
+        for fecha, usuario in ((self._fecha(self.manana, datetime.time(9)), self.usuario),
+                               (self._fecha(self.manana, datetime.time.min), self.otro),
+                               (self._fecha(siguiente, datetime.time.min), self.otro)):
+            Cita.objects.create(estado=EstadoCita.RESERVADA, usuario=usuario, fecha=fecha)
+
+        self.client.force_login(self.usuario)
+        self.assertEqual(self._citas(), [
+            (datetime.time.min, 'otro', True),
+            (datetime.time(9), 'administrador', True),
+            (datetime.time(9, 30), 'administrador', False),
+        ])
+        # Filtrado por veterinario
+        self.assertEqual(self._citas(usuario=self.otro.pk), [(datetime.time.min, 'otro', True)])
+        # Las horas que ya pasaron no se ofrecen
+        self.ventana = {'desde': timezone.localdate().isoformat(), 'hasta': self.manana.isoformat()}
+        HorarioVeterinario.objects.create(
+            usuario=self.otro, dia_semana=timezone.localdate().weekday(), hora_inicio=datetime.time(0), hora_fin=datetime.time(0, 30), duracion=30,
+        )
+        caches['default'].clear()
+        self.assertEqual(self._citas(usuario=self.otro.pk), [])
+
+
+class EstadosTests(TestCase):
+    """
+    Verifica que los estados se guarden como enteros y se muestren con el nombre de su enum.
+    """
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        self.cita = Cita.objects.create(estado=EstadoCita.RESERVADA, usuario=self.usuario, fecha=timezone.now())
+
+    def test_estado_entero(self):
+        cita = Cita.objects.get(pk=self.cita.pk)
+        self.assertEqual(cita.estado, 1)
+        self.assertEqual(cita.get_estado_display(), 'Reservada')
+        self.assertEqual(Cita.objects.filter(estado=EstadoCita.RESERVADA).count(), 1)
+        # Un valor fuera del enum no se puede guardar
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cita.objects.filter(pk=cita.pk).update(estado=9)
+
+    def test_filtros(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('panel_cita_listar'), {'estado': EstadoCita.RESERVADA})
+        self.assertContains(respuesta, '<td>Reservada</td>', html=True)
+        self.assertEqual(respuesta.context['filtros']['estado'], EstadoCita.RESERVADA)
+
+        hoy = timezone.localdate()
+        url = reverse('panel_cita_calendario_datos')
+        ventana = {'desde': hoy.isoformat(), 'hasta': (hoy + datetime.timedelta(days=1)).isoformat()}
+        self.assertEqual(self.client.get(url, dict(ventana, estado='x')).status_code, 400)
+        citas = self.client.get(url, dict(ventana, estado=EstadoCita.RESERVADA)).json()['citas']
+        self.assertEqual([(cita['estado'], cita['estado_display']) for cita in citas], [(1, 'Reservada')])
+
+    def test_filtro_disponible(self):
+        # estado=0 (DISPONIBLE) devuelve solo las horas libres del horario, no las reservadas
+        manana = timezone.localdate() + datetime.timedelta(days=1)
+        HorarioVeterinario.objects.create(
+            usuario=self.usuario, dia_semana=manana.weekday(), hora_inicio=datetime.time(9), hora_fin=datetime.time(10), duracion=30,
+        )
+        zona = timezone.get_current_timezone()
+        Cita.objects.create(
+            estado=EstadoCita.RESERVADA, usuario=self.usuario, fecha=timezone.make_aware(datetime.datetime.combine(manana, datetime.time(9)), zona),
+        )
+        self.client.force_login(self.usuario)
+        ventana = {'desde': manana.isoformat(), 'hasta': (manana + datetime.timedelta(days=1)).isoformat(), 'estado': EstadoCita.DISPONIBLE}
+        citas = self.client.get(reverse('panel_cita_calendario_datos'), ventana).json()['citas']
+        self.assertEqual(
+            [(datetime.datetime.fromisoformat(cita['fecha']).time(), cita['estado']) for cita in citas],
+            [(datetime.time(9, 30), EstadoCita.DISPONIBLE)],
+        )
+
+
+class InicioSesionTests(TransactionTestCase):
+    """
+    Verifica que el inicio de sesión verifique la contraseña una sola vez, el límite de intentos y el comando benchmark_login.
+    (TransactionTestCase: la ráfaga del comando usa otras conexiones desde varios hilos.)
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        get_user_model().objects.create_user('veterinario', password='clave-de-prueba')
+
+    def _verificaciones(self):
+        return mock.patch.object(AbstractBaseUser, 'check_password', autospec=True, side_effect=AbstractBaseUser.check_password)
+
+    @override_settings(LIMITES_TASA={})
+    def test_una_verificacion_de_contrasena(self):
+        with self._verificaciones() as verificar:
+            respuesta = self.client.post(reverse('panel_home'), {'username': 'veterinario', 'password': 'clave-de-prueba'})
+        self.assertRedirects(respuesta, reverse('panel_home'))
+        self.assertEqual(verificar.call_count, 1)
+        self.assertEqual(self.client.get(reverse('panel_home')).context['username'], 'veterinario')
+
+    @override_settings(LIMITES_TASA={'login': {'ip': (4, 1), 'usuario': (2, 1)}})
+    def test_limite_de_intentos(self):
+        url = reverse('panel_home')
+        # El formulario se puede ver siempre, solo se limitan los envíos
+        for i in range(4):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        # Por usuario, sin distinguir mayúsculas
+        for usuario in ('veterinario', 'Veterinario'):
+            self.assertEqual(self.client.post(url, {'username': usuario, 'password': 'incorrecta'}).status_code, 200)
+        with self._verificaciones() as verificar:
+            respuesta = self.client.post(url, {'username': 'VETERINARIO ', 'password': 'clave-de-prueba'})
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertIn('Retry-After', respuesta)
+        # El intento rechazado no llega a verificar la contraseña
+        verificar.assert_not_called()
+
+        # Por IP, aunque cambie el usuario (el intento rechazado por usuario también usó una ficha de la IP)
+        self.assertEqual(self.client.post(url, {'username': 'otro', 'password': 'incorrecta'}).status_code, 200)
+        self.assertEqual(self.client.post(url, {'username': 'otro2', 'password': 'incorrecta'}).status_code, 429)
+
+    def test_benchmark(self):
+        salida = StringIO()
+        call_command('benchmark_login', inicios=1, duracion=0.2, tasa=20, proporcion_maxima=10, stdout=salida)
+        self.assertIn("Flujo actual (una verificación)", salida.getvalue())
+        self.assertIn("Ráfaga con límite", salida.getvalue())
+        # El usuario temporal se borra
+        self.assertEqual(list(get_user_model().objects.values_list('username', flat=True)), ['veterinario'])
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_login', inicios=1, duracion=0.1, tasa=20, proporcion_maxima=0, stdout=StringIO())
+
+
+@override_settings(LIMITES_TASA={})
+class AuditoriaTests(TransactionTestCase):
+    """
+    Verifica el registro de auditoría: un registro por cambio confirmado, con los campos modificados,
+    guardados al terminar la petición con un solo INSERT.
+    """
+
+    def setUp(self):
+        self.administrador = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        self.client.force_login(self.administrador)
+
+    def _registros(self):
+        return list(RegistroAuditoria.objects.order_by('pk').values_list('modelo', 'objeto_id', 'accion', 'cambios', 'usuario_id'))
+
+    def test_crear_editar_eliminar(self):
+        datos = {'nombre_producto': 'Vacuna', 'stock_disponible': 5, 'precio': 1000}
+        self.client.post(reverse('panel_producto_agregar'), datos)
+        producto = Producto.objects.get()
+        [(modelo, objeto_id, accion, cambios, usuario_id)] = self._registros()
+        self.assertEqual((modelo, objeto_id, accion, usuario_id), ('paneltrabajador.producto', str(producto.pk), RegistroAuditoria.ACCION_CREAR, self.administrador.pk))
+        self.assertEqual(cambios['precio'], [None, 1000])
+
+        # Solo los campos modificados; guardar sin cambios no genera registro
+        self.client.post(reverse('panel_producto_editar', kwargs={'id_producto': producto.pk}), dict(datos, precio=1500))
+        self.client.post(reverse('panel_producto_editar', kwargs={'id_producto': producto.pk}), dict(datos, precio=1500))
+        self.client.post(reverse('panel_producto_eliminar', kwargs={'id_producto': producto.pk}))
+        registros = self._registros()
+        self.assertEqual([registro[2] for registro in registros], [RegistroAuditoria.ACCION_CREAR, RegistroAuditoria.ACCION_EDITAR, RegistroAuditoria.ACCION_ELIMINAR])
+        self.assertEqual(registros[1][3], {'precio': [1000, 1500]})
+        self.assertEqual(registros[2][3]['nombre_producto'], ['Vacuna', None])
+
+        # Fuera de una petición no se registra nada
+        Producto.objects.create(nombre_producto='Sin petición', stock_disponible=1, precio=1)
+        self.assertEqual(len(self._registros()), 3)
+
+    def test_acciones_masivas(self):
+        crear_datos(0, 3)
+        citas = list(Cita.objects.filter(estado=EstadoCita.RESERVADA).order_by('pk').values_list('pk', flat=True))
+        datos = {'accion': 'estado', 'estado': EstadoCita.CANCELADA, 'seleccion': citas, 'confirmar': '1'}
+
+        # Una acción revertida no deja registros
+        with mock.patch('paneltrabajador.views.acciones.versiones.incrementar', side_effect=IntegrityError):
+            self.client.post(reverse('panel_cita_acciones'), datos)
+        self.assertEqual(self._registros(), [])
+
+        # Un registro por cita, guardados juntos al terminar la petición
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(reverse('panel_cita_acciones'), datos)
+        inserciones = [consulta for consulta in consultas if consulta['sql'].startswith('INSERT INTO "{}"'.format(RegistroAuditoria._meta.db_table))]
+        self.assertEqual(len(inserciones), 1)
+        self.assertEqual(
+            [(objeto_id, accion, cambios) for modelo, objeto_id, accion, cambios, usuario_id in self._registros()],
+            [(str(pk), RegistroAuditoria.ACCION_EDITAR, {'estado': [EstadoCita.RESERVADA, EstadoCita.CANCELADA]}) for pk in citas],
+        )
+
+    def test_listado(self):
+        producto = Producto.objects.create(nombre_producto='Vacuna', stock_disponible=5, precio=1000)
+        for precio in (1100, 1200):
+            self.client.post(reverse('panel_producto_editar', kwargs={'id_producto': producto.pk}), {'nombre_producto': 'Vacuna', 'stock_disponible': 5, 'precio': precio})
+        self.client.post(reverse('panel_producto_agregar'), {'nombre_producto': 'Otro', 'stock_disponible': 1, 'precio': 1})
+
+        url = reverse('panel_auditoria_listar')
+        respuesta = self.client.get(url, {'modelo': 'paneltrabajador.producto', 'objeto': producto.pk})
+        self.assertEqual([registro.cambios['precio'][1] for registro in respuesta.context['pagina']], [1200, 1100])
+        self.assertEqual(len(self.client.get(url, {'usuario': self.administrador.pk}).context['pagina']), 3)
+        # El ID del objeto se ignora sin un modelo válido
+        self.assertEqual(len(self.client.get(url, {'modelo': 'auth.user', 'objeto': producto.pk}).context['pagina']), 3)
+
+        self.client.force_login(get_user_model().objects.create_user('recepcion', password='clave-de-prueba'))
+        self.assertRedirects(self.client.get(url), reverse('panel_home'), fetch_redirect_response=False)
+
+
+@override_settings(SUCURSALES=settings.SUCURSALES_PRUEBA, LIMITES_TASA={})
+class SucursalesTests(TransactionTestCase):
+    """
+    Verifica, con una base SQLite por sucursal (SUCURSALES_PRUEBA), qué sucursal usa cada petición y que cada sucursal
+    escriba sus datos, sus contadores de versión y su auditoría en su propia base de datos.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        self.administrador = get_user_model().objects.create_superuser('administrador', password='clave-de-prueba')
+        # Usuario del panel asignado a la sucursal norte
+        self.de_norte = get_user_model().objects.create_superuser('norte', password='clave-de-prueba')
+        SucursalUsuario.objects.create(usuario=self.de_norte, sucursal='norte')
+
+    def test_bases_datos(self):
+        with sucursales.usar('centro'):
+            self.assertEqual(versiones.base_datos('paneltrabajador.cita'), 'prueba_centro')
+            self.assertEqual(router.db_for_write(RegistroAuditoria), 'prueba_centro')
+            # El inventario y los usuarios son compartidos, sus contadores quedan en "default"
+            self.assertEqual(versiones.base_datos('paneltrabajador.producto'), 'default')
+            self.assertEqual(versiones.base_datos(versiones.AUTH), 'default')
+
+    def test_prefijo_no_cambia_la_sucursal_del_panel(self):
+        self.client.force_login(self.de_norte)
+        # El prefijo de otra sucursal no se acepta en las rutas del panel ni del admin
+        for ruta in ('/s/centro/panel/citas/', '/s/centro/panel', '/s/centro/admin/'):
+            self.assertEqual(self.client.get(ruta).status_code, 404, ruta)
+        self.assertNotIn('sucursal', self.client.session)
+        self.assertEqual(self.client.get('/panel/citas/').wsgi_request.sucursal, 'norte')
+
+        # En las páginas públicas sí
+        respuesta = self.client.get('/s/centro/reservahora/')
+        self.assertEqual((respuesta.status_code, respuesta.wsgi_request.sucursal), (200, 'centro'))
+        self.assertEqual(self.client.session['sucursal'], 'centro')
+        # y el usuario del panel sigue en su sucursal
+        self.assertEqual(self.client.get('/panel/citas/').wsgi_request.sucursal, 'norte')
+
+    def _cliente(self, rut):
+        return Cliente.objects.create(rut=rut, nombre_cliente='Cliente {}'.format(rut), direccion='Calle', telefono=900000000, email='c@ejemplo.cl')
+
+    def _ruts(self, alias):
+        return sorted(Cliente.objects.using(alias).values_list('rut', flat=True))
+
+    def test_lecturas_y_escrituras_en_la_sucursal_activa(self):
+        with sucursales.usar('centro'):
+            self._cliente(1)
+        with sucursales.usar('norte'):
+            self._cliente(2)
+            # La sucursal activa no ve los datos de la otra
+            self.assertFalse(Cliente.objects.filter(rut=1).exists())
+        self.assertEqual((self._ruts('prueba_centro'), self._ruts('prueba_norte'), self._ruts('default')), ([1], [2], []))
+
+        # Una petición del panel escribe en la sucursal del usuario
+        self.client.force_login(self.de_norte)
+        respuesta = self.client.post(
+            reverse('panel_api_coleccion', kwargs={'recurso': 'clientes'}),
+            json.dumps({'rut': 3, 'nombre_cliente': 'Cliente 3', 'direccion': 'Calle', 'telefono': 900000000, 'email': 'c@ejemplo.cl'}),
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual((self._ruts('prueba_centro'), self._ruts('prueba_norte')), ([1], [2, 3]))
+
+    def test_versiones_y_auditoria_en_la_base_de_la_sucursal(self):
+        with sucursales.usar('norte'):
+            self._cliente(2)
+        producto = Producto.objects.create(nombre_producto='Alimento', stock_disponible=5, precio=1000)
+
+        self.client.force_login(self.de_norte)
+        respuesta = self.client.post(
+            reverse('panel_api_coleccion', kwargs={'recurso': 'facturas'}),
+            json.dumps({'cliente': 2, 'total_pagar': 5000, 'detalle': 'Consulta', 'estado_pago': EstadoPago.PENDIENTE}),
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        detalle = reverse('panel_api_detalle', kwargs={'recurso': 'productos', 'pk': producto.pk})
+        self.assertEqual(self.client.patch(detalle, json.dumps({'stock_disponible': 4}), content_type='application/json').status_code, 200)
+
+        def contadores(alias):
+            return set(VersionModelo.objects.using(alias).values_list('modelo', flat=True))
+
+        # Los contadores y la auditoría de la factura quedan en la sucursal, los del inventario en "default"
+        self.assertIn('paneltrabajador.factura', contadores('prueba_norte'))
+        self.assertNotIn('paneltrabajador.factura', contadores('default') | contadores('prueba_centro'))
+        self.assertIn('paneltrabajador.producto', contadores('default'))
+        self.assertNotIn('paneltrabajador.producto', contadores('prueba_norte'))
+
+        # La auditoría de la petición queda en la sucursal del usuario (el inventario, sin código de sucursal)
+        auditoria_norte = list(RegistroAuditoria.objects.using('prueba_norte').order_by('pk').values_list('modelo', 'sucursal'))
+        self.assertEqual(auditoria_norte, [('paneltrabajador.factura', 'norte'), ('paneltrabajador.producto', '')])
+        self.assertFalse(RegistroAuditoria.objects.using('default').exists())
+        self.assertFalse(RegistroAuditoria.objects.using('prueba_centro').exists())
+
+    def test_usuarios_replicados(self):
+        usuarios = get_user_model().objects
+        pks = sorted(usuarios.using('default').values_list('pk', flat=True))
+        # Los usuarios creados se copian en cada sucursal, con la misma llave primaria
+        for alias in ('prueba_centro', 'prueba_norte'):
+            self.assertEqual(sorted(usuarios.using(alias).values_list('pk', flat=True)), pks)
+
+        self.administrador.first_name = 'Administradora'
+        self.administrador.save()
+        self.assertEqual(usuarios.using('prueba_norte').get(pk=self.administrador.pk).first_name, 'Administradora')
+
+        # El comando repara una sucursal desactualizada: copia los que faltan y elimina los que sobran
+        usuarios.using('prueba_centro').filter(pk=self.de_norte.pk).delete()
+        usuarios.db_manager('prueba_norte').create_user('sobrante', password='clave-de-prueba')
+        call_command('sincronizar_usuarios', stdout=open(os.devnull, 'w'))
+        for alias in ('prueba_centro', 'prueba_norte'):
+            self.assertEqual(sorted(usuarios.using(alias).values_list('pk', flat=True)), pks)
+
+        self.de_norte.delete()
+        self.assertFalse(usuarios.using('prueba_centro').filter(username='norte').exists())
+
+    def test_reporte_de_todas_las_sucursales(self):
+        with sucursales.usar('centro'):
+            self._cliente(1)
+            self._cliente(2)
+        with sucursales.usar('norte'):
+            self._cliente(3)
+
+        # Cada sucursal se consulta en su propio hilo y su propia base de datos
+        self.assertEqual(sucursales.en_todas(Cliente.objects.count), {'centro': 2, 'norte': 1})
+
+        self.client.force_login(self.administrador)
+        respuesta = self.client.get(reverse('panel_reporte_sucursales'))
+        self.assertEqual([(fila['nombre'], fila['clientes']) for fila in respuesta.context['filas']], [('Sucursal Centro', 2), ('Sucursal Norte', 1)])
+        self.assertEqual(respuesta.context['total']['clientes'], 3)
+
+        # Un usuario de una sola sucursal no ve las demás
+        self.client.force_login(self.de_norte)
+        self.assertRedirects(self.client.get(reverse('panel_reporte_sucursales')), reverse('panel_home'))
 
-# Create your tests here.
@@ -0,0 +1,183 @@
+import hashlib
+import threading
+from collections import defaultdict
+from functools import wraps
+
+from django.contrib import messages
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+# Control de versiones por modelo para las peticiones condicionales (ETag / Last-Modified).
+# Cada modelo tiene un contador en VersionModelo que se incrementa con las señales post_save
+# y post_delete (ver paneltrabajador.signals). Las vistas decoradas con @condicional responden
+# 304 si ninguno de sus modelos cambió, con una sola consulta a la base de datos.
+# Con sucursales, el contador de un modelo de sucursal se guarda en la base de la sucursal activa
+# (así cada sucursal escribe solo en su propia base) y el de los demás modelos (inventario, usuarios)
+# en "default"; una página que depende de ambos hace una consulta a cada base.
+
+# Etiqueta usada para los cambios de usuarios, grupos y permisos (afectan el menú y los formularios)
+AUTH = 'auth.user'
+
+_pendientes = threading.local()
+
+
+def etiqueta(modelo):
+    """
+    Devuelve la etiqueta de un modelo ("app.modelo"). Acepta también la etiqueta directamente.
+    """
+    if isinstance(modelo, str):
+        return modelo
+    return modelo._meta.label_lower
+
+
+def base_datos(nombre):
+    """
+    Alias de la base de datos donde se guarda el contador de un modelo (por su etiqueta).
+    """
+    from paneltrabajador import sucursales
+
+    if nombre in sucursales.MODELOS_SUCURSAL:
+        return sucursales.base_datos(sucursales.actual())
+    return 'default'
+
+
+def incrementar(*modelos):
+    """
+    Incrementa inmediatamente la versión de los modelos indicados.
+
+    Debe llamarse después de las escrituras que no envían señales
+    (QuerySet.update, bulk_create, bulk_update). También incrementa
+    las generaciones de la cache del panel (ver paneltrabajador.cache).
+    """
+    from paneltrabajador import cache
+    from paneltrabajador.models import VersionModelo
+
+    ahora = timezone.now()
+    nombres = {etiqueta(modelo) for modelo in modelos}
+    for nombre in nombres:
+        contadores = VersionModelo.objects.using(base_datos(nombre))
+        actualizados = contadores.filter(modelo=nombre).update(version=F('version') + 1, actualizado_en=ahora)
+        if not actualizados:
+            version, creado = contadores.get_or_create(modelo=nombre, defaults={'version': 1, 'actualizado_en': ahora})
+            if not creado:
+                contadores.filter(modelo=nombre).update(version=F('version') + 1, actualizado_en=ahora)
+
+    # Los datos en cache que dependen de estos modelos quedan obsoletos
+    cache.incrementar_generacion(*nombres)
+
+
+def programar_incremento(modelo, using=None):
+    """
+    Incrementa la versión del modelo cuando se confirme la transacción actual.
+
+    Varios cambios dentro de una misma transacción (por ejemplo un borrado en lote)
+    se agrupan en un solo incremento. Fuera de una transacción se incrementa de inmediato.
+    """
+    nombre = etiqueta(modelo)
+    conexion = transaction.get_connection(using)
+
+    if not conexion.in_atomic_block:
+        incrementar(nombre)
+        return
+
+    # Revisamos si ya hay un incremento pendiente para este modelo en la transacción.
+    # Si la transacción (o el savepoint) se revirtió, Django descartó el callback y se vuelve a programar.
+    pendientes = getattr(_pendientes, 'callbacks', None)
+    if pendientes is None:
+        pendientes = _pendientes.callbacks = {}
+
+    callback = pendientes.get((conexion.alias, nombre))
+    if callback is not None and any(entrada[1] is callback for entrada in conexion.run_on_commit):
+        return
+
+    def aplicar():
+        pendientes.pop((conexion.alias, nombre), None)
+        incrementar(nombre)
+
+    pendientes[(conexion.alias, nombre)] = aplicar
+    transaction.on_commit(aplicar, using=using)
+
+
+def obtener(*modelos):
+    """
+    Obtiene la versión y la fecha de cambio de los modelos, con una consulta por base de datos.
+
+    Returns:
+        list: Tuplas (etiqueta, version, actualizado_en) ordenadas por etiqueta.
+    """
+    from paneltrabajador.models import VersionModelo
+
+    nombres = sorted({etiqueta(modelo) for modelo in modelos})
+    por_base = defaultdict(list)
+    for nombre in nombres:
+        por_base[base_datos(nombre)].append(nombre)
+
+    versiones = {}
+    for using, grupo in por_base.items():
+        filas = VersionModelo.objects.using(using).filter(modelo__in=grupo).values_list('modelo', 'version', 'actualizado_en')
+        versiones.update((fila[0], fila) for fila in filas)
+    return [versiones.get(nombre, (nombre, 0, None)) for nombre in nombres]
+
+
+def _validadores(request, modelos):
+    """
+    Calcula el ETag y la fecha de última modificación de una página del panel.
+
+    Devuelve (None, None) cuando la página no se puede validar: usuario no autenticado,
+    métodos distintos de GET/HEAD o mensajes pendientes de mostrar.
+    """
+    if request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+        return None, None
+
+    # Los mensajes de Django se muestran una sola vez, la página debe renderizarse
+    if len(messages.get_messages(request)):
+        return None, None
+
+    cache = getattr(request, '_validadores_panel', None)
+    if cache is not None:
+        return cache
+
+    versiones = obtener(AUTH, *modelos)
+
+    # La página depende del usuario, su sesión, el token CSRF incluido en los formularios
+    # y la sucursal (cada sucursal tiene sus propios contadores, que pueden coincidir con los de otra).
+    # Cada contador se identifica con su base de datos
+    partes = [str(request.user.pk), request.session.session_key or '', request.META.get('CSRF_COOKIE', ''), getattr(request, 'sucursal', None) or '']
+    partes += ['{}@{}:{}'.format(nombre, base_datos(nombre), version) for nombre, version, actualizado_en in versiones]
+    etag = '"{}"'.format(hashlib.sha1('|'.join(partes).encode()).hexdigest())
+
+    fechas = [actualizado_en for nombre, version, actualizado_en in versiones if actualizado_en]
+    ultima = max(fechas) if fechas else None
+
+    request._validadores_panel = (etag, ultima)
+    return request._validadores_panel
+
+
+def condicional(*modelos):
+    """
+    Decorador para las vistas del panel que dependen de los modelos indicados.
+
+    Agrega ETag y Last-Modified a la respuesta y responde 304 si el navegador ya tiene
+    la versión actual (If-None-Match / If-Modified-Since). Los cambios de usuarios
+    y permisos siempre se consideran.
+
+    Args:
+        *modelos: Modelos (o etiquetas) de los que depende la página.
+    """
+    def decorador(funcion):
+        @condition(
+            etag_func=lambda request, *args, **kwargs: _validadores(request, modelos)[0],
+            last_modified_func=lambda request, *args, **kwargs: _validadores(request, modelos)[1],
+        )
+        @wraps(funcion)
+        def envoltura(request, *args, **kwargs):
+            respuesta = funcion(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and request.user.is_authenticated:
+                # El navegador puede guardar la página, pero debe validarla siempre
+                patch_cache_control(respuesta, private=True, no_cache=True)
+            return respuesta
+        return envoltura
+    return decorador
@@ -1,8 +1,17 @@
 from .home import home, cerrar_sesion
-from .cita import cita_agregar, cita_editar, cita_eliminar, cita_listar
+from .api import api_coleccion, api_detalle, api_factura_lineas, api_masivo
+from .acciones import cita_acciones, factura_acciones, producto_acciones
+from .auditoria import auditoria_listar
+from .cache import cache_estadisticas
+from .autocompletar import autocompletar_clientes, autocompletar_mascotas, autocompletar_productos, autocompletar_usuarios
+from .cita import cita_agregar, cita_calendario, cita_calendario_datos, cita_editar, cita_eliminar, cita_filas, cita_listar
 from .cliente import cliente_crear, cliente_editar, cliente_eliminar, cliente_listado
+from .documentos import factura_imprimir, mascota_imprimir
+from .historico import historico_citas, historico_facturas
 from .factura import factura_agregar, factura_editar, factura_eliminar, factura_listar
-from .mascota import mascota_agregar, mascota_editar, mascota_eliminar, mascota_listar
+from .perfiles import perfil_descargar, perfil_detalle, perfil_listar
+from .mascota import mascota_agregar, mascota_editar, mascota_eliminar, mascota_filas, mascota_listar
+from .sucursales import reporte_sucursales, sucursal_cambiar
 from .producto import producto_agregar, producto_editar, producto_eliminar, producto_listar
 from .usuarios import usuario_agregar, usuario_editar, usuario_eliminar, usuario_listar, usuario_newpassword
 
@@ -0,0 +1,233 @@
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, router, transaction
+from django.shortcuts import redirect, render
+from paneltrabajador import auditoria, espera, facturacion, versiones
+from paneltrabajador.models import Cita, EstadoCita, EstadoPago, Factura, Producto
+
+# Acciones masivas de los listados del panel.
+# Cada acción se ejecuta como una sola consulta UPDATE ... WHERE pk IN (...) o DELETE,
+# dentro de una transacción y después de una página de confirmación.
+
+# Cantidad máxima de filas por acción
+MAXIMO_SELECCION = 1000
+
+
+def _seleccion(request):
+    """
+    Obtiene las llaves primarias seleccionadas en el listado.
+
+    :return: Lista de enteros sin repetir, o None si hay valores inválidos.
+    """
+    valores = request.POST.getlist('seleccion')
+    if not all(valor.isdigit() for valor in valores):
+        return None
+    return sorted({int(valor) for valor in valores})
+
+
+def _parametro_estado(request):
+    estado = request.POST.get('estado', '')
+    if not estado.isdigit() or int(estado) not in EstadoCita.values:
+        return None, None
+    estado = EstadoCita(int(estado))
+    return estado, 'Cambiar el estado a "{}"'.format(estado.label)
+
+
+def _cambiar_estado(citas, estado):
+    # Las citas que quedan disponibles o canceladas se ofrecen a la lista de espera al confirmar la transacción
+    if estado in espera.ESTADOS_LIBERADOS:
+        espera.liberadas(citas.exclude(estado=estado).values_list('pk', flat=True))
+    return citas.update(estado=estado)
+
+
+def _parametro_usuario(request):
+    usuario_id = request.POST.get('usuario', '')
+    if not usuario_id.isdigit():
+        return None, None
+    usuario = get_user_model().objects.filter(id=int(usuario_id), is_active=True).only('id', 'username').first()
+    if usuario is None:
+        return None, None
+    return usuario.id, 'Reasignar al usuario "{}"'.format(usuario.username)
+
+
+# Definición de las acciones por listado:
+# permiso requerido, descripción, parámetro opcional (función que lo valida), la operación sobre el queryset
+# y el campo que edita (para el registro de auditoría, ya que QuerySet.update no envía señales)
+ACCIONES = {
+    'citas': {
+        'modelo': Cita,
+        'goback': 'panel_cita_listar',
+        'acciones': {
+            'estado': {
+                'permiso': 'paneltrabajador.change_cita',
+                'parametro': _parametro_estado,
+                'operacion': _cambiar_estado,
+                'campo': 'estado',
+            },
+            'usuario': {
+                'permiso': 'paneltrabajador.change_cita',
+                'parametro': _parametro_usuario,
+                'operacion': lambda citas, usuario_id: citas.update(usuario_id=usuario_id),
+                'campo': 'usuario_id',
+            },
+            'eliminar': {
+                'permiso': 'paneltrabajador.delete_cita',
+                'descripcion': 'Eliminar',
+                'operacion': lambda citas, parametro: citas.delete()[0],
+            },
+        },
+    },
+    'facturas': {
+        'modelo': Factura,
+        'goback': 'panel_factura_listar',
+        'acciones': {
+            'pagada': {
+                'permiso': 'paneltrabajador.change_factura',
+                'descripcion': 'Marcar como pagadas',
+                'operacion': lambda facturas, parametro: facturas.update(estado_pago=EstadoPago.PAGADA),
+                'campo': 'estado_pago',
+            },
+            'eliminar': {
+                'permiso': 'paneltrabajador.delete_factura',
+                'descripcion': 'Eliminar',
+                'operacion': lambda facturas, parametro: _eliminar_facturas(facturas),
+            },
+        },
+    },
+    'productos': {
+        'modelo': Producto,
+        'goback': 'panel_producto_listar',
+        'acciones': {
+            'eliminar': {
+                'permiso': 'paneltrabajador.delete_producto',
+                'descripcion': 'Eliminar',
+                'operacion': lambda productos, parametro: productos.delete()[0],
+            },
+        },
+    },
+}
+
+
+def _eliminar_facturas(facturas):
+    # Las facturas eliminadas desde el panel devuelven al stock los productos de sus líneas
+    with transaction.atomic(using=router.db_for_write(Producto)):
+        facturacion.devolver_stock(facturas)
+        # Cantidad de facturas eliminadas, sin contar sus líneas
+        return facturas.delete()[1].get(Factura._meta.label, 0)
+
+
+def _accion_masiva(request, listado):
+    """
+    Procesa una acción masiva enviada desde un listado.
+
+    El primer envío muestra un resumen para confirmar. El segundo (con "confirmar")
+    ejecuta la acción en una transacción y redirige al listado.
+
+    :param request: Objeto HttpRequest.
+    :param listado: Llave del listado en ACCIONES.
+    :return: HttpResponse con la confirmación o una redirección al listado.
+    """
+    config = ACCIONES[listado]
+    goback = config['goback']
+
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # Solamente se aceptan envíos del formulario del listado
+    if request.method != 'POST':
+        return redirect(goback)
+
+    accion = config['acciones'].get(request.POST.get('accion'))
+    if accion is None:
+        messages.error(request, "Debe seleccionar una acción válida.")
+        return redirect(goback)
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    if not request.user.has_perm(accion['permiso']):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    seleccion = _seleccion(request)
+    if not seleccion:
+        messages.error(request, "Debe seleccionar al menos un elemento.")
+        return redirect(goback)
+    if len(seleccion) > MAXIMO_SELECCION:
+        messages.error(request, "Puede seleccionar como máximo {} elementos.".format(MAXIMO_SELECCION))
+        return redirect(goback)
+
+    # Validamos el parámetro de la acción (nuevo estado, usuario, etc.)
+    parametro = None
+    descripcion = accion.get('descripcion')
+    if 'parametro' in accion:
+        parametro, descripcion = accion['parametro'](request)
+        if parametro is None:
+            messages.error(request, "El valor seleccionado para la acción no es válido.")
+            return redirect(goback)
+
+    modelo = config['modelo']
+    queryset = modelo.objects.filter(pk__in=seleccion)
+
+    # El usuario confirmó, ejecutamos la acción en una sola consulta
+    if request.POST.get('confirmar'):
+        campo = accion.get('campo')
+        using = router.db_for_write(modelo)
+        try:
+            with transaction.atomic(using=using):
+                if campo and auditoria.activa():
+                    anteriores = {pk: {campo: valor} for pk, valor in queryset.values_list('pk', campo)}
+                cantidad = accion['operacion'](queryset, parametro)
+                # QuerySet.update no envía señales, actualizamos la versión del modelo
+                # y el registro de auditoría a mano
+                versiones.incrementar(modelo)
+                if campo and auditoria.activa():
+                    actuales = modelo._base_manager.filter(pk__in=anteriores).values_list('pk', campo)
+                    auditoria.registrar_masivo(modelo, anteriores, {pk: {campo: valor} for pk, valor in actuales}, using)
+        except IntegrityError:
+            # Por ejemplo, reasignar o reactivar una cita a una hora que el veterinario ya tiene ocupada
+            messages.error(request, "No se realizó la acción: entra en conflicto con otros registros (por ejemplo, el veterinario ya tiene una cita a esa hora).")
+            return redirect(goback)
+        messages.success(request, "{}: {} {} afectados.".format(descripcion, cantidad, modelo._meta.verbose_name_plural))
+        return redirect(goback)
+
+    # Mostramos el resumen antes de ejecutar
+    contexto = {
+        'titulo': 'Confirmar acción masiva',
+        'descripcion': descripcion,
+        'cantidad': queryset.count(),
+        'modelo': modelo._meta.verbose_name_plural,
+        'seleccion': seleccion,
+        'datos': {campo: request.POST.get(campo) for campo in ('accion', 'estado', 'usuario') if request.POST.get(campo)},
+        'goback': goback,
+    }
+    return render(request, 'paneltrabajador/acciones_confirmar.html', contexto)
+
+
+def cita_acciones(request):
+    """
+    Acciones masivas sobre las citas seleccionadas: cambiar estado, reasignar usuario o eliminar.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con la confirmación o una redirección al listado.
+    """
+    return _accion_masiva(request, 'citas')
+
+
+def factura_acciones(request):
+    """
+    Acciones masivas sobre las facturas seleccionadas: marcar como pagadas o eliminar.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con la confirmación o una redirección al listado.
+    """
+    return _accion_masiva(request, 'facturas')
+
+
+def producto_acciones(request):
+    """
+    Acciones masivas sobre los productos seleccionados: eliminar.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con la confirmación o una redirección al listado.
+    """
+    return _accion_masiva(request, 'productos')
@@ -0,0 +1,487 @@
+import base64
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, router, transaction
+from django.forms.models import model_to_dict
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from paneltrabajador import auditoria, espera, facturacion, versiones
+from paneltrabajador.forms import CitaForm, ClienteForm, FacturaForm, MascotaForm, ProductoForm
+from paneltrabajador.models import Cita, Cliente, EstadoCita, Factura, FacturaLinea, Mascota, Producto
+
+# API JSON (versión 1) para las entidades del panel.
+# Usa la misma sesión y los mismos permisos (has_perm) que las vistas HTML.
+# Las lecturas llevan un ETag calculado con las versiones de los modelos (ver paneltrabajador.versiones):
+# si el cliente ya tiene la versión actual se responde 304 sin consultar ni serializar los datos.
+
+# Recursos expuestos: nombre en la URL -> modelo y formulario usado para validar las escrituras
+RECURSOS = {
+    'clientes': {'modelo': Cliente, 'form': ClienteForm},
+    'mascotas': {'modelo': Mascota, 'form': MascotaForm},
+    'citas': {'modelo': Cita, 'form': CitaForm},
+    'facturas': {'modelo': Factura, 'form': FacturaForm},
+    'productos': {'modelo': Producto, 'form': ProductoForm},
+}
+
+# Acción de permiso de Django según el método HTTP
+PERMISO_METODO = {
+    'GET': 'view',
+    'HEAD': 'view',
+    'POST': 'add',
+    'PUT': 'change',
+    'PATCH': 'change',
+    'DELETE': 'delete',
+}
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 500
+
+
+def _error(mensaje, status, **extra):
+    return JsonResponse({'error': mensaje, **extra}, status=status)
+
+
+def _verificar_acceso(request, recurso):
+    """
+    Verifica que el recurso exista, que el usuario esté autenticado y que tenga el permiso
+    correspondiente al método HTTP.
+
+    Returns:
+        tuple: (configuración del recurso, respuesta de error o None).
+    """
+    config = RECURSOS.get(recurso)
+    if config is None:
+        return None, _error("Recurso no encontrado.", 404)
+
+    if not request.user.is_authenticated:
+        return None, _error("Debe iniciar sesión.", 401)
+
+    accion = PERMISO_METODO.get(request.method)
+    if accion is None:
+        return None, _error("Método no permitido.", 405)
+
+    permiso = 'paneltrabajador.{}_{}'.format(accion, config['modelo']._meta.model_name)
+    if not request.user.has_perm(permiso):
+        return None, _error("No tiene los permisos para realizar esto.", 403)
+
+    return config, None
+
+
+def _campos(modelo, request):
+    """
+    Obtiene los campos a serializar a partir del parámetro ?fields= (sparse fieldsets).
+    La llave primaria siempre se incluye.
+
+    Returns:
+        tuple: (lista de campos, error o None).
+    """
+    disponibles = [campo.name for campo in modelo._meta.concrete_fields]
+    pk = modelo._meta.pk.name
+
+    solicitados = request.GET.get('fields')
+    if not solicitados:
+        return disponibles, None
+
+    campos = [campo.strip() for campo in solicitados.split(',') if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in disponibles]
+    if invalidos:
+        return None, _error("Campos inválidos.", 400, campos=invalidos, disponibles=disponibles)
+
+    if pk not in campos:
+        campos.insert(0, pk)
+    return campos, None
+
+
+def _codificar_cursor(pk):
+    return base64.urlsafe_b64encode(json.dumps({'pk': pk}).encode()).decode()
+
+
+def _decodificar_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))['pk']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _leer_json(request):
+    try:
+        return json.loads(request.body or b'null'), None
+    except ValueError:
+        return None, _error("El cuerpo de la petición no es JSON válido.", 400)
+
+
+def _etag(request, *modelos):
+    """
+    ETag de una lectura, calculado antes de consultar los datos: las versiones de los modelos
+    de los que depende la respuesta (una consulta por base de datos), el usuario, la sucursal
+    y la URL completa (campos, límite y cursor).
+    """
+    filas = versiones.obtener(versiones.AUTH, *modelos)
+    partes = [str(request.user.pk), getattr(request, 'sucursal', None) or '', request.get_full_path()]
+    partes += ['{}@{}:{}'.format(nombre, versiones.base_datos(nombre), version) for nombre, version, actualizado_en in filas]
+    return '"{}"'.format(hashlib.sha1('|'.join(partes).encode()).hexdigest())
+
+
+def _cabeceras_cache(respuesta, etag):
+    respuesta['ETag'] = etag
+    # Las respuestas dependen del usuario, así que solo se pueden guardar en el navegador
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    patch_vary_headers(respuesta, ('Cookie',))
+    return respuesta
+
+
+def _no_modificado(request, etag):
+    """
+    Respuesta 304 sin cuerpo si el cliente ya tiene esta versión (If-None-Match), o None.
+    """
+    respuesta = get_conditional_response(request, etag=etag)
+    if respuesta is None:
+        return None
+    return _cabeceras_cache(respuesta, etag)
+
+
+def _respuesta_json(datos, etag):
+    return _cabeceras_cache(JsonResponse(datos, safe=False), etag)
+
+
+def _serializar(instancia, campos):
+    datos = model_to_dict(instancia, fields=campos)
+    # model_to_dict omite los campos no editables (AutoField), los agregamos
+    for campo in campos:
+        if campo not in datos:
+            datos[campo] = getattr(instancia, instancia._meta.get_field(campo).attname)
+    return datos
+
+
+def _formulario(config, datos, instancia=None):
+    """
+    Construye el formulario del recurso. En una edición los datos enviados se combinan
+    con los actuales, así PATCH solo necesita los campos que cambian.
+    """
+    if instancia is not None:
+        actuales = model_to_dict(instancia)
+        actuales.update(datos)
+        datos = actuales
+    return config['form'](datos, instance=instancia)
+
+
+def api_coleccion(request, recurso):
+    """
+    Lista (GET) o crea (POST) objetos de un recurso.
+
+    GET acepta ?fields=campo1,campo2, ?limite=N y ?cursor=... para la paginación por cursor.
+    La respuesta incluye "siguiente", el cursor de la siguiente página o null.
+
+    :param request: Objeto HttpRequest.
+    :param recurso: Nombre del recurso (clientes, mascotas, citas, facturas o productos).
+    :return: JsonResponse con el listado o el objeto creado.
+    """
+    config, error = _verificar_acceso(request, recurso)
+    if error:
+        return error
+    modelo = config['modelo']
+
+    if request.method == 'POST':
+        datos, error = _leer_json(request)
+        if error:
+            return error
+        if not isinstance(datos, dict):
+            return _error("Se esperaba un objeto JSON.", 400)
+
+        form = _formulario(config, datos)
+        if not form.is_valid():
+            return _error("Datos inválidos.", 400, errores=form.errors.get_json_data())
+        instancia = form.save()
+        return JsonResponse(_serializar(instancia, [campo.name for campo in modelo._meta.concrete_fields]), status=201)
+
+    if request.method not in ('GET', 'HEAD'):
+        return _error("Método no permitido.", 405)
+
+    campos, error = _campos(modelo, request)
+    if error:
+        return error
+
+    try:
+        limite = min(int(request.GET.get('limite', LIMITE_POR_DEFECTO)), LIMITE_MAXIMO)
+    except ValueError:
+        return _error("El límite debe ser un número.", 400)
+    if limite < 1:
+        return _error("El límite debe ser mayor a 0.", 400)
+
+    pk = modelo._meta.pk.name
+    consulta = modelo.objects.order_by(pk)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        ultimo = _decodificar_cursor(cursor)
+        if ultimo is None:
+            return _error("Cursor inválido.", 400)
+        consulta = consulta.filter(**{pk + '__gt': ultimo})
+
+    etag = _etag(request, modelo)
+    no_modificado = _no_modificado(request, etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    # Pedimos uno extra para saber si existe una página siguiente
+    filas = list(consulta.values(*campos)[:limite + 1])
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = _codificar_cursor(filas[-1][pk])
+
+    return _respuesta_json({'resultados': filas, 'siguiente': siguiente}, etag)
+
+
+def api_detalle(request, recurso, pk):
+    """
+    Obtiene (GET), edita (PUT/PATCH) o elimina (DELETE) un objeto de un recurso.
+
+    :param request: Objeto HttpRequest.
+    :param recurso: Nombre del recurso.
+    :param pk: Llave primaria del objeto.
+    :return: JsonResponse con el objeto, o una respuesta vacía al eliminar.
+    """
+    config, error = _verificar_acceso(request, recurso)
+    if error:
+        return error
+    modelo = config['modelo']
+
+    if request.method in ('GET', 'HEAD'):
+        campos, error = _campos(modelo, request)
+        if error:
+            return error
+        # Un objeto eliminado incrementa la versión, así que el 304 se puede decidir antes de buscarlo
+        etag = _etag(request, modelo)
+        no_modificado = _no_modificado(request, etag)
+        if no_modificado is not None:
+            return no_modificado
+
+    instancia = modelo.objects.filter(pk=pk).first()
+    if instancia is None:
+        return _error("Objeto no encontrado.", 404)
+
+    if request.method in ('GET', 'HEAD'):
+        return _respuesta_json(_serializar(instancia, campos), etag)
+
+    if request.method == 'DELETE':
+        # Los clientes se eliminan de forma lógica, igual que en el panel
+        if isinstance(instancia, Cliente):
+            instancia.eliminar()
+        elif isinstance(instancia, Factura):
+            # Igual que en el panel, los productos de sus líneas vuelven al stock
+            with transaction.atomic(using=router.db_for_write(Producto)), transaction.atomic(using=router.db_for_write(Factura)):
+                facturacion.devolver_stock([instancia])
+                instancia.delete()
+        else:
+            instancia.delete()
+        return HttpResponse(status=204)
+
+    if request.method not in ('PUT', 'PATCH'):
+        return _error("Método no permitido.", 405)
+
+    datos, error = _leer_json(request)
+    if error:
+        return error
+    if not isinstance(datos, dict):
+        return _error("Se esperaba un objeto JSON.", 400)
+
+    form = _formulario(config, datos, instancia)
+    if not form.is_valid():
+        return _error("Datos inválidos.", 400, errores=form.errors.get_json_data())
+    instancia = form.save()
+    return JsonResponse(_serializar(instancia, [campo.name for campo in modelo._meta.concrete_fields]))
+
+
+def api_masivo(request, recurso):
+    """
+    Escrituras masivas de un recurso en una sola transacción.
+
+    POST recibe una lista de objetos y los crea con bulk_create.
+    PATCH recibe una lista de objetos con su llave primaria y los actualiza con bulk_update
+    (cada llave primaria una sola vez).
+    Si algún objeto es inválido no se escribe nada y se devuelven los errores por posición.
+
+    :param request: Objeto HttpRequest.
+    :param recurso: Nombre del recurso.
+    :return: JsonResponse con la cantidad de objetos escritos.
+    """
+    config, error = _verificar_acceso(request, recurso)
+    if error:
+        return error
+    modelo = config['modelo']
+    pk = modelo._meta.pk.name
+
+    if request.method not in ('POST', 'PATCH'):
+        return _error("Método no permitido.", 405)
+
+    datos, error = _leer_json(request)
+    if error:
+        return error
+    if not isinstance(datos, list) or not all(isinstance(objeto, dict) for objeto in datos):
+        return _error("Se esperaba una lista de objetos JSON.", 400)
+    if len(datos) > LIMITE_MAXIMO:
+        return _error("Máximo {} objetos por petición.".format(LIMITE_MAXIMO), 400)
+
+    instancias = []
+    errores = {}
+
+    if request.method == 'POST':
+        for posicion, objeto in enumerate(datos):
+            form = _formulario(config, objeto)
+            if form.is_valid():
+                instancias.append(form.save(commit=False))
+            else:
+                errores[posicion] = form.errors.get_json_data()
+
+        if errores:
+            return _error("Datos inválidos.", 400, errores=errores)
+
+        # La transacción debe ser la de la base de datos del modelo (la de la sucursal, ver paneltrabajador.routers)
+        using = router.db_for_write(modelo)
+        try:
+            with transaction.atomic(using=using):
+                creados = modelo.objects.bulk_create(instancias)
+                # bulk_create no envía señales, actualizamos la versión del modelo y la auditoría a mano
+                versiones.incrementar(modelo)
+                for objeto in creados:
+                    auditoria.registrar_guardado(objeto, True, using)
+                if modelo is Cita:
+                    espera.liberadas([objeto.pk for objeto in creados if objeto.estado == EstadoCita.DISPONIBLE], using)
+        except IntegrityError:
+            return _error("Los objetos enviados están duplicados entre sí o con objetos existentes.", 409)
+        return JsonResponse({'creados': len(creados), 'pks': [objeto.pk for objeto in creados]}, status=201)
+
+    # PATCH: obtenemos todos los objetos a editar en una sola consulta
+    try:
+        pks = [modelo._meta.pk.to_python(objeto.get(pk)) for objeto in datos]
+    except ValidationError:
+        return _error("Llave primaria inválida.", 400)
+    existentes = modelo.objects.in_bulk([valor for valor in pks if valor is not None])
+
+    campos_editados = set()
+    anteriores = {}
+    for posicion, objeto in enumerate(datos):
+        instancia = existentes.get(pks[posicion])
+        if instancia is None:
+            errores[posicion] = {pk: _error_campo("Objeto no encontrado.", 'not_found')}
+            continue
+        # Cada objeto se edita una sola vez por petición (la auditoría guarda sus valores anteriores)
+        if instancia.pk in anteriores:
+            errores[posicion] = {pk: _error_campo("Objeto repetido en la petición.", 'duplicate')}
+            continue
+
+        # El formulario modifica la instancia, guardamos antes sus valores para la auditoría
+        anteriores[instancia.pk] = auditoria.valores(instancia)
+        form = _formulario(config, objeto, instancia)
+        if form.is_valid():
+            instancias.append(form.save(commit=False))
+            campos_editados.update(campo for campo in objeto if campo != pk and campo in form.fields)
+        else:
+            errores[posicion] = form.errors.get_json_data()
+
+    if errores:
+        return _error("Datos inválidos.", 400, errores=errores)
+
+    if campos_editados:
+        using = router.db_for_write(modelo)
+        try:
+            with transaction.atomic(using=using):
+                modelo.objects.bulk_update(instancias, list(campos_editados))
+                versiones.incrementar(modelo)
+                auditoria.registrar_masivo(modelo, anteriores, {instancia.pk: auditoria.valores(instancia) for instancia in instancias}, using)
+                if modelo is Cita:
+                    espera.liberadas([
+                        instancia.pk for instancia in instancias
+                        if instancia.estado in espera.ESTADOS_LIBERADOS and anteriores[instancia.pk]['estado'] != instancia.estado
+                    ], using)
+        except IntegrityError:
+            return _error("Los cambios enviados están duplicados entre sí o con objetos existentes.", 409)
+    return JsonResponse({'actualizados': len(instancias)})
+
+
+def _error_campo(mensaje, codigo):
+    # Mismo formato que form.errors.get_json_data()
+    return [{'message': mensaje, 'code': codigo}]
+
+
+def api_factura_lineas(request, pk):
+    """
+    Líneas de productos de una factura.
+
+    GET devuelve las líneas y el total.
+    PUT reemplaza todas las líneas con una lista de objetos {producto, cantidad, precio (opcional)}.
+    Los productos se obtienen en una sola consulta y la factura se guarda con facturacion.guardar
+    (bulk_create de las líneas y un solo UPDATE condicional del stock). Si falta stock no se escribe nada.
+
+    :param request: Objeto HttpRequest.
+    :param pk: Número de la factura.
+    :return: JsonResponse con las líneas, o con el total y la cantidad de líneas guardadas.
+    """
+    config, error = _verificar_acceso(request, 'facturas')
+    if error:
+        return error
+
+    if request.method in ('GET', 'HEAD'):
+        # Las líneas se guardan siempre junto con la factura (facturacion.guardar), su versión basta
+        etag = _etag(request, Factura)
+        no_modificado = _no_modificado(request, etag)
+        if no_modificado is not None:
+            return no_modificado
+
+    factura = Factura.objects.filter(pk=pk).first()
+    if factura is None:
+        return _error("Objeto no encontrado.", 404)
+
+    if request.method in ('GET', 'HEAD'):
+        lineas = FacturaLinea.objects.filter(factura=factura).order_by('pk').values('id', 'producto', 'nombre', 'cantidad', 'precio')
+        return _respuesta_json({'total_pagar': factura.total_pagar, 'lineas': list(lineas)}, etag)
+
+    if request.method != 'PUT':
+        return _error("Método no permitido.", 405)
+
+    datos, error = _leer_json(request)
+    if error:
+        return error
+    if not isinstance(datos, list) or not all(isinstance(objeto, dict) for objeto in datos):
+        return _error("Se esperaba una lista de objetos JSON.", 400)
+    if len(datos) > LIMITE_MAXIMO:
+        return _error("Máximo {} objetos por petición.".format(LIMITE_MAXIMO), 400)
+
+    def entero(valor):
+        # Los booleanos de JSON no son cantidades
+        return isinstance(valor, int) and not isinstance(valor, bool)
+
+    # Todos los productos en una sola consulta
+    productos = Producto.objects.in_bulk({objeto.get('producto') for objeto in datos if entero(objeto.get('producto'))})
+
+    lineas = []
+    errores = {}
+    for posicion, objeto in enumerate(datos):
+        producto = productos.get(objeto.get('producto')) if entero(objeto.get('producto')) else None
+        cantidad = objeto.get('cantidad')
+        precio = objeto.get('precio', producto.precio if producto else None)
+
+        errores_linea = {}
+        if producto is None:
+            errores_linea['producto'] = _error_campo("Producto no encontrado.", 'invalid_choice')
+        if not entero(cantidad) or cantidad < 1:
+            errores_linea['cantidad'] = _error_campo("La cantidad debe ser un entero mayor a 0.", 'invalid')
+        if not entero(precio) or precio < 0:
+            errores_linea['precio'] = _error_campo("El precio debe ser un entero mayor o igual a 0.", 'invalid')
+
+        if errores_linea:
+            errores[posicion] = errores_linea
+        else:
+            lineas.append(FacturaLinea(producto=producto, cantidad=cantidad, precio=precio))
+
+    if errores:
+        return _error("Datos inválidos.", 400, errores=errores)
+
+    try:
+        facturacion.guardar(factura, lineas)
+    except facturacion.StockInsuficiente as excepcion:
+        return _error(str(excepcion), 409, productos=excepcion.productos)
+    return JsonResponse({'total_pagar': factura.total_pagar, 'lineas': len(lineas)})
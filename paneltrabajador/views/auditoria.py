@@ -0,0 +1,60 @@
+from urllib.parse import urlencode
+
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.shortcuts import redirect, render
+from paneltrabajador.auditoria import MODELOS_AUDITADOS
+from paneltrabajador.models import RegistroAuditoria
+
+# Cantidad de registros por página
+POR_PAGINA = 50
+
+
+def auditoria_listar(request):
+    """
+    Lista paginada del registro de auditoría.
+
+    Se puede filtrar por objeto (?modelo= y ?objeto=) y por usuario (?usuario=),
+    ambas consultas usan los índices de RegistroAuditoria.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con el listado de cambios.
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    if not request.user.has_perm('paneltrabajador.view_registroauditoria'):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    registros = RegistroAuditoria.objects.select_related('usuario').order_by('-fecha')
+    filtros = {}
+
+    modelo = request.GET.get('modelo', '')
+    if modelo in MODELOS_AUDITADOS:
+        registros = registros.filter(modelo=modelo)
+        filtros['modelo'] = modelo
+
+        # El ID del objeto solo tiene sentido junto al modelo
+        objeto = request.GET.get('objeto', '').strip()
+        if objeto:
+            registros = registros.filter(objeto_id=objeto)
+            filtros['objeto'] = objeto
+
+    usuario = request.GET.get('usuario', '')
+    if usuario.isdigit():
+        registros = registros.filter(usuario_id=int(usuario))
+        filtros['usuario'] = usuario
+
+    pagina = Paginator(registros, POR_PAGINA).get_page(request.GET.get('pagina'))
+    contexto = {
+        'pagina': pagina,
+        'filtros': filtros,
+        'consulta': urlencode(filtros),
+        'modelos': MODELOS_AUDITADOS,
+        'usuarios': get_user_model().objects.order_by('username').values('id', 'username'),
+    }
+    return render(request, 'paneltrabajador/auditoria/listado.html', contexto)
@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from paneltrabajador.models import Cliente, Mascota, Producto
+
+# Búsquedas para los campos con autocompletado de los formularios del panel (ver forms.Autocompletar).
+# Las búsquedas por texto usan "comienza con" para aprovechar los índices, y los números
+# se buscan por su llave exacta (RUT, número de chip o ID).
+
+# Cantidad máxima de resultados por búsqueda
+MAXIMO_RESULTADOS = 20
+
+
+def _verificar(request, permiso):
+    # Devuelve la respuesta de error, o None si el usuario puede buscar
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': "Debe iniciar sesión."}, status=401)
+    if not request.user.has_perm(permiso):
+        return JsonResponse({'error': "No tiene los permisos para realizar esto."}, status=403)
+    return None
+
+
+def _resultados(filas):
+    return JsonResponse({'resultados': [{'id': pk, 'texto': texto} for pk, texto in filas]})
+
+
+def autocompletar_clientes(request):
+    """
+    Busca clientes por RUT (exacto) o por el comienzo del nombre (?q=).
+
+    :param request: Objeto HttpRequest.
+    :return: JsonResponse con los resultados {id, texto}.
+    """
+    error = _verificar(request, 'paneltrabajador.view_cliente')
+    if error:
+        return error
+
+    busqueda = request.GET.get('q', '').strip()
+    if not busqueda:
+        return _resultados([])
+
+    clientes = Cliente.objects.only('rut', 'nombre_cliente')
+    if busqueda.isdigit():
+        clientes = clientes.filter(rut=int(busqueda))
+    else:
+        clientes = clientes.filter(nombre_cliente__istartswith=busqueda).order_by('nombre_cliente')
+
+    return _resultados((cliente.rut, str(cliente)) for cliente in clientes[:MAXIMO_RESULTADOS])
+
+
+def autocompletar_mascotas(request):
+    """
+    Busca mascotas por número de chip (exacto) o por el comienzo del nombre (?q=).
+
+    Con ?cliente= se muestran solo las mascotas de ese cliente, incluso sin texto de búsqueda.
+
+    :param request: Objeto HttpRequest.
+    :return: JsonResponse con los resultados {id, texto}.
+    """
+    error = _verificar(request, 'paneltrabajador.view_mascota')
+    if error:
+        return error
+
+    busqueda = request.GET.get('q', '').strip()
+    cliente = request.GET.get('cliente', '')
+
+    mascotas = Mascota.objects.select_related('cliente').only('id_mascota', 'nombre', 'cliente__rut', 'cliente__nombre_cliente')
+    if cliente.isdigit():
+        mascotas = mascotas.filter(cliente_id=int(cliente))
+    elif not busqueda:
+        return _resultados([])
+
+    if busqueda.isdigit():
+        mascotas = mascotas.filter(numero_chip=int(busqueda))
+    elif busqueda:
+        mascotas = mascotas.filter(nombre__istartswith=busqueda)
+
+    mascotas = mascotas.order_by('nombre')[:MAXIMO_RESULTADOS]
+    return _resultados((mascota.id_mascota, str(mascota)) for mascota in mascotas)
+
+
+def autocompletar_usuarios(request):
+    """
+    Busca usuarios activos por el comienzo del nombre de usuario (?q=).
+
+    :param request: Objeto HttpRequest.
+    :return: JsonResponse con los resultados {id, texto}.
+    """
+    error = _verificar(request, 'auth.view_user')
+    if error:
+        return error
+
+    busqueda = request.GET.get('q', '').strip()
+    if not busqueda:
+        return _resultados([])
+
+    usuarios = get_user_model().objects.filter(is_active=True, username__istartswith=busqueda).order_by('username')
+    return _resultados(usuarios.values_list('id', 'username')[:MAXIMO_RESULTADOS])
+
+
+def autocompletar_productos(request):
+    """
+    Busca productos por ID (exacto) o por el comienzo del nombre (?q=).
+
+    :param request: Objeto HttpRequest.
+    :return: JsonResponse con los resultados {id, texto}.
+    """
+    error = _verificar(request, 'paneltrabajador.view_producto')
+    if error:
+        return error
+
+    busqueda = request.GET.get('q', '').strip()
+    if not busqueda:
+        return _resultados([])
+
+    productos = Producto.objects.only('id_producto', 'nombre_producto', 'stock_disponible')
+    if busqueda.isdigit():
+        productos = productos.filter(id_producto=int(busqueda))
+    else:
+        productos = productos.filter(nombre_producto__istartswith=busqueda).order_by('nombre_producto')
+
+    return _resultados((producto.id_producto, str(producto)) for producto in productos[:MAXIMO_RESULTADOS])
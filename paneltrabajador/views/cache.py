@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.shortcuts import redirect, render
+from paneltrabajador import cache
+from paneltrabajador.signals import MODELOS_VERSIONADOS
+from paneltrabajador.versiones import AUTH, etiqueta
+
+
+def cache_estadisticas(request):
+    """
+    Estadísticas de uso de las caches configuradas: aciertos, fallos, desalojos y entradas,
+    junto con las generaciones actuales de los modelos.
+
+    Los contadores son los del proceso que atiende la petición. Solo para usuarios staff.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con las estadísticas.
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # Solo el personal (staff) puede ver las estadísticas
+    if not request.user.is_staff:
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    filas = []
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        datos = cache.estadisticas(getattr(backend, 'ubicacion', ''))
+        lecturas = datos['aciertos'] + datos['fallos']
+        filas.append(dict(
+            datos,
+            alias=alias,
+            backend=settings.CACHES[alias]['BACKEND'],
+            porcentaje=round(100 * datos['aciertos'] / lecturas, 1) if lecturas else None,
+            entradas=backend.cantidad_entradas() if hasattr(backend, 'cantidad_entradas') else None,
+        ))
+
+    modelos = [etiqueta(modelo) for modelo in MODELOS_VERSIONADOS] + [AUTH]
+    contexto = {
+        'filas': filas,
+        'generaciones': zip(modelos, cache.generaciones(*modelos)),
+    }
+    return render(request, 'paneltrabajador/cache/estadisticas.html', contexto)
@@ -1,13 +1,62 @@
+import datetime
+
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.utils import timezone
+from paneltrabajador import disponibilidad
 from paneltrabajador.forms import CitaForm
-from paneltrabajador.models import Cita
+from paneltrabajador.models import Cita, Cliente, EstadoCita, Mascota
+from paneltrabajador.views.fragmentos import ordenar, paginar, respuesta_filas
+from paneltrabajador.versiones import condicional
+
+# Cantidad máxima de días que puede abarcar una consulta del calendario (un mes y algo)
+CALENDARIO_MAX_DIAS = 42
+
+# Órdenes permitidos en el listado de citas (?orden=)
+ORDENES_CITA = ('n_cita', '-n_cita', 'fecha', '-fecha')
+
+
+def _citas_listado(request):
+    """
+    Obtiene las citas del listado aplicando los filtros (?estado=, ?usuario=) y el orden (?orden=).
+
+    Returns:
+        tuple: (queryset, diccionario con los filtros aplicados).
+    """
+    citas = Cita.objects.select_related('cliente', 'mascota__cliente', 'usuario')
+
+    estado = request.GET.get('estado', '')
+    if estado.isdigit() and int(estado) in EstadoCita.values:
+        estado = int(estado)
+        citas = citas.filter(estado=estado)
+    else:
+        estado = ''
 
+    usuario = request.GET.get('usuario', '')
+    if usuario.isdigit():
+        citas = citas.filter(usuario_id=int(usuario))
+    else:
+        usuario = ''
+
+    citas, orden = ordenar(request, citas, ORDENES_CITA, 'n_cita')
+    return citas, {'estado': estado, 'usuario': usuario, 'orden': orden}
+
+
+def _pagina_citas(request):
+    citas, filtros = _citas_listado(request)
+    citas, siguiente = paginar(request, citas)
+    return citas, siguiente, filtros
+
+
+@condicional(Cita, Cliente, Mascota)
 def cita_listar(request):
     """
-    Vista para listar todas las citas.
+    Vista para listar las citas.
 
     Requiere que el usuario esté autenticado y tenga permisos para ver citas.
+    Se muestra la primera página; las siguientes se cargan con cita_filas.
 
     :param request: Objeto HttpRequest.
     :return: HttpResponse con la lista de citas.
@@ -20,10 +69,42 @@ def cita_listar(request):
         messages.error(request, "No tiene los permisos para realizar esto.")
         return redirect('panel_home')
 
-    # Obtenemos todos los objetos del modelo
-    # Usamos la funcion personalizada del modelo
-    citas = Cita.get_for_listado()
-    return render(request, 'paneltrabajador/cita/listado.html', {'citas': citas})
+    citas, siguiente, filtros = _pagina_citas(request)
+
+    # Usuarios para el filtro y la acción masiva de reasignar
+    usuarios = get_user_model().objects.filter(is_active=True).order_by('username').values('id', 'username')
+
+    contexto = {
+        'citas': citas,
+        'siguiente': siguiente,
+        'filtros': filtros,
+        'usuarios': usuarios,
+        'estados': EstadoCita.choices,
+    }
+    return render(request, 'paneltrabajador/cita/listado.html', contexto)
+
+
+@condicional(Cita, Cliente, Mascota)
+def cita_filas(request):
+    """
+    Devuelve solamente las filas de la tabla de citas para una página, filtro u orden.
+
+    Acepta los mismos parámetros que el listado (?pagina=, ?estado=, ?usuario=, ?orden=).
+    Se usa para el scroll infinito y el filtrado sin recargar la página.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con las filas (<tr>) de la tabla.
+    """
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    if not request.user.has_perm('paneltrabajador.view_cita'):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    citas, siguiente, filtros = _pagina_citas(request)
+    return respuesta_filas(request, 'paneltrabajador/cita/filas.html', {'citas': citas, 'es_home': False}, siguiente)
 
 def cita_agregar(request):
     """
@@ -60,6 +141,7 @@ def cita_agregar(request):
     return render(request, 'paneltrabajador/form_generico.html', {'form': form})
 
 
+@condicional(Cita, Cliente, Mascota)
 def cita_editar(request, n_cita):
     """
     Vista para editar una cita existente.
@@ -137,3 +219,121 @@ def cita_eliminar(request, n_cita):
     }
 
     return render(request, 'paneltrabajador/eliminar_generico.html', contexto)
+
+
+def cita_calendario(request):
+    """
+    Vista del calendario de citas (día, semana o mes).
+
+    La página no carga citas, estas se obtienen desde cita_calendario_datos
+    solamente para la ventana visible.
+
+    Requiere que el usuario esté autenticado y tenga permisos para ver citas.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con el calendario.
+    """
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    if not request.user.has_perm('paneltrabajador.view_cita'):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    # Usuarios para el filtro por veterinario
+    usuarios = get_user_model().objects.filter(is_active=True).order_by('username').values('id', 'username', 'first_name', 'last_name')
+
+    contexto = {
+        'usuarios': usuarios,
+        'estados': EstadoCita.choices,
+    }
+    return render(request, 'paneltrabajador/cita/calendario.html', contexto)
+
+
+def cita_calendario_datos(request):
+    """
+    Devuelve en JSON las citas de una ventana de fechas.
+
+    Parámetros GET:
+        desde: Fecha inicial (AAAA-MM-DD), incluida.
+        hasta: Fecha final (AAAA-MM-DD), excluida.
+        usuario: ID del usuario (veterinario), opcional.
+        estado: Estado de la cita, opcional.
+
+    Se resuelve con una sola consulta por rango sobre el índice de fecha
+    (o de usuario y fecha si se filtra por veterinario). Las horas de los horarios de los
+    veterinarios que no tienen cita se agregan como disponibles, sin n_cita.
+
+    :param request: Objeto HttpRequest.
+    :return: JsonResponse con las citas de la ventana.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': "Debe iniciar sesión."}, status=401)
+
+    if not request.user.has_perm('paneltrabajador.view_cita'):
+        return JsonResponse({'error': "No tiene los permisos para realizar esto."}, status=403)
+
+    # Validamos la ventana de fechas
+    try:
+        desde = datetime.date.fromisoformat(request.GET.get('desde', ''))
+        hasta = datetime.date.fromisoformat(request.GET.get('hasta', ''))
+    except ValueError:
+        return JsonResponse({'error': "Las fechas deben tener el formato AAAA-MM-DD."}, status=400)
+
+    if hasta <= desde or (hasta - desde).days > CALENDARIO_MAX_DIAS:
+        return JsonResponse({'error': "La ventana debe ser de entre 1 y {} días.".format(CALENDARIO_MAX_DIAS)}, status=400)
+
+    # Las fechas se interpretan en la zona horaria de la clínica
+    zona = timezone.get_current_timezone()
+    inicio = timezone.make_aware(datetime.datetime.combine(desde, datetime.time.min), zona)
+    fin = timezone.make_aware(datetime.datetime.combine(hasta, datetime.time.min), zona)
+
+    citas = Cita.objects.filter(fecha__gte=inicio, fecha__lt=fin)
+
+    usuario = request.GET.get('usuario')
+    if usuario:
+        if not usuario.isdigit():
+            return JsonResponse({'error': "Usuario inválido."}, status=400)
+        citas = citas.filter(usuario_id=int(usuario))
+
+    # Sin el parámetro (o vacío) es None; EstadoCita.DISPONIBLE es 0, no se puede comparar por verdad
+    estado = request.GET.get('estado') or None
+    if estado is not None:
+        if not estado.isdigit() or int(estado) not in EstadoCita.values:
+            return JsonResponse({'error': "Estado inválido."}, status=400)
+        estado = EstadoCita(int(estado))
+        citas = citas.filter(estado=estado)
+
+    # Una sola consulta con los datos necesarios para dibujar el calendario
+    filas = list(citas.order_by('fecha').values(
+        'n_cita', 'fecha', 'estado', 'usuario_id', 'usuario__username', 'cliente__nombre_cliente', 'mascota__nombre'
+    ))
+
+    # Las horas del horario sin cita no existen en la tabla, se agregan como disponibles (sin n_cita)
+    if estado is None:
+        ocupadas = {(fila['usuario_id'], fila['fecha']) for fila in filas if fila['estado'] != EstadoCita.CANCELADA}
+        ahora = timezone.now()
+        for usuario_id, username, nombre, fecha in disponibilidad.horas_horario(desde, hasta, int(usuario) if usuario else None):
+            if fecha > ahora and (usuario_id, fecha) not in ocupadas:
+                filas.append({'n_cita': None, 'fecha': fecha, 'estado': EstadoCita.DISPONIBLE, 'usuario__username': username, 'cliente__nombre_cliente': None, 'mascota__nombre': None})
+        filas.sort(key=lambda fila: fila['fecha'])
+    elif estado == EstadoCita.DISPONIBLE:
+        filas = [
+            {'n_cita': hora['n_cita'], 'fecha': hora['fecha'], 'estado': EstadoCita.DISPONIBLE, 'usuario__username': hora['usuario'], 'cliente__nombre_cliente': None, 'mascota__nombre': None}
+            for hora in disponibilidad.horas(desde, hasta, int(usuario) if usuario else None)
+        ]
+
+    resultado = [
+        {
+            'n_cita': fila['n_cita'],
+            'fecha': timezone.localtime(fila['fecha'], zona).isoformat(),
+            'estado': fila['estado'],
+            'estado_display': EstadoCita(fila['estado']).label,
+            'usuario': fila['usuario__username'],
+            'cliente': fila['cliente__nombre_cliente'],
+            'mascota': fila['mascota__nombre'],
+        }
+        for fila in filas
+    ]
+    return JsonResponse({'citas': resultado})
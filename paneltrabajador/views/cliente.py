@@ -2,6 +2,9 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib import messages
 from paneltrabajador.forms import ClienteForm
 from paneltrabajador.models import Cliente, Mascota
+from paneltrabajador.versiones import condicional
+
+@condicional(Cliente)
 def cliente_listado(request):
     """
     Vista para listar todos los clientes.
@@ -61,6 +64,7 @@ def cliente_crear(request):
     return render(request, 'paneltrabajador/form_generico.html', {'form': form})
 
 
+@condicional(Cliente, Mascota)
 def cliente_editar(request, rut):
     """
     Vista para editar un cliente existente.
@@ -132,8 +136,8 @@ def cliente_eliminar(request, rut):
 
     # El usuario hizo click en OK entonces envio el formulario
     if request.method == 'POST':
-        # Eliminar objeto
-        cliente.delete()
+        # Marcamos el cliente como eliminado, sus datos relacionados se borran después con purgar_clientes
+        cliente.eliminar()
         messages.success(request, "Se ha eliminado el cliente correctamente.")
         # Redirige a la página de listado después de eliminar
         return redirect('panel_cliente_listado')
@@ -0,0 +1,50 @@
+from django.contrib import messages
+from django.shortcuts import redirect
+from paneltrabajador import documentos
+
+
+def _imprimir(request, permiso, tipo, pk):
+    """
+    Verifica la autenticación y el permiso, y responde con el documento en el formato pedido (?formato=pdf).
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    if not request.user.has_perm(permiso):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    return documentos.respuesta(request, tipo, pk, request.GET.get('formato', 'html'))
+
+
+def factura_imprimir(request, numero_factura):
+    """
+    Muestra la factura lista para imprimir (HTML) o en PDF.
+
+    El documento se genera una vez por versión de la factura y se sirve desde el disco
+    (ver paneltrabajador.documentos).
+
+    Args:
+        request: La solicitud HTTP.
+        numero_factura: El número de la factura.
+
+    Returns:
+        HttpResponse: El documento, o 304 si el navegador ya tiene la versión actual.
+    """
+    return _imprimir(request, 'paneltrabajador.view_factura', 'factura', numero_factura)
+
+
+def mascota_imprimir(request, id_mascota):
+    """
+    Muestra la ficha de la mascota lista para imprimir (HTML) o en PDF.
+
+    Args:
+        request: La solicitud HTTP.
+        id_mascota: El ID de la mascota.
+
+    Returns:
+        HttpResponse: El documento, o 304 si el navegador ya tiene la versión actual.
+    """
+    return _imprimir(request, 'paneltrabajador.view_mascota', 'ficha', id_mascota)
@@ -1,7 +1,39 @@
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib import messages
-from paneltrabajador.forms import FacturaForm
-from paneltrabajador.models import Factura
+from django.db import router, transaction
+from paneltrabajador import facturacion
+from paneltrabajador.forms import FacturaForm, FacturaLineaFormSet
+from paneltrabajador.models import Cliente, Factura, FacturaLinea, Producto
+from paneltrabajador.versiones import condicional
+
+
+def _guardar_factura(request, form, lineas):
+    """
+    Guarda la factura del formulario con las líneas del formset, descontando el stock.
+
+    :return: True si se guardó, False si hubo errores (quedan en el formulario o como mensaje).
+    """
+    if not (form.is_valid() and lineas.is_valid()):
+        return False
+
+    nuevas = [
+        FacturaLinea(producto=datos['producto'], cantidad=datos['cantidad'], precio=datos['precio'])
+        for datos in lineas.cleaned_data
+        if datos and not datos.get('DELETE')
+    ]
+    # Sin productos el total se ingresa a mano
+    if not nuevas and form.cleaned_data.get('total_pagar') is None:
+        form.add_error('total_pagar', "Ingrese el total o agregue productos.")
+        return False
+
+    try:
+        facturacion.guardar(form.save(commit=False), nuevas)
+    except facturacion.StockInsuficiente as error:
+        messages.error(request, str(error))
+        return False
+    return True
+
+@condicional(Factura, Cliente)
 def factura_listar(request):
     """
     Muestra un listado de todas las facturas.
@@ -23,8 +55,8 @@ def factura_listar(request):
         messages.error(request, "No tiene los permisos para realizar esto.")
         return redirect('panel_home')
 
-    # Obtenemos todos los objetos del modelo
-    facturas = Factura.objects.all()
+    # Obtenemos todos los objetos del modelo, con el cliente en la misma consulta (se muestra en cada fila)
+    facturas = Factura.objects.select_related('cliente')
     return render(request, 'paneltrabajador/factura/listado.html', {'facturas': facturas})
 
 def factura_agregar(request):
@@ -52,21 +84,22 @@ def factura_agregar(request):
 
     # Se ha enviado el formulario
     if request.method == 'POST':
-        # Pasar los datos de la peticion al formulario para la validacion
-        form = FacturaForm(request.POST)
-        # Todo Ok?
-        if form.is_valid():
-            # Agregar nuevo objeto
-            form.save()
+        # Pasar los datos de la peticion al formulario (y a las líneas de productos) para la validacion
+        form = FacturaForm(request.POST, con_lineas=True)
+        lineas = FacturaLineaFormSet(request.POST)
+        # Todo Ok? Agregar nuevo objeto con sus líneas
+        if _guardar_factura(request, form, lineas):
             # Redirige a la página de listado después de agregar un nuevo objeto
             messages.success(request, "Se ha agregado la factura correctamente.")
             return redirect('panel_factura_listar')
     else:
         # Asignar form para mostrarlo en el template
-        form = FacturaForm()
+        form = FacturaForm(con_lineas=True)
+        lineas = FacturaLineaFormSet()
 
-    return render(request, 'paneltrabajador/form_generico.html', {'form': form})
+    return render(request, 'paneltrabajador/factura/form.html', {'form': form, 'lineas': lineas})
 
+@condicional(Factura, Cliente)
 def factura_editar(request, numero_factura):
     """
     Permite editar una factura existente.
@@ -98,19 +131,19 @@ def factura_editar(request, numero_factura):
         # Pasar los datos de la peticion al formulario para la validacion
         # Aparte le pasamos el objeto para que pueda saber que estamos editando ese objeto en particular
         # En el caso de que no asignaramos instance, pensará que debemos agregar un objeto nuevo
-        form = FacturaForm(request.POST, instance=factura)
-        # Todo Ok?
-        if form.is_valid():
-            # Guardar
-            form.save()
+        form = FacturaForm(request.POST, instance=factura, con_lineas=True)
+        lineas = FacturaLineaFormSet(request.POST, instance=factura)
+        # Todo Ok? Guardar (las líneas se reemplazan y el stock se ajusta con la diferencia)
+        if _guardar_factura(request, form, lineas):
             # Redirige a la página de listado después de editar
             messages.success(request, "Se ha editado la factura correctamente.")
             return redirect('panel_factura_listar')
     else:
         # Asignar form para mostrarlo en el template
-        form = FacturaForm(instance=factura)
+        form = FacturaForm(instance=factura, con_lineas=True)
+        lineas = FacturaLineaFormSet(instance=factura)
 
-    return render(request, 'paneltrabajador/form_generico.html', {'form': form, 'factura': factura})
+    return render(request, 'paneltrabajador/factura/form.html', {'form': form, 'lineas': lineas, 'factura': factura})
 
 def factura_eliminar(request, numero_factura):
     """
@@ -141,8 +174,10 @@ def factura_eliminar(request, numero_factura):
 
     # El usuario hizo click en OK entonces envio el formulario
     if request.method == 'POST':
-        # Eliminar objeto
-        factura.delete()
+        # Eliminar objeto, devolviendo al stock los productos de sus líneas
+        with transaction.atomic(using=router.db_for_write(Producto)), transaction.atomic(using=router.db_for_write(Factura)):
+            facturacion.devolver_stock([factura])
+            factura.delete()
         # Redirige a la página de listado después de eliminar
         messages.success(request, "Se ha eliminado la factura correctamente.")
         return redirect('panel_factura_listar')
@@ -0,0 +1,55 @@
+from django.shortcuts import render
+
+# Funciones compartidas por los listados que se cargan por partes (scroll infinito y filtros).
+# El listado completo renderiza la primera página dentro de master.html y los "fragmentos"
+# devuelven solamente las filas (<tr>) de la página pedida, sin el layout.
+
+# Cantidad de filas por página
+POR_PAGINA = 50
+
+
+def ordenar(request, queryset, ordenes, por_defecto):
+    """
+    Ordena el queryset según ?orden=, aceptando solo los valores de la lista.
+
+    La llave primaria se agrega como desempate para que las páginas no se repitan.
+
+    Returns:
+        tuple: (queryset ordenado, orden aplicado).
+    """
+    orden = request.GET.get('orden', por_defecto)
+    if orden not in ordenes:
+        orden = por_defecto
+    return queryset.order_by(orden, 'pk'), orden
+
+
+def paginar(request, queryset):
+    """
+    Obtiene las filas de la página indicada en ?pagina= (desde 1).
+
+    No se cuenta el total de filas: se pide una fila extra para saber si existe
+    una página siguiente, así cada fragmento es una sola consulta.
+
+    Returns:
+        tuple: (lista de objetos, número de la página siguiente o None).
+    """
+    pagina = request.GET.get('pagina', '1')
+    pagina = int(pagina) if pagina.isdigit() and int(pagina) > 0 else 1
+
+    inicio = (pagina - 1) * POR_PAGINA
+    filas = list(queryset[inicio:inicio + POR_PAGINA + 1])
+    if len(filas) > POR_PAGINA:
+        return filas[:POR_PAGINA], pagina + 1
+    return filas, None
+
+
+def respuesta_filas(request, template, contexto, siguiente):
+    """
+    Renderiza solamente las filas de un listado.
+
+    El número de la página siguiente se envía en la cabecera X-Pagina-Siguiente
+    (vacía si es la última).
+    """
+    respuesta = render(request, template, contexto)
+    respuesta['X-Pagina-Siguiente'] = siguiente or ''
+    return respuesta
@@ -0,0 +1,64 @@
+from django.contrib import messages
+from django.core.paginator import Paginator
+from django.shortcuts import redirect, render
+from paneltrabajador.models import CitaHistorica, FacturaHistorica
+
+# Vistas de solo lectura de las tablas históricas (citas y facturas archivadas).
+# Estas tablas solo se consultan cuando el usuario entra a estas páginas.
+
+# Cantidad de filas por página
+POR_PAGINA = 50
+
+
+def _filtrar_rut(request, queryset):
+    # Filtro opcional por RUT del cliente (?rut=)
+    rut = request.GET.get('rut', '').strip()
+    if rut.isdigit():
+        return queryset.filter(cliente_rut=int(rut)), rut
+    return queryset, ''
+
+
+def historico_citas(request):
+    """
+    Lista paginada de las citas archivadas.
+
+    Requiere que el usuario esté autenticado y tenga permisos para ver citas.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con el listado histórico de citas.
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    if not request.user.has_perm('paneltrabajador.view_cita'):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    citas, rut = _filtrar_rut(request, CitaHistorica.objects.order_by('-fecha'))
+    pagina = Paginator(citas, POR_PAGINA).get_page(request.GET.get('pagina'))
+    return render(request, 'paneltrabajador/historico/citas.html', {'pagina': pagina, 'rut': rut})
+
+
+def historico_facturas(request):
+    """
+    Lista paginada de las facturas pagadas archivadas.
+
+    Requiere que el usuario esté autenticado y tenga permisos para ver facturas.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con el listado histórico de facturas.
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    if not request.user.has_perm('paneltrabajador.view_factura'):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    facturas, rut = _filtrar_rut(request, FacturaHistorica.objects.order_by('-numero_factura'))
+    pagina = Paginator(facturas, POR_PAGINA).get_page(request.GET.get('pagina'))
+    return render(request, 'paneltrabajador/historico/facturas.html', {'pagina': pagina, 'rut': rut})
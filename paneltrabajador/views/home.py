@@ -1,7 +1,8 @@
 from django.shortcuts import redirect, render
 from django.contrib import messages
-from django.contrib.auth import authenticate, login, logout
-from paneltrabajador.models import Cita
+from django.contrib.auth import login, logout
+from ambpublica.limitador import comprobar, respuesta_limite
+from paneltrabajador.models import Cita, EstadoCita
 from django.contrib.auth.forms import AuthenticationForm
 
 def home(request):
@@ -17,8 +18,8 @@ def home(request):
     """
     # El usuario está autenticado, cargar home del panel
     if request.user.is_authenticated:
-        # Cargar todas las citas
-        citas = Cita.get_for_listado(usuario=request.user, estado='1')
+        # Cargar las citas reservadas del usuario
+        citas = Cita.objects.filter(usuario=request.user, estado=EstadoCita.RESERVADA).select_related('cliente', 'mascota__cliente', 'usuario')
 
         # Mostramos el grupo del usuario
         grupo = ""
@@ -32,18 +33,19 @@ def home(request):
     else:
         # Envio de login
         if request.method == 'POST':
+            # Limitamos los intentos por IP y por usuario antes de verificar la contraseña,
+            # que es la parte costosa del inicio de sesión
+            espera = comprobar('login', request)
+            if espera > 0:
+                return respuesta_limite(espera)
+
             form = AuthenticationForm(request=request, data=request.POST)
 
-            # Es valido el formulario?
+            # Es valido el formulario? La validación ya autentica al usuario (una sola verificación de contraseña)
             if form.is_valid():
-                # Hacer autentificacion
-                username = form.cleaned_data.get("username")
-                password = form.cleaned_data.get("password")
-                user = authenticate(request, username=username, password=password)
-                # Si el usuario existe entonces logear y redirigir al home
-                if user is not None:
-                    login(request, user)
-                    return redirect('panel_home')
+                # Logear y redirigir al home
+                login(request, form.get_user())
+                return redirect('panel_home')
         else:
             # Asignar form para mostrarlo en el template
             form = AuthenticationForm()
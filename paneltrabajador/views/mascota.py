@@ -1,10 +1,37 @@
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib import messages
 from paneltrabajador.forms import MascotaForm
-from paneltrabajador.models import Mascota
+from paneltrabajador.models import Cliente, Mascota
+from paneltrabajador.views.fragmentos import ordenar, paginar, respuesta_filas
+from paneltrabajador.versiones import condicional
+
+# Órdenes permitidos en el listado de mascotas (?orden=)
+ORDENES_MASCOTA = ('id_mascota', '-id_mascota', 'nombre', '-nombre')
+
+
+def _pagina_mascotas(request):
+    """
+    Obtiene una página de mascotas aplicando la búsqueda por nombre (?q=) y el orden (?orden=).
+
+    Returns:
+        tuple: (lista de mascotas, página siguiente o None, filtros aplicados).
+    """
+    mascotas = Mascota.objects.select_related('cliente')
+
+    busqueda = request.GET.get('q', '').strip()
+    if busqueda:
+        mascotas = mascotas.filter(nombre__icontains=busqueda)
+
+    mascotas, orden = ordenar(request, mascotas, ORDENES_MASCOTA, 'id_mascota')
+    mascotas, siguiente = paginar(request, mascotas)
+    return mascotas, siguiente, {'q': busqueda, 'orden': orden}
+
+
+@condicional(Mascota, Cliente)
 def mascota_listar(request):
     """
-    Lista todas las mascotas si el usuario está autenticado y tiene los permisos necesarios.
+    Lista las mascotas si el usuario está autenticado y tiene los permisos necesarios.
+    Se muestra la primera página; las siguientes se cargan con mascota_filas.
 
     Args:
         request: La solicitud HTTP.
@@ -21,9 +48,33 @@ def mascota_listar(request):
         messages.error(request, "No tiene los permisos para realizar esto.")
         return redirect('panel_home')
 
-    # Obtenemos todos los objetos del modelo
-    mascotas = Mascota.objects.all()
-    return render(request, 'paneltrabajador/mascota/listado.html', {'mascotas': mascotas})
+    mascotas, siguiente, filtros = _pagina_mascotas(request)
+    return render(request, 'paneltrabajador/mascota/listado.html', {'mascotas': mascotas, 'siguiente': siguiente, 'filtros': filtros})
+
+
+@condicional(Mascota, Cliente)
+def mascota_filas(request):
+    """
+    Devuelve solamente las filas de la tabla de mascotas para una página, búsqueda u orden.
+
+    Args:
+        request: La solicitud HTTP.
+
+    Returns:
+        HttpResponse: Las filas (<tr>) de la tabla, sin el layout del panel.
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    if not request.user.has_perm('paneltrabajador.view_mascota'):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    mascotas, siguiente, filtros = _pagina_mascotas(request)
+    contexto = {'mascotas': mascotas, 'mostrar_cliente': True}
+    return respuesta_filas(request, 'paneltrabajador/mascota/filas_listado.html', contexto, siguiente)
 
 def mascota_agregar(request):
     """
@@ -60,6 +111,7 @@ def mascota_agregar(request):
 
     return render(request, 'paneltrabajador/form_generico.html', {'form': form})
 
+@condicional(Mascota, Cliente)
 def mascota_editar(request, id_mascota):
     """
     Edita una mascota existente si el usuario está autenticado y tiene los permisos necesarios.
@@ -0,0 +1,98 @@
+import datetime
+import os
+
+from django.contrib import messages
+from django.http import FileResponse
+from django.shortcuts import redirect, render
+from paneltrabajador import perfilador
+
+# Funciones que se muestran de cada captura en el listado
+FUNCIONES_LISTADO = 5
+
+
+def _verificar_superusuario(request):
+    """
+    Solo los superusuarios pueden ver los perfiles (son los únicos que pueden generarlos).
+
+    :return: Redirección si el usuario no puede entrar, o None.
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    if not request.user.is_superuser:
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+    return None
+
+
+def perfil_listar(request):
+    """
+    Muestra las capturas del perfilador, de la más reciente a la más antigua,
+    con sus funciones de mayor tiempo acumulado.
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con el listado.
+    """
+    error = _verificar_superusuario(request)
+    if error:
+        return error
+
+    capturas = []
+    for nombre in perfilador.nombres():
+        captura = perfilador.leer(nombre)
+        # La captura pudo eliminarse mientras se leía el listado
+        if captura is not None:
+            captura['fecha'] = datetime.datetime.fromisoformat(captura['fecha'])
+            captura['funciones'] = captura['funciones'][:FUNCIONES_LISTADO]
+            capturas.append(captura)
+
+    contexto = {'capturas': capturas, 'parametro': perfilador.PARAMETRO}
+    return render(request, 'paneltrabajador/perfiles/listado.html', contexto)
+
+
+def perfil_detalle(request, nombre):
+    """
+    Muestra una captura: las funciones de mayor tiempo acumulado y la línea de tiempo de sus consultas SQL.
+
+    :param request: Objeto HttpRequest.
+    :param nombre: Nombre de la captura.
+    :return: HttpResponse con el detalle.
+    """
+    error = _verificar_superusuario(request)
+    if error:
+        return error
+
+    captura = perfilador.leer(nombre)
+    if captura is None:
+        messages.error(request, "La captura no existe.")
+        return redirect('panel_perfil_listar')
+
+    captura['fecha'] = datetime.datetime.fromisoformat(captura['fecha'])
+
+    # Ancho de cada consulta en la línea de tiempo, en porcentaje de la duración de la petición
+    total = captura['duracion'] or 1
+    for consulta in captura['consultas']:
+        consulta['desde'] = round(100 * consulta['inicio'] / total, 2)
+        consulta['ancho'] = max(round(100 * consulta['duracion'] / total, 2), 0.5)
+
+    return render(request, 'paneltrabajador/perfiles/detalle.html', {'captura': captura})
+
+
+def perfil_descargar(request, nombre):
+    """
+    Descarga el archivo .prof de una captura (para abrirlo con pstats o snakeviz).
+
+    :param request: Objeto HttpRequest.
+    :param nombre: Nombre de la captura.
+    :return: FileResponse con el perfil.
+    """
+    error = _verificar_superusuario(request)
+    if error:
+        return error
+
+    ruta = perfilador.ruta_perfil(nombre)
+    if ruta is None:
+        messages.error(request, "La captura no existe.")
+        return redirect('panel_perfil_listar')
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=os.path.basename(ruta))
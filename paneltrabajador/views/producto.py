@@ -6,7 +6,9 @@ from paneltrabajador.forms import ProductoForm
 from paneltrabajador.models import Producto
 from django.contrib.auth import get_user_model
 from django.core.mail import send_mail
+from paneltrabajador.versiones import condicional
 
+@condicional(Producto)
 def producto_listar(request):
     """
     Lista todos los productos si el usuario está autenticado y tiene los permisos necesarios.
@@ -66,6 +68,7 @@ def producto_agregar(request):
 
     return render(request, 'paneltrabajador/form_generico.html', {'form': form})
 
+@condicional(Producto)
 def producto_editar(request, id_producto):
     """
     Edita un producto existente si el usuario está autenticado y tiene los permisos necesarios.
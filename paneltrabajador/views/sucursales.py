@@ -0,0 +1,93 @@
+from django.contrib import messages
+from django.db.models import Count, Q, Sum
+from django.shortcuts import redirect, render
+from django.utils.http import url_has_allowed_host_and_scheme
+from paneltrabajador import cache, sucursales
+from paneltrabajador.models import Cita, Cliente, EstadoCita, EstadoPago, Factura
+
+
+def sucursal_cambiar(request):
+    """
+    Cambia la sucursal en la que trabaja el usuario (se guarda en la sesión).
+
+    Los usuarios con una sucursal asignada no pueden cambiarla.
+
+    :param request: Objeto HttpRequest.
+    :return: Redirección a la página anterior.
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated or request.method != 'POST':
+        return redirect('panel_home')
+
+    if getattr(request, 'sucursal_asignada', False):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    codigo = request.POST.get('sucursal')
+    if codigo not in sucursales.codigos():
+        messages.error(request, "La sucursal seleccionada no existe.")
+        return redirect('panel_home')
+
+    request.session['sucursal'] = codigo
+    messages.success(request, "Ahora está trabajando en {}.".format(sucursales.nombre(codigo)))
+
+    siguiente = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(siguiente, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        return redirect(siguiente)
+    return redirect('panel_home')
+
+
+def _resumen_sucursal():
+    # Se ejecuta en un hilo por sucursal (ver sucursales.en_todas), cada consulta va a la base de datos de esa sucursal
+    citas = dict(Cita.objects.values_list('estado').annotate(cantidad=Count('pk')).order_by())
+    facturas = Factura.objects.aggregate(
+        pendientes=Count('pk', filter=Q(estado_pago=EstadoPago.PENDIENTE)),
+        monto_pendiente=Sum('total_pagar', filter=Q(estado_pago=EstadoPago.PENDIENTE)),
+        monto_pagado=Sum('total_pagar', filter=Q(estado_pago=EstadoPago.PAGADA)),
+    )
+    return {
+        'clientes': Cliente.objects.count(),
+        'citas': [citas.get(estado, 0) for estado in EstadoCita.values],
+        'facturas_pendientes': facturas['pendientes'],
+        'monto_pendiente': facturas['monto_pendiente'] or 0,
+        'monto_pagado': facturas['monto_pagado'] or 0,
+    }
+
+
+def reporte_sucursales(request):
+    """
+    Resumen de clientes, citas y facturas de todas las sucursales.
+
+    Cada sucursal se consulta en paralelo en su propia base de datos y los resultados se suman en la fila de total.
+    El resultado queda en la cache del panel (ver paneltrabajador.cache).
+
+    :param request: Objeto HttpRequest.
+    :return: HttpResponse con el reporte.
+    """
+    # El usuario no está autenticado, redireccionar al inicio
+    if not request.user.is_authenticated:
+        return redirect('panel_home')
+
+    # El usuario no tiene los permisos necesarios, redireccionar al home con un mensaje de error
+    # Los usuarios de una sola sucursal no ven las demás
+    if not request.user.has_perm('paneltrabajador.view_factura') or getattr(request, 'sucursal_asignada', False):
+        messages.error(request, "No tiene los permisos para realizar esto.")
+        return redirect('panel_home')
+
+    # El reporte consulta todas las sucursales, se guarda en cache hasta que cambien los clientes, citas o facturas
+    resultados = cache.obtener_o_calcular('reporte_sucursales', (Cliente, Cita, Factura), lambda: sucursales.en_todas(_resumen_sucursal), por_sucursal=False)
+
+    filas = []
+    total = {'clientes': 0, 'citas': [0] * len(EstadoCita.values), 'facturas_pendientes': 0, 'monto_pendiente': 0, 'monto_pagado': 0}
+    for codigo, resumen in resultados.items():
+        filas.append(dict(resumen, nombre=sucursales.nombre(codigo) or 'Principal'))
+        for campo in ('clientes', 'facturas_pendientes', 'monto_pendiente', 'monto_pagado'):
+            total[campo] += resumen[campo]
+        total['citas'] = [a + b for a, b in zip(total['citas'], resumen['citas'])]
+
+    contexto = {
+        'filas': filas,
+        'total': total,
+        'estados': EstadoCita.labels,
+    }
+    return render(request, 'paneltrabajador/reportes/sucursales.html', contexto)
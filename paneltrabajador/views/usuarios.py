@@ -5,7 +5,9 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.core.mail import send_mail
 from paneltrabajador.forms import UsuarioForm
+from paneltrabajador.versiones import condicional
 
+@condicional()
 def usuario_listar(request):
     """
     Lista todos los usuarios si el usuario está autenticado y tiene los permisos necesarios.
@@ -66,6 +68,7 @@ def usuario_agregar(request):
 
             # Ahora guardamos el usuario
             nuevo_user.save()
+            form.guardar_sucursal(nuevo_user)
 
             # Redirige a la página de listado después de agregar un nuevo objeto
             messages.success(request, "Se ha agregado el usuario.")
@@ -75,6 +78,7 @@ def usuario_agregar(request):
 
     return render(request, 'paneltrabajador/form_generico.html', {'form': form})
 
+@condicional()
 def usuario_editar(request, id_usuario):
     """
     Edita un usuario existente si el usuario está autenticado y tiene los permisos necesarios.
@@ -121,6 +125,7 @@ def usuario_editar(request, id_usuario):
 
             # Finalmente guardamos y cometemos a la base de datos
             nuevo_user.save()
+            form.guardar_sucursal(nuevo_user)
 
             # Redirige a la página de listado después de editar
             messages.success(request, "Se ha editado el usuario.")
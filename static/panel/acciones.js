@@ -0,0 +1,25 @@
+// Acciones masivas de los listados: casilla para seleccionar todas las filas
+// y campos extra que solo se muestran para la acción que los necesita.
+(function () {
+  document.querySelectorAll("[data-seleccionar-todo]").forEach(function (casilla) {
+    casilla.addEventListener("change", function () {
+      const formulario = casilla.dataset.seleccionarTodo;
+      document.querySelectorAll('input[name="seleccion"][form="' + formulario + '"]').forEach(function (otra) {
+        otra.checked = casilla.checked;
+      });
+    });
+  });
+
+  document.querySelectorAll("form[data-acciones]").forEach(function (formulario) {
+    const selector = formulario.querySelector('select[name="accion"]');
+    function actualizar() {
+      formulario.querySelectorAll("[data-para-accion]").forEach(function (campo) {
+        const visible = campo.dataset.paraAccion === selector.value;
+        campo.classList.toggle("d-none", !visible);
+        campo.disabled = !visible;
+      });
+    }
+    selector.addEventListener("change", actualizar);
+    actualizar();
+  });
+})();
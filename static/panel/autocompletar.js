@@ -0,0 +1,84 @@
+// Autocompletado de los campos de clientes, mascotas y usuarios de los formularios del panel.
+// El <select> solo trae la opción seleccionada; al escribir en el buscador se piden
+// al servidor las coincidencias y se reemplazan las opciones del <select>.
+(function () {
+  const ESPERA_MS = 250;
+
+  document.querySelectorAll("select[data-autocompletar]").forEach(function (select) {
+    const buscador = document.createElement("input");
+    buscador.type = "search";
+    buscador.className = "form-control mb-1";
+    buscador.placeholder = "Buscar...";
+    buscador.setAttribute("aria-label", "Buscar " + select.name);
+    select.parentNode.insertBefore(buscador, select);
+
+    // Campo del que dependen las opciones (por ejemplo, las mascotas del cliente seleccionado)
+    const padre = select.dataset.dependeDe ? select.form.querySelector('[name="' + select.dataset.dependeDe + '"]') : null;
+
+    let temporizador = null;
+    let peticion = null;
+
+    function mostrar(resultados) {
+      const actual = select.value;
+      const vacia = select.querySelector('option[value=""]');
+      select.innerHTML = "";
+      if (vacia) {
+        select.appendChild(vacia);
+      }
+      resultados.forEach(function (resultado) {
+        const opcion = new Option(resultado.texto, resultado.id);
+        opcion.selected = String(resultado.id) === actual;
+        select.appendChild(opcion);
+      });
+      // Si la opción anterior ya no está, se selecciona el primer resultado
+      if (select.value !== actual && resultados.length) {
+        select.value = String(resultados[0].id);
+      }
+      select.dispatchEvent(new Event("change", { bubbles: true }));
+    }
+
+    function buscar() {
+      const parametros = new URLSearchParams({ q: buscador.value.trim() });
+      if (padre && padre.value) {
+        parametros.set("cliente", padre.value);
+      }
+      if (!parametros.get("q") && !parametros.get("cliente")) {
+        return;
+      }
+
+      if (peticion) {
+        peticion.abort();
+      }
+      peticion = new AbortController();
+
+      fetch(select.dataset.autocompletar + "?" + parametros.toString(), {
+        signal: peticion.signal,
+        credentials: "same-origin",
+      })
+        .then(function (respuesta) {
+          return respuesta.ok ? respuesta.json() : { resultados: [] };
+        })
+        .then(function (datos) {
+          mostrar(datos.resultados);
+        })
+        .catch(function () {});
+    }
+
+    buscador.addEventListener("input", function () {
+      clearTimeout(temporizador);
+      temporizador = setTimeout(buscar, ESPERA_MS);
+    });
+
+    // Al cambiar el campo padre se vuelven a cargar las opciones
+    if (padre) {
+      padre.addEventListener("change", function () {
+        buscador.value = "";
+        if (padre.value) {
+          buscar();
+        } else {
+          mostrar([]);
+        }
+      });
+    }
+  });
+})();
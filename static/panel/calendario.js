@@ -0,0 +1,194 @@
+// Calendario de citas del panel.
+// Solo pide al servidor las citas de la ventana visible (día, semana o mes).
+(function () {
+  const contenedor = document.getElementById("calendario");
+  if (!contenedor) {
+    return;
+  }
+
+  const DIAS = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"];
+  const COLORES = { "0": "success", "1": "primary", "2": "secondary", "3": "warning" };
+
+  const grilla = contenedor.querySelector("[data-grilla]");
+  const titulo = contenedor.querySelector("[data-titulo]");
+  const error = contenedor.querySelector("[data-error]");
+
+  let vista = "semana";
+  let referencia = new Date();
+  let peticion = null;
+
+  // Fecha local en formato AAAA-MM-DD
+  function iso(fecha) {
+    const mes = String(fecha.getMonth() + 1).padStart(2, "0");
+    const dia = String(fecha.getDate()).padStart(2, "0");
+    return fecha.getFullYear() + "-" + mes + "-" + dia;
+  }
+
+  function sumarDias(fecha, dias) {
+    const nueva = new Date(fecha);
+    nueva.setDate(nueva.getDate() + dias);
+    return nueva;
+  }
+
+  function lunes(fecha) {
+    const dia = (fecha.getDay() + 6) % 7;
+    return sumarDias(new Date(fecha.getFullYear(), fecha.getMonth(), fecha.getDate()), -dia);
+  }
+
+  // Calcula la ventana [desde, hasta) a consultar según la vista actual
+  function ventana() {
+    const hoy = new Date(referencia.getFullYear(), referencia.getMonth(), referencia.getDate());
+    if (vista === "dia") {
+      return { desde: hoy, hasta: sumarDias(hoy, 1) };
+    }
+    if (vista === "semana") {
+      const inicio = lunes(hoy);
+      return { desde: inicio, hasta: sumarDias(inicio, 7) };
+    }
+    // En el mes mostramos semanas completas
+    const inicio = lunes(new Date(hoy.getFullYear(), hoy.getMonth(), 1));
+    const finMes = new Date(hoy.getFullYear(), hoy.getMonth() + 1, 1);
+    const semanas = Math.ceil((finMes - inicio) / (7 * 86400000));
+    return { desde: inicio, hasta: sumarDias(inicio, semanas * 7) };
+  }
+
+  function mover(direccion) {
+    if (vista === "dia") {
+      referencia = sumarDias(referencia, direccion);
+    } else if (vista === "semana") {
+      referencia = sumarDias(referencia, 7 * direccion);
+    } else {
+      referencia = new Date(referencia.getFullYear(), referencia.getMonth() + direccion, 1);
+    }
+    cargar();
+  }
+
+  function elementoCita(cita) {
+    const hora = cita.fecha.substring(11, 16);
+    const detalle = cita.mascota ? cita.mascota + " (" + cita.cliente + ")" : cita.estado_display;
+    // Las horas del horario sin cita no tienen n_cita ni página de edición
+    const url = cita.n_cita ? contenedor.dataset.urlEditar : null;
+    const elemento = document.createElement(url ? "a" : "div");
+    if (url) {
+      elemento.href = url.replace("/0/", "/" + cita.n_cita + "/");
+    }
+    elemento.className = "d-block small text-truncate mb-1 px-1 rounded text-white text-decoration-none bg-" + (COLORES[cita.estado] || "info");
+    elemento.title = hora + " - " + cita.estado_display + " - " + cita.usuario + " - " + detalle;
+    elemento.textContent = hora + " " + detalle;
+    return elemento;
+  }
+
+  function dibujar(desde, hasta, citas) {
+    // Agrupamos las citas por día
+    const porDia = {};
+    citas.forEach(function (cita) {
+      const dia = cita.fecha.substring(0, 10);
+      (porDia[dia] = porDia[dia] || []).push(cita);
+    });
+
+    const dias = Math.round((hasta - desde) / 86400000);
+    const columnas = vista === "dia" ? 1 : 7;
+    const tabla = document.createElement("table");
+    tabla.className = "table table-bordered table-sm";
+
+    if (columnas === 7) {
+      const encabezado = tabla.createTHead().insertRow();
+      DIAS.forEach(function (nombre) {
+        const celda = document.createElement("th");
+        celda.textContent = nombre;
+        encabezado.appendChild(celda);
+      });
+    }
+
+    const cuerpo = tabla.createTBody();
+    let fila = null;
+    for (let i = 0; i < dias; i++) {
+      if (i % columnas === 0) {
+        fila = cuerpo.insertRow();
+      }
+      const fecha = sumarDias(desde, i);
+      const celda = fila.insertCell();
+      celda.style.width = 100 / columnas + "%";
+      if (vista === "mes" && fecha.getMonth() !== referencia.getMonth()) {
+        celda.className = "bg-light text-muted";
+      }
+      const numero = document.createElement("div");
+      numero.className = "fw-bold small";
+      numero.textContent = fecha.getDate();
+      celda.appendChild(numero);
+      (porDia[iso(fecha)] || []).forEach(function (cita) {
+        celda.appendChild(elementoCita(cita));
+      });
+    }
+
+    grilla.replaceChildren(tabla);
+  }
+
+  function cargar() {
+    const rango = ventana();
+    const parametros = new URLSearchParams({ desde: iso(rango.desde), hasta: iso(rango.hasta) });
+    contenedor.querySelectorAll("[data-filtro]").forEach(function (filtro) {
+      if (filtro.value) {
+        parametros.set(filtro.dataset.filtro, filtro.value);
+      }
+    });
+
+    titulo.textContent = vista === "mes"
+      ? referencia.toLocaleDateString("es-CL", { month: "long", year: "numeric" })
+      : iso(rango.desde) + (vista === "dia" ? "" : " — " + iso(sumarDias(rango.hasta, -1)));
+
+    // Cancelamos la petición anterior si el usuario navega rápido
+    if (peticion) {
+      peticion.abort();
+    }
+    peticion = new AbortController();
+
+    fetch(contenedor.dataset.url + "?" + parametros, { signal: peticion.signal, credentials: "same-origin" })
+      .then(function (respuesta) {
+        return respuesta.json().then(function (datos) {
+          if (!respuesta.ok) {
+            throw new Error(datos.error || "Error al cargar las citas.");
+          }
+          return datos;
+        });
+      })
+      .then(function (datos) {
+        error.classList.add("d-none");
+        dibujar(rango.desde, rango.hasta, datos.citas);
+      })
+      .catch(function (e) {
+        if (e.name !== "AbortError") {
+          error.textContent = e.message;
+          error.classList.remove("d-none");
+        }
+      });
+  }
+
+  contenedor.querySelectorAll("[data-accion]").forEach(function (boton) {
+    boton.addEventListener("click", function () {
+      const accion = boton.dataset.accion;
+      if (accion === "hoy") {
+        referencia = new Date();
+        cargar();
+      } else {
+        mover(accion === "siguiente" ? 1 : -1);
+      }
+    });
+  });
+
+  contenedor.querySelectorAll("[data-vista]").forEach(function (boton) {
+    boton.addEventListener("click", function () {
+      contenedor.querySelectorAll("[data-vista]").forEach(function (otro) {
+        otro.classList.toggle("active", otro === boton);
+      });
+      vista = boton.dataset.vista;
+      cargar();
+    });
+  });
+
+  contenedor.querySelectorAll("[data-filtro]").forEach(function (filtro) {
+    filtro.addEventListener("change", cargar);
+  });
+
+  cargar();
+})();
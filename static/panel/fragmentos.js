@@ -0,0 +1,83 @@
+// Listados que se cargan por partes: scroll infinito y filtros sin recargar la página.
+// Solo se piden al servidor las filas (<tr>) de la página siguiente o del filtro nuevo.
+(function () {
+  document.querySelectorAll("table[data-filas]").forEach(function (tabla) {
+    const cuerpo = tabla.querySelector("tbody");
+    const filtros = document.querySelector('form[data-filtros="' + tabla.id + '"]');
+    const cargarMas = document.querySelector('[data-cargar-mas="' + tabla.id + '"]');
+    let peticion = null;
+
+    function parametros(pagina) {
+      const datos = filtros ? new URLSearchParams(new FormData(filtros)) : new URLSearchParams();
+      datos.set("pagina", pagina);
+      return datos;
+    }
+
+    // Pide las filas de una página. Si "reemplazar" es verdadero se cambian todas las filas (nuevo filtro)
+    function cargar(pagina, reemplazar) {
+      if (peticion) {
+        peticion.abort();
+      }
+      peticion = new AbortController();
+
+      return fetch(tabla.dataset.filas + "?" + parametros(pagina).toString(), {
+        signal: peticion.signal,
+        credentials: "same-origin",
+      })
+        .then(function (respuesta) {
+          if (!respuesta.ok) {
+            throw new Error(respuesta.status);
+          }
+          tabla.dataset.siguiente = respuesta.headers.get("X-Pagina-Siguiente") || "";
+          return respuesta.text();
+        })
+        .then(function (html) {
+          if (reemplazar) {
+            cuerpo.innerHTML = html;
+          } else {
+            cuerpo.insertAdjacentHTML("beforeend", html);
+          }
+          if (cargarMas) {
+            cargarMas.classList.toggle("d-none", !tabla.dataset.siguiente);
+          }
+          peticion = null;
+        })
+        .catch(function (error) {
+          if (error.name !== "AbortError") {
+            peticion = null;
+          }
+        });
+    }
+
+    if (cargarMas) {
+      cargarMas.addEventListener("click", function (evento) {
+        evento.preventDefault();
+        if (tabla.dataset.siguiente && !peticion) {
+          cargar(tabla.dataset.siguiente, false);
+        }
+      });
+
+      // Cargamos la página siguiente al llegar al final de la tabla
+      if ("IntersectionObserver" in window) {
+        new IntersectionObserver(function (entradas) {
+          if (entradas[0].isIntersecting && tabla.dataset.siguiente && !peticion) {
+            cargar(tabla.dataset.siguiente, false);
+          }
+        }).observe(cargarMas);
+      }
+    }
+
+    if (filtros) {
+      function filtrar(evento) {
+        evento.preventDefault();
+        cargar(1, true);
+        // Dejamos los filtros en la URL para poder recargar o compartir el listado
+        const datos = parametros(1);
+        datos.delete("pagina");
+        history.replaceState(null, "", "?" + datos.toString());
+      }
+      filtros.addEventListener("submit", filtrar);
+      filtros.addEventListener("change", filtrar);
+    }
+  });
+})();